@@ -8,6 +8,10 @@ import io
 from contextlib import redirect_stdout, redirect_stderr
 from src.agent_controller import AgentController
 from src.main import SimulationEngine
+from src.llm_backends import create_llm_backend
+from src.llm_stream import get_event_stream
+from src.llm_client import get_llm_client
+from src.llm_scheduler import get_llm_scheduler
 from .environment_service import load_environment_config
 from simulation_log_extractor import SimulationLogExtractor, create_frontend_api_adapter
 
@@ -76,12 +80,30 @@ class SimulationManager:
             # 创建仿真引擎，传入完整配置
             engine_config = {
                 "posts_per_slice": config.get("posts_per_slice", 50),
+                "slice_duration_hours": config.get("slice_duration_hours"),  # 按时间窗口划分时间片（小时），不设置时按posts_per_slice划分
+                "corpus_stream": config.get("corpus_stream"),  # true或{"dir": .., "run_size": ..} 语料构建为磁盘时间片文件，按时间片流式读取
+                "corpus_cache": config.get("corpus_cache", True),  # false关闭；{"dir": ..} 指定目录（默认~/.cache/social_simulation/corpus）。源文件未变化时加载编译好的语料
+                "social_graph": config.get("social_graph"),  # {"path": csv/json} 或 {"synthetic": {"avg_following": ..}}，Feed只包含关注作者的帖子和热门样本
+                "dynamic_pool": config.get("dynamic_pool"),  # true或{"window_slices": .., "half_life_slices": ..}，Agent帖子在之后的时间片重新进入Feed
+                "approximate_feed": config.get("approximate_feed"),  # true或{"max_skip_probability": ..}，只评估选中概率可能达到上限的帖子
                 "llm": config.get("llm", {}),
                 "w_pop": config.get("w_pop", 0.7),
                 "k": config.get("k", 2),
                 "skip_llm": config.get("skip_llm", False),  # 新增：跳过LLM调用的配置
                 "llm_config": config.get("llm_config", {}),  # 新增：LLM测试配置
-                "pre_injected_events": config.get("pre_injected_events", [])  # 🔥 修复：传入预置官方声明事件
+                "pre_injected_events": config.get("pre_injected_events", []),  # 🔥 修复：传入预置官方声明事件
+                "annotation_workers": config.get("annotation_workers", 4),  # 发帖标注并行线程数（0为同步标注）
+                "posting_workers": config.get("posting_workers", 4),  # 发帖流水线线程数（0为读完一个Agent的帖子后串行发帖）
+                "simulation_id": simulation_id,
+                "llm_priority": config.get("llm_priority", "interactive"),  # interactive | batch
+                "llm_token_budget": config.get("llm_token_budget"),
+                "llm_rate_limit": config.get("llm_rate_limit"),  # {"requests_per_second": .., "tokens_per_minute": ..}
+                "llm_cassette": config.get("llm_cassette"),  # {"mode": "record|replay", "path": .., "strict": false}
+                "random_seed": config.get("random_seed"),
+                "llm_batch": config.get("llm_batch"),  # {"dir": .., "auto_process": false} 离线批处理，续跑时传入相同dir
+                "prompt_budget": config.get("prompt_budget"),  # {"max_tokens": {"posting": .., "reading": ..}, "max_chain_ancestors": ..}
+                "llm_gating": config.get("llm_gating"),  # {"min_information_strength": 0.3, "shadow_rate": 0.1, ...} 阅读阶段跳过低影响LLM调用
+                "llm_surrogate": config.get("llm_surrogate")  # {"record_pairs": true, "model_path": "..", "mode": "gate|replace"} 代理模型
             }
             
             # 🔍 调试信息：检查是否有预置官方声明
@@ -160,6 +182,8 @@ class SimulationManager:
                 # 触发示例数据加载
                 engine._load_sample_data()
                 print(f"示例数据加载完成，总时间片数: {engine.total_slices}")
+            # 实际的时间片时间范围和帖子数量（供/timeslices接口使用）
+            simulation_config["time_slices"] = engine.get_time_slice_info()
             
             # 确定最大时间片数
             max_slices = config.get("max_slices")
@@ -195,8 +219,15 @@ class SimulationManager:
             else:
                 detailed_log = "未找到实时日志文件"
         
-            # 保存结果
-            simulation_config["status"] = "completed"
+            # 保存结果（离线批处理模式下可能暂停等待批处理结果）
+            if engine.batch_status == "waiting_for_results":
+                simulation_config["status"] = "waiting_for_batch"
+                simulation_config["llm_batch"] = {
+                    "dir": engine.llm_batch_job.job_dir,
+                    "awaiting_batches": engine.llm_batch_job.awaiting_batches()
+                }
+            else:
+                simulation_config["status"] = "completed"
             simulation_config["detailed_log"] = detailed_log  # 保存详细日志
             simulation_config["log_file"] = latest_log  # 新增：日志文件路径
             simulation_config["results"] = {
@@ -204,7 +235,8 @@ class SimulationManager:
                 "agent_count": len(agent_configs),
                 "duration": 0,  # 简化处理，不依赖results的结构
                 "simulation_data": results,
-                "agent_states": self._get_agent_states(engine.agent_controller)
+                "agent_states": self._get_agent_states(engine.agent_controller),
+                "llm_usage": get_llm_scheduler().get_usage(simulation_id)
             }
             
             # 清理停止标志
@@ -355,15 +387,12 @@ class SimulationManager:
     def _annotate_with_llm(self, content):
         """使用LLM对官方声明内容进行数据标记，重用现有的promptdataprocess.txt模板"""
         import os
-        import requests
         import json
         
-        # 检查LLM配置
-        api_key = os.getenv('LLM_API_KEY')
-        endpoint = os.getenv('LLM_ENDPOINT')
-        model = os.getenv('LLM_MODEL', 'deepseek-v3')
+        # 检查LLM配置（服务层按环境变量创建后端）
+        llm_backend = create_llm_backend({"model": os.getenv('LLM_MODEL', 'deepseek-v3')})
         
-        if not api_key or not endpoint:
+        if llm_backend is None:
             print(f"[LLM标记] 未配置LLM API，跳过自动标记")
             return {"success": False, "error": "LLM未配置"}
         
@@ -403,16 +432,8 @@ class SimulationManager:
             print(f"[LLM标记] 开始标记官方声明内容...")
             print(f"[LLM标记] 内容长度: {len(content)} 字符")
             
-            response = requests.post(
-                endpoint,
-                headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {api_key}'},
-                json={'model': model, 'messages': [{'role': 'user', 'content': annotation_prompt}]},
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            api_response = response.json()
-            llm_content = api_response['choices'][0]['message']['content']
+            # 共享客户端：相同内容的批量官方声明并发标注时只发出一次请求
+            llm_content = get_llm_client().complete(llm_backend, annotation_prompt, timeout=30)
             
             print(f"[LLM标记] 原始响应: {llm_content}")
             
@@ -809,12 +830,22 @@ def get_realtime_log(simulation_id):
             yield f"data: {{'error': '未找到日志文件'}}\n\n"
             return
             
-        # 实时读取日志文件
+        # 实时读取日志文件；发帖生成的流式文本以命名事件llm_stream推送（onmessage不会收到）
+        import json
+        events = get_event_stream()
         last_position = 0
+        last_event_seq = 0
+        stream_events = []
         while True:
             try:
+                for event in stream_events:
+                    yield f"event: llm_stream\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                    last_event_seq = event['seq']
+                
                 simulation = simulation_manager.get_simulation_status(simulation_id)
                 if not simulation or simulation['status'] in ['completed', 'error', 'stopped']:
+                    for event in events.read(simulation_id, last_event_seq):
+                        yield f"event: llm_stream\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
                     # 仿真结束，发送最后的日志内容
                     if os.path.exists(log_file_path):
                         with open(log_file_path, 'r', encoding='utf-8') as f:
@@ -837,7 +868,8 @@ def get_realtime_log(simulation_id):
                             yield f"data: {json.dumps({'content': new_content, 'status': 'running'})}\n\n"
                             last_position = f.tell()
                 
-                time.sleep(0.5)  # 每0.5秒检查一次
+                # 每0.5秒检查一次日志，期间有流式事件时立即推送
+                stream_events = events.wait(simulation_id, last_event_seq, timeout=0.5)
                 
             except Exception as e:
                 yield f"data: {{'error': '读取日志失败: {str(e)}'}}\n\n"
@@ -869,6 +901,18 @@ def get_simulation_results(simulation_id):
     
     return jsonify(status["results"])
 
+@simulation_bp.route('/llm_usage/<simulation_id>', methods=['GET'])
+def get_simulation_llm_usage(simulation_id):
+    """获取仿真的LLM调用用量（运行中也可查询）"""
+    if simulation_id not in simulation_manager.simulations:
+        return jsonify({"error": "仿真不存在"}), 404
+    
+    return jsonify({
+        "status": "success",
+        "simulation_id": simulation_id,
+        "llm_usage": get_llm_scheduler().get_usage(simulation_id)
+    })
+
 @simulation_bp.route('/load', methods=['POST'])
 def load_simulation():
     """加载历史仿真配置"""
@@ -1268,6 +1312,21 @@ def get_simulation_timeslices(simulation_id):
         
         simulation = simulation_manager.simulations[simulation_id]
         
+        # 仿真加载数据后记录了实际的时间范围和帖子数量
+        slice_infos = simulation.get("time_slices")
+        if slice_infos:
+            return jsonify({
+                "status": "success",
+                "time_slices": [{
+                    "index": info["index"],
+                    "timeRange": f"{info['start_time']} - {info['end_time']}" if info["start_time"] else None,
+                    "startTime": info["start_time"],
+                    "endTime": info["end_time"],
+                    "postCount": info["post_count"]
+                } for info in slice_infos],
+                "total_slices": len(slice_infos)
+            })
+        
         # 从仿真配置中获取时间片信息
         config = simulation.get("config", {})
         time_slices_count = config.get("time_slices", 10)
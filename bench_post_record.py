@@ -0,0 +1,97 @@
+"""
+帖子记录基准测试：比较世界状态帖子池中的Post记录与原normalize_post生成的dict
+（每条帖子的内存占用、按键读取的耗时）
+
+用法: python bench_post_record.py [帖子数]
+"""
+
+import random
+import sys
+import timeit
+
+from src.post import Post, source_post_id
+
+
+def legacy_normalize_post(post):
+    """原WorldState.normalize_post（别名与规范字段同时保存，类别按分值写入）"""
+    std = dict(post)
+    if 'post_id' not in std:
+        if 'id' in std:
+            std['post_id'] = std['id']
+        elif 'mid' in std:
+            std['post_id'] = std['mid']
+        else:
+            std['post_id'] = str(std.get('uid', '')) + '_' + str(std.get('t', ''))
+    if 'author_id' not in std and 'uid' in std:
+        std['author_id'] = std['uid']
+    if 'content' not in std and 'text' in std:
+        std['content'] = std['text']
+    elif 'content' not in std:
+        std['content'] = ''
+    if 'timestamp' not in std and 't' in std:
+        std['timestamp'] = std['t']
+    if 'parent_post_id' not in std and 'pid' in std:
+        std['parent_post_id'] = std['pid']
+    std.setdefault('emotion_score', 0.0)
+    std.setdefault('stance_score', 0.0)
+    std.setdefault('information_strength', 0.5)
+    std.setdefault('keywords', [])
+    std.setdefault('is_repost', False)
+    std['emotion_category'] = 'positive' if std['emotion_score'] > 0.3 else (
+        'negative' if std['emotion_score'] < -0.3 else 'neutral')
+    std['stance_category'] = 'support' if std['stance_score'] > 0.3 else (
+        'oppose' if std['stance_score'] < -0.3 else 'neutral')
+    std.setdefault('parent_post_id', None)
+    return std
+
+
+def corpus_posts(count: int, seed: int = 0):
+    """与语料相同形状的原始帖子（mid/uid/t/pid别名 + 热度和标注分值）"""
+    rng = random.Random(seed)
+    return [{
+        'mid': f"m{i}",
+        'uid': f"u{rng.randint(0, 500)}",
+        'text': f"帖子{i}",
+        't': 1704067200 + i * 60,
+        'pid': f"m{rng.randint(0, i)}" if i else None,
+        'popularity': rng.randint(0, 500),
+        'emotion_score': round(rng.uniform(-1, 1), 3),
+        'stance_score': round(rng.uniform(-1, 1), 3),
+        'information_strength': 0.6,
+    } for i in range(count)]
+
+
+def record_bytes(record) -> int:
+    """记录本身的字节数（Post包含extra字典，不含共享的键和值对象）"""
+    size = sys.getsizeof(record)
+    if isinstance(record, Post):
+        size += sys.getsizeof(record.extra)
+    return size
+
+
+def main(count: int = 5000):
+    raw = corpus_posts(count)
+    variants = {
+        'dict': [legacy_normalize_post(post) for post in raw],
+        'Post': [Post.from_dict(post) for post in raw],
+    }
+    keys = ('stance_score', 'popularity', 'mid', 'author_id', 'stance_category')
+    print(f"{count} 条帖子")
+    for name, records in variants.items():
+        memory = sum(record_bytes(record) for record in records)
+        print(f"  {name:5s} 内存 {memory / 1e6:.2f} MB")
+    for key in keys:
+        timings = []
+        for name, records in variants.items():
+            seconds = min(timeit.repeat(lambda: [record.get(key) for record in records], number=40, repeat=5))
+            timings.append(f"{name} {seconds:.3f}s")
+        print(f"  get({key!r}) x {40 * count}: " + ", ".join(timings))
+    timings = []
+    for name, records in variants.items():
+        seconds = min(timeit.repeat(lambda: [source_post_id(record) for record in records], number=40, repeat=5))
+        timings.append(f"{name} {seconds:.3f}s")
+    print(f"  source_post_id x {40 * count}: " + ", ".join(timings))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -1,9 +1,15 @@
 from enum import Enum
-import requests
 import os
 import random
 from dotenv import load_dotenv
 import csv
+from .llm_client import get_llm_client
+from .llm_scheduler import LLMBudgetExceededError, estimate_tokens
+from .llm_batch import BatchPendingError
+from .llm_stream import get_event_stream, EVENT_POST_START, EVENT_POST_DELTA, EVENT_POST_DONE
+from .prompt_layout import stable_format_template
+from .influence import InfluenceHistory
+from .post import source_post_id
 
 load_dotenv()  # 加载环境变量
 
@@ -11,10 +17,30 @@ class RoleType(Enum):
     ORDINARY_USER = "ordinary_user"
     OPINION_LEADER = "opinion_leader"
 
+def _tracked_state(field):
+    """Agent当前状态属性：赋值时通知增量统计（state_tracker）"""
+    attr = f'_current_{field}'
+
+    def getter(self):
+        return self.__dict__[attr]
+
+    def setter(self, value):
+        tracker = self.state_tracker
+        if tracker is not None:
+            tracker.on_change(field, self.__dict__[attr], value)
+        self.__dict__[attr] = value
+
+    return property(getter, setter)
+
+
 class Agent:
     """
     统一的Agent类，只保留标准字段和LLM功能
     """
+    current_emotion = _tracked_state('emotion')
+    current_stance = _tracked_state('stance')
+    current_confidence = _tracked_state('confidence')
+
     def __init__(self, agent_id, role_type, attitude_firmness, opinion_blocking, activity_level,
                  initial_emotion, initial_stance, initial_confidence,
                  current_emotion=None, current_stance=None, current_confidence=None,
@@ -33,6 +59,8 @@ class Agent:
         self.initial_stance = float(initial_stance)
         self.initial_confidence = float(initial_confidence)
         
+        # 状态增量统计（由AgentController注入，None表示未跟踪）
+        self.state_tracker = None
         # 当前状态（如果未指定则使用初始值）
         self.current_emotion = float(current_emotion) if current_emotion is not None else self.initial_emotion
         self.current_stance = float(current_stance) if current_stance is not None else self.initial_stance
@@ -47,13 +75,19 @@ class Agent:
         self.blocked_user_ids = blocked_user_ids or []
         # 新增：记录本时间片已读帖子
         self.viewed_posts = []
-        # 新增：记录本时间片每次读帖后的情绪和立场变化
-        self.emotion_stance_history = []
+        # 新增：记录本时间片每次读帖后的情绪和立场变化（环形缓冲，同时维护影响最大的帖子）
+        self.emotion_stance_history = InfluenceHistory()
         
-        # LLM相关配置
-        self.llm_api_key = os.getenv('LLM_API_KEY')
-        self.llm_endpoint = os.getenv('LLM_ENDPOINT')
-        self.llm_model = os.getenv('LLM_MODEL')
+        # LLM后端（由仿真引擎经AgentController注入，None表示未配置）
+        self.llm_backend = None
+        # 所属仿真ID（用于LLM调度的优先级、预算和用量统计）
+        self.simulation_id = None
+        # prompt token预算（由AgentController注入，None表示不裁剪）
+        self.prompt_budget = None
+        # 阅读阶段的LLM调用门控（由AgentController注入，None表示每条帖子都调用LLM）
+        self.llm_gate = None
+        # 代理模型训练样本录制（由AgentController注入，None表示不录制）
+        self.surrogate_recorder = None
         
         # 发帖算法相关参数
         self.expression_threshold = 0.05  # 表达欲阈值
@@ -89,28 +123,36 @@ class Agent:
         rand = random.random()
         return rand < p_reply
 
-    def update_emotion_and_stance(self, post, event_description=None, time_slice_index=None, all_posts=None):
+    def update_emotion_and_stance(self, post, event_description=None, time_slice_index=None, all_posts=None,
+                                  mid_index=None):
         """
         更新情绪状态和观点立场，使用LLM融合算法，并记录变化历史
+        
+        mid_index: all_posts的mid索引（时间片上下文中预先构建），None时按需从all_posts构建
         """
         prev_emotion = self.current_emotion
         prev_stance = self.current_stance
         prev_confidence = self.current_confidence
-        emotion_suggested, stance_suggested = self._update_emotion_llm_fusion(post, event_description, all_posts)
+        emotion_suggested, stance_suggested = self._update_emotion_llm_fusion(
+            post, event_description, all_posts, time_slice_index=time_slice_index, mid_index=mid_index
+        )
         self._update_stance(post, llm_stance_suggested=stance_suggested)
         # 记录本次变化
-        self.emotion_stance_history.append({
-            'post_id': post.get('mid', post.get('id', post.get('post_id', None))),
-            'emotion_before': prev_emotion,
-            'stance_before': prev_stance,
-            'confidence_before': prev_confidence,
-            'emotion_after': self.current_emotion,
-            'stance_after': self.current_stance,
-            'confidence_after': self.current_confidence,
-            'time_slice_index': time_slice_index
-        })
-
-    def _update_emotion_llm_fusion(self, post, event_description=None, all_posts=None):
+        self.emotion_stance_history.record(
+            source_post_id(post),
+            prev_emotion, prev_stance, prev_confidence,
+            self.current_emotion, self.current_stance, self.current_confidence,
+            time_slice_index
+        )
+
+    def llm_configured(self):
+        """是否可以调用LLM（已注入可用后端，或本仿真的调用由cassette回放/离线批处理提供）"""
+        if self.llm_backend is not None and self.llm_backend.configured:
+            return True
+        return get_llm_client().serves_offline(self.simulation_id)
+
+    def _update_emotion_llm_fusion(self, post, event_description=None, all_posts=None, time_slice_index=None,
+                                   mid_index=None):
         """
         LLM建议融合算法：
         1. 构造prompt，传递当前情绪、帖子内容、事件描述给LLM，获得建议情绪E_suggested（-1~1）
@@ -119,9 +161,19 @@ class Agent:
         其中α为self.emotion_sensitivity，I_strength为post['information_strength']
         """
         # 1. 构造prompt并请求LLM
-        if not self.llm_api_key or not self.llm_endpoint:
-            print(f"[LLM Debug] Agent {self.agent_id}: api_key={bool(self.llm_api_key)}, endpoint={bool(self.llm_endpoint)}")
-            print(f"[LLM] 未设置API KEY或endpoint，跳过LLM情绪推理，直接赋值。Agent: {self.agent_id}")
+        llm_configured = self.llm_configured()
+        # 未配置LLM时，门控只在有预测器（代理模型）时参与决策
+        gate_decision = None
+        if self.llm_gate is not None and (llm_configured or self.llm_gate.predictor is not None):
+            gate_decision = self.llm_gate.decide(self, post, llm_available=llm_configured)
+        if gate_decision is not None and not gate_decision.use_llm:
+            # 门控判定本条帖子不值得调用LLM，使用标注值（或本地预测值）
+            print(f"[LLM Gate] Agent {self.agent_id}: 跳过LLM ({gate_decision.reason})，建议情绪: {gate_decision.emotion_suggested}, 建议立场: {gate_decision.stance_suggested}")
+            E_suggested = gate_decision.emotion_suggested
+            S_suggested = gate_decision.stance_suggested
+        elif not llm_configured:
+            print(f"[LLM Debug] Agent {self.agent_id}: backend={self.llm_backend.describe() if self.llm_backend else None}")
+            print(f"[LLM] 未配置LLM后端，跳过LLM情绪推理，直接赋值。Agent: {self.agent_id}")
             E_suggested = post.get('emotion_score', post.get('emotion', 0.0))
             S_suggested = post.get('stance_score', 0.0)
         else:
@@ -146,18 +198,26 @@ class Agent:
                 # 动态导入避免循环依赖
                 from .services import extract_chain, generate_context
                 
-                mid_index = {}
-                def build_index(posts):
-                    for p in posts:
-                        mid_index[p.get('mid', p.get('id'))] = p
-                        if 'children' in p:
-                            build_index(p['children'])
-                build_index(all_posts)
+                if mid_index is None:
+                    mid_index = {}
+                    def build_index(posts):
+                        for p in posts:
+                            mid_index[p.get('mid', p.get('id'))] = p
+                            if 'children' in p:
+                                build_index(p['children'])
+                    build_index(all_posts)
                 
                 # 提取对话链条
                 target_mid = post.get('mid', post.get('id'))
                 chain = extract_chain(mid_index, target_mid)
-                context_text = generate_context(chain)
+                if self.prompt_budget is not None and chain:
+                    # 只保留最近的父帖子，超出阅读prompt预算时继续裁掉最早的父帖子
+                    chain, dropped = self.prompt_budget.trim_chain(
+                        chain, reserved_tokens=estimate_tokens(prompt_template) + estimate_tokens(event_description or "")
+                    )
+                    if dropped:
+                        print(f"[Prompt] Agent {self.agent_id}: 对话链省略 {dropped} 层较早的父帖子")
+                context_text = generate_context(chain) if chain else "(这是一个独立帖子，没有回复关系)"
             else:
                 # 没有all_posts，生成简单上下文
                 context_text = "(这是一个独立帖子，没有回复关系)"
@@ -165,8 +225,8 @@ class Agent:
             # 获取帖子内容
             post_content = post.get('text', post.get('content', post.get('original_text', '')))
             
-            # 替换模板中的占位符
-            prompt = prompt_template.format(
+            # 替换模板中的占位符（静态说明在前、Agent状态和帖子内容在后，便于上游前缀缓存）
+            prompt = stable_format_template(prompt_template).format(
                 current_emotion=self.current_emotion,
                 current_stance=self.current_stance,
                 current_confidence=self.current_confidence,
@@ -183,20 +243,17 @@ class Agent:
             print(f"[LLM Post] 帖子内容: '{post_content}'")
             print(f"[LLM Post] 帖子字段: {list(post.keys())}")
             try:
-                response = requests.post(
-                    self.llm_endpoint,
-                    headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {self.llm_api_key}'},
-                    json={'model': self.llm_model, 'messages': [{'role': 'user', 'content': prompt}]}
-                )
-                response.raise_for_status()
-                print(f"[LLM API Response] Status: {response.status_code}")
-                print(f"[LLM API Response] Raw: {response.text[:500]}...")  # 只显示前500字符
-                
                 import json as _json
-                api_response = response.json()
-                print(f"[LLM API Response] JSON: {api_response}")
-                
-                llm_content = api_response['choices'][0]['message']['content']
+                llm_content = get_llm_client().complete(
+                    self.llm_backend, prompt,
+                    simulation_id=self.simulation_id,
+                    call_info={
+                        'call_site': 'reading',
+                        'agent_id': self.agent_id,
+                        'time_slice': time_slice_index,
+                        'post_id': source_post_id(post)
+                    }
+                )
                 print(f"[LLM Content] {llm_content}")
                 
                 # 尝试解析LLM返回的JSON，处理markdown代码块格式
@@ -216,6 +273,18 @@ class Agent:
                 E_suggested = float(result.get('emotion_suggested', self.current_emotion))
                 S_suggested = float(result.get('stance_suggested', self.current_stance))
                 print(f"[LLM] Agent {self.agent_id} LLM分析完成，建议情绪: {E_suggested}, 建议立场: {S_suggested}")
+                if gate_decision is not None and gate_decision.shadow:
+                    self.llm_gate.record_shadow(gate_decision, E_suggested, S_suggested)
+                if self.surrogate_recorder is not None:
+                    self.surrogate_recorder.record(self, post, E_suggested, S_suggested)
+            except BatchPendingError:
+                # 离线批处理：本时间片暂停在这条帖子，等待结果导入后重新执行
+                raise
+            except LLMBudgetExceededError as e:
+                # 预算用尽：与未配置LLM时一致，直接使用帖子标注值
+                print(f"[LLM] {e}，使用帖子标注值。Agent: {self.agent_id}")
+                E_suggested = post.get('emotion_score', post.get('emotion', 0.0))
+                S_suggested = post.get('stance_score', 0.0)
             except Exception as e:
                 print(f"[LLM] API调用失败: {e}，使用默认值。Agent: {self.agent_id}")
                 print(f"[LLM Debug] Exception type: {type(e).__name__}")
@@ -335,11 +404,11 @@ class Agent:
 
     def generate_text(self, skip_llm=False, agent_controller=None):
         """调用LLM生成文本"""
-        if skip_llm or not self.llm_api_key or not self.llm_endpoint:
+        if skip_llm or not self.llm_configured():
             if skip_llm:
                 print(f"[LLM] 跳过LLM文本生成，返回模板文本。Agent: {self.agent_id}")
             else:
-                print(f"[LLM] 未设置API KEY或endpoint，跳过LLM调用，返回空字符串。Agent: {self.agent_id}")
+                print(f"[LLM] 未配置LLM后端，跳过LLM调用，返回空字符串。Agent: {self.agent_id}")
             
             # 返回模板文本而不是空字符串
             if skip_llm:
@@ -352,9 +421,10 @@ class Agent:
         # 根据Agent类型选择不同的prompt
         if self.role_type.value == "opinion_leader":
             # 意见领袖使用专门的prompt模板
-            if agent_controller and hasattr(agent_controller, 'last_env_summary'):
+            env_summary = getattr(agent_controller, 'last_env_summary', None) if agent_controller else None
+            if env_summary:
                 from .opinion_leader_prompts import build_opinion_leader_post_prompt
-                prompt = build_opinion_leader_post_prompt(self, agent_controller.last_env_summary)
+                prompt = build_opinion_leader_post_prompt(self, env_summary)
             else:
                 # 如果没有环境摘要，使用简化版本
                 prompt = f"""你是一位在中国社交媒体上极具影响力的意见领袖。请基于你的当前状态撰写一篇社交媒体帖子。
@@ -412,16 +482,31 @@ class Agent:
         if f"current_emotion: {self.current_emotion:.3f}" in prompt:
             print(f"[LLM Info] Agent {self.agent_id}: 模板包含当前情绪信息")
 
+        # 流式输出的增量文本转发到本仿真的实时事件流
+        time_slice = getattr(agent_controller, 'current_time_slice', None)
+        events = get_event_stream()
+        event_info = {'agent_id': self.agent_id, 'time_slice': time_slice}
+        events.publish(self.simulation_id, EVENT_POST_START, event_info)
+
         try:
-            response = requests.post(
-                self.llm_endpoint,
-                headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {self.llm_api_key}'},
-                json={'model': self.llm_model, 'messages': [{'role': 'user', 'content': prompt}]}
+            content = get_llm_client().complete(
+                self.llm_backend, prompt,
+                simulation_id=self.simulation_id,
+                call_info={
+                    'call_site': 'posting',
+                    'agent_id': self.agent_id,
+                    'time_slice': time_slice
+                },
+                on_delta=lambda delta: events.publish(self.simulation_id, EVENT_POST_DELTA, {**event_info, 'delta': delta})
             )
-            response.raise_for_status()
-            return response.json()['choices'][0]['message']['content'].strip()
+            content = content.strip()
+            events.publish(self.simulation_id, EVENT_POST_DONE, {**event_info, 'content': content})
+            return content
+        except BatchPendingError:
+            raise
         except Exception as e:
             print(f"[LLM] 生成文本失败: {e}，返回空字符串。Agent: {self.agent_id}")
+            events.publish(self.simulation_id, EVENT_POST_DONE, {**event_info, 'content': '', 'error': str(e)})
             return ""
 
     def get_status(self):
@@ -502,7 +587,7 @@ class Agent:
 
     def reset_emotion_stance_history(self):
         """清空本时间片情绪立场变化历史"""
-        self.emotion_stance_history = []
+        self.emotion_stance_history.clear()
 
 def load_agents_from_csv(csv_path):
     """从CSV文件读取智能体状态并恢复为对象列表"""
@@ -4,114 +4,249 @@ from .time_manager import TimeSliceManager
 import json
 import random
 import math
+import numpy as np
 from typing import Optional
 from src.services import generate_context, make_prompt
+from src.post_annotator import (
+    PostAnnotator, load_annotation_template, find_parent_content,
+    build_annotation_prompt, request_annotation
+)
+from src.llm_batch import BatchPendingError
+from src.posting_pipeline import PostingPipeline
+from src.slice_context import SliceContext
+from src.aggregates import AgentAggregates
+from src.post import source_post_id
+from src.social_graph import DEFAULT_TRENDING_SAMPLE
+from src.feed_index import StanceFeedIndex
+from src.llm_backends import create_llm_backend
+from src.llm_scheduler import estimate_tokens
+from src.prompt_budget import PromptBudget
+from src.prompt_layout import stable_marker_template
 from datetime import datetime, timedelta
 
 class AgentController:
-    def __init__(self, world_state: WorldState, time_manager: Optional[TimeSliceManager], w_pop=0.7, k=2, agent_posts_file=None):
+    def __init__(self, world_state: WorldState, time_manager: Optional[TimeSliceManager], w_pop=0.7, k=2, agent_posts_file=None,
+                 annotation_workers=4, prompt_budget: Optional[PromptBudget] = None, llm_gate=None,
+                 surrogate_recorder=None, posting_workers=4):
         self.world_state = world_state
         self.time_manager = time_manager
         self.agents = []
+        self.agent_aggregates = AgentAggregates()  # 全体Agent状态的增量统计，添加Agent时注入为agent.state_tracker
         self.w_pop = w_pop
         self.k = k
         self.agent_posts_file = agent_posts_file  # 用于存储Agent生成帖子的JSON文件路径
         self.current_time_slice = 0  # 用于飓风消息处理
+        self.simulation_id = None  # 所属仿真ID，添加Agent时同步给Agent用于LLM调度
+        self.llm_backend = None  # 由仿真引擎注入的LLM后端，添加Agent时同步给Agent
+        self.agent_random_seed = None  # 设置后每个Agent每个时间片使用独立随机序列（离线批处理重复执行时间片需要）
+        self.prompt_budget = prompt_budget or PromptBudget()  # prompt token预算，添加Agent时同步给Agent
+        self.llm_gate = llm_gate  # 阅读阶段的LLM调用门控（None表示不启用），添加Agent时同步给Agent
+        self.surrogate_recorder = surrogate_recorder  # 代理模型训练样本录制（None表示不录制）
+        # 发帖标注阶段：annotation_workers > 0 时标注在后台并行执行，时间片结束前统一回写
+        self.post_annotator = PostAnnotator(max_workers=annotation_workers) if annotation_workers > 0 else None
+        # 发帖流水线：posting_workers > 0 时Agent发帖在后台执行，与后续Agent的阅读重叠，时间片结束前按Agent顺序写入
+        self.posting_pipeline = PostingPipeline(max_workers=posting_workers) if posting_workers > 0 else None
+        # 流水线中需要延迟标注的Agent（时间片边界写入帖子池后提交到标注阶段）
+        self._pipeline_deferred_annotation = set()
+        # 当前时间片的共享上下文（update_agent_emotions期间有效）和其中的环境摘要（供意见领袖发帖prompt使用）
+        self.slice_context = None
+        self.last_env_summary = None
+        # 社交关系图（None表示每个Agent对时间片全部帖子打分）；启用时每个时间片构建候选索引slice_exposure
+        self.social_graph = None
+        self.trending_sample = DEFAULT_TRENDING_SAMPLE
+        self.slice_exposure = None
+        # 近似Feed（None表示精确打分）：被跳过帖子的最大选中概率；启用时每个时间片构建立场索引feed_index
+        self.max_skip_probability = None
+        self.feed_index = None
+        # 动态帖子池（None表示Agent帖子不进入之后的Feed）；启用时记录阅读/回复计数，时间片结束时批量更新热度
+        self.dynamic_pool = None
+
+    def set_llm_backend(self, llm_backend):
+        """注入LLM后端，并同步给所有已添加和之后添加的Agent"""
+        self.llm_backend = llm_backend
+        if llm_backend is None:
+            print(f"[LLM Config] 未配置LLM后端")
+        else:
+            print(f"[LLM Config] 为 {len(self.agents)} 个Agent配置LLM后端: {llm_backend.describe()}")
+        for agent in self.agents:
+            agent.llm_backend = llm_backend
+
+    def set_social_graph(self, social_graph, trending_sample=DEFAULT_TRENDING_SAMPLE):
+        """
+        设置社交关系图：个性化Feed只对关注作者的帖子和全局热门样本打分
+
+        Args:
+            social_graph: SocialGraph，None时恢复为对全部帖子打分
+            trending_sample: 每个时间片所有Agent都能看到的热门帖子数
+        """
+        self.social_graph = social_graph
+        self.trending_sample = trending_sample
+        if social_graph is None:
+            return
+        print(f"[Graph] 社交关系图: {social_graph}，全局热门样本 {trending_sample} 条")
+        missing = [agent.agent_id for agent in self.agents if len(social_graph.following(agent.agent_id)) == 0]
+        if missing:
+            print(f"[Graph] {len(missing)} 个Agent没有关注任何作者，只能看到热门样本: {missing[:5]}")
+
+    def set_approximate_feed(self, max_skip_probability):
+        """
+        设置近似Feed：只评估按立场窗口和热度头部可能被选中的帖子（启用社交关系图时不生效）
+
+        Args:
+            max_skip_probability: 被跳过帖子在精确Feed中的最大选中概率，None时恢复精确打分
+
+        Raises:
+            ValueError: 当max_skip_probability不在(0, 1)内时
+        """
+        if max_skip_probability is not None and not 0.0 < max_skip_probability < 1.0:
+            raise ValueError("近似Feed的跳过概率上限必须在0和1之间")
+        self.max_skip_probability = max_skip_probability
+        if max_skip_probability is not None:
+            print(f"[Feed] 近似Feed: 跳过选中概率 < {max_skip_probability} 的帖子")
 
     def configure_llm_for_agents(self, llm_config):
-        """为所有Agent配置LLM设置"""
+        """按LLM配置创建后端并注入所有Agent"""
         if not llm_config:
             return
-            
-        api_key = llm_config.get("api_key")
-        # 支持两种字段名：base_url（前端发送）和 endpoint（传统字段）
-        base_url = llm_config.get("base_url") or llm_config.get("endpoint")
-        model = llm_config.get("model", "deepseek-v3-250324")
-        
-        print(f"[LLM Config] 为 {len(self.agents)} 个Agent配置LLM: {model}")
-        print(f"[LLM Config] API Key: {'已设置' if api_key else '未设置'}")
-        print(f"[LLM Config] Endpoint: {base_url}")
-        
-        for agent in self.agents:
-            agent.llm_api_key = api_key
-            agent.llm_endpoint = base_url
-            agent.llm_model = model
-            print(f"  - Agent {agent.agent_id}: LLM已配置 (key={bool(api_key)}, endpoint={bool(base_url)})")
+        self.set_llm_backend(create_llm_backend(llm_config))
 
-    def process_hurricane_messages(self, posts, agent):
+    def process_hurricane_messages(self, posts, agent, official_posts=None):
         """
-        处理官方声明和紧急广播消息
+        处理官方声明和紧急广播消息（单个Agent）
         官方声明会绕过正常的个性化筛选，强制被所有Agent阅读
         
         Args:
             posts: 当前时间片的所有帖子
             agent: 当前处理的Agent
+            official_posts: 已筛选好的官方消息（时间片上下文中预先计算），None时从posts中筛选
         
         Returns:
             list: 官方消息列表
+        
+        Raises:
+            BatchPendingError: 离线批处理模式下遇到尚无结果的LLM请求
         """
-        official_posts = [
-            post for post in posts 
-            if post.get('is_official_statement', False) or
-               post.get('is_hurricane', False) or 
-               post.get('force_read', False) or
-               (post.get('is_event', False) and post.get('priority', 0) >= 999)
-        ]
+        if official_posts is None:
+            official_posts = [
+                post for post in posts 
+                if post.get('is_official_statement', False) or
+                   post.get('is_hurricane', False) or 
+                   post.get('force_read', False) or
+                   (post.get('is_event', False) and post.get('priority', 0) >= 999)
+            ]
+        paused = self.broadcast_hurricane_messages([agent], official_posts)
+        if paused:
+            raise paused[agent.agent_id]
+        return official_posts
+
+    def broadcast_hurricane_messages(self, agents, official_posts, random_states=None):
+        """
+        将官方声明和紧急广播一次性作用于整个Agent群体
+        
+        官方声明的权威加权影响对所有Agent做数组运算（连续的官方声明合并为一次读取/回写）；
+        其他广播消息逐Agent走update_emotion_and_stance（可能调用LLM）。
+        每个Agent的消息处理顺序与逐条阅读时相同；已读记录和屏蔽检查批量记录。
         
-        if official_posts:
-            print(f"🏛️ [官方消息] Agent {agent.agent_id} 收到 {len(official_posts)} 条官方消息")
+        Args:
+            agents: 接收广播的Agent列表
+            official_posts: 官方消息列表（按发布顺序）
+            random_states: {agent_id: 随机数状态}，逐Agent处理时切换到该Agent的随机序列并在处理后更新
+        
+        Returns:
+            dict: {agent_id: BatchPendingError}，离线批处理模式下暂停的Agent
+        """
+        paused = {}
+        if not official_posts or not agents:
+            return paused
+        print(f"🏛️ [官方消息] {len(official_posts)} 条官方消息广播给 {len(agents)} 个Agent")
+        
+        # 强制阅读，不受屏蔽影响
+        for agent in agents:
+            agent.viewed_posts.extend(official_posts)
+        
+        idx = 0
+        while idx < len(official_posts):
+            active = [agent for agent in agents if agent.agent_id not in paused]
+            if official_posts[idx].get('is_official_statement', False):
+                # 连续的官方声明：读取一次状态数组，依次作用后统一回写
+                end = idx
+                while end < len(official_posts) and official_posts[end].get('is_official_statement', False):
+                    end += 1
+                self._apply_official_statements(active, official_posts[idx:end])
+                idx = end
+                continue
             
-            for official_post in official_posts:
-                # 确定消息类型和处理方式
-                if official_post.get('is_official_statement', False):
-                    statement_type = official_post.get('statement_type', 'clarification')
-                    authority_level = official_post.get('authority_level', 'high')
-                    print(f"📢 官方声明({statement_type}|{authority_level}): {official_post.get('content', '')[:50]}...")
-                else:
-                    print(f"� 紧急广播: {official_post.get('content', '')[:50]}...")
-                
-                # 强制阅读，不受屏蔽影响
-                if not hasattr(agent, 'viewed_posts'):
-                    agent.viewed_posts = []
-                agent.viewed_posts.append(official_post)
-                
-                # 官方声明的影响更稳定和可控
-                if official_post.get('is_official_statement', False):
-                    # 官方声明具有更高的可信度，影响更温和但持久
-                    emotion_impact = official_post.get('emotion_score', 0.1) * 0.8  # 降低情绪波动
-                    stance_impact = official_post.get('stance_score', 0.0) * 1.2   # 增强立场影响
-                    
-                    # 根据权威级别调整影响力
-                    authority_multiplier = {
-                        "high": 1.0,
-                        "medium": 0.7, 
-                        "low": 0.4
-                    }.get(official_post.get('authority_level', 'high'), 1.0)
-                    
-                    emotion_impact *= authority_multiplier
-                    stance_impact *= authority_multiplier
-                    
-                    # 应用影响
-                    agent.current_emotion += emotion_impact
-                    agent.current_stance += stance_impact
-                    
-                    # 限制范围
-                    agent.current_emotion = max(-1.0, min(1.0, agent.current_emotion))
-                    agent.current_stance = max(-1.0, min(1.0, agent.current_stance))
-                    
-                    print(f"   └─ Agent {agent.agent_id} 状态更新: 情绪{emotion_impact:+.3f}→{agent.current_emotion:.3f}, 立场{stance_impact:+.3f}→{agent.current_stance:.3f}")
-                else:
-                    # 传统的强制情绪立场更新
+            # 传统的强制情绪立场更新
+            official_post = official_posts[idx]
+            print(f"🌪️ 紧急广播: {official_post.get('content', '')[:50]}...")
+            for agent in active:
+                if random_states is not None and agent.agent_id in random_states:
+                    random.setstate(random_states[agent.agent_id])
+                try:
                     agent.update_emotion_and_stance(
                         official_post, 
                         time_slice_index=self.current_time_slice
                     )
-                
-                # 官方消息通常不触发屏蔽（来源可信）
-                if not official_post.get('author_id', '').startswith('official'):
-                    agent.check_blocking(official_post)
+                    # 官方消息通常不触发屏蔽（来源可信）
+                    if not (official_post.get('author_id') or '').startswith('official'):
+                        agent.check_blocking(official_post)
+                except BatchPendingError as e:
+                    paused[agent.agent_id] = e
+                finally:
+                    if random_states is not None and agent.agent_id in random_states:
+                        random_states[agent.agent_id] = random.getstate()
+            idx += 1
+        return paused
+
+    def _apply_official_statements(self, agents, statements):
+        """
+        对一组Agent依次施加官方声明的影响（数组运算）
+        官方声明具有更高的可信度，影响更温和但持久：情绪影响×0.8，立场影响×1.2，再按权威级别加权
+        """
+        if not agents:
+            return
+        emotions = np.fromiter((agent.current_emotion for agent in agents), dtype=np.float64, count=len(agents))
+        stances = np.fromiter((agent.current_stance for agent in agents), dtype=np.float64, count=len(agents))
+        blocking = None
         
-        return official_posts
+        for statement in statements:
+            statement_type = statement.get('statement_type', 'clarification')
+            authority_level = statement.get('authority_level', 'high')
+            
+            emotion_impact = statement.get('emotion_score', 0.1) * 0.8  # 降低情绪波动
+            stance_impact = statement.get('stance_score', 0.0) * 1.2   # 增强立场影响
+            
+            # 根据权威级别调整影响力
+            authority_multiplier = {
+                "high": 1.0,
+                "medium": 0.7, 
+                "low": 0.4
+            }.get(authority_level, 1.0)
+            
+            emotion_impact *= authority_multiplier
+            stance_impact *= authority_multiplier
+            
+            # 应用影响并限制范围
+            emotions = np.clip(emotions + emotion_impact, -1.0, 1.0)
+            stances = np.clip(stances + stance_impact, -1.0, 1.0)
+            
+            print(f"📢 官方声明({statement_type}|{authority_level}): {statement.get('content', '')[:50]}... "
+                  f"情绪{emotion_impact:+.3f}, 立场{stance_impact:+.3f} → 平均情绪 {emotions.mean():.3f}, 平均立场 {stances.mean():.3f}")
+            
+            # 官方消息通常不触发屏蔽（来源可信）；其他来源按立场差异批量检查
+            if not (statement.get('author_id') or '').startswith('official'):
+                if blocking is None:
+                    blocking = np.fromiter((agent.opinion_blocking for agent in agents), dtype=np.float64, count=len(agents))
+                user_id = statement.get('user_id', statement.get('author_id'))
+                if user_id:
+                    stance_diff = np.abs(stances - statement.get('stance_score', 0.0))
+                    for i in np.flatnonzero((blocking > 0.0) & (stance_diff > 0.7)):
+                        if user_id not in agents[i].blocked_user_ids:
+                            agents[i].blocked_user_ids.append(user_id)
+        
+        for agent, emotion, stance in zip(agents, emotions.tolist(), stances.tolist()):
+            agent.current_emotion = emotion
+            agent.current_stance = stance
 
     def create_agent(self, agent_config):
         """创建Agent实例"""
@@ -119,6 +254,15 @@ class AgentController:
 
     def add_agent(self, agent: Agent):
         """添加Agent到控制器"""
+        if self.simulation_id is not None:
+            agent.simulation_id = self.simulation_id
+        if self.llm_backend is not None:
+            agent.llm_backend = self.llm_backend
+        agent.prompt_budget = self.prompt_budget
+        agent.llm_gate = self.llm_gate
+        agent.surrogate_recorder = self.surrogate_recorder
+        self.agent_aggregates.add(agent)
+        agent.state_tracker = self.agent_aggregates
         self.agents.append(agent)
     
     def load_agents_from_config(self, config_path):
@@ -139,10 +283,14 @@ class AgentController:
                 return agent
         return None
 
-    def _generate_personalized_feed(self, agent, all_posts, k=None, x0=None, w_pop=None, w_rel=None, opinion_blocking=None):
+    def _generate_personalized_feed(self, agent, all_posts, k=None, x0=None, w_pop=None, w_rel=None, opinion_blocking=None,
+                                    popularity_range=None, candidate_indices=None):
         """
         为指定Agent生成个性化信息流（完整加权融合+Sigmoid概率门控）
         移除T_stance硬性过滤，让立场差异通过相关性分数自然处理
+        
+        popularity_range: 预先计算的热度归一化参数 (pop_min, pop_range)，None时从all_posts计算
+        candidate_indices: 只对all_posts中这些位置的帖子打分（社交关系图或近似Feed的候选帖子），None时对全部帖子打分
         """
         # 优先使用传参，否则用控制器属性
         k = self.k if k is None else k
@@ -156,13 +304,17 @@ class AgentController:
         score_pops = []
         post_ids = []
 
-        # 计算热度归一化参数
-        pops = [post.get('popularity', 0) for post in all_posts]
-        pop_min = min(pops) if pops else 0
-        pop_max = max(pops) if pops else 1
-        pop_range = max(1e-6, pop_max - pop_min)
+        # 计算热度归一化参数（同一时间片对所有Agent相同）
+        if popularity_range is None:
+            pops = [post.get('popularity', 0) for post in all_posts]
+            pop_min = min(pops) if pops else 0
+            pop_max = max(pops) if pops else 1
+            pop_range = max(1e-6, pop_max - pop_min)
+        else:
+            pop_min, pop_range = popularity_range
 
-        for post in all_posts:
+        scored_posts = all_posts if candidate_indices is None else [all_posts[i] for i in candidate_indices]
+        for post in scored_posts:
             # 硬性屏蔽：只保留有information_strength的帖子
             if post.get("information_strength") is None:
                 continue
@@ -187,7 +339,7 @@ class AgentController:
             final_scores.append(final_score)
             score_rels.append(score_rel)
             score_pops.append(score_pop)
-            post_ids.append(post.get('mid', post.get('id', post.get('post_id', 'unknown'))))
+            post_ids.append(source_post_id(post, 'unknown'))
 
         print(f"[Feed] Agent {agent.agent_id} 候选池大小: {len(candidate_posts)} (k={k}, x0={'auto' if x0 is None else x0})")
 
@@ -213,7 +365,7 @@ class AgentController:
         return agent_feed, list(zip(post_ids, score_pops, score_rels, final_scores, viewing_probs))
 
     # update_agent_emotions 也要适配返回值
-    def update_agent_emotions(self, posts, time_slice_index=None, llm_config=None):
+    def update_agent_emotions(self, posts, time_slice_index=None, llm_config=None, slice_context=None):
         """为每个Agent生成个性化Feed并逐条阅读，调用Agent自身的情绪更新算法，并统计分数
         支持飓风消息（强制广播）功能
         
@@ -221,28 +373,33 @@ class AgentController:
             posts: 帖子列表
             time_slice_index: 时间片索引
             llm_config: LLM配置 {"enabled_agents": ["agent1"], "enabled_timeslices": [0]}
+            slice_context: 仿真引擎为本时间片构建的SliceContext，None时由posts构建
         """
         # 保存当前时间片索引
         self.current_time_slice = time_slice_index or 0
         
-        # 分离飓风消息和普通消息
-        hurricane_posts = [
-            post for post in posts 
-            if post.get('is_hurricane', False) or 
-               post.get('force_read', False) or
-               (post.get('is_event', False) and post.get('priority', 0) >= 999)
-        ]
+        # 时间片共享的预计算数据（飓风/普通帖子划分、热度范围、mid索引、环境摘要等），时间片结束时失效
+        if slice_context is None:
+            slice_context = SliceContext(time_slice_index, posts)
+        self.slice_context = slice_context
+        self.last_env_summary = slice_context.env_summary
+        # 社交关系图：按作者分组本时间片的普通帖子，之后每个Agent的候选帖子为O(关注数)查找
+        self.slice_exposure = None
+        if self.social_graph is not None:
+            self.slice_exposure = self.social_graph.exposure(slice_context.normal_posts, self.trending_sample)
+        # 近似Feed：按立场排序本时间片的普通帖子，之后每个Agent只评估立场窗口和热度头部
+        self.feed_index = None
+        if self.max_skip_probability is not None and self.slice_exposure is None:
+            self.feed_index = StanceFeedIndex(slice_context.normal_posts, slice_context.popularity_range,
+                                              self.max_skip_probability)
         
-        normal_posts = [
-            post for post in posts 
-            if not (post.get('is_hurricane', False) or 
-                    post.get('force_read', False) or
-                    (post.get('is_event', False) and post.get('priority', 0) >= 999))
-        ]
+        # LLM门控：代理模型的帖子特征每个时间片计算一次
+        if self.llm_gate is not None:
+            self.llm_gate.begin_slice(slice_context.posts)
         
-        if hurricane_posts:
-            print(f"🌪️ [时间片 {time_slice_index}] 检测到 {len(hurricane_posts)} 条飓风消息")
-            print(f"📊 普通帖子: {len(normal_posts)} 条")
+        if slice_context.hurricane_posts:
+            print(f"🌪️ [时间片 {time_slice_index}] 检测到 {len(slice_context.hurricane_posts)} 条飓风消息")
+            print(f"📊 普通帖子: {len(slice_context.normal_posts)} 条")
         
         all_agent_scores = {}
         posting_agents = []  # 记录本时间片发帖的Agent
@@ -253,123 +410,52 @@ class AgentController:
         # 判断当前时间片是否启用LLM
         llm_enabled_for_timeslice = time_slice_index in enabled_timeslices
         
+        random_states = None
+        if self.agent_random_seed is not None:
+            # 每个Agent使用独立的确定性随机序列，重复执行同一时间片时互不影响
+            random_states = {}
+            for agent in self.agents:
+                random.seed(f"{self.agent_random_seed}:{self.current_time_slice}:{agent.agent_id}")
+                random_states[agent.agent_id] = random.getstate()
+        
         for agent in self.agents:
-            # 每个时间片开始时记录状态快照（用于发帖判定）
+            # 每个时间片开始时记录状态快照（用于发帖判定），清空已读帖子和情绪立场历史
             agent.snapshot_state()
-            
-            # 清空已读帖子和情绪立场历史
             agent.reset_viewed_posts()
             agent.reset_emotion_stance_history()
-            
-            # 判断当前Agent是否启用LLM
-            agent_llm_enabled = agent.agent_id in enabled_agents and llm_enabled_for_timeslice
-            
-            if agent_llm_enabled:
-                print(f"🤖 Agent {agent.agent_id} 在时间片 {time_slice_index} 使用LLM")
-            
-            # 1. 首先强制处理飓风消息
-            if hurricane_posts:
-                self.process_hurricane_messages(hurricane_posts, agent)
-            
-            # 2. 然后正常处理普通帖子
-            personalized_feed, post_scores = self._generate_personalized_feed(agent, normal_posts)
-            all_agent_scores[agent.agent_id] = post_scores
-            
-            # 注意：不要重新初始化viewed_posts，保留飓风消息记录
-            # 如果viewed_posts不存在，才初始化
-            if not hasattr(agent, 'viewed_posts'):
-                agent.viewed_posts = []
-            
-            for idx, post in enumerate(personalized_feed):
-                # 检查是否需要执行单次屏蔽跳过
-                post_author = post.get('author_id') or post.get('user_id')
-                if post_author and post_author in agent.blocked_user_ids:
-                    # 单次屏蔽：跳过此帖子并从屏蔽列表中移除该用户
-                    agent.blocked_user_ids.remove(post_author)
-                    print(f"[单次屏蔽] Agent {agent.agent_id} 跳过已屏蔽用户 {post_author} 的帖子，并将其从屏蔽列表移除")
-                    continue  # 跳过这个帖子，不做任何处理
-                
-                # 正常处理帖子
-                agent.viewed_posts.append(post)  # 只有实际处理的帖子才计入viewed_posts
-                
-                # 根据配置决定是否跳过LLM
-                skip_llm = not agent_llm_enabled
-                # 只在第一个帖子时显示prompt示例，避免输出过长
-                show_prompt_example = (idx == 0)
-                # 传递帖子列表用于提取链条上下文
-                agent.update_emotion_and_stance(
-                    post, 
-                    time_slice_index=time_slice_index,
-                    all_posts=posts
+        
+        # 1. 飓风消息/官方声明：先于个性化Feed对所有Agent广播
+        paused_agents = self.broadcast_hurricane_messages(self.agents, slice_context.hurricane_posts, random_states)
+        
+        for agent in self.agents:
+            if agent.agent_id in paused_agents:
+                print(f"[Batch] Agent {agent.agent_id} 暂停，{paused_agents[agent.agent_id]}")
+                continue
+            if random_states is not None:
+                random.setstate(random_states[agent.agent_id])
+            try:
+                post_scores, posted = self._run_agent_slice(
+                    agent, slice_context, time_slice_index,
+                    agent.agent_id in enabled_agents and llm_enabled_for_timeslice
                 )
-                
-                # 处理完帖子后检查是否需要新增屏蔽
-                agent.check_blocking(post)
-                
-                print(f"Agent {agent.agent_id} 阅读帖子 {post.get('mid', post.get('id', post.get('post_id', 'unknown')))}: "
-                      f"情绪 {agent.current_emotion:.3f}, 立场 {agent.current_stance:.3f}, "
-                      f"置信度 {agent.current_confidence:.3f} {'[LLM]' if agent_llm_enabled else '[非LLM]'}")
-            
-            # 发帖判定
-            # =============================================================================
-            # 🚨 临时作弊逻辑：强制所有Agent发帖（测试用）
-            # TODO: 测试完成后删除此作弊逻辑，恢复正常的 agent.should_post() 判定
-            # =============================================================================
-            FORCE_ALL_AGENTS_POST = True  # 🚨 作弊开关：设为False恢复正常判定
-            
-            # 原始判定逻辑（保留但暂时注释）
-            # original_should_post = agent.should_post()
-            
-            # 使用作弊逻辑或原始逻辑
-            should_post_decision = FORCE_ALL_AGENTS_POST  # or original_should_post
-            
-            if should_post_decision:
+            except BatchPendingError as e:
+                # 离线批处理：该Agent暂停在第一条缺少结果的请求，其余Agent继续收集本轮请求
+                print(f"[Batch] Agent {agent.agent_id} 暂停，{e}")
+                continue
+            all_agent_scores[agent.agent_id] = post_scores
+            if posted:
                 posting_agents.append(agent.agent_id)
-                
-                # 显示是否为强制发帖
-                if FORCE_ALL_AGENTS_POST:
-                    print(f"🚨 Agent {agent.agent_id} 强制发帖（作弊模式）！")
-                else:
-                    print(f"✍️ Agent {agent.agent_id} 决定发帖！")
-                    
-                print(f"   情绪波动: {abs(agent.current_emotion - agent.last_emotion):.3f}")
-                print(f"   立场波动: {abs(agent.current_stance - agent.last_stance):.3f}")
-                print(f"   活跃度: {agent.activity_level:.3f}")
-                
-                # 生成发帖内容（根据配置决定是否使用LLM）
-                skip_llm_for_posting = not agent_llm_enabled
-                post_content = agent.generate_text(skip_llm=skip_llm_for_posting, agent_controller=self)
-                print(f"   发帖内容: {post_content[:100]}...")
-                
-                # === 新增：分析影响最大的帖子 ===
-                self._analyze_most_influential_post(agent)
-                
-                # === 新增：构建帖子JSON并添加到世界状态 ===
-                try:
-                    # 构建帖子JSON对象（启用LLM标注）
-                    post_json = self.build_post_json(
-                        agent, 
-                        post_content, 
-                        posts, 
-                        use_llm_annotation=agent_llm_enabled
-                    )
-                    
-                    # 添加到世界状态，供下一轮阅读
-                    if self.world_state:
-                        self.world_state.add_post(post_json)
-                        print(f"   ✅ 新帖子已添加到帖子池: ID={post_json.get('id', 'unknown')}")
-                    
-                    # 同时保存到Agent生成帖子的JSON文件
-                    self._save_agent_post_to_file(post_json, agent)
-                    
-                except Exception as e:
-                    print(f"   ❌ 发帖流程失败: {e}")
-                
-            else:
-                delta_emotion = abs(agent.current_emotion - agent.last_emotion)
-                delta_stance = abs(agent.current_stance - agent.last_stance)
-                fluctuation = delta_emotion + delta_stance
-                print(f"Agent {agent.agent_id} 不发帖 (波动量: {fluctuation:.3f}, 阈值: {agent.expression_threshold:.3f})")
+        
+        # 时间片边界：等待流水线中的发帖完成（按Agent顺序写入），再等待所有发帖标注完成并回写
+        self.join_posting_pipeline(posts, all_agent_scores, posting_agents)
+        self.flush_post_annotations()
+        self.slice_context = None
+        self.slice_exposure = None
+        if self.feed_index is not None:
+            print(f"[Feed] 近似Feed: {self.feed_index.summary()}")
+            self.feed_index = None
+        if self.dynamic_pool is not None:
+            self.dynamic_pool.end_slice(self.current_time_slice)
         
         # 输出本时间片发帖统计
         if posting_agents:
@@ -380,6 +466,215 @@ class AgentController:
             
         return all_agent_scores
 
+    def _run_agent_slice(self, agent, slice_context, time_slice_index, agent_llm_enabled):
+        """
+        单个Agent在一个时间片内的完整流程（飓风消息之后）：个性化Feed阅读 → 发帖判定与发帖
+
+        Returns:
+            tuple: (Feed打分, 是否发帖)
+
+        Raises:
+            BatchPendingError: 离线批处理模式下遇到尚无结果的LLM请求
+        """
+        posted = False
+        posts = slice_context.posts
+        # 时间片开始时的状态快照、飓风消息已由update_agent_emotions对所有Agent统一处理
+        
+        if agent_llm_enabled:
+            print(f"🤖 Agent {agent.agent_id} 在时间片 {time_slice_index} 使用LLM")
+        
+        # 2. 正常处理普通帖子
+        candidate_indices = None
+        x0 = None
+        if self.slice_exposure is not None:
+            candidate_indices = self.slice_exposure.candidates(agent.agent_id)
+        elif self.feed_index is not None:
+            # 近似Feed：sigmoid中心点仍为全部帖子的均值，与精确Feed相同
+            candidate_indices, x0 = self.feed_index.candidates(
+                getattr(agent, 'current_stance', 0.0), self.k, self.w_pop, 1.0 - self.w_pop
+            )
+        personalized_feed, post_scores = self._generate_personalized_feed(
+            agent, slice_context.normal_posts, x0=x0, popularity_range=slice_context.popularity_range,
+            candidate_indices=candidate_indices
+        )
+        
+        # 注意：不要重新初始化viewed_posts，保留飓风消息记录
+        # 如果viewed_posts不存在，才初始化
+        if not hasattr(agent, 'viewed_posts'):
+            agent.viewed_posts = []
+        
+        for idx, post in enumerate(personalized_feed):
+            # 检查是否需要执行单次屏蔽跳过
+            post_author = post.get('author_id') or post.get('user_id')
+            if post_author and post_author in agent.blocked_user_ids:
+                # 单次屏蔽：跳过此帖子并从屏蔽列表中移除该用户
+                agent.blocked_user_ids.remove(post_author)
+                print(f"[单次屏蔽] Agent {agent.agent_id} 跳过已屏蔽用户 {post_author} 的帖子，并将其从屏蔽列表移除")
+                continue  # 跳过这个帖子，不做任何处理
+            
+            # 正常处理帖子
+            agent.viewed_posts.append(post)  # 只有实际处理的帖子才计入viewed_posts
+            if self.dynamic_pool is not None:
+                self.dynamic_pool.record_read(post)
+            
+            # 根据配置决定是否跳过LLM
+            skip_llm = not agent_llm_enabled
+            # 只在第一个帖子时显示prompt示例，避免输出过长
+            show_prompt_example = (idx == 0)
+            # 传递帖子列表用于提取链条上下文
+            agent.update_emotion_and_stance(
+                post, 
+                time_slice_index=time_slice_index,
+                all_posts=posts,
+                mid_index=slice_context.mid_index
+            )
+            
+            # 处理完帖子后检查是否需要新增屏蔽
+            agent.check_blocking(post)
+            
+            print(f"Agent {agent.agent_id} 阅读帖子 {source_post_id(post, 'unknown')}: "
+                  f"情绪 {agent.current_emotion:.3f}, 立场 {agent.current_stance:.3f}, "
+                  f"置信度 {agent.current_confidence:.3f} {'[LLM]' if agent_llm_enabled else '[非LLM]'}")
+        
+        # 发帖判定
+        # =============================================================================
+        # 🚨 临时作弊逻辑：强制所有Agent发帖（测试用）
+        # TODO: 测试完成后删除此作弊逻辑，恢复正常的 agent.should_post() 判定
+        # =============================================================================
+        FORCE_ALL_AGENTS_POST = True  # 🚨 作弊开关：设为False恢复正常判定
+        
+        # 原始判定逻辑（保留但暂时注释）
+        # original_should_post = agent.should_post()
+        
+        # 使用作弊逻辑或原始逻辑
+        should_post_decision = FORCE_ALL_AGENTS_POST  # or original_should_post
+        
+        if should_post_decision:
+            posted = True
+            
+            # 显示是否为强制发帖
+            if FORCE_ALL_AGENTS_POST:
+                print(f"🚨 Agent {agent.agent_id} 强制发帖（作弊模式）！")
+            else:
+                print(f"✍️ Agent {agent.agent_id} 决定发帖！")
+                
+            print(f"   情绪波动: {abs(agent.current_emotion - agent.last_emotion):.3f}")
+            print(f"   立场波动: {abs(agent.current_stance - agent.last_stance):.3f}")
+            print(f"   活跃度: {agent.activity_level:.3f}")
+            
+            # 启用标注阶段时先用Agent状态值，LLM标注延迟到时间片结束前回写
+            defer_annotation = agent_llm_enabled and self.post_annotator is not None
+            if self.posting_pipeline is not None:
+                # 流水线：发帖在后台执行，主循环继续下一个Agent的阅读，时间片边界按Agent顺序写入后再提交标注
+                if defer_annotation:
+                    self._pipeline_deferred_annotation.add(agent.agent_id)
+                self.posting_pipeline.submit(agent, self._compose_agent_post, agent, posts, agent_llm_enabled,
+                                             defer_annotation)
+            else:
+                post_json = self._compose_agent_post(agent, posts, agent_llm_enabled, defer_annotation)
+                if post_json is not None:
+                    self._publish_agent_post(agent, post_json, posts, defer_annotation)
+            
+        else:
+            delta_emotion = abs(agent.current_emotion - agent.last_emotion)
+            delta_stance = abs(agent.current_stance - agent.last_stance)
+            fluctuation = delta_emotion + delta_stance
+            print(f"Agent {agent.agent_id} 不发帖 (波动量: {fluctuation:.3f}, 阈值: {agent.expression_threshold:.3f})")
+        
+        return post_scores, posted
+
+    def _compose_agent_post(self, agent, posts, agent_llm_enabled, defer_annotation):
+        """
+        生成发帖内容、分析影响最大的帖子并构建帖子JSON（流水线模式下在后台线程执行）
+
+        Returns:
+            Optional[dict]: 帖子JSON，构建失败时返回None
+
+        Raises:
+            BatchPendingError: 离线批处理模式下遇到尚无结果的LLM请求
+        """
+        # 生成发帖内容（根据配置决定是否使用LLM）
+        skip_llm_for_posting = not agent_llm_enabled
+        post_content = agent.generate_text(skip_llm=skip_llm_for_posting, agent_controller=self)
+        print(f"   发帖内容: {post_content[:100]}...")
+        
+        # === 新增：分析影响最大的帖子 ===
+        self._analyze_most_influential_post(agent)
+        
+        # === 新增：构建帖子JSON ===
+        try:
+            return self.build_post_json(
+                agent, 
+                post_content, 
+                posts, 
+                use_llm_annotation=agent_llm_enabled and not defer_annotation,
+                latest_ts=self.slice_context.latest_timestamp if self.slice_context is not None else None
+            )
+        except BatchPendingError:
+            raise
+        except Exception as e:
+            print(f"   ❌ 发帖流程失败: {e}")
+            return None
+
+    def _publish_agent_post(self, agent, post_json, posts, defer_annotation):
+        """
+        将帖子添加到世界状态并保存到Agent帖子JSON文件，需要时提交延迟标注
+        
+        Returns:
+            bool: 是否写入成功
+        """
+        try:
+            # 添加到世界状态，供下一轮阅读
+            if self.world_state:
+                post_id = self.world_state.add_post(post_json)
+                print(f"   ✅ 新帖子已添加到帖子池: ID={post_json.get('id', 'unknown')}")
+                if self.dynamic_pool is not None:
+                    # 帖子池中的记录进入之后时间片的Feed（延迟标注回写后Feed中的分值同步更新）
+                    self.dynamic_pool.add(self.world_state.get_post(post_id), self.current_time_slice)
+            
+            # 同时保存到Agent生成帖子的JSON文件
+            self._save_agent_post_to_file(post_json, agent)
+            
+            if defer_annotation:
+                self.post_annotator.submit(agent, post_json, posts, time_slice_index=self.current_time_slice)
+            return True
+            
+        except Exception as e:
+            print(f"   ❌ 发帖流程失败: {e}")
+            return False
+
+    def join_posting_pipeline(self, posts, all_agent_scores=None, posting_agents=None):
+        """
+        时间片边界：等待流水线中的发帖任务完成，按Agent顺序写入帖子池和JSON文件，
+        需要延迟标注的帖子提交到标注阶段（之后由flush_post_annotations统一回写）
+        
+        Args:
+            posts: 当前时间片帖子
+            all_agent_scores: 本时间片的Feed打分（发帖暂停的Agent会被移除）
+            posting_agents: 本时间片发帖的Agent ID列表（发帖暂停的Agent会被移除）
+        
+        Returns:
+            int: 写入的帖子数量
+        """
+        if self.posting_pipeline is None or not self.posting_pipeline.pending_count:
+            return 0
+        published = 0
+        deferred, self._pipeline_deferred_annotation = self._pipeline_deferred_annotation, set()
+        for agent, post_json, error in self.posting_pipeline.join():
+            if isinstance(error, BatchPendingError):
+                # 离线批处理：与串行模式一致，该Agent本时间片视为暂停
+                print(f"[Batch] Agent {agent.agent_id} 暂停，{error}")
+                if all_agent_scores is not None:
+                    all_agent_scores.pop(agent.agent_id, None)
+                if posting_agents is not None and agent.agent_id in posting_agents:
+                    posting_agents.remove(agent.agent_id)
+            elif error is not None:
+                print(f"   ❌ Agent {agent.agent_id} 发帖流程失败: {error}")
+            elif post_json is not None and self._publish_agent_post(agent, post_json, posts,
+                                                                    defer_annotation=agent.agent_id in deferred):
+                published += 1
+        return published
+
     def get_agent_statuses(self):
         """获取所有Agent的状态"""
         return [agent.get_status() for agent in self.agents]
@@ -407,20 +702,9 @@ class AgentController:
     def compute_macro_summary(self):
         """
         统计当前所有agent的平均情绪、平均立场、agent数量等。
+        （读取增量统计，另含平均置信度、方差、立场分布和极化指数）
         """
-        emotion_sum = 0
-        stance_sum = 0
-        count = 0
-        for agent in self.agents:
-            status = agent.get_status()
-            emotion_sum += status['current_emotion']
-            stance_sum += status['current_stance']
-            count += 1
-        return {
-            'average_emotion': emotion_sum / count if count else 0,
-            'average_stance': stance_sum / count if count else 0,
-            'agent_count': count
-        }
+        return self.agent_aggregates.summary()
 
     def leader_read_briefing(self, time_slice_index):
         """
@@ -456,13 +740,6 @@ class AgentController:
         posts_read = getattr(agent, 'viewed_posts', [])
         print(f"[Debug] Agent {agent.agent_id} 本时间片读到 {len(posts_read)} 个帖子")
         
-        # 构造已读帖子列表
-        posts_content = []
-        for i, post in enumerate(posts_read):
-            post_content = post.get('content', post.get('text', ''))
-            posts_content.append(f"- [帖子{i+1}] {post_content}")
-        posts_text = '\n'.join(posts_content) if posts_content else "（本时间片未读到任何帖子）"
-        
         # 构造agent属性信息
         agent_attributes = f"""- agent_id: {agent.agent_id}
 - role_type: {agent.role_type.value}
@@ -475,13 +752,41 @@ class AgentController:
         
         print(f"[Debug] Agent属性信息长度: {len(agent_attributes)} 字符")
         
-        # 替换模板中的占位符
-        prompt = prompt_template
+        # 按token预算选择已读帖子（优先保留强制阅读和影响最大的帖子）
+        posts_read, dropped = self.prompt_budget.select_posts(
+            posts_read, getattr(agent, 'emotion_stance_history', []),
+            reserved_tokens=estimate_tokens(prompt_template) + estimate_tokens(agent_attributes)
+        )
+        if dropped:
+            print(f"[Prompt] Agent {agent.agent_id}: 超出发帖prompt预算，省略 {dropped} 个影响较小的已读帖子")
+        
+        # 构造已读帖子列表
+        posts_content = []
+        for i, post in enumerate(posts_read):
+            post_content = post.get('content', post.get('text', ''))
+            posts_content.append(f"- [帖子{i+1}] {post_content}")
+        posts_text = '\n'.join(posts_content) if posts_content else "（本时间片未读到任何帖子）"
+        
+        # 模板中的占位符及其所在段落的标题
+        posts_placeholder = "- [帖子1] 内容……\n- [帖子2] 内容……\n- [帖子3] 内容……\n（请用实际内容替换）"
+        attributes_placeholder = """- agent_id: 你的唯一标识符
+- opinion_tendency: 你的立场倾向，范围[-1,1]，-1为极度支持患者，1为极度支持医院，0为中立
+- emotion_state: 当前情绪状态，范围[-1,1]，-1为极度负面，1为极度正面
+- information_preference: 信息偏好，范围[0,1]，0为偏好情绪化内容，1为偏好事实/数据
+- influence_level: 影响力等级，范围[0,1]，0为普通用户，1为极具影响力
+- memory: 你对事件的记忆片段或印象（如有）
+（请用实际参数和含义替换/补充）"""
+        posts_section_marker = "## 2. 当前时间片内你读到的所有帖子"
+        attributes_section_marker = "## 3. 你的属性与当前状态"
+        
+        # 替换模板中的占位符（已读帖子和属性段落移到末尾，静态说明作为稳定前缀便于上游前缀缓存）
+        prompt = stable_marker_template(prompt_template, (
+            posts_placeholder, attributes_placeholder, posts_section_marker, attributes_section_marker
+        ))
         original_prompt_length = len(prompt)
         print(f"[Debug] 原始模板长度: {original_prompt_length} 字符")
         
         # 替换帖子部分 - 查找更精确的文本
-        posts_placeholder = "- [帖子1] 内容……\n- [帖子2] 内容……\n- [帖子3] 内容……\n（请用实际内容替换）"
         if posts_placeholder in prompt:
             prompt = prompt.replace(posts_placeholder, posts_text)
             print(f"[Debug] 成功替换帖子占位符")
@@ -489,13 +794,12 @@ class AgentController:
             print(f"[Debug] 未找到帖子占位符，使用备用方案")
             # 备用方案：查找section并替换内容
             posts_section_start = "## 2. 当前时间片内你读到的所有帖子 (Posts Read in Current Timestep)"
-            posts_section_end = "## 3. 你的属性与当前状态"
             
             start_idx = prompt.find(posts_section_start)
-            end_idx = prompt.find(posts_section_end)
+            end_idx = self._find_section_end(prompt, start_idx)
             print(f"[Debug] Posts section 位置: {start_idx} 到 {end_idx}")
             
-            if start_idx != -1 and end_idx != -1:
+            if start_idx != -1:
                 # 找到section边界，替换内容
                 before_section = prompt[:start_idx]
                 after_section = prompt[end_idx:]
@@ -504,14 +808,6 @@ class AgentController:
                 print(f"[Debug] 使用备用方案替换帖子section")
         
         # 替换属性部分 - 查找更精确的文本  
-        attributes_placeholder = """- agent_id: 你的唯一标识符
-- opinion_tendency: 你的立场倾向，范围[-1,1]，-1为极度支持患者，1为极度支持医院，0为中立
-- emotion_state: 当前情绪状态，范围[-1,1]，-1为极度负面，1为极度正面
-- information_preference: 信息偏好，范围[0,1]，0为偏好情绪化内容，1为偏好事实/数据
-- influence_level: 影响力等级，范围[0,1]，0为普通用户，1为极具影响力
-- memory: 你对事件的记忆片段或印象（如有）
-（请用实际参数和含义替换/补充）"""
-        
         if attributes_placeholder in prompt:
             prompt = prompt.replace(attributes_placeholder, agent_attributes)
             print(f"[Debug] 成功替换属性占位符")
@@ -519,13 +815,12 @@ class AgentController:
             print(f"[Debug] 未找到属性占位符，使用备用方案")
             # 备用方案：查找section并替换内容
             attributes_section_start = "## 3. 你的属性与当前状态 (Your Attributes and State)"
-            attributes_section_end = "## 4. 你的任务"
             
             start_idx = prompt.find(attributes_section_start)
-            end_idx = prompt.find(attributes_section_end)
+            end_idx = self._find_section_end(prompt, start_idx)
             print(f"[Debug] Attributes section 位置: {start_idx} 到 {end_idx}")
             
-            if start_idx != -1 and end_idx != -1:
+            if start_idx != -1:
                 # 找到section边界，替换内容
                 before_section = prompt[:start_idx]
                 after_section = prompt[end_idx:]
@@ -538,6 +833,14 @@ class AgentController:
         
         return prompt
 
+    @staticmethod
+    def _find_section_end(prompt, start_idx):
+        """从start_idx处的段落标题开始，找到下一个二级标题的位置（没有时为文本末尾）"""
+        if start_idx == -1:
+            return -1
+        end_idx = prompt.find("\n## ", start_idx + 1)
+        return end_idx + 1 if end_idx != -1 else len(prompt)
+
     def _save_agent_post_to_file(self, post_json, agent):
         """将Agent生成的帖子保存到JSON文件中"""
         if not self.agent_posts_file:
@@ -572,7 +875,44 @@ class AgentController:
         except Exception as e:
             print(f"   ⚠️ 保存帖子到JSON文件失败: {e}")
 
-    def build_post_json(self, agent, content, all_posts_in_slice, use_llm_annotation=True):
+    def flush_post_annotations(self):
+        """
+        等待本时间片所有延迟标注完成，并将结果回写到WorldState和Agent帖子JSON文件
+        
+        Returns:
+            int: 回写的帖子数量
+        """
+        if self.post_annotator is None or not self.post_annotator.pending_count:
+            return 0
+        results = self.post_annotator.flush()
+        for result in results:
+            if self.world_state:
+                self.world_state.update_post(result['post_id'], result['fields'])
+        self._update_agent_posts_in_file({r['post_id']: r['fields'] for r in results})
+        return len(results)
+
+    def _update_agent_posts_in_file(self, updates):
+        """将标注结果批量回写到Agent生成帖子的JSON文件（一次读写）"""
+        if not self.agent_posts_file or not updates:
+            return
+        try:
+            with open(self.agent_posts_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            for post in data.get('agent_posts', []):
+                fields = updates.get(post.get('id'))
+                if fields:
+                    post.update(fields)
+            
+            with open(self.agent_posts_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            
+            print(f"   📝 已回写 {len(updates)} 条帖子标注到JSON文件: {self.agent_posts_file}")
+            
+        except Exception as e:
+            print(f"   ⚠️ 回写帖子标注到JSON文件失败: {e}")
+
+    def build_post_json(self, agent, content, all_posts_in_slice, use_llm_annotation=True, latest_ts=None):
         """
         根据agent的影响最大帖子、当前时间片帖子，自动拼接发帖json对象。
         时间戳使用全数字格式，pid为影响最大的帖子的mid。
@@ -582,13 +922,15 @@ class AgentController:
             content: 帖子内容
             all_posts_in_slice: 当前时间片所有帖子
             use_llm_annotation: 是否使用LLM进行帖子标注（与原始帖子保持一致）
+            latest_ts: 时间片内最新的帖子时间戳（时间片上下文中预先计算），None时从all_posts_in_slice计算
         """
         # 获取影响最大的帖子ID
         record = getattr(agent, 'most_influential_post_record', None)
         parent_mid = record['post_id'] if record else None
         
         # 生成时间戳（全数字格式）
-        latest_ts = max([p.get('timestamp') for p in all_posts_in_slice if p.get('timestamp')], default=None)
+        if latest_ts is None:
+            latest_ts = max([p.get('timestamp') for p in all_posts_in_slice if p.get('timestamp')], default=None)
         if latest_ts:
             from datetime import datetime, timedelta
             try:
@@ -616,42 +958,13 @@ class AgentController:
         stance_confidence = 0.5
         
         # 如果启用LLM标注，使用promptdataprocess模板进行标注
-        if use_llm_annotation and hasattr(agent, 'llm_api_key') and agent.llm_api_key and agent.llm_endpoint:
+        if use_llm_annotation and agent.llm_configured():
             try:
                 print(f"[标注] 使用LLM对Agent {agent.agent_id}的帖子进行标注...")
                 
-                # 读取promptdataprocess模板
-                with open('data/promptdataprocess.txt', 'r', encoding='utf-8') as f:
-                    template = f.read()
-                
-                # 构建对话上下文（如果有父帖子）
-                conversation_context = ""
-                if parent_mid and all_posts_in_slice:
-                    # 找到父帖子
-                    parent_post = None
-                    for p in all_posts_in_slice:
-                        if str(p.get('id', p.get('mid', ''))) == str(parent_mid):
-                            parent_post = p
-                            break
-                    
-                    if parent_post:
-                        conversation_context = f"\n[父帖子]: {parent_post.get('content', '')}"
-                
-                # 构建标注prompt（替换模板中的目标帖子）
-                target_post_section = f'[目标帖子]: {content}'
-                
-                # 如果有对话上下文，构建完整的目标帖子部分
-                if conversation_context:
-                    target_post_section = f'{conversation_context}\n\n[目标帖子]: {content}'
-                
-                # 替换模板中的示例目标帖子（两个地方都需要替换）
-                annotation_prompt = template.replace(
-                    '[目标帖子 (回复 4)]: 走正常途径不如闹来钱多又快',
-                    target_post_section
-                ).replace(
-                    '[目标帖子]: "走正常途径不如闹来钱多又快"',
-                    f'[目标帖子]: "{content}"'
-                )
+                template = load_annotation_template()
+                parent_content = find_parent_content(parent_mid, all_posts_in_slice)
+                annotation_prompt = build_annotation_prompt(template, content, parent_content)
                 
                 print(f"    [标注Prompt完整版] Agent {agent.agent_id} 帖子标注prompt开始 ================")
                 print(annotation_prompt)
@@ -659,37 +972,28 @@ class AgentController:
                 print(f"    [标注Debug] 标注Prompt长度: {len(annotation_prompt)} 字符")
                 
                 # 调用LLM进行标注
-                import requests
-                response = requests.post(
-                    agent.llm_endpoint,
-                    headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {agent.llm_api_key}'},
-                    json={'model': agent.llm_model, 'messages': [{'role': 'user', 'content': annotation_prompt}]}
+                annotation_result = request_annotation(
+                    annotation_prompt, agent.llm_backend,
+                    simulation_id=agent.simulation_id,
+                    call_info={'call_site': 'annotation', 'agent_id': agent.agent_id,
+                               'time_slice': self.current_time_slice, 'post_id': f"{agent.agent_id}_{new_timestamp}"}
                 )
-                response.raise_for_status()
-                
-                # 解析LLM返回的标注结果
-                import json
-                result_text = response.json()['choices'][0]['message']['content'].strip()
-                # 尝试提取JSON部分
-                if '{' in result_text and '}' in result_text:
-                    json_start = result_text.find('{')
-                    json_end = result_text.rfind('}') + 1
-                    json_str = result_text[json_start:json_end]
-                    annotation_result = json.loads(json_str)
-                    
+                if annotation_result:
                     # 使用LLM标注的结果
-                    emotion_score = float(annotation_result.get('emotion_score', emotion_score))
-                    stance_score = float(annotation_result.get('stance_score', stance_score))
-                    information_strength = float(annotation_result.get('information_strength', information_strength))
+                    emotion_score = annotation_result.get('emotion_score', emotion_score)
+                    stance_score = annotation_result.get('stance_score', stance_score)
+                    information_strength = annotation_result.get('information_strength', information_strength)
                     keywords = annotation_result.get('keywords', keywords)
                     stance_category = annotation_result.get('stance_category', stance_category)
-                    stance_confidence = float(annotation_result.get('stance_confidence', stance_confidence))
+                    stance_confidence = annotation_result.get('stance_confidence', stance_confidence)
                     
                     print(f"[标注] LLM标注成功: emotion={emotion_score:.3f}, stance={stance_score:.3f}, info_strength={information_strength:.3f}")
                     print(f"[标注] LLM标注扩展: keywords={keywords}, stance_category={stance_category}, stance_confidence={stance_confidence:.3f}")
                 else:
                     print(f"[标注] LLM返回格式无效，使用默认值")
                     
+            except BatchPendingError:
+                raise
             except Exception as e:
                 print(f"[标注] LLM标注失败: {e}，使用Agent状态值")
         else:
@@ -717,42 +1021,17 @@ class AgentController:
     def _analyze_most_influential_post(self, agent):
         """
         分析Agent在当前时间片中受影响最大的帖子，并设置most_influential_post_record
+        （影响分数的最大值在阅读时已由emotion_stance_history维护，这里O(1)读取）
         """
-        if not hasattr(agent, 'emotion_stance_history') or not agent.emotion_stance_history:
+        history = getattr(agent, 'emotion_stance_history', None)
+        if not history:
             print(f"[影响分析] Agent {agent.agent_id}: 无情绪立场变化历史，跳过影响分析")
             return
-            
-        max_influence_score = 0.0
-        most_influential_record = None
-        
-        print(f"[影响分析] Agent {agent.agent_id}: 分析 {len(agent.emotion_stance_history)} 条历史记录")
-        
-        for i, record in enumerate(agent.emotion_stance_history):
-            # 计算情绪变化幅度
-            emotion_change = abs(record['emotion_after'] - record['emotion_before'])
-            # 计算立场变化幅度
-            stance_change = abs(record['stance_after'] - record['stance_before'])
-            # 计算置信度变化幅度
-            confidence_change = abs(record['confidence_after'] - record['confidence_before'])
-            
-            # 计算综合影响分数（可以调整权重）
-            influence_score = emotion_change * 0.4 + stance_change * 0.4 + confidence_change * 0.2
-            
-            print(f"  帖子 {record['post_id']}: 情绪变化={emotion_change:.3f}, 立场变化={stance_change:.3f}, 置信度变化={confidence_change:.3f}, 影响分数={influence_score:.3f}")
-            
-            if influence_score > max_influence_score:
-                max_influence_score = influence_score
-                most_influential_record = {
-                    'post_id': record['post_id'],
-                    'influence_score': influence_score,
-                    'emotion_change': emotion_change,
-                    'stance_change': stance_change,
-                    'confidence_change': confidence_change
-                }
-        
+
+        most_influential_record = history.most_influential()
         if most_influential_record:
             agent.most_influential_post_record = most_influential_record
-            print(f"[影响分析] Agent {agent.agent_id}: 影响最大的帖子是 {most_influential_record['post_id']}, 影响分数={most_influential_record['influence_score']:.3f}")
+            print(f"[影响分析] Agent {agent.agent_id}: 分析 {history.total_records} 条历史记录，影响最大的帖子是 {most_influential_record['post_id']}, 影响分数={most_influential_record['influence_score']:.3f}")
         else:
             print(f"[影响分析] Agent {agent.agent_id}: 未找到有影响的帖子")
 
@@ -0,0 +1,207 @@
+"""
+增量统计模块
+AgentAggregates维护全体Agent情绪/立场/置信度的累计和、平方和以及立场分组计数：
+Agent状态每次赋值时O(1)更新，均值、方差、立场分布和极化指数O(1)读取，
+不再需要每个时间片遍历所有Agent构造get_status()。
+PostAggregates逐条累计帖子的类别直方图和标注字段的和/计数，
+生成与calculate_environmental_summary相同字段的环境摘要。
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+# Agent被跟踪的状态字段（对应Agent.current_<field>）
+STATE_FIELDS = ('emotion', 'stance', 'confidence')
+
+# 立场分组阈值，与意见领袖prompt中"正面/负面"的划分一致
+STANCE_NEUTRAL_BAND = 0.1
+
+STANCE_GROUPS = ('positive', 'neutral', 'negative')
+
+
+def stance_group(stance: float) -> str:
+    """立场分组：>0.1为正面，<-0.1为负面，其余为中立"""
+    if stance > STANCE_NEUTRAL_BAND:
+        return 'positive'
+    if stance < -STANCE_NEUTRAL_BAND:
+        return 'negative'
+    return 'neutral'
+
+
+class _RunningSum:
+    """带补偿的累加器（Neumaier求和）：长时间增减后误差不随更新次数累积"""
+
+    __slots__ = ('total', 'compensation')
+
+    def __init__(self):
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def add(self, value: float):
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+
+    @property
+    def value(self) -> float:
+        return self.total + self.compensation
+
+
+class AgentAggregates:
+    """全体Agent状态的增量统计（Agent.state_tracker）"""
+
+    def __init__(self, agents: Optional[Iterable[Any]] = None):
+        """
+        Args:
+            agents: 初始统计的Agent（之后通过add/on_change增量更新）
+        """
+        self.rebuild(agents or [])
+
+    def rebuild(self, agents: Iterable[Any]):
+        """从头重新统计（检查点恢复等绕过属性赋值的场景使用）"""
+        self.count = 0
+        self._sums = {field: _RunningSum() for field in STATE_FIELDS}
+        self._squares = {field: _RunningSum() for field in STATE_FIELDS}
+        self._abs_stance = _RunningSum()
+        self.stance_groups = {group: 0 for group in STANCE_GROUPS}
+        for agent in agents:
+            self.add(agent)
+
+    def add(self, agent):
+        """新Agent加入统计"""
+        self._update(agent, 1)
+
+    def remove(self, agent):
+        """Agent移出统计"""
+        self._update(agent, -1)
+
+    def _update(self, agent, sign: int):
+        self.count += sign
+        for field in STATE_FIELDS:
+            value = getattr(agent, f'current_{field}')
+            self._sums[field].add(sign * value)
+            self._squares[field].add(sign * value * value)
+        self._abs_stance.add(sign * abs(agent.current_stance))
+        self.stance_groups[stance_group(agent.current_stance)] += sign
+
+    def on_change(self, field: str, old: float, new: float):
+        """Agent状态赋值时的回调：从统计中减去旧值、加上新值"""
+        self._sums[field].add(-old)
+        self._sums[field].add(new)
+        self._squares[field].add(-old * old)
+        self._squares[field].add(new * new)
+        if field == 'stance':
+            self._abs_stance.add(-abs(old))
+            self._abs_stance.add(abs(new))
+            old_group, new_group = stance_group(old), stance_group(new)
+            if old_group != new_group:
+                self.stance_groups[old_group] -= 1
+                self.stance_groups[new_group] += 1
+
+    def mean(self, field: str) -> float:
+        """字段均值，没有Agent时为0"""
+        return self._sums[field].value / self.count if self.count else 0
+
+    def variance(self, field: str) -> float:
+        """字段总体方差，没有Agent时为0"""
+        if not self.count:
+            return 0.0
+        mean = self._sums[field].value / self.count
+        return max(0.0, self._squares[field].value / self.count - mean * mean)
+
+    def stance_distribution(self) -> Dict[str, float]:
+        """正面/中立/负面立场的Agent占比"""
+        if not self.count:
+            return {group: 0.0 for group in STANCE_GROUPS}
+        return {group: n / self.count for group, n in self.stance_groups.items()}
+
+    def polarization_index(self) -> float:
+        """
+        极化指数：4·p正面·p负面，取值[0, 1]
+        两个阵营各占一半时为1，没有对立阵营时为0
+        """
+        if not self.count:
+            return 0.0
+        return 4.0 * self.stance_groups['positive'] * self.stance_groups['negative'] / (self.count * self.count)
+
+    def mean_abs_stance(self) -> float:
+        """平均立场强度|stance|（立场极端程度）"""
+        return self._abs_stance.value / self.count if self.count else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """宏观统计（compute_macro_summary的输出）"""
+        return {
+            'average_emotion': self.mean('emotion'),
+            'average_stance': self.mean('stance'),
+            'agent_count': self.count,
+            'average_confidence': self.mean('confidence'),
+            'emotion_variance': self.variance('emotion'),
+            'stance_variance': self.variance('stance'),
+            'stance_distribution': self.stance_distribution(),
+            'polarization_index': self.polarization_index(),
+            'mean_abs_stance': self.mean_abs_stance(),
+        }
+
+
+# 环境摘要中求均值的帖子字段 -> 摘要键
+_POST_SCORE_FIELDS = (
+    ('stance_score', 'average_stance_score'),
+    ('stance_confidence', 'average_stance_confidence'),
+    ('emotion_score', 'average_emotion_score'),
+    ('information_strength', 'average_information_strength'),
+)
+
+
+class PostAggregates:
+    """时间片帖子的增量统计（环境摘要）"""
+
+    def __init__(self, posts: Optional[Iterable[Dict[str, Any]]] = None):
+        """
+        Args:
+            posts: 初始统计的帖子（之后通过add增量加入）
+        """
+        self.total_posts = 0
+        self.stance_category_counts: Dict[str, int] = {}
+        self.emotion_category_counts: Dict[str, int] = {}
+        # 字段 -> [和, 有效计数]
+        self._score_sums = {field: [0.0, 0] for field, _ in _POST_SCORE_FIELDS}
+        for post in posts or []:
+            self.add(post)
+
+    def add(self, post: Dict[str, Any]):
+        """加入一条帖子"""
+        self.total_posts += 1
+        sc = post.get("stance_category")
+        if sc:
+            self.stance_category_counts[sc] = self.stance_category_counts.get(sc, 0) + 1
+        ec = post.get("emotion_category")
+        if ec:
+            self.emotion_category_counts[ec] = self.emotion_category_counts.get(ec, 0) + 1
+        for field, _ in _POST_SCORE_FIELDS:
+            value = post.get(field)
+            if value is not None:
+                acc = self._score_sums[field]
+                acc[0] += value
+                acc[1] += 1
+
+    def average(self, field: str) -> float:
+        """字段均值（只统计有该字段的帖子），没有时为0.0"""
+        total, count = self._score_sums[field]
+        return total / count if count else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """环境摘要，字段和语义与calculate_environmental_summary一致；没有帖子时为空字典"""
+        if not self.total_posts:
+            return {}
+        averages = {key: self.average(field) for field, key in _POST_SCORE_FIELDS}
+        return {
+            "total_posts_in_slice": self.total_posts,
+            "stance_distribution": {k: v / self.total_posts for k, v in self.stance_category_counts.items()},
+            "average_stance_score": averages["average_stance_score"],
+            "average_stance_confidence": averages["average_stance_confidence"],
+            "emotion_distribution": {k: v / self.total_posts for k, v in self.emotion_category_counts.items()},
+            "average_emotion_score": averages["average_emotion_score"],
+            "average_information_strength": averages["average_information_strength"],
+        }
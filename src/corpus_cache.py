@@ -0,0 +1,187 @@
+"""
+语料缓存模块
+load_initial_data每次启动都对同一个数据文件执行json.load、递归展开、过滤、标准化和排序。
+这里把处理结果编译为一个二进制列式文件，按源文件SHA-256和处理流程版本命名：
+  时间片帖子（已排序）及其epoch秒、世界状态帖子（已标准化）两张表，
+  每个字段一列（int64/float64/bool数组，字符串和其他值存为字符串表下标），外加存在标记；
+  字符串表去重后整体存储。
+源文件不变时直接加载编译结果，跳过整个处理流程。
+"""
+
+import hashlib
+import json
+import os
+import struct
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+# load_initial_data的处理流程（展开/过滤/标准化/排序）或文件格式变化时递增，旧缓存自动失效
+PIPELINE_VERSION = 2
+MAGIC = b'SIMCORP1'
+
+KIND_INT = 'int'
+KIND_FLOAT = 'float'
+KIND_BOOL = 'bool'
+KIND_STR = 'str'
+KIND_JSON = 'json'
+
+_DTYPES = {KIND_INT: '<i8', KIND_FLOAT: '<f8', KIND_BOOL: 'u1', KIND_STR: '<i4', KIND_JSON: '<i4'}
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class CompiledCorpus(NamedTuple):
+    """编译后的语料"""
+    slice_posts: List[Dict[str, Any]]  # 时间片帖子，按时间排序
+    epochs: List[float]                # 时间片帖子的epoch秒
+    pool_posts: List[Dict[str, Any]]   # 世界状态帖子（已标准化），语料顺序
+
+
+def source_digest(path: str) -> str:
+    """源文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_cache_dir() -> str:
+    """默认缓存目录：用户缓存目录（$XDG_CACHE_HOME或~/.cache）下，不写入数据文件所在的源码树"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "social_simulation", "corpus")
+
+
+def cache_path(cache_dir: str, digest: str) -> str:
+    """缓存文件路径（源文件摘要 + 处理流程版本）"""
+    return os.path.join(cache_dir, f"{digest[:32]}_p{PIPELINE_VERSION}.corpus")
+
+
+def _column_kind(values: List[Any]) -> str:
+    types = {type(v) for v in values}
+    if types == {int} and all(_INT64_MIN <= v <= _INT64_MAX for v in values):
+        return KIND_INT
+    if types == {float}:
+        return KIND_FLOAT
+    if types == {bool}:
+        return KIND_BOOL
+    if types == {str}:
+        return KIND_STR
+    return KIND_JSON
+
+
+class _Writer:
+    def __init__(self):
+        self.blobs: List[bytes] = []
+        self.size = 0
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+
+    def add_blob(self, data: bytes) -> Dict[str, int]:
+        ref = {'offset': self.size, 'nbytes': len(data)}
+        self.blobs.append(data)
+        self.size += len(data)
+        return ref
+
+    def intern(self, text: str) -> int:
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def add_table(self, posts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(key for post in posts for key in post))
+        columns = []
+        for key in keys:
+            present = [key in post for post in posts]
+            values = [post[key] for post in posts if key in post]
+            kind = _column_kind(values)
+            if kind == KIND_STR:
+                values = [self.intern(v) for v in values]
+            elif kind == KIND_JSON:
+                values = [self.intern(json.dumps(v, ensure_ascii=False)) for v in values]
+            column = np.zeros(len(posts), dtype=_DTYPES[kind])
+            column[np.asarray(present, dtype=bool)] = values
+            columns.append({
+                'key': key,
+                'kind': kind,
+                'present': self.add_blob(np.asarray(present, dtype='u1').tobytes()),
+                'values': self.add_blob(column.tobytes()),
+            })
+        return {'count': len(posts), 'columns': columns}
+
+
+def save_corpus_cache(path: str, compiled: CompiledCorpus, digest: str):
+    """写入编译后的语料（先写临时文件再替换，并发启动的仿真不会读到不完整的文件）"""
+    writer = _Writer()
+    header = {
+        'pipeline_version': PIPELINE_VERSION,
+        'source_sha256': digest,
+        'tables': {
+            'slice_posts': writer.add_table(compiled.slice_posts),
+            'pool_posts': writer.add_table(compiled.pool_posts),
+        },
+        'epochs': writer.add_blob(np.asarray(compiled.epochs, dtype='<f8').tobytes()),
+    }
+    header['strings'] = writer.add_blob(json.dumps(writer.strings, ensure_ascii=False).encode('utf-8'))
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for blob in writer.blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+def _read_table(table: Dict[str, Any], data: memoryview, strings: List[str]) -> List[Dict[str, Any]]:
+    count = table['count']
+    posts = [{} for _ in range(count)]
+    for column in table['columns']:
+        present_ref, values_ref = column['present'], column['values']
+        present = np.frombuffer(data, dtype='u1', count=count, offset=present_ref['offset']).tolist()
+        values = np.frombuffer(data, dtype=_DTYPES[column['kind']], count=count,
+                               offset=values_ref['offset']).tolist()
+        kind, key = column['kind'], column['key']
+        if kind == KIND_BOOL:
+            values = [bool(v) for v in values]
+        elif kind == KIND_STR:
+            values = [strings[v] for v in values]
+        for post, is_present, value in zip(posts, present, values):
+            if is_present:
+                # JSON值（列表/嵌套回复等）每条帖子单独解码，不共享可变对象
+                post[key] = json.loads(strings[value]) if kind == KIND_JSON else value
+    return posts
+
+
+def load_corpus_cache(path: str) -> Optional[CompiledCorpus]:
+    """读取编译后的语料，文件不存在、格式或处理流程版本不符时返回None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        content = f.read()
+    if content[:len(MAGIC)] != MAGIC:
+        return None
+    header_start = len(MAGIC) + 8
+    (header_len,) = struct.unpack_from('<Q', content, len(MAGIC))
+    try:
+        header = json.loads(content[header_start:header_start + header_len].decode('utf-8'))
+    except ValueError:
+        return None
+    if header.get('pipeline_version') != PIPELINE_VERSION:
+        return None
+
+    data = memoryview(content)[header_start + header_len:]
+    strings_ref = header['strings']
+    strings = json.loads(bytes(data[strings_ref['offset']:strings_ref['offset'] + strings_ref['nbytes']]).decode('utf-8'))
+    epochs_ref = header['epochs']
+    epochs = np.frombuffer(data, dtype='<f8', count=epochs_ref['nbytes'] // 8, offset=epochs_ref['offset']).tolist()
+    return CompiledCorpus(
+        slice_posts=_read_table(header['tables']['slice_posts'], data, strings),
+        epochs=epochs,
+        pool_posts=_read_table(header['tables']['pool_posts'], data, strings),
+    )
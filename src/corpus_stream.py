@@ -0,0 +1,295 @@
+"""
+流式语料模块
+语料大于内存时不再json.load整个文件：逐个解析顶级帖子（含嵌套回复）并展开过滤，
+按时间外部排序（分段排序写入临时文件，再多路归并）写成磁盘时间片文件：
+  posts.jsonl  按时间升序、每行一条帖子JSON
+  posts.idx    每条帖子的epoch秒（float64）和行起始字节偏移（int64，多一个结束偏移）
+  meta.json    源文件大小/修改时间和帖子数（源文件变化后重新构建）
+仿真时StreamingSliceReader以内存映射方式读取，每次只解码一个时间片的帖子，
+内存占用与时间片大小相关，与语料大小无关。
+"""
+
+import heapq
+import json
+import mmap
+import os
+import re
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .services import is_valid_post, iter_flattened_posts
+from .time_manager import TimeSlicing, parse_timestamp
+
+DATA_FILENAME = 'posts.jsonl'
+INDEX_FILENAME = 'posts.idx'
+META_FILENAME = 'meta.json'
+FORMAT_VERSION = 1
+
+# 外部排序每段在内存中排序的帖子数
+DEFAULT_RUN_SIZE = 20000
+# 增量解析每次读取的字符数
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json_array(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    逐个解析JSON数组文件的顶级元素（每次只在内存中保留一个元素及一个读取块）
+
+    Raises:
+        ValueError: 当文件不是JSON数组或格式错误时
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, pos, eof = '', 0, False
+        expect = '['  # '['：数组开始；'value'：元素；','：分隔符
+
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            complete = pos < len(buffer)
+            if complete and expect == 'value' and buffer[pos] != ']':
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # 恰好结束在缓冲区末尾的元素（如数字）可能被读取块截断
+                    complete = eof or end < len(buffer)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    complete = False
+            if not complete:
+                if eof:
+                    raise ValueError("JSON数组没有结束")
+                chunk = f.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+
+            char = buffer[pos]
+            if expect == '[':
+                if char != '[':
+                    raise ValueError("帖子数据必须是列表格式")
+                pos += 1
+                expect = 'value'
+            elif char == ']':
+                return
+            elif expect == 'value':
+                yield value
+                pos = end
+                expect = ','
+            else:
+                if char != ',':
+                    raise ValueError(f"JSON格式错误: 期望','，实际为{char!r}")
+                pos += 1
+                expect = 'value'
+
+
+def iter_corpus_posts(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    流式读取语料：展开嵌套回复、过滤有效帖子并标准化timestamp字段
+    （与load_initial_data的flatten_posts_recursive -> filter_valid_posts -> TimeSliceManager流程一致）
+
+    Raises:
+        KeyError: 当有效帖子缺少timestamp字段时
+    """
+    index = 0
+    for thread in iter_json_array(path, chunk_size):
+        for post in iter_flattened_posts([thread]):
+            if not is_valid_post(post):
+                continue
+            if 'timestamp' not in post:
+                if 't' not in post:
+                    raise KeyError(f"帖子 {index} 缺少timestamp字段")
+                post['timestamp'] = post['t']
+            index += 1
+            yield post
+
+
+def _source_stamp(source_path: str) -> Dict[str, Any]:
+    stat = os.stat(source_path)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+
+def _write_run(records: List[tuple], directory: str) -> str:
+    records.sort()
+    fd, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for epoch, seq, line in records:
+            f.write(f"{epoch!r}\t{seq}\t{line}\n")
+    return path
+
+
+def _read_run(path: str) -> Iterator[tuple]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in f:
+            epoch, seq, line = row.rstrip('\n').split('\t', 2)
+            yield float(epoch), int(seq), line
+
+
+def build_slice_file(source_path: str, output_dir: str, run_size: int = DEFAULT_RUN_SIZE,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    把语料文件构建为按时间排序的磁盘时间片文件（外部排序，内存占用由run_size决定）
+
+    时间相同的帖子保持语料中的顺序（与TimeSliceManager的稳定排序一致）。
+
+    Returns:
+        Dict: meta.json的内容
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # 先删除旧的meta.json：构建中途失败时不会把不完整的文件当作最新
+    meta_path = os.path.join(output_dir, META_FILENAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    runs = []
+    records = []
+    count = 0
+    try:
+        # 1. 分段：每run_size条帖子排序后写入一个临时文件
+        for post in iter_corpus_posts(source_path, chunk_size):
+            records.append((parse_timestamp(post['timestamp']), count, json.dumps(post, ensure_ascii=False)))
+            count += 1
+            if len(records) >= run_size:
+                runs.append(_write_run(records, output_dir))
+                records = []
+        if records:
+            runs.append(_write_run(records, output_dir))
+            records = []
+
+        # 2. 多路归并：写出帖子行，同时把epoch和偏移分别写入临时数组文件
+        data_tmp = os.path.join(output_dir, DATA_FILENAME + '.tmp')
+        index_tmp = os.path.join(output_dir, INDEX_FILENAME + '.tmp')
+        offsets_tmp = os.path.join(output_dir, INDEX_FILENAME + '.offsets.tmp')
+        offset = 0
+        with open(data_tmp, 'wb') as data_file, open(index_tmp, 'wb') as epoch_file, \
+                open(offsets_tmp, 'wb') as offset_file:
+            epochs, offsets = [], []
+            for epoch, _, line in heapq.merge(*[_read_run(path) for path in runs]):
+                encoded = line.encode('utf-8') + b'\n'
+                data_file.write(encoded)
+                epochs.append(epoch)
+                offsets.append(offset)
+                offset += len(encoded)
+                if len(epochs) >= run_size:
+                    np.asarray(epochs, dtype='<f8').tofile(epoch_file)
+                    np.asarray(offsets, dtype='<i8').tofile(offset_file)
+                    epochs, offsets = [], []
+            offsets.append(offset)
+            np.asarray(epochs, dtype='<f8').tofile(epoch_file)
+            np.asarray(offsets, dtype='<i8').tofile(offset_file)
+        # 索引文件 = epochs[n] + offsets[n+1]
+        with open(index_tmp, 'ab') as index_file, open(offsets_tmp, 'rb') as offset_file:
+            while True:
+                block = offset_file.read(DEFAULT_CHUNK_SIZE)
+                if not block:
+                    break
+                index_file.write(block)
+        os.remove(offsets_tmp)
+    finally:
+        for path in runs:
+            os.remove(path)
+
+    os.replace(data_tmp, os.path.join(output_dir, DATA_FILENAME))
+    os.replace(index_tmp, os.path.join(output_dir, INDEX_FILENAME))
+    meta = {'version': FORMAT_VERSION, 'post_count': count, **_source_stamp(source_path)}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def slice_file_is_current(source_path: str, output_dir: str) -> bool:
+    """磁盘时间片文件是否存在且与源文件一致"""
+    meta_path = os.path.join(output_dir, META_FILENAME)
+    if not os.path.exists(meta_path):
+        return False
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (meta.get('version') == FORMAT_VERSION and
+            all(meta.get(k) == v for k, v in _source_stamp(source_path).items()))
+
+
+class StreamingSliceReader(TimeSlicing):
+    """
+    磁盘时间片文件的读取器（接口与TimeSliceManager相同）
+
+    帖子数据和索引以内存映射方式打开，get_slice只解码所请求时间片的帖子。
+    """
+
+    def __init__(self, slice_dir: str, slice_size: Optional[int] = None,
+                 slice_duration: Optional[float] = None):
+        """
+        Args:
+            slice_dir: build_slice_file的输出目录
+            slice_size: 每个时间片包含的帖子数量
+            slice_duration: 每个时间片的时长（秒），给出时按时间窗口划分
+        """
+        self._validate_slicing(slice_size, slice_duration)
+        self.slice_dir = slice_dir
+        index_path = os.path.join(slice_dir, INDEX_FILENAME)
+        count = (os.path.getsize(index_path) - 8) // 16
+        self._post_count = count
+        if count > 0:
+            self._epochs = np.memmap(index_path, dtype='<f8', mode='r', shape=(count,))
+            self._offsets = np.memmap(index_path, dtype='<i8', mode='r', offset=8 * count, shape=(count + 1,))
+            self._data_file = open(os.path.join(slice_dir, DATA_FILENAME), 'rb')
+            self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._epochs = np.zeros(0, dtype='<f8')
+            self._offsets = np.zeros(1, dtype='<i8')
+            self._data_file = None
+            self._data = None
+        self._init_slicing(slice_size, slice_duration)
+
+    @classmethod
+    def from_source(cls, source_path: str, slice_dir: str, slice_size: Optional[int] = None,
+                    slice_duration: Optional[float] = None, run_size: int = DEFAULT_RUN_SIZE) -> 'StreamingSliceReader':
+        """源文件没有对应的时间片文件或已变化时先构建，再打开读取器"""
+        if not slice_file_is_current(source_path, slice_dir):
+            print(f"[Corpus] 构建磁盘时间片文件: {source_path} -> {slice_dir}")
+            meta = build_slice_file(source_path, slice_dir, run_size=run_size)
+            print(f"[Corpus] 已写入 {meta['post_count']} 条帖子")
+        return cls(slice_dir, slice_size=slice_size, slice_duration=slice_duration)
+
+    def _lower_bound(self, epoch: float, lo: int = 0) -> int:
+        # bisect在np.memmap上逐个元素取值（每次生成numpy标量），searchsorted在C中完成二分查找
+        return lo + int(np.searchsorted(self._epochs[lo:], epoch, side='left'))
+
+    def get_slice(self, slice_index: int) -> List[Dict[str, Any]]:
+        """
+        读取指定索引的时间片（只解码这一个时间片的帖子）
+
+        Raises:
+            IndexError: 当slice_index超出范围时
+        """
+        if self._epochs is None:
+            raise ValueError("时间片读取器已关闭")
+        start_index, end_index = self.slice_bounds(slice_index)
+        if end_index <= start_index:
+            return []
+        block = self._data[int(self._offsets[start_index]):int(self._offsets[end_index])]
+        # 按字节拆分行（帖子JSON中的换行已转义；str.splitlines还会在U+2028等字符处拆分）
+        return [json.loads(line) for line in block.split(b'\n') if line]
+
+    def iter_posts(self) -> Iterator[Dict[str, Any]]:
+        """按时间顺序逐个时间片遍历所有帖子"""
+        for slice_index in range(self.total_slices):
+            yield from self.get_slice(slice_index)
+
+    @property
+    def total_posts(self) -> int:
+        """总帖子数量（关闭后仍可获取）"""
+        return self._post_count
+
+    def close(self):
+        """关闭内存映射和数据文件（可重复调用，关闭后不能再读取时间片）"""
+        if self._data is not None:
+            self._data.close()
+            self._data_file.close()
+            self._data = None
+            self._data_file = None
+        self._epochs = self._offsets = None
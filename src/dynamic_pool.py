@@ -0,0 +1,173 @@
+"""
+动态帖子池模块
+Agent发布的帖子进入世界状态后，在之后window_slices个时间片内重新进入个性化Feed的候选集。
+热度由增量计数维护：阅读和回复（以该帖子为pid的新帖）在时间片内只累加到待处理计数，
+时间片结束时批量计入热度；热度按半衰期衰减，衰减只在读取或更新某条帖子时按经过的
+时间片数一次算出（惰性衰减），不需要每个时间片重扫整个帖子池。
+"""
+
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .post import source_post_id
+
+# 帖子发布后保留在Feed候选集中的时间片数
+DEFAULT_WINDOW_SLICES = 3
+# 热度衰减一半所需的时间片数
+DEFAULT_HALF_LIFE_SLICES = 1.0
+# 每次阅读/回复增加的热度
+DEFAULT_READ_WEIGHT = 1.0
+DEFAULT_REPLY_WEIGHT = 3.0
+# 新帖子的初始热度
+DEFAULT_INITIAL_POPULARITY = 1.0
+
+
+class _PoolEntry:
+    """池中一条帖子的热度状态（score为updated_slice时的热度）"""
+
+    __slots__ = ('post', 'created_slice', 'score', 'updated_slice')
+
+    def __init__(self, post, created_slice: int, score: float, updated_slice: int):
+        self.post = post
+        self.created_slice = created_slice
+        self.score = score
+        self.updated_slice = updated_slice
+
+
+class DynamicPostPool:
+    """Agent帖子的动态Feed池（增量阅读/回复计数 + 惰性时间衰减）"""
+
+    def __init__(self, window_slices: int = DEFAULT_WINDOW_SLICES,
+                 half_life_slices: float = DEFAULT_HALF_LIFE_SLICES,
+                 read_weight: float = DEFAULT_READ_WEIGHT, reply_weight: float = DEFAULT_REPLY_WEIGHT,
+                 initial_popularity: float = DEFAULT_INITIAL_POPULARITY):
+        """
+        Args:
+            window_slices: 帖子发布后进入Feed候选集的时间片数
+            half_life_slices: 热度半衰期（时间片数）
+            read_weight: 每次阅读增加的热度
+            reply_weight: 每次回复增加的热度
+            initial_popularity: 新帖子的初始热度
+
+        Raises:
+            ValueError: 当window_slices小于1或half_life_slices小于等于0时
+        """
+        if window_slices < 1:
+            raise ValueError("动态帖子池的窗口必须至少为1个时间片")
+        if half_life_slices <= 0:
+            raise ValueError("热度半衰期必须大于0")
+        self.window_slices = window_slices
+        self.half_life_slices = float(half_life_slices)
+        self.decay_per_slice = 0.5 ** (1.0 / self.half_life_slices)
+        self.read_weight = read_weight
+        self.reply_weight = reply_weight
+        self.initial_popularity = initial_popularity
+        self._entries: Dict[Any, _PoolEntry] = {}
+        # (发布时间片, 帖子key)，按发布顺序排列，过期帖子从左侧移除
+        self._order: Deque[Tuple[int, Any]] = deque()
+        self._pending_reads: Counter = Counter()
+        self._pending_replies: Counter = Counter()
+
+    @classmethod
+    def from_config(cls, config) -> Optional['DynamicPostPool']:
+        """按配置创建（false/None不启用，true使用默认参数，dict覆盖参数）"""
+        if not config:
+            return None
+        return cls(**config) if isinstance(config, dict) else cls()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, post_key) -> bool:
+        return post_key in self._entries
+
+    def add(self, post, slice_index: int):
+        """登记在slice_index发布的Agent帖子（从下一个时间片起进入Feed），其父帖子记一次回复"""
+        key = source_post_id(post)
+        if key is None or key in self._entries:
+            return
+        self._entries[key] = _PoolEntry(post, slice_index, float(self.initial_popularity), slice_index)
+        self._order.append((slice_index, key))
+        self.record_reply(post.get('pid', post.get('parent_post_id')))
+
+    def record_read(self, post):
+        """记录一次阅读（只统计池中的帖子，时间片结束时计入热度）"""
+        key = source_post_id(post)
+        if key in self._entries:
+            self._pending_reads[key] += 1
+
+    def record_reply(self, parent_key):
+        """记录一次回复（只统计池中的帖子，时间片结束时计入热度）"""
+        if parent_key is not None and parent_key in self._entries:
+            self._pending_replies[parent_key] += 1
+
+    def _decayed(self, entry: _PoolEntry, slice_index: int) -> float:
+        elapsed = slice_index - entry.updated_slice
+        return entry.score * self.decay_per_slice ** elapsed if elapsed > 0 else entry.score
+
+    def popularity(self, post_key, slice_index: int) -> float:
+        """帖子在slice_index时的热度（不在池中时为0）"""
+        entry = self._entries.get(post_key)
+        return self._decayed(entry, slice_index) if entry is not None else 0.0
+
+    def end_slice(self, slice_index: int):
+        """时间片结束：把本时间片的阅读和回复计数批量计入热度（只更新有计数的帖子）"""
+        for key in self._pending_reads.keys() | self._pending_replies.keys():
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            entry.score = (self._decayed(entry, slice_index) +
+                           self.read_weight * self._pending_reads[key] +
+                           self.reply_weight * self._pending_replies[key])
+            entry.updated_slice = slice_index
+        self._pending_reads.clear()
+        self._pending_replies.clear()
+
+    def feed_posts(self, slice_index: int) -> List[Any]:
+        """
+        slice_index的Feed候选中来自动态池的帖子（之前时间片发布且仍在窗口内，按发布顺序），
+        移除已过窗口的帖子，并把当前热度写入帖子的popularity字段
+        """
+        oldest = slice_index - self.window_slices
+        while self._order and self._order[0][0] < oldest:
+            _, key = self._order.popleft()
+            self._entries.pop(key, None)
+        posts = []
+        for created_slice, key in self._order:
+            if created_slice >= slice_index:
+                break
+            entry = self._entries[key]
+            entry.post['popularity'] = self._decayed(entry, slice_index)
+            posts.append(entry.post)
+        return posts
+
+    def state(self) -> Dict[str, Any]:
+        """检查点数据（帖子只保存key，恢复时从世界状态重新关联）"""
+        return {
+            "entries": [(key, entry.created_slice, entry.score, entry.updated_slice)
+                        for _, key in self._order for entry in (self._entries[key],)],
+            "pending_reads": dict(self._pending_reads),
+            "pending_replies": dict(self._pending_replies),
+        }
+
+    def restore(self, state: Dict[str, Any], lookup: Callable[[Any], Any]):
+        """
+        从state()的结果恢复
+
+        Args:
+            state: 检查点数据
+            lookup: 帖子key -> 世界状态中的帖子（找不到时返回None，该帖子被丢弃）
+        """
+        self._entries.clear()
+        self._order.clear()
+        for key, created_slice, score, updated_slice in state["entries"]:
+            post = lookup(key)
+            if post is None:
+                continue
+            self._entries[key] = _PoolEntry(post, created_slice, score, updated_slice)
+            self._order.append((created_slice, key))
+        self._pending_reads = Counter(state["pending_reads"])
+        self._pending_replies = Counter(state["pending_replies"])
+
+    def __repr__(self):
+        return f"DynamicPostPool(posts={len(self._entries)}, window={self.window_slices}, half_life={self.half_life_slices})"
@@ -0,0 +1,153 @@
+"""
+近似Feed的立场索引模块
+个性化Feed对每条帖子计算 Final_Score = w_pop * Score_Pop + w_rel * max(0, 1 - |agent_stance - post_stance|)，
+再以 sigmoid(k * (Final_Score - x0)) 的概率独立选中（x0为全部帖子Final_Score的均值）。
+大时间片中多数帖子的选中概率可以忽略，近似模式只评估可能达到概率下限的帖子：
+
+- 帖子按stance_score排序并保存前缀和：任意Agent的x0（Score_Rel的均值）在O(log n)内精确算出
+- 帖子按热度降序排列（相当于依次弹出热度最大堆）：热度头部的帖子总是评估
+- 头部之外的帖子热度不超过头部之后的最大热度，只有立场窗口 |agent_stance - post_stance| <= d 内的
+  帖子才可能达到概率下限；头部大小在若干候选值中取 头部 + 窗口 最小的一个
+
+被跳过的帖子在精确Feed中的选中概率都小于max_skip_probability（误差上界），
+每个Agent漏选帖子的期望数不超过 max_skip_probability × 跳过帖子数。
+"""
+
+import math
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# 被跳过帖子在精确Feed中的最大选中概率
+DEFAULT_MAX_SKIP_PROBABILITY = 0.01
+# 浮点误差余量（阈值比较时放宽，保证不会因舍入跳过达到下限的帖子）
+_SLACK = 1e-9
+
+
+class StanceFeedIndex:
+    """一个时间片普通帖子的立场排序索引和热度排序（时间片开始时构建一次，所有Agent共享）"""
+
+    def __init__(self, posts: Sequence[Dict[str, Any]], popularity_range: Tuple[float, float],
+                 max_skip_probability: float = DEFAULT_MAX_SKIP_PROBABILITY):
+        """
+        Args:
+            posts: 时间片的普通帖子（个性化Feed的打分范围）
+            popularity_range: 热度归一化参数 (pop_min, pop_range)，与精确Feed相同
+            max_skip_probability: 被跳过帖子的最大选中概率（0到1之间）
+
+        Raises:
+            ValueError: 当max_skip_probability不在(0, 1)内时
+        """
+        if not 0.0 < max_skip_probability < 1.0:
+            raise ValueError("近似Feed的跳过概率上限必须在0和1之间")
+        self.max_skip_probability = max_skip_probability
+        self.logit_threshold = math.log(max_skip_probability / (1.0 - max_skip_probability))
+        pop_min, pop_range = popularity_range
+        # 与精确Feed一致：没有information_strength的帖子不参与打分
+        self._positions = np.asarray([i for i, post in enumerate(posts)
+                                      if post.get("information_strength") is not None], dtype=np.int64)
+        valid = [posts[i] for i in self._positions]
+        stances = np.asarray([float(post.get('stance_score', 0.0)) for post in valid], dtype=np.float64)
+        pops = np.asarray([(float(post.get('popularity', 0)) - pop_min) / pop_range if pop_range > 0 else 0.0
+                           for post in valid], dtype=np.float64)
+        self.total_posts = len(valid)
+        # 立场升序（窗口查找）与前缀和（x0计算）
+        self._stance_order = np.argsort(stances, kind='stable')
+        self._stances = stances[self._stance_order]
+        self._stance_prefix = np.concatenate(([0.0], np.cumsum(self._stances)))
+        # 热度降序：第h条之后的帖子热度都不超过 _pops_desc[h]
+        self._pop_order = np.argsort(-pops, kind='stable')
+        self._pops_desc = pops[self._pop_order]
+        self._pop_mean = float(pops.mean()) if len(pops) else 0.0
+        # 候选头部大小：0, 1, 2, 4, ...（不超过帖子数）
+        sizes = [0]
+        while sizes[-1] < self.total_posts:
+            sizes.append(min(self.total_posts, max(1, sizes[-1] * 2)))
+        self._head_sizes = sizes
+        # 本时间片的统计（所有Agent累计）
+        self.evaluated = 0
+        self.scanned = 0
+        self.expected_missed_bound = 0.0
+
+    def _rel_sum(self, agent_stance: float) -> float:
+        """所有帖子 max(0, 1 - |agent_stance - s|) 之和（前缀和，O(log n)）"""
+        s = self._stances
+        lo = int(np.searchsorted(s, agent_stance - 1.0, side='left'))
+        mid = int(np.searchsorted(s, agent_stance, side='left'))
+        hi = int(np.searchsorted(s, agent_stance + 1.0, side='right'))
+        prefix = self._stance_prefix
+        left = (mid - lo) * (1.0 - agent_stance) + (prefix[mid] - prefix[lo])
+        right = (hi - mid) * (1.0 + agent_stance) - (prefix[hi] - prefix[mid])
+        return left + right
+
+    def _window(self, half_width: float, agent_stance: float) -> Tuple[int, int]:
+        """立场窗口 [agent_stance - d, agent_stance + d] 在立场排序中的范围"""
+        if half_width < 0:
+            return 0, 0
+        lo = int(np.searchsorted(self._stances, agent_stance - half_width - _SLACK, side='left'))
+        hi = int(np.searchsorted(self._stances, agent_stance + half_width + _SLACK, side='right'))
+        return lo, hi
+
+    def _window_for_head(self, head: int, agent_stance: float, threshold: float,
+                         w_pop: float, w_rel: float) -> Tuple[int, int]:
+        """头部大小为head时，头部之外可能达到分数下限的帖子所在的立场窗口"""
+        if head >= self.total_posts:
+            return 0, 0
+        # 头部之外的最大可能分数：w_pop * 最大热度 + w_rel * Score_Rel
+        remaining = threshold - w_pop * self._pops_desc[head]
+        if w_rel <= 0:
+            return (0, self.total_posts) if remaining <= _SLACK else (0, 0)
+        min_rel = remaining / w_rel
+        if min_rel <= _SLACK:
+            # Score_Rel为0的帖子也可能达到下限
+            return 0, self.total_posts
+        return self._window(1.0 - min_rel, agent_stance)
+
+    def candidates(self, agent_stance: float, k: float, w_pop: float, w_rel: float) -> Tuple[List[int], float]:
+        """
+        Agent需要评估的帖子位置和精确Feed的sigmoid中心点
+
+        Args:
+            agent_stance: Agent当前立场
+            k: sigmoid斜率
+            w_pop: 热度权重
+            w_rel: 相关性权重
+
+        Returns:
+            tuple: (帖子在时间片普通帖子中的位置（升序）, 全部帖子Final_Score的均值x0)
+        """
+        n = self.total_posts
+        if n == 0:
+            return [], 0.0
+        x0 = w_pop * self._pop_mean + w_rel * self._rel_sum(agent_stance) / n
+        if k <= 0:
+            # 斜率非正时概率不随分数递减，无法剪枝
+            self._record(n, n)
+            return self._positions.tolist(), x0
+        # 选中概率 >= max_skip_probability 等价于 Final_Score >= threshold
+        threshold = x0 + self.logit_threshold / k - _SLACK
+        best = None
+        for head in self._head_sizes:
+            lo, hi = self._window_for_head(head, agent_stance, threshold, w_pop, w_rel)
+            cost = head + hi - lo
+            if best is None or cost < best[0]:
+                best = (cost, head, lo, hi)
+        _, head, lo, hi = best
+        picked = np.union1d(self._pop_order[:head], self._stance_order[lo:hi])
+        self._record(len(picked), n)
+        return self._positions[picked].tolist(), x0
+
+    def _record(self, evaluated: int, total: int):
+        self.evaluated += evaluated
+        self.scanned += total
+        self.expected_missed_bound += self.max_skip_probability * (total - evaluated)
+
+    def summary(self) -> str:
+        """本时间片累计的评估量与误差上界"""
+        ratio = self.evaluated / self.scanned if self.scanned else 0.0
+        return (f"评估 {self.evaluated}/{self.scanned} 条候选帖子（{ratio:.1%}），"
+                f"跳过帖子的期望漏选数 ≤ {self.expected_missed_bound:.2f}"
+                f"（单条选中概率 < {self.max_skip_probability}）")
+
+    def __repr__(self):
+        return f"StanceFeedIndex(posts={self.total_posts}, max_skip_probability={self.max_skip_probability})"
@@ -0,0 +1,140 @@
+"""
+影响追踪模块
+InfluenceHistory替代按dict逐条记录的emotion_stance_history：
+阅读时把每次情绪/立场/置信度变化写入定长环形缓冲（并行的float数组），
+同时维护加权影响分数（0.4/0.4/0.2）的运行最大值，
+发帖时影响最大的帖子O(1)取得，不再回扫整个历史。
+"""
+
+from array import array
+from typing import Any, Dict, Iterator, List, Optional
+
+# 影响分数权重：情绪、立场、置信度变化幅度
+EMOTION_WEIGHT = 0.4
+STANCE_WEIGHT = 0.4
+CONFIDENCE_WEIGHT = 0.2
+
+# 环形缓冲默认容量（一个时间片内的阅读次数，超出时覆盖最早的记录）
+DEFAULT_HISTORY_CAPACITY = 256
+
+# 并行数组保存的字段（与原dict记录的键一致）
+_VALUE_FIELDS = ('emotion_before', 'stance_before', 'confidence_before',
+                 'emotion_after', 'stance_after', 'confidence_after')
+
+
+def influence_score(record: Dict[str, Any]) -> float:
+    """一条情绪立场变化记录的综合影响分数（情绪、立场、置信度变化幅度加权）"""
+    emotion_change = abs(record['emotion_after'] - record['emotion_before'])
+    stance_change = abs(record['stance_after'] - record['stance_before'])
+    confidence_change = abs(record['confidence_after'] - record['confidence_before'])
+    return emotion_change * EMOTION_WEIGHT + stance_change * STANCE_WEIGHT + confidence_change * CONFIDENCE_WEIGHT
+
+
+class InfluenceHistory:
+    """Agent一个时间片内的情绪立场变化历史（定长环形缓冲 + 影响分数运行最大值）"""
+
+    def __init__(self, capacity: int = DEFAULT_HISTORY_CAPACITY):
+        """
+        Args:
+            capacity: 保留的最近记录数（影响最大值的统计不受容量限制）
+        """
+        self.capacity = capacity
+        self._values = {field: array('d', bytes(8 * capacity)) for field in _VALUE_FIELDS}
+        self._scores = array('d', bytes(8 * capacity))
+        self._post_ids: List[Any] = [None] * capacity
+        self._time_slices: List[Any] = [None] * capacity
+        self.clear()
+
+    def clear(self):
+        """清空记录（时间片开始时调用，复用已分配的数组）"""
+        self._start = 0
+        self._size = 0
+        self.total_records = 0
+        # 影响分数运行最大值（分数为0的记录不算有影响）
+        self._best_score = 0.0
+        self._best_post_id = None
+        self._best_changes = (0.0, 0.0, 0.0)
+
+    def record(self, post_id, emotion_before: float, stance_before: float, confidence_before: float,
+               emotion_after: float, stance_after: float, confidence_after: float, time_slice_index=None):
+        """记录一次阅读带来的变化（不分配dict）"""
+        emotion_change = abs(emotion_after - emotion_before)
+        stance_change = abs(stance_after - stance_before)
+        confidence_change = abs(confidence_after - confidence_before)
+        score = emotion_change * EMOTION_WEIGHT + stance_change * STANCE_WEIGHT + confidence_change * CONFIDENCE_WEIGHT
+
+        if self._size < self.capacity:
+            slot = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+        values = self._values
+        values['emotion_before'][slot] = emotion_before
+        values['stance_before'][slot] = stance_before
+        values['confidence_before'][slot] = confidence_before
+        values['emotion_after'][slot] = emotion_after
+        values['stance_after'][slot] = stance_after
+        values['confidence_after'][slot] = confidence_after
+        self._scores[slot] = score
+        self._post_ids[slot] = post_id
+        self._time_slices[slot] = time_slice_index
+        self.total_records += 1
+
+        # 严格大于：分数相同时保留最先读到的帖子
+        if score > self._best_score:
+            self._best_score = score
+            self._best_post_id = post_id
+            self._best_changes = (emotion_change, stance_change, confidence_change)
+
+    def most_influential(self) -> Optional[Dict[str, Any]]:
+        """本时间片影响最大的帖子记录（没有任何变化时为None）"""
+        if self._best_score <= 0.0:
+            return None
+        emotion_change, stance_change, confidence_change = self._best_changes
+        return {
+            'post_id': self._best_post_id,
+            'influence_score': self._best_score,
+            'emotion_change': emotion_change,
+            'stance_change': stance_change,
+            'confidence_change': confidence_change
+        }
+
+    def post_scores(self) -> Dict[Any, float]:
+        """按post_id汇总保留记录的影响分数（同一帖子多条记录取最大值）"""
+        scores: Dict[Any, float] = {}
+        for slot in self._slots():
+            post_id = self._post_ids[slot]
+            score = self._scores[slot]
+            if score > scores.get(post_id, -1.0):
+                scores[post_id] = score
+        return scores
+
+    def _slots(self) -> Iterator[int]:
+        for i in range(self._size):
+            yield (self._start + i) % self.capacity
+
+    def _record_at(self, slot: int) -> Dict[str, Any]:
+        record = {'post_id': self._post_ids[slot]}
+        for field in _VALUE_FIELDS:
+            record[field] = self._values[field][slot]
+        record['time_slice_index'] = self._time_slices[slot]
+        return record
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """按阅读顺序生成与原dict记录格式相同的记录（只在需要时构造）"""
+        for slot in self._slots():
+            yield self._record_at(slot)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("history index out of range")
+        return self._record_at((self._start + index) % self.capacity)
+
+    def __repr__(self):
+        return f"InfluenceHistory(records={self._size}, capacity={self.capacity})"
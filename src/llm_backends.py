@@ -0,0 +1,346 @@
+"""
+LLM后端模块
+统一的LLM后端接口及三种实现：OpenAI兼容HTTP接口、进程内本地模型（ModelScope LLMService）和确定性Mock。
+仿真引擎按配置创建一个后端并注入AgentController/Agent，所有调用经LLMClient（合并、限流、录制、批处理）转发到后端。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import requests
+
+from .llm_scheduler import estimate_tokens
+
+BACKEND_OPENAI = 'openai'
+BACKEND_LOCAL = 'local'
+BACKEND_MOCK = 'mock'
+BACKEND_TYPES = (BACKEND_OPENAI, BACKEND_LOCAL, BACKEND_MOCK)
+
+DEFAULT_MODEL = 'deepseek-v3-250324'
+
+# 一次调用的结果：(回复内容, usage字段)
+Completion = Tuple[str, Optional[Dict[str, Any]]]
+
+# 流式调用的增量回调：每收到一段文本调用一次
+DeltaCallback = Callable[[str], None]
+
+
+class LLMBackend:
+    """
+    LLM后端基类。
+
+    子类至少实现complete()；complete_batch()默认逐条调用，
+    支持原生批量推理的后端应覆盖它并把supports_native_batch设为True。
+    complete_stream()默认一次性回调完整回复，支持流式输出的后端应覆盖它。
+    """
+
+    name = 'base'
+    supports_native_batch = False
+
+    @property
+    def supports_streaming(self) -> bool:
+        """complete_stream()是否真正逐段返回"""
+        return False
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model
+
+    @property
+    def configured(self) -> bool:
+        """后端是否可用（如HTTP后端需要endpoint和api_key）"""
+        return True
+
+    def cache_key(self) -> Hashable:
+        """区分不同后端实例的键，用于single-flight合并"""
+        return (self.name, self.model)
+
+    def complete(self, prompt: str, timeout: Optional[float] = None,
+                 call_info: Optional[Dict[str, Any]] = None) -> Completion:
+        """同步完成一次单轮对话"""
+        raise NotImplementedError
+
+    def complete_batch(self, prompts: List[str], timeout: Optional[float] = None,
+                       call_infos: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[Completion]:
+        """批量完成多条prompt，按输入顺序返回"""
+        call_infos = call_infos or [None] * len(prompts)
+        return [self.complete(prompt, timeout, info) for prompt, info in zip(prompts, call_infos)]
+
+    async def acomplete(self, prompt: str, timeout: Optional[float] = None,
+                        call_info: Optional[Dict[str, Any]] = None) -> Completion:
+        """异步完成一次单轮对话（默认在线程池中执行同步调用）"""
+        return await asyncio.to_thread(self.complete, prompt, timeout, call_info)
+
+    def complete_stream(self, prompt: str, on_delta: DeltaCallback, timeout: Optional[float] = None,
+                        call_info: Optional[Dict[str, Any]] = None) -> Completion:
+        """流式完成一次单轮对话，边生成边回调增量文本，返回拼接后的完整回复"""
+        content, usage = self.complete(prompt, timeout, call_info)
+        if content:
+            on_delta(content)
+        return content, usage
+
+    def describe(self) -> Dict[str, Any]:
+        """用于日志和元数据的后端描述（不含密钥）"""
+        return {'backend': self.name, 'model': self.model}
+
+
+class OpenAIHTTPBackend(LLMBackend):
+    """OpenAI兼容的chat/completions HTTP接口（连接复用同一个Session）"""
+
+    name = BACKEND_OPENAI
+
+    def __init__(self, endpoint: str, api_key: str, model: Optional[str] = None,
+                 timeout: Optional[float] = None, stream: bool = False,
+                 max_stream_tokens: Optional[int] = None, prompt_cache_key: Optional[str] = None):
+        """
+        Args:
+            endpoint: chat/completions接口地址
+            api_key: API密钥
+            model: 模型名称
+            timeout: 默认请求超时（秒），None表示不限
+            stream: complete_stream()是否使用SSE流式接口
+            max_stream_tokens: 流式生成的token上限，超过后中止读取并截断回复（None表示不限）
+            prompt_cache_key: 前缀缓存路由提示，设置后请求带上"{prompt_cache_key}:{调用点}"，
+                让同一模板的请求落到同一缓存（仅对支持该字段的服务商开启）
+        """
+        super().__init__(model or DEFAULT_MODEL)
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.timeout = timeout
+        self.stream = stream
+        self.max_stream_tokens = max_stream_tokens
+        self.prompt_cache_key = prompt_cache_key
+        self._local = threading.local()
+        # 统计
+        self.streams_truncated = 0
+
+    @property
+    def supports_streaming(self) -> bool:
+        return self.stream
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.endpoint and self.api_key)
+
+    def cache_key(self) -> Hashable:
+        return (self.name, self.endpoint, self.model)
+
+    def _session(self) -> requests.Session:
+        # requests.Session不保证线程安全，每个线程各用一个
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({'Content-Type': 'application/json', 'Authorization': f'Bearer {self.api_key}'})
+            self._local.session = session
+        return session
+
+    def _request_body(self, prompt: str, call_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        body = {'model': self.model, 'messages': [{'role': 'user', 'content': prompt}]}
+        if self.prompt_cache_key:
+            body['prompt_cache_key'] = f"{self.prompt_cache_key}:{(call_info or {}).get('call_site') or infer_call_site(prompt)}"
+        return body
+
+    def complete(self, prompt: str, timeout: Optional[float] = None,
+                 call_info: Optional[Dict[str, Any]] = None) -> Completion:
+        """
+        Raises:
+            requests.RequestException: 请求或HTTP状态失败
+            KeyError/ValueError: 响应格式无效
+        """
+        response = self._session().post(
+            self.endpoint,
+            json=self._request_body(prompt, call_info),
+            timeout=timeout if timeout is not None else self.timeout
+        )
+        response.raise_for_status()
+        api_response = response.json()
+        return api_response['choices'][0]['message']['content'], api_response.get('usage')
+
+    def complete_stream(self, prompt: str, on_delta: DeltaCallback, timeout: Optional[float] = None,
+                        call_info: Optional[Dict[str, Any]] = None) -> Completion:
+        """
+        通过SSE流式接口生成，超过max_stream_tokens时关闭连接并返回已生成的部分
+
+        Raises:
+            requests.RequestException: 请求、HTTP状态或读取流失败
+        """
+        if not self.stream:
+            return super().complete_stream(prompt, on_delta, timeout, call_info)
+
+        body = self._request_body(prompt, call_info)
+        body.update({'stream': True, 'stream_options': {'include_usage': True}})
+        if self.max_stream_tokens:
+            body['max_tokens'] = self.max_stream_tokens
+        response = self._session().post(
+            self.endpoint, json=body, stream=True,
+            timeout=timeout if timeout is not None else self.timeout
+        )
+        try:
+            response.raise_for_status()
+            parts: List[str] = []
+            usage = None
+            streamed_tokens = 0
+            for line in response.iter_lines():
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[len(b'data:'):].strip()
+                if data == b'[DONE]':
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get('usage') or usage
+                choices = chunk.get('choices') or []
+                delta = (choices[0].get('delta') or {}).get('content') if choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                on_delta(delta)
+                streamed_tokens += estimate_tokens(delta)
+                if self.max_stream_tokens and streamed_tokens >= self.max_stream_tokens:
+                    self.streams_truncated += 1
+                    print(f"[LLM] 流式生成超过{self.max_stream_tokens} token上限，提前中止")
+                    break
+        finally:
+            response.close()
+        return ''.join(parts), usage
+
+    def describe(self) -> Dict[str, Any]:
+        info = {'backend': self.name, 'model': self.model, 'endpoint': self.endpoint}
+        if self.prompt_cache_key:
+            info['prompt_cache_key'] = self.prompt_cache_key
+        if self.stream:
+            info.update({'stream': True, 'max_stream_tokens': self.max_stream_tokens,
+                         'streams_truncated': self.streams_truncated})
+        return info
+
+
+class LocalModelBackend(LLMBackend):
+    """
+    进程内本地模型，封装LLMService（ModelScope，加载失败时LLMService自身回退到Mock文本）。
+    单条调用进入LLMService的微批队列，与并发的其他调用合并成一次generate；
+    批量调用直接按批生成。
+    """
+
+    name = BACKEND_LOCAL
+    supports_native_batch = True
+
+    def __init__(self, service, max_new_tokens: int = 200):
+        """
+        Args:
+            service: LLMService实例
+            max_new_tokens: 每次生成的最大新token数
+        """
+        super().__init__(service.model_name)
+        self.service = service
+        self.max_new_tokens = max_new_tokens
+
+    def complete(self, prompt: str, timeout: Optional[float] = None,
+                 call_info: Optional[Dict[str, Any]] = None) -> Completion:
+        return self.service.submit(prompt, self.max_new_tokens).result(timeout), None
+
+    def complete_batch(self, prompts: List[str], timeout: Optional[float] = None,
+                       call_infos: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[Completion]:
+        return [(content, None) for content in self.service.generate_batch(prompts, self.max_new_tokens)]
+
+    def describe(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'model': self.model, 'generation': self.service.get_stats()}
+
+
+def infer_call_site(prompt: str) -> str:
+    """根据prompt内容推断调用点（阅读/标注/发帖）"""
+    if 'emotion_suggested' in prompt:
+        return 'reading'
+    if 'information_strength' in prompt or 'stance_category' in prompt:
+        return 'annotation'
+    return 'posting'
+
+
+def mock_reply(prompt: str, call_site: Optional[str] = None) -> str:
+    """
+    确定性的模拟回复：阅读/标注返回JSON，发帖返回文本，
+    数值由prompt摘要决定，同一prompt总得到相同结果
+    """
+    call_site = call_site or infer_call_site(prompt)
+    digest = hashlib.sha1(prompt.encode('utf-8')).digest()
+    emotion = round(digest[0] / 127.5 - 1.0, 3)
+    stance = round(digest[1] / 127.5 - 1.0, 3)
+    if call_site == 'reading':
+        return json.dumps({'emotion_suggested': emotion, 'stance_suggested': stance})
+    if call_site == 'annotation':
+        return json.dumps({
+            'emotion_score': emotion,
+            'stance_score': stance,
+            'information_strength': round(digest[2] / 255.0, 3),
+            'keywords': [],
+            'stance_category': 'NEUTRAL_MEDIATING',
+            'stance_confidence': round(digest[3] / 255.0, 3),
+        })
+    return f"[模拟发帖] 情绪{emotion:+.2f} 立场{stance:+.2f}"
+
+
+class MockBackend(LLMBackend):
+    """确定性Mock后端：不访问网络，用于测试和基准对比"""
+
+    name = BACKEND_MOCK
+    supports_native_batch = True
+
+    def __init__(self, model: Optional[str] = None):
+        super().__init__(model or 'mock')
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, prompt: str, timeout: Optional[float] = None,
+                 call_info: Optional[Dict[str, Any]] = None) -> Completion:
+        with self._lock:
+            self.calls += 1
+        content = mock_reply(prompt, (call_info or {}).get('call_site'))
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(content)
+        return content, {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+
+
+def create_llm_backend(llm_config: Optional[Dict[str, Any]] = None, use_env: bool = True) -> Optional[LLMBackend]:
+    """
+    按配置创建LLM后端
+
+    Args:
+        llm_config: {"backend": "openai|local|mock", "api_key", "base_url"/"endpoint", "model", "timeout",
+            "stream", "max_stream_tokens", "prompt_cache_key", ...}
+            local后端的其余字段（model_name、use_mock）传给LLMServiceFactory
+        use_env: 未配置时是否读取环境变量LLM_API_KEY / LLM_ENDPOINT / LLM_MODEL
+
+    Returns:
+        Optional[LLMBackend]: 后端实例；HTTP后端缺少endpoint或api_key时返回None
+    """
+    llm_config = llm_config or {}
+    backend_type = llm_config.get('backend') or BACKEND_OPENAI
+    if backend_type not in BACKEND_TYPES:
+        raise ValueError(f"未知的LLM后端: {backend_type}，支持: {list(BACKEND_TYPES)}")
+
+    if backend_type == BACKEND_MOCK:
+        return MockBackend(llm_config.get('model'))
+    if backend_type == BACKEND_LOCAL:
+        from .llm_service import LLMServiceFactory
+        return LocalModelBackend(
+            LLMServiceFactory.create_service(llm_config),
+            max_new_tokens=llm_config.get('max_new_tokens', 200)
+        )
+
+    # 支持两种字段名：base_url（前端发送）和 endpoint（传统字段）
+    api_key = llm_config.get('api_key') or (os.getenv('LLM_API_KEY') if use_env else None)
+    endpoint = llm_config.get('base_url') or llm_config.get('endpoint') or (os.getenv('LLM_ENDPOINT') if use_env else None)
+    model = llm_config.get('model') or (os.getenv('LLM_MODEL') if use_env else None)
+    if not (api_key and endpoint):
+        return None
+    return OpenAIHTTPBackend(
+        endpoint, api_key, model, timeout=llm_config.get('timeout'),
+        stream=bool(llm_config.get('stream', False)),
+        max_stream_tokens=llm_config.get('max_stream_tokens'),
+        prompt_cache_key=llm_config.get('prompt_cache_key')
+    )
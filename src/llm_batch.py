@@ -0,0 +1,261 @@
+"""
+LLM离线批处理模块
+仿真以时间片为单位运行：本轮所有缺少结果的LLM请求（阅读、发帖、标注）导出为
+OpenAI Batch格式的JSONL文件，拿到对应的结果文件后导入并重新执行该时间片。
+每个Agent在遇到第一条缺少结果的请求时暂停，因此同一时间片通常需要多轮
+（轮数约等于单个Agent的最长调用链），时间片的中间状态由检查点回滚。
+"""
+
+import glob
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from .llm_backends import mock_reply
+from .llm_cassette import cassette_key
+
+BATCH_ENDPOINT_URL = '/v1/chat/completions'
+RESULTS_SUFFIX = '.results.jsonl'
+CHECKPOINT_FILENAME = 'checkpoint.pkl'
+
+
+class BatchPendingError(Exception):
+    """请求已加入待导出批次，需要等待批处理结果"""
+
+
+def batch_custom_id(call_info: Optional[Dict[str, Any]], prompt: str) -> str:
+    """批处理请求ID：调用点前缀 + cassette同款记录键（结果可直接对应回调用）"""
+    call_site = (call_info or {}).get('call_site') or 'llm'
+    return f"{call_site}:{cassette_key(call_info, prompt)}"
+
+
+def parse_result_line(entry: Dict[str, Any]) -> Optional[str]:
+    """
+    从一行OpenAI Batch结果中取出回复内容
+
+    Returns:
+        Optional[str]: 回复内容；请求失败或格式无效时返回None
+    """
+    response = entry.get('response') or {}
+    if entry.get('error') or response.get('status_code', 200) != 200:
+        return None
+    try:
+        return response['body']['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+class LLMBatchJob:
+    """
+    单次仿真的离线批处理任务。
+
+    lookup()命中已导入的结果时直接返回，否则把请求记入待导出队列并返回None；
+    write_pending()把队列写成一个批次文件，ingest_results()导入批处理结果。
+    批次文件、结果文件和时间片检查点都保存在job_dir中，进程退出后可以续跑。
+    """
+
+    def __init__(self, job_dir: str):
+        """
+        Args:
+            job_dir: 批次文件、结果文件和检查点所在目录
+        """
+        self.job_dir = job_dir
+        os.makedirs(job_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._results: Dict[str, str] = {}
+        self._pending: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._ingested_files = set()
+        # 统计
+        self.hits = 0
+        self.batches_written = 0
+        self.requests_exported = 0
+        self.results_ingested = 0
+        self.failed_results = 0
+
+    def lookup(self, call_info: Optional[Dict[str, Any]], prompt: str, model: str) -> Optional[str]:
+        """
+        查找一次调用的批处理结果
+
+        Returns:
+            Optional[str]: 已导入的回复；尚无结果时返回None（请求已加入待导出队列）
+        """
+        custom_id = batch_custom_id(call_info, prompt)
+        with self._lock:
+            if custom_id in self._results:
+                self.hits += 1
+                return self._results[custom_id]
+            if custom_id not in self._pending:
+                self._pending[custom_id] = {
+                    'custom_id': custom_id,
+                    'method': 'POST',
+                    'url': BATCH_ENDPOINT_URL,
+                    'body': {'model': model, 'messages': [{'role': 'user', 'content': prompt}]},
+                }
+        return None
+
+    def has_pending(self) -> bool:
+        """本轮是否有等待结果的请求"""
+        with self._lock:
+            return bool(self._pending)
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def write_pending(self, time_slice_index: int) -> Optional[str]:
+        """
+        把待导出队列写成批次文件并清空队列
+
+        Returns:
+            Optional[str]: 批次文件路径；没有待导出请求时返回None
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            pattern = os.path.join(self.job_dir, f'slice_{time_slice_index:04d}_round_*.jsonl')
+            round_index = len([p for p in glob.glob(pattern) if not p.endswith(RESULTS_SUFFIX)])
+            path = os.path.join(self.job_dir, f'slice_{time_slice_index:04d}_round_{round_index:03d}.jsonl')
+            with open(path, 'w', encoding='utf-8') as f:
+                for request in self._pending.values():
+                    f.write(json.dumps(request, ensure_ascii=False) + '\n')
+            count = len(self._pending)
+            self._pending.clear()
+            self.batches_written += 1
+            self.requests_exported += count
+        print(f"[Batch] 时间片 {time_slice_index} 导出 {count} 条待处理LLM请求: {path}")
+        return path
+
+    @staticmethod
+    def results_path_for(batch_path: str) -> str:
+        """批次文件对应的默认结果文件路径"""
+        return batch_path[:-len('.jsonl')] + RESULTS_SUFFIX
+
+    def ingest_results(self, results_path: str) -> int:
+        """
+        导入一个OpenAI Batch格式的结果文件
+
+        Returns:
+            int: 成功导入的结果条数
+        """
+        count = 0
+        failed = 0
+        with open(results_path, 'r', encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        with self._lock:
+            for entry in entries:
+                content = parse_result_line(entry)
+                if content is None:
+                    failed += 1
+                    continue
+                self._results[entry['custom_id']] = content
+                count += 1
+            self._ingested_files.add(os.path.abspath(results_path))
+            self.results_ingested += count
+            self.failed_results += failed
+        print(f"[Batch] 导入结果 {count} 条（失败 {failed} 条，下一轮重新导出）: {results_path}")
+        return count
+
+    def ingest_all(self) -> int:
+        """导入job_dir中所有尚未导入的结果文件"""
+        total = 0
+        for path in sorted(glob.glob(os.path.join(self.job_dir, f'*{RESULTS_SUFFIX}'))):
+            if os.path.abspath(path) not in self._ingested_files:
+                total += self.ingest_results(path)
+        return total
+
+    def awaiting_batches(self) -> List[str]:
+        """已导出但还没有结果文件的批次"""
+        batches = [
+            p for p in sorted(glob.glob(os.path.join(self.job_dir, '*.jsonl')))
+            if not p.endswith(RESULTS_SUFFIX)
+        ]
+        return [p for p in batches if not os.path.exists(self.results_path_for(p))]
+
+    def save_checkpoint(self, state: Dict[str, Any]):
+        """保存时间片开始时的仿真状态，供下次进程续跑"""
+        path = os.path.join(self.job_dir, CHECKPOINT_FILENAME)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """读取检查点，没有时返回None"""
+        path = os.path.join(self.job_dir, CHECKPOINT_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def clear_checkpoint(self):
+        """仿真全部完成后删除检查点"""
+        path = os.path.join(self.job_dir, CHECKPOINT_FILENAME)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回批处理统计"""
+        with self._lock:
+            return {
+                'job_dir': self.job_dir,
+                'hits': self.hits,
+                'pending': len(self._pending),
+                'batches_written': self.batches_written,
+                'requests_exported': self.requests_exported,
+                'results_ingested': self.results_ingested,
+                'failed_results': self.failed_results,
+            }
+
+
+class LocalBatchProcessor:
+    """
+    本地批处理替身：读取批次文件，逐条生成回复并写出OpenAI Batch格式的结果文件。
+    用于测试离线流水线，也可以传入responder转发到真实接口。
+    """
+
+    def __init__(self, responder: Optional[Callable[[str, str], str]] = None):
+        """
+        Args:
+            responder: (call_site, prompt) -> 回复内容，默认使用确定性的mock_reply
+        """
+        self.responder = responder or (lambda call_site, prompt: mock_reply(prompt, call_site))
+
+    def process(self, batch_path: str, results_path: Optional[str] = None) -> str:
+        """
+        处理一个批次文件
+
+        Returns:
+            str: 结果文件路径
+        """
+        results_path = results_path or LLMBatchJob.results_path_for(batch_path)
+        with open(batch_path, 'r', encoding='utf-8') as src, \
+                open(results_path, 'w', encoding='utf-8') as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                call_site = request['custom_id'].split(':', 1)[0]
+                prompt = request['body']['messages'][-1]['content']
+                try:
+                    content = self.responder(call_site, prompt)
+                    result = {
+                        'custom_id': request['custom_id'],
+                        'response': {
+                            'status_code': 200,
+                            'body': {'choices': [{'message': {'role': 'assistant', 'content': content}}]},
+                        },
+                        'error': None,
+                    }
+                except Exception as e:
+                    result = {
+                        'custom_id': request['custom_id'],
+                        'response': None,
+                        'error': {'message': str(e)},
+                    }
+                dst.write(json.dumps(result, ensure_ascii=False) + '\n')
+        print(f"[Batch] 本地批处理完成: {results_path}")
+        return results_path
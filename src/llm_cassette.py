@@ -0,0 +1,153 @@
+"""
+LLM调用录制/回放模块（cassette）
+record模式把每次调用的 (调用点, Agent, 时间片, 帖子, prompt) → 回复 写入仿真目录下的压缩文件；
+replay模式从文件直接返回回复，不访问网络，配合录制时保存的随机种子可以复现完全相同的Agent轨迹。
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional
+
+CASSETTE_VERSION = 1
+
+MODE_RECORD = 'record'
+MODE_REPLAY = 'replay'
+CASSETTE_MODES = (MODE_RECORD, MODE_REPLAY)
+
+
+class CassetteMissError(Exception):
+    """严格回放模式下cassette中找不到对应的调用记录"""
+
+
+def cassette_key(call_info: Optional[Dict[str, Any]], prompt: str) -> str:
+    """由调用上下文和prompt生成记录键（prompt只保存摘要，保持文件紧凑）"""
+    call_info = call_info or {}
+    raw = json.dumps([
+        call_info.get('call_site'),
+        call_info.get('agent_id'),
+        call_info.get('time_slice'),
+        call_info.get('post_id'),
+        hashlib.sha1(prompt.encode('utf-8')).hexdigest(),
+    ], ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class LLMCassette:
+    """
+    单次仿真的LLM调用记录。
+
+    文件为gzip压缩的JSON Lines：首行是头部（版本、随机种子等），之后每行一条调用记录。
+    同一键出现多次时按录制顺序依次回放。
+    """
+
+    def __init__(self, path: str, mode: str, strict: bool = False, header: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            path: cassette文件路径
+            mode: 'record' 或 'replay'
+            strict: 回放时找不到记录是否抛出CassetteMissError（否则回退到真实调用）
+            header: 录制时写入头部的附加信息（如random_seed）
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"未知的cassette模式: {mode}，支持: {list(CASSETTE_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._entries = defaultdict(deque)
+        self._file = None
+        self.header: Dict[str, Any] = {}
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        if mode == MODE_REPLAY:
+            self._load()
+        else:
+            self.header = {'version': CASSETTE_VERSION, **(header or {})}
+            self._file = gzip.open(path, 'wt', encoding='utf-8')
+            self._file.write(json.dumps(self.header, ensure_ascii=False) + '\n')
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == MODE_RECORD
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            first = f.readline()
+            if not first:
+                raise ValueError(f"cassette文件为空: {self.path}")
+            self.header = json.loads(first)
+            if self.header.get('version') != CASSETTE_VERSION:
+                raise ValueError(f"不支持的cassette版本: {self.header.get('version')}")
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry['k']].append(entry['r'])
+        print(f"[Cassette] 已加载 {sum(len(v) for v in self._entries.values())} 条LLM调用记录: {self.path}")
+
+    def lookup(self, call_info: Optional[Dict[str, Any]], prompt: str) -> Optional[str]:
+        """
+        回放一次调用
+
+        Returns:
+            Optional[str]: 录制的回复；找不到且非严格模式时返回None
+
+        Raises:
+            CassetteMissError: 严格模式下找不到记录
+        """
+        key = cassette_key(call_info, prompt)
+        with self._lock:
+            queue = self._entries.get(key)
+            if queue:
+                self.hits += 1
+                return queue.popleft()
+            self.misses += 1
+        if self.strict:
+            raise CassetteMissError(f"cassette中没有对应的LLM调用记录: {call_info}")
+        return None
+
+    def record(self, call_info: Optional[Dict[str, Any]], prompt: str, response: str):
+        """录制一次调用的回复"""
+        call_info = call_info or {}
+        entry = {
+            'k': cassette_key(call_info, prompt),
+            's': call_info.get('call_site'),
+            'a': call_info.get('agent_id'),
+            't': call_info.get('time_slice'),
+            'p': call_info.get('post_id'),
+            'r': response,
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self.recorded += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回录制/回放统计"""
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'strict': self.strict,
+                'path': self.path,
+                'hits': self.hits,
+                'misses': self.misses,
+                'recorded': self.recorded,
+            }
+
+    def close(self):
+        """关闭录制文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,319 @@
+"""
+LLM客户端模块
+所有LLM调用的统一入口：通过注入的LLMBackend（HTTP/本地模型/Mock）完成调用，
+提供同步、异步和批量接口，并对相同(后端, prompt)的并发请求做single-flight合并：
+同一时刻只向上游发出一次请求，所有等待者共享同一结果。
+上游调用经过LLMScheduler排队限流，429/503按Retry-After退避重试。
+传入on_delta且后端开启流式输出时，增量文本在生成过程中逐段回调。
+实际发往上游的prompt按调用点统计公共前缀，衡量上游前缀缓存的可复用程度。
+挂载离线批处理任务的仿真不访问网络，调用结果来自导入的批处理结果文件。
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import requests
+
+from .llm_backends import DeltaCallback, LLMBackend, OpenAIHTTPBackend
+from .llm_batch import BatchPendingError
+from .prompt_layout import PrefixReuseTracker
+from .llm_scheduler import LLMScheduler, get_llm_scheduler, estimate_tokens, DEFAULT_COMPLETION_TOKENS
+
+# 需要排队重试而不是直接失败的HTTP状态码
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+class _InFlightCall:
+    """一次进行中的上游调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    并发请求合并器。
+
+    do(key, fn) 在没有相同key的进行中调用时执行fn；否则阻塞等待进行中的调用并返回其结果
+    （异常同样会传递给所有等待者）。调用结束后key即被移除，不做结果缓存。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _InFlightCall] = {}
+        # 统计
+        self.total_calls = 0
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.total_calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced_calls += 1
+                leader = False
+            else:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self.upstream_calls += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def get_stats(self) -> Dict[str, int]:
+        """返回合并统计"""
+        with self._lock:
+            return {
+                'total_calls': self.total_calls,
+                'upstream_calls': self.upstream_calls,
+                'coalesced_calls': self.coalesced_calls,
+                'in_flight': len(self._calls),
+            }
+
+
+class LLMClient:
+    """LLM客户端（线程安全，可在多个Agent和服务间共享）"""
+
+    def __init__(self, timeout: Optional[float] = None, scheduler: Optional[LLMScheduler] = None,
+                 max_retries: int = 5):
+        """
+        Args:
+            timeout: 默认请求超时（秒），None表示不限
+            scheduler: 限流调度器，默认使用进程级共享调度器
+            max_retries: 429/503的最大重试次数
+        """
+        self.timeout = timeout
+        self.scheduler = scheduler or get_llm_scheduler()
+        self.max_retries = max_retries
+        self.single_flight = SingleFlight()
+        self.prefix_reuse = PrefixReuseTracker()
+        # simulation_id -> LLMCassette
+        self._cassettes: Dict[Any, Any] = {}
+        # simulation_id -> LLMBatchJob
+        self._batch_jobs: Dict[Any, Any] = {}
+        # (endpoint, api_key, model) -> OpenAIHTTPBackend，供chat()兼容接口复用连接
+        self._http_backends: Dict[Tuple[str, str, str], OpenAIHTTPBackend] = {}
+        self._backends_lock = threading.Lock()
+
+    def attach_cassette(self, simulation_id, cassette):
+        """为仿真挂载录制/回放cassette"""
+        self._cassettes[simulation_id] = cassette
+
+    def detach_cassette(self, simulation_id):
+        """卸载仿真的cassette并返回它"""
+        return self._cassettes.pop(simulation_id, None)
+
+    def is_replaying(self, simulation_id) -> bool:
+        """该仿真是否处于cassette回放模式（回放时无需API配置）"""
+        cassette = self._cassettes.get(simulation_id)
+        return cassette is not None and cassette.replaying
+
+    def attach_batch_job(self, simulation_id, batch_job):
+        """为仿真挂载离线批处理任务（该仿真的调用不再访问网络）"""
+        self._batch_jobs[simulation_id] = batch_job
+
+    def detach_batch_job(self, simulation_id):
+        """卸载仿真的离线批处理任务并返回它"""
+        return self._batch_jobs.pop(simulation_id, None)
+
+    def serves_offline(self, simulation_id) -> bool:
+        """该仿真的调用是否由cassette回放或离线批处理提供（此时无需API配置）"""
+        return self.is_replaying(simulation_id) or simulation_id in self._batch_jobs
+
+    def _offline_reply(self, simulation_id, backend, prompt: str,
+                       call_info: Optional[Dict[str, Any]]) -> Optional[str]:
+        """批处理任务或回放cassette能提供回复时直接返回，否则返回None"""
+        batch_job = self._batch_jobs.get(simulation_id)
+        if batch_job is not None:
+            content = batch_job.lookup(call_info, prompt, backend.model if backend else None)
+            if content is None:
+                raise BatchPendingError(f"等待批处理结果: {(call_info or {}).get('call_site')} {(call_info or {}).get('agent_id')}")
+            return content
+
+        cassette = self._cassettes.get(simulation_id)
+        if cassette is not None and cassette.replaying:
+            return cassette.lookup(call_info, prompt)
+        return None
+
+    def complete(self, backend: Optional[LLMBackend], prompt: str, timeout: Optional[float] = None,
+                 simulation_id=None, call_info: Optional[Dict[str, Any]] = None,
+                 on_delta: Optional[DeltaCallback] = None) -> str:
+        """
+        通过指定后端完成一次单轮对话
+
+        Args:
+            backend: LLM后端（回放或离线批处理模式下可以为None）
+            prompt: 用户消息
+            timeout: 本次请求超时（秒），默认使用客户端超时
+            simulation_id: 计费和优先级所属的仿真ID
+            call_info: 调用上下文 {'call_site', 'agent_id', 'time_slice', 'post_id'}，用于cassette录制/回放
+            on_delta: 流式增量回调（仅在后端开启流式输出且实际调用上游时触发；合并等待者和离线回复不回调）
+
+        Returns:
+            str: 回复内容
+
+        Raises:
+            LLMBudgetExceededError: 仿真token预算已用尽
+            CassetteMissError: 严格回放模式下找不到记录
+            BatchPendingError: 离线批处理模式下尚无结果（请求已加入待导出批次）
+            ValueError: 没有可用的后端
+            requests.RequestException: HTTP后端请求失败（可重试错误超过重试次数）
+        """
+        content = self._offline_reply(simulation_id, backend, prompt, call_info)
+        if content is not None:
+            return content
+        if backend is None:
+            raise ValueError("未配置LLM后端")
+
+        key = (backend.cache_key(), prompt)
+        content = self.single_flight.do(
+            key, lambda: self._scheduled_complete(backend, prompt, timeout, simulation_id, call_info, on_delta)
+        )
+        self._record(simulation_id, call_info, prompt, content)
+        return content
+
+    async def acomplete(self, backend: Optional[LLMBackend], prompt: str, timeout: Optional[float] = None,
+                        simulation_id=None, call_info: Optional[Dict[str, Any]] = None) -> str:
+        """complete()的异步版本（在线程池中执行，合并和限流与同步调用共享）"""
+        return await asyncio.to_thread(self.complete, backend, prompt, timeout, simulation_id, call_info)
+
+    def complete_batch(self, backend: Optional[LLMBackend], prompts: List[str], timeout: Optional[float] = None,
+                       simulation_id=None, call_infos: Optional[List[Optional[Dict[str, Any]]]] = None,
+                       max_workers: int = 8) -> List[str]:
+        """
+        批量完成多条prompt，按输入顺序返回
+
+        支持原生批量推理的后端一次性提交（按总预估token排队一次）；
+        其他后端或回放/批处理模式下逐条并发调用complete()。
+        """
+        call_infos = call_infos or [None] * len(prompts)
+        if not prompts:
+            return []
+        if backend is not None and backend.supports_native_batch and not self.serves_offline(simulation_id):
+            estimated = sum(estimate_tokens(p) + DEFAULT_COMPLETION_TOKENS for p in prompts)
+            for prompt, info in zip(prompts, call_infos):
+                self.prefix_reuse.observe((info or {}).get('call_site') or 'llm', prompt)
+            self.scheduler.acquire(simulation_id, estimated)
+            try:
+                completions = backend.complete_batch(prompts, timeout if timeout is not None else self.timeout, call_infos)
+            except Exception:
+                self.scheduler.release(simulation_id, estimated)
+                raise
+            usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+            for _, item_usage in completions:
+                for field in usage:
+                    usage[field] += int((item_usage or {}).get(field, 0) or 0)
+            self.scheduler.record_result(simulation_id, estimated, usage if usage['total_tokens'] else None)
+            for prompt, info, (content, _) in zip(prompts, call_infos, completions):
+                self._record(simulation_id, info, prompt, content)
+            return [content for content, _ in completions]
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts)))) as executor:
+            futures = [
+                executor.submit(self.complete, backend, prompt, timeout, simulation_id, info)
+                for prompt, info in zip(prompts, call_infos)
+            ]
+            return [future.result() for future in futures]
+
+    def chat(self, endpoint: str, api_key: str, model: str, prompt: str,
+             timeout: Optional[float] = None, simulation_id=None,
+             call_info: Optional[Dict[str, Any]] = None) -> str:
+        """按endpoint/api_key/model调用OpenAI兼容HTTP后端（后端实例按参数复用）"""
+        return self.complete(self.http_backend(endpoint, api_key, model), prompt, timeout, simulation_id, call_info)
+
+    def http_backend(self, endpoint: str, api_key: str, model: str) -> OpenAIHTTPBackend:
+        """获取（或创建）对应参数的OpenAI兼容HTTP后端"""
+        key = (endpoint, api_key, model)
+        with self._backends_lock:
+            backend = self._http_backends.get(key)
+            if backend is None:
+                backend = OpenAIHTTPBackend(endpoint, api_key, model, timeout=self.timeout)
+                self._http_backends[key] = backend
+            return backend
+
+    def _record(self, simulation_id, call_info, prompt: str, content: str):
+        cassette = self._cassettes.get(simulation_id)
+        if cassette is not None and cassette.recording:
+            cassette.record(call_info, prompt, content)
+
+    def _scheduled_complete(self, backend: LLMBackend, prompt: str, timeout: Optional[float],
+                            simulation_id, call_info: Optional[Dict[str, Any]] = None,
+                            on_delta: Optional[DeltaCallback] = None) -> str:
+        """经调度器排队后调用后端，限流错误时退避重试"""
+        estimated = estimate_tokens(prompt) + DEFAULT_COMPLETION_TOKENS
+        timeout = timeout if timeout is not None else self.timeout
+        self.prefix_reuse.observe((call_info or {}).get('call_site') or 'llm', prompt)
+        attempt = 0
+        while True:
+            self.scheduler.acquire(simulation_id, estimated)
+            try:
+                if on_delta is not None and backend.supports_streaming:
+                    content, usage = backend.complete_stream(prompt, on_delta, timeout, call_info)
+                else:
+                    content, usage = backend.complete(prompt, timeout, call_info)
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    self.scheduler.release(simulation_id, estimated)
+                    raise
+                retry_after = self._retry_after(e.response, attempt)
+                print(f"[LLM] 上游限流({status})，{retry_after:.1f}秒后重试 (第{attempt + 1}次)")
+                self.scheduler.record_retry(simulation_id, estimated)
+                self.scheduler.penalize(retry_after)
+                attempt += 1
+                continue
+            except Exception:
+                # 超时、连接错误、响应解析失败等：失败的调用不占用预算
+                self.scheduler.release(simulation_id, estimated)
+                raise
+            self.scheduler.record_result(simulation_id, estimated, usage)
+            return content
+
+    @staticmethod
+    def _retry_after(response, attempt: int) -> float:
+        """优先使用Retry-After响应头，否则指数退避（上限30秒）"""
+        try:
+            return max(0.0, float(response.headers.get('Retry-After')))
+        except (TypeError, ValueError):
+            return min(2.0 ** attempt, 30.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回客户端调用统计（合并统计和各调用点的前缀复用统计）"""
+        return {**self.single_flight.get_stats(), 'prefix_reuse': self.prefix_reuse.get_stats()}
+
+
+_default_client: Optional[LLMClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """获取进程内共享的LLM客户端（single-flight合并需要所有调用方共用同一实例）"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = LLMClient()
+        return _default_client
@@ -0,0 +1,194 @@
+"""
+LLM调用门控模块
+阅读帖子时按(Agent, 帖子)决定是否值得调用LLM：信息强度过低、帖子与Agent当前状态足够接近、
+仿真token预算即将用尽时跳过LLM，直接使用帖子标注的emotion_score/stance_score
+（配置了本地预测器且预测可信时使用预测值）。
+影子采样按比例对本应跳过的调用照常请求LLM，统计跳过时的建议值与LLM建议值的偏差。
+"""
+
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from .llm_scheduler import get_llm_scheduler
+from .post import source_post_id
+
+# 与Agent._update_stance中THRESHOLD_PROCESS一致：低于该信息强度时立场只做随机扰动
+DEFAULT_MIN_INFORMATION_STRENGTH = 0.3
+
+SKIP_LOW_INFORMATION = 'low_information'
+SKIP_ALIGNED = 'aligned'
+SKIP_BUDGET = 'budget'
+SKIP_PREDICTED = 'predicted'
+
+
+class GateDecision:
+    """一次门控决策"""
+
+    __slots__ = ('use_llm', 'reason', 'emotion_suggested', 'stance_suggested', 'shadow')
+
+    def __init__(self, use_llm: bool, reason: Optional[str] = None,
+                 emotion_suggested: float = 0.0, stance_suggested: float = 0.0, shadow: bool = False):
+        self.use_llm = use_llm
+        self.reason = reason
+        # 跳过LLM时使用的建议值
+        self.emotion_suggested = emotion_suggested
+        self.stance_suggested = stance_suggested
+        # 影子采样：本应跳过但仍调用LLM，用于统计偏差
+        self.shadow = shadow
+
+
+def _sample(agent_id, post_id, rate: float) -> bool:
+    """按(Agent, 帖子)确定性采样，不消耗全局随机序列（保证开启影子采样不改变Agent轨迹）"""
+    if rate <= 0:
+        return False
+    digest = hashlib.sha1(f"{agent_id}:{post_id}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') / 2 ** 32 < rate
+
+
+class LLMGate:
+    """阅读阶段的LLM调用门控（线程安全）"""
+
+    def __init__(self, min_information_strength: Optional[float] = DEFAULT_MIN_INFORMATION_STRENGTH,
+                 min_stance_distance: Optional[float] = None, min_emotion_distance: Optional[float] = None,
+                 budget_reserve_ratio: float = 0.1, budget_min_information_strength: float = 0.7,
+                 predictor=None, shadow_rate: float = 0.0):
+        """
+        Args:
+            min_information_strength: 信息强度低于该值时跳过LLM（None表示不启用）
+            min_stance_distance: 帖子立场与Agent当前立场的距离低于该值时视为一致
+            min_emotion_distance: 帖子情绪与Agent当前情绪的距离低于该值时视为一致
+                （两个距离都配置且都低于阈值时跳过LLM）
+            budget_reserve_ratio: 剩余token预算低于该比例时进入节省模式
+            budget_min_information_strength: 节省模式下只为信息强度不低于该值的帖子调用LLM
+            predictor: 可选的本地预测器，predict(agent, post)返回(情绪, 立场)或None（不可信）
+            shadow_rate: 影子采样比例（0~1）
+        """
+        self.min_information_strength = min_information_strength
+        self.min_stance_distance = min_stance_distance
+        self.min_emotion_distance = min_emotion_distance
+        self.budget_reserve_ratio = budget_reserve_ratio
+        self.budget_min_information_strength = budget_min_information_strength
+        self.predictor = predictor
+        self.shadow_rate = shadow_rate
+        self._lock = threading.Lock()
+        # 统计
+        self.decisions = 0
+        self.llm_calls = 0
+        self.skipped: Dict[str, int] = {}
+        self.shadow_samples = 0
+        self._shadow_emotion_error = 0.0
+        self._shadow_stance_error = 0.0
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]], predictor=None) -> Optional['LLMGate']:
+        """从仿真配置创建，未配置或enabled为False时返回None"""
+        if not config or not config.get('enabled', True):
+            return None
+        return cls(
+            min_information_strength=config.get('min_information_strength', DEFAULT_MIN_INFORMATION_STRENGTH),
+            min_stance_distance=config.get('min_stance_distance'),
+            min_emotion_distance=config.get('min_emotion_distance'),
+            budget_reserve_ratio=config.get('budget_reserve_ratio', 0.1),
+            budget_min_information_strength=config.get('budget_min_information_strength', 0.7),
+            predictor=predictor,
+            shadow_rate=config.get('shadow_rate', 0.0),
+        )
+
+    def begin_slice(self, posts: List[Dict[str, Any]]):
+        """时间片开始时通知预测器（预测器可在此预计算本时间片帖子的特征）"""
+        begin_slice = getattr(self.predictor, 'begin_slice', None)
+        if begin_slice is not None:
+            begin_slice(posts)
+
+    def _skip_reason(self, agent, post) -> Optional[str]:
+        information_strength = float(post.get('information_strength', 1.0) or 0.0)
+        if self.min_information_strength is not None and information_strength < self.min_information_strength:
+            return SKIP_LOW_INFORMATION
+
+        if self.min_stance_distance is not None and self.min_emotion_distance is not None:
+            stance_distance = abs(float(post.get('stance_score', 0.0) or 0.0) - agent.current_stance)
+            emotion_distance = abs(float(post.get('emotion_score', post.get('emotion', 0.0)) or 0.0) - agent.current_emotion)
+            if stance_distance < self.min_stance_distance and emotion_distance < self.min_emotion_distance:
+                return SKIP_ALIGNED
+
+        if information_strength < self.budget_min_information_strength:
+            usage = get_llm_scheduler().get_usage(agent.simulation_id)
+            budget = usage.get('token_budget')
+            if budget and budget - usage.get('budget_used', 0) < budget * self.budget_reserve_ratio:
+                return SKIP_BUDGET
+        return None
+
+    def decide(self, agent, post, llm_available: bool = True) -> GateDecision:
+        """
+        决定本次阅读是否调用LLM
+
+        Args:
+            llm_available: LLM是否可用（不可用时只使用预测器，不做影子采样）
+        """
+        reason = self._skip_reason(agent, post)
+        emotion = float(post.get('emotion_score', post.get('emotion', 0.0)) or 0.0)
+        stance = float(post.get('stance_score', 0.0) or 0.0)
+        if reason is None and self.predictor is not None:
+            predicted = self.predictor.predict(agent, post)
+            if predicted is not None:
+                reason = SKIP_PREDICTED
+                emotion, stance = predicted
+
+        if reason is None:
+            decision = GateDecision(True)
+        else:
+            shadow = llm_available and _sample(agent.agent_id, source_post_id(post), self.shadow_rate)
+            decision = GateDecision(shadow, reason, emotion, stance, shadow=shadow)
+
+        with self._lock:
+            self.decisions += 1
+            if not decision.use_llm:
+                self.skipped[reason] = self.skipped.get(reason, 0) + 1
+            elif llm_available:
+                self.llm_calls += 1
+        return decision
+
+    def record_shadow(self, decision: GateDecision, emotion_suggested: float, stance_suggested: float):
+        """记录影子采样中LLM建议值与跳过时建议值的偏差"""
+        with self._lock:
+            self.shadow_samples += 1
+            self._shadow_emotion_error += abs(emotion_suggested - decision.emotion_suggested)
+            self._shadow_stance_error += abs(stance_suggested - decision.stance_suggested)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回门控统计：节省的调用数和影子采样的平均绝对偏差"""
+        with self._lock:
+            saved = sum(self.skipped.values())
+            return {
+                'decisions': self.decisions,
+                'llm_calls': self.llm_calls,
+                'calls_saved': saved,
+                'saved_ratio': saved / self.decisions if self.decisions else 0.0,
+                'skipped': dict(self.skipped),
+                'shadow_samples': self.shadow_samples,
+                'shadow_emotion_mae': self._shadow_emotion_error / self.shadow_samples if self.shadow_samples else None,
+                'shadow_stance_mae': self._shadow_stance_error / self.shadow_samples if self.shadow_samples else None,
+            }
+
+
+def trajectory_deviation(states: List[Dict[str, Any]], reference_states: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    比较两次仿真的最终Agent状态（如门控运行与全量LLM运行的completion_metadata["final_agent_states"]）
+
+    Returns:
+        Dict: 共同Agent数，情绪/立场/置信度的平均绝对偏差和最大偏差
+    """
+    reference = {state['id']: state for state in reference_states}
+    errors = {'emotion': [], 'stance': [], 'confidence': []}
+    for state in states:
+        ref = reference.get(state['id'])
+        if ref is None:
+            continue
+        for field in errors:
+            errors[field].append(abs(state.get(f'final_{field}', 0.0) - ref.get(f'final_{field}', 0.0)))
+    report: Dict[str, Any] = {'agents': len(errors['emotion'])}
+    for field, values in errors.items():
+        report[f'{field}_mae'] = sum(values) / len(values) if values else None
+        report[f'{field}_max'] = max(values) if values else None
+    return report
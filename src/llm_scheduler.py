@@ -0,0 +1,266 @@
+"""
+LLM调用调度模块
+进程级令牌桶限流（请求数/秒、token数/分钟）、按仿真的token预算、交互式/批量优先级，
+限流时排队等待而不是直接失败，并按仿真统计预估与实际token用量。
+"""
+
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# 优先级：数值越小越先获得调用配额
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BATCH = 'batch'
+PRIORITY_ORDER = {PRIORITY_INTERACTIVE: 0, PRIORITY_BATCH: 1}
+
+# 预估回复长度（token），用于请求前的配额预留
+DEFAULT_COMPLETION_TOKENS = 256
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    近似估算文本token数：中日韩字符按1个token计，其余字符按4个字符1个token计
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def cached_prompt_tokens(api_usage: Dict[str, Any]) -> int:
+    """
+    从usage中取出命中上游前缀缓存的prompt token数
+    （OpenAI: prompt_tokens_details.cached_tokens；DeepSeek: prompt_cache_hit_tokens）
+    """
+    details = api_usage.get('prompt_tokens_details') or {}
+    return int(details.get('cached_tokens') or api_usage.get('prompt_cache_hit_tokens') or 0)
+
+
+class LLMBudgetExceededError(Exception):
+    """仿真的token预算已用尽"""
+
+
+class TokenBucket:
+    """令牌桶（非线程安全，由LLMScheduler加锁调用）"""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发量）
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, amount: float) -> float:
+        """返回获得amount个令牌还需等待的秒数（0表示可立即获得）"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        """扣除令牌（允许透支为负数，透支部分由后续补充偿还）"""
+        self._refill()
+        self.tokens -= amount
+
+
+class LLMScheduler:
+    """
+    进程级LLM调用调度器。
+
+    acquire()按优先级排队，只有队首请求可以扣除令牌；令牌不足时等待补充，
+    收到429后penalize()会让所有请求暂停到Retry-After之后。
+    """
+
+    def __init__(self, requests_per_second: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        """
+        Args:
+            requests_per_second: 每秒请求数上限，None或0表示不限
+            tokens_per_minute: 每分钟token数上限，None或0表示不限
+        """
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._blocked_until = 0.0
+        self._simulations: Dict[Any, Dict[str, Any]] = {}
+        self.configure(requests_per_second, tokens_per_minute)
+
+    def configure(self, requests_per_second: Optional[float] = None,
+                  tokens_per_minute: Optional[float] = None):
+        """重新设置限流参数"""
+        with self._cond:
+            self.requests_per_second = requests_per_second or None
+            self.tokens_per_minute = tokens_per_minute or None
+            self._request_bucket = (
+                TokenBucket(requests_per_second, max(1.0, requests_per_second))
+                if requests_per_second else None
+            )
+            self._token_bucket = (
+                TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+                if tokens_per_minute else None
+            )
+            self._cond.notify_all()
+
+    def register_simulation(self, simulation_id, priority: str = PRIORITY_INTERACTIVE,
+                            token_budget: Optional[int] = None):
+        """
+        登记仿真的优先级和token预算
+
+        Args:
+            simulation_id: 仿真ID
+            priority: 'interactive'（前端交互）或 'batch'（批量/参数扫描）
+            token_budget: 该仿真允许消耗的总token数，None表示不限
+        """
+        if priority not in PRIORITY_ORDER:
+            raise ValueError(f"未知的LLM调用优先级: {priority}，支持: {list(PRIORITY_ORDER)}")
+        with self._cond:
+            usage = self._usage(simulation_id)
+            usage['priority'] = priority
+            usage['token_budget'] = token_budget
+
+    def _usage(self, simulation_id) -> Dict[str, Any]:
+        if simulation_id not in self._simulations:
+            self._simulations[simulation_id] = {
+                'priority': PRIORITY_INTERACTIVE,
+                'token_budget': None,
+                'requests': 0,
+                'estimated_tokens': 0,
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'total_tokens': 0,
+                'cached_prompt_tokens': 0,
+                'budget_used': 0,
+                'retries': 0,
+                'queued_seconds': 0.0,
+            }
+        return self._simulations[simulation_id]
+
+    def _reserve_wait(self, estimated_tokens: int) -> float:
+        """尝试为队首请求扣除配额，返回还需等待的秒数"""
+        wait = self._blocked_until - time.monotonic()
+        if self._request_bucket is not None:
+            wait = max(wait, self._request_bucket.wait_time(1))
+        if self._token_bucket is not None:
+            wait = max(wait, self._token_bucket.wait_time(estimated_tokens))
+        if wait > 0:
+            return wait
+        if self._request_bucket is not None:
+            self._request_bucket.consume(1)
+        if self._token_bucket is not None:
+            self._token_bucket.consume(estimated_tokens)
+        return 0.0
+
+    def acquire(self, simulation_id, estimated_tokens: int):
+        """
+        阻塞直到获得一次调用配额
+
+        Raises:
+            LLMBudgetExceededError: 该仿真的预算不足以支付本次预估用量
+        """
+        with self._cond:
+            usage = self._usage(simulation_id)
+            budget = usage['token_budget']
+            if budget is not None and usage['budget_used'] + estimated_tokens > budget:
+                raise LLMBudgetExceededError(
+                    f"仿真 {simulation_id} token预算不足: 已用 {usage['budget_used']}，"
+                    f"本次预估 {estimated_tokens}，预算 {budget}"
+                )
+            # 预留预算，实际用量在record_result中校正
+            usage['budget_used'] += estimated_tokens
+
+            ticket = (PRIORITY_ORDER[usage['priority']], next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            start = time.monotonic()
+            while True:
+                if self._waiting[0] == ticket:
+                    wait = self._reserve_wait(estimated_tokens)
+                    if wait <= 0:
+                        heapq.heappop(self._waiting)
+                        self._cond.notify_all()
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            usage['queued_seconds'] += time.monotonic() - start
+            usage['requests'] += 1
+            usage['estimated_tokens'] += estimated_tokens
+
+    def release(self, simulation_id, estimated_tokens: int):
+        """调用失败（异常、超时、不可重试的错误）：退还acquire预留的预算"""
+        with self._cond:
+            self._usage(simulation_id)['budget_used'] -= estimated_tokens
+
+    def record_retry(self, simulation_id, estimated_tokens: int):
+        """请求被上游限流拒绝：退还预留的预算并计入重试次数"""
+        with self._cond:
+            usage = self._usage(simulation_id)
+            usage['budget_used'] -= estimated_tokens
+            usage['retries'] += 1
+
+    def record_result(self, simulation_id, estimated_tokens: int, api_usage: Optional[Dict[str, Any]]):
+        """
+        记录一次调用的实际token用量（来自响应中的usage字段），并用差额校正令牌桶和预算
+        """
+        with self._cond:
+            usage = self._usage(simulation_id)
+            if not api_usage:
+                return
+            prompt_tokens = int(api_usage.get('prompt_tokens', 0) or 0)
+            completion_tokens = int(api_usage.get('completion_tokens', 0) or 0)
+            total_tokens = int(api_usage.get('total_tokens', prompt_tokens + completion_tokens) or 0)
+            usage['prompt_tokens'] += prompt_tokens
+            usage['completion_tokens'] += completion_tokens
+            usage['total_tokens'] += total_tokens
+            usage['cached_prompt_tokens'] += cached_prompt_tokens(api_usage)
+            delta = total_tokens - estimated_tokens
+            usage['budget_used'] += delta
+            if self._token_bucket is not None and delta:
+                self._token_bucket.consume(delta)
+
+    def penalize(self, retry_after: float):
+        """上游返回限流错误后，让所有排队请求至少等待retry_after秒"""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+
+    def get_usage(self, simulation_id) -> Dict[str, Any]:
+        """获取单个仿真的调用统计"""
+        with self._cond:
+            return dict(self._usage(simulation_id))
+
+    def get_all_usage(self) -> Dict[Any, Dict[str, Any]]:
+        """获取所有仿真的调用统计"""
+        with self._cond:
+            return {sim_id: dict(usage) for sim_id, usage in self._simulations.items()}
+
+
+_default_scheduler: Optional[LLMScheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """获取进程内共享的调度器，初始限流参数读取环境变量LLM_MAX_RPS / LLM_MAX_TPM"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = LLMScheduler(
+                requests_per_second=float(os.getenv('LLM_MAX_RPS', '0') or 0),
+                tokens_per_minute=float(os.getenv('LLM_MAX_TPM', '0') or 0),
+            )
+        return _default_scheduler
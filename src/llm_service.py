@@ -1,10 +1,16 @@
 """
 LLM服务模块
 支持ModelScope SDK和Mock模式
+本地模型按批生成：左填充批量分词、每批一次generate、只解码新生成的token；
+MicroBatcher把几毫秒内的并发请求合并成一批，吞吐量以prompts/秒统计。
 """
 
 import os
-from typing import Optional, Dict, Any
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Callable, List, Tuple
 import logging
 
 # 配置日志
@@ -18,7 +24,9 @@ class LLMService:
     def __init__(self, 
                  model_name: str = "qwen/Qwen2.5-0.5B-Instruct",
                  use_mock: bool = True,
-                 api_key: Optional[str] = None):
+                 api_key: Optional[str] = None,
+                 max_batch_size: int = 8,
+                 max_wait_ms: float = 5.0):
         """
         初始化LLM服务
         
@@ -26,15 +34,29 @@ class LLMService:
             model_name: ModelScope模型名称
             use_mock: 是否使用Mock模式
             api_key: API密钥（如果需要）
+            max_batch_size: 微批队列每批最多合并的请求数
+            max_wait_ms: 微批队列收集并发请求的最长等待时间（毫秒）
         """
         self.model_name = model_name
         self.use_mock = use_mock
         self.api_key = api_key
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
         
         # ModelScope相关
         self.model = None
         self.tokenizer = None
         
+        # 微批队列（首次submit时创建）
+        self._batcher: Optional['MicroBatcher'] = None
+        self._batcher_lock = threading.Lock()
+        
+        # 吞吐统计
+        self._stats_lock = threading.Lock()
+        self.batches_generated = 0
+        self.prompts_generated = 0
+        self.generate_seconds = 0.0
+        
         if not use_mock:
             self._initialize_modelscope()
         else:
@@ -54,12 +76,27 @@ class LLMService:
                 trust_remote_code=True
             )
             
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=torch.float16,
-                device_map="auto",
-                trust_remote_code=True
-            )
+            # 批量生成时按左侧填充，新token才能对齐在序列末尾
+            self.tokenizer.padding_side = "left"
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            
+            # CPU上float16算子慢且部分不支持，只在有GPU时使用半精度
+            if torch.cuda.is_available():
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    self.model_name,
+                    torch_dtype=torch.float16,
+                    device_map="auto",
+                    trust_remote_code=True
+                )
+            else:
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    self.model_name,
+                    torch_dtype=torch.float32,
+                    trust_remote_code=True
+                )
+            self.model.eval()
+            self.use_mock = False
             
             logger.info("ModelScope模型加载完成")
             
@@ -85,10 +122,7 @@ class LLMService:
         print(f"[LLM Request] 开始处理prompt (长度: {len(prompt)})")
         print(f"[Prompt] {prompt[:200]}...")  # 显示前200字符
         
-        if self.use_mock:
-            response = self._mock_generate(prompt)
-        else:
-            response = self._modelscope_generate(prompt, max_length)
+        response = self.generate_batch([prompt], max_length)[0]
         
         # 记录LLM响应
         print(f"[LLM Response] 生成完成 (长度: {len(response)})")
@@ -96,13 +130,62 @@ class LLMService:
         
         return response
     
+    def generate_batch(self, prompts: List[str], max_length: int = 200) -> List[str]:
+        """
+        批量生成帖子内容（一次generate调用）
+        
+        Args:
+            prompts: 提示词列表
+            max_length: 每条最大生成长度（新token数）
+            
+        Returns:
+            List[str]: 与prompts一一对应的生成内容
+        """
+        if not prompts:
+            return []
+        
+        start = time.perf_counter()
+        if self.use_mock:
+            responses = [self._mock_generate(prompt) for prompt in prompts]
+        else:
+            responses = self._modelscope_generate_batch(prompts, max_length)
+        elapsed = time.perf_counter() - start
+        
+        with self._stats_lock:
+            self.batches_generated += 1
+            self.prompts_generated += len(prompts)
+            self.generate_seconds += elapsed
+        
+        if len(prompts) > 1:
+            print(f"[LLM Batch] 批量生成 {len(prompts)} 条，耗时 {elapsed:.2f}秒 "
+                  f"({len(prompts) / elapsed if elapsed > 0 else 0:.1f} prompts/秒)")
+        return responses
+    
+    def _format_prompt(self, prompt: str) -> str:
+        """Instruct模型使用tokenizer自带的对话模板"""
+        if getattr(self.tokenizer, "chat_template", None):
+            return self.tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}],
+                tokenize=False,
+                add_generation_prompt=True
+            )
+        return prompt
+    
     def _modelscope_generate(self, prompt: str, max_length: int) -> str:
         """使用ModelScope生成内容"""
+        return self._modelscope_generate_batch([prompt], max_length)[0]
+    
+    def _modelscope_generate_batch(self, prompts: List[str], max_length: int) -> List[str]:
+        """使用ModelScope批量生成内容"""
         try:
             import torch
             
-            # 构建输入
-            inputs = self.tokenizer(prompt, return_tensors="pt")
+            # 构建输入（左侧填充到同一长度）
+            inputs = self.tokenizer(
+                [self._format_prompt(prompt) for prompt in prompts],
+                return_tensors="pt",
+                padding=True
+            ).to(self.model.device)
             
             # 生成参数
             generation_config = {
@@ -110,34 +193,67 @@ class LLMService:
                 "temperature": 0.7,
                 "top_p": 0.9,
                 "do_sample": True,
-                "pad_token_id": self.tokenizer.eos_token_id
+                "pad_token_id": self.tokenizer.pad_token_id
             }
             
             # 生成
-            with torch.no_grad():
+            with torch.inference_mode():
                 outputs = self.model.generate(
                     **inputs,
                     **generation_config
                 )
             
-            # 解码输出
-            generated_text = self.tokenizer.decode(
-                outputs[0], 
+            # 只解码新生成的token（输入部分长度相同，直接按列截取）
+            new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+            generated_texts = self.tokenizer.batch_decode(
+                new_tokens,
                 skip_special_tokens=True
             )
             
-            # 提取新生成的内容（去掉原始prompt）
-            new_content = generated_text[len(prompt):].strip()
-            
             # 如果生成为空，返回默认内容
-            if not new_content:
-                return self._mock_generate(prompt)
-            
-            return new_content
+            return [
+                text.strip() or self._mock_generate(prompt)
+                for prompt, text in zip(prompts, generated_texts)
+            ]
             
         except Exception as e:
             logger.error(f"ModelScope生成失败: {e}")
-            return self._mock_generate(prompt)
+            return [self._mock_generate(prompt) for prompt in prompts]
+    
+    def submit(self, prompt: str, max_length: int = 200) -> Future:
+        """
+        提交一条生成请求到微批队列，与几毫秒内的其他并发请求合并生成
+        
+        Returns:
+            Future: 结果为生成内容
+        """
+        with self._batcher_lock:
+            if self._batcher is None:
+                self._batcher = MicroBatcher(self.generate_batch, self.max_batch_size, self.max_wait_ms)
+            batcher = self._batcher
+        return batcher.submit(prompt, max_length)
+    
+    def close(self):
+        """停止微批队列的后台线程"""
+        with self._batcher_lock:
+            batcher, self._batcher = self._batcher, None
+        if batcher is not None:
+            batcher.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """返回生成吞吐统计"""
+        with self._stats_lock:
+            stats = {
+                'mode': 'mock' if self.use_mock else 'modelscope',
+                'batches': self.batches_generated,
+                'prompts': self.prompts_generated,
+                'avg_batch_size': self.prompts_generated / self.batches_generated if self.batches_generated else 0.0,
+                'generate_seconds': self.generate_seconds,
+                'prompts_per_second': self.prompts_generated / self.generate_seconds if self.generate_seconds > 0 else 0.0,
+            }
+        if self._batcher is not None:
+            stats['micro_batcher'] = self._batcher.get_stats()
+        return stats
     
     def _mock_generate(self, prompt: str) -> str:
         """Mock生成内容"""
@@ -192,5 +308,107 @@ class LLMServiceFactory:
         return LLMService(
             model_name=model_name,
             use_mock=use_mock,
-            api_key=api_key
-        ) 
\ No newline at end of file
+            api_key=api_key,
+            max_batch_size=config.get("max_batch_size", 8),
+            max_wait_ms=config.get("max_wait_ms", 5.0)
+        )
+
+
+class MicroBatcher:
+    """
+    微批队列。
+    
+    后台线程取出第一条请求后，最多再等待max_wait_ms收集并发请求（凑满max_batch_size立即发出），
+    按max_length分组后每组调用一次generate_batch，结果通过Future返回给各提交者。
+    """
+    
+    def __init__(self, generate_batch: Callable[[List[str], int], List[str]],
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0):
+        """
+        Args:
+            generate_batch: (prompts, max_length) -> 生成内容列表
+            max_batch_size: 每批最多合并的请求数
+            max_wait_ms: 收集并发请求的最长等待时间（毫秒）
+        """
+        self.generate_batch = generate_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: 'queue.Queue[Optional[Tuple[str, int, Future]]]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        # 统计
+        self.batches = 0
+        self.requests = 0
+        self.max_batch_seen = 0
+        self._thread = threading.Thread(target=self._run, name="llm-micro-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, prompt: str, max_length: int = 200) -> Future:
+        """提交一条请求"""
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher已关闭")
+            self._queue.put((prompt, max_length, future))
+        return future
+    
+    def close(self):
+        """处理完已提交的请求后停止后台线程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+    
+    def _collect(self, first) -> Tuple[list, bool]:
+        """在等待窗口内收集一批请求，返回(批次, 是否收到关闭信号)"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            
+            groups: Dict[int, list] = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+            for max_length, items in groups.items():
+                try:
+                    results = self.generate_batch([prompt for prompt, _, _ in items], max_length)
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), result in zip(items, results):
+                    future.set_result(result)
+            
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """返回合批统计"""
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+                'max_batch_size': self.max_batch_seen,
+                'queued': self._queue.qsize(),
+            }
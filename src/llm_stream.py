@@ -0,0 +1,80 @@
+"""
+LLM流式事件模块
+按仿真保存发帖生成过程中的流式事件（开始、增量文本、完成），供实时监控接口推送给前端。
+每个仿真的事件带递增序号，读取方记住上次读到的序号即可增量读取；缓冲区有上限，
+读取过慢的一方只会丢失最早的事件。
+"""
+
+import itertools
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+EVENT_POST_START = 'post_start'
+EVENT_POST_DELTA = 'post_delta'
+EVENT_POST_DONE = 'post_done'
+
+DEFAULT_MAX_EVENTS = 2000
+
+
+class SimulationEventStream:
+    """按仿真划分的有界事件缓冲区（线程安全）"""
+
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS):
+        """
+        Args:
+            max_events: 每个仿真最多保留的事件数
+        """
+        self.max_events = max_events
+        self._condition = threading.Condition()
+        self._events: Dict[Any, deque] = {}
+        self._seq = itertools.count(1)
+
+    def publish(self, simulation_id, event_type: str, data: Dict[str, Any]) -> int:
+        """
+        发布一个事件
+
+        Returns:
+            int: 事件序号
+        """
+        with self._condition:
+            seq = next(self._seq)
+            events = self._events.get(simulation_id)
+            if events is None:
+                events = self._events[simulation_id] = deque(maxlen=self.max_events)
+            events.append({'seq': seq, 'type': event_type, **data})
+            self._condition.notify_all()
+        return seq
+
+    def read(self, simulation_id, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """读取序号大于after_seq的事件"""
+        with self._condition:
+            return [e for e in self._events.get(simulation_id, ()) if e['seq'] > after_seq]
+
+    def wait(self, simulation_id, after_seq: int = 0, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """等待序号大于after_seq的事件，超时返回空列表"""
+        with self._condition:
+            # 序号单调递增，只需检查最新的事件
+            self._condition.wait_for(
+                lambda: bool(self._events.get(simulation_id)) and self._events[simulation_id][-1]['seq'] > after_seq,
+                timeout=timeout
+            )
+            return [e for e in self._events.get(simulation_id, ()) if e['seq'] > after_seq]
+
+    def clear(self, simulation_id):
+        """删除仿真的全部事件"""
+        with self._condition:
+            self._events.pop(simulation_id, None)
+
+
+_default_stream: Optional[SimulationEventStream] = None
+_default_stream_lock = threading.Lock()
+
+
+def get_event_stream() -> SimulationEventStream:
+    """获取进程内共享的事件流（仿真线程发布，实时日志接口读取）"""
+    global _default_stream
+    with _default_stream_lock:
+        if _default_stream is None:
+            _default_stream = SimulationEventStream()
+        return _default_stream
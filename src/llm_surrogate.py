@@ -0,0 +1,356 @@
+"""
+LLM代理模型模块
+真实运行中每次阅读LLM调用成功后，记录 (Agent特征与当前状态, 帖子标注) → (emotion_suggested, stance_suggested)
+训练样本（gzip压缩的JSON Lines）；用这些样本在CPU上训练一个带交互项的岭回归模型，
+作为LLMGate的预测器代替部分LLM调用，或在探索性运行中完全代替LLM。
+Agent每读一条帖子状态就会变化，阅读时逐条推理：帖子的特征行在时间片开始时计算一次，
+每次推理只拼接Agent当前状态；训练时留出一部分样本生成校准报告。
+"""
+
+import gzip
+import json
+import random
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+AGENT_FEATURES = ('is_opinion_leader', 'attitude_firmness', 'opinion_blocking',
+                  'current_emotion', 'current_stance', 'current_confidence')
+POST_FEATURES = ('emotion_score', 'stance_score', 'information_strength')
+# 交互项：帖子与Agent状态的差距、按信息强度加权的帖子标注、态度坚定度对立场差距的调节
+INTERACTION_FEATURES = ('emotion_gap', 'stance_gap', 'strength_x_emotion', 'strength_x_stance',
+                        'firmness_x_stance_gap')
+FEATURE_NAMES = AGENT_FEATURES + POST_FEATURES + INTERACTION_FEATURES
+TARGETS = ('emotion_suggested', 'stance_suggested')
+
+# 判断是否外推时允许超出训练特征范围的比例
+DEFAULT_RANGE_TOLERANCE = 0.05
+
+# SurrogatePredictor的两种用法
+SURROGATE_GATE = 'gate'  # 作为门控预测器：只在输入落在训练范围内时代替LLM
+SURROGATE_REPLACE = 'replace'  # 完全代替LLM（探索性运行，不需要API配置）
+
+
+def agent_feature_row(agent) -> List[float]:
+    """Agent的静态特征和当前状态"""
+    role = getattr(agent.role_type, 'value', agent.role_type)
+    return [
+        1.0 if role == 'opinion_leader' else 0.0,
+        float(agent.attitude_firmness),
+        float(agent.opinion_blocking),
+        float(agent.current_emotion),
+        float(agent.current_stance),
+        float(agent.current_confidence),
+    ]
+
+
+def post_feature_row(post: Dict[str, Any]) -> List[float]:
+    """帖子的标注特征（缺失时与Agent未配置LLM时的回退值一致）"""
+    return [
+        float(post.get('emotion_score', post.get('emotion', 0.0)) or 0.0),
+        float(post.get('stance_score', 0.0) or 0.0),
+        float(post.get('information_strength', 1.0) or 0.0),
+    ]
+
+
+def _post_terms(post: Dict[str, Any]) -> Tuple[float, ...]:
+    """帖子特征和只依赖帖子的交互项（strength_x_emotion, strength_x_stance）"""
+    emotion, stance, strength = post_feature_row(post)
+    return emotion, stance, strength, strength * emotion, strength * stance
+
+
+def _feature_row(agent_row: List[float], post_terms: Tuple[float, ...]) -> np.ndarray:
+    """单个样本的完整特征（与combine_features逐行结果相同，不经过numpy广播）"""
+    emotion, stance, strength, strength_x_emotion, strength_x_stance = post_terms
+    stance_gap = stance - agent_row[4]
+    return np.array(agent_row + [emotion, stance, strength, emotion - agent_row[3], stance_gap,
+                                 strength_x_emotion, strength_x_stance, agent_row[1] * stance_gap])
+
+
+def combine_features(agent_x: np.ndarray, post_x: np.ndarray) -> np.ndarray:
+    """
+    拼接Agent特征、帖子特征和交互项，支持广播：
+    (N, 6)与(N, 3)得到逐行样本(N, F)；(A, 1, 6)与(1, P, 3)得到整个网格(A, P, F)
+    """
+    shape = np.broadcast_shapes(agent_x.shape[:-1], post_x.shape[:-1])
+    agent_x = np.broadcast_to(agent_x, shape + agent_x.shape[-1:])
+    post_x = np.broadcast_to(post_x, shape + post_x.shape[-1:])
+    emotion_gap = post_x[..., 0] - agent_x[..., 3]
+    stance_gap = post_x[..., 1] - agent_x[..., 4]
+    interactions = np.stack([
+        emotion_gap,
+        stance_gap,
+        post_x[..., 2] * post_x[..., 0],
+        post_x[..., 2] * post_x[..., 1],
+        agent_x[..., 1] * stance_gap,
+    ], axis=-1)
+    return np.concatenate([agent_x, post_x, interactions], axis=-1)
+
+
+class SurrogatePairRecorder:
+    """训练样本录制（线程安全），文件格式：每行 {"agent": [...], "post": [...], "y": [情绪, 立场]}"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self.recorded = 0
+
+    def record(self, agent, post: Dict[str, Any], emotion_suggested: float, stance_suggested: float):
+        """记录一次LLM调用的输入特征和建议值（须在融合更新之前调用，保证是LLM看到的状态）"""
+        line = json.dumps({
+            'agent': agent_feature_row(agent),
+            'post': post_feature_row(post),
+            'y': [float(emotion_suggested), float(stance_suggested)],
+        }) + '\n'
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self.recorded += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'path': self.path, 'recorded': self.recorded}
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_pairs(paths: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    读取一个或多个样本文件
+
+    Returns:
+        (Agent特征(N, 6), 帖子特征(N, 3), 目标(N, 2))
+    """
+    agent_rows, post_rows, targets = [], [], []
+    for path in paths:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    pair = json.loads(line)
+                    agent_rows.append(pair['agent'])
+                    post_rows.append(pair['post'])
+                    targets.append(pair['y'])
+    if not targets:
+        raise ValueError(f"样本文件中没有训练样本: {list(paths)}")
+    return (np.asarray(agent_rows, dtype=np.float64), np.asarray(post_rows, dtype=np.float64),
+            np.asarray(targets, dtype=np.float64))
+
+
+class SurrogateModel:
+    """标准化特征上的双输出岭回归，输出截断到[-1, 1]"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, mean: np.ndarray, scale: np.ndarray,
+                 feature_min: np.ndarray, feature_max: np.ndarray, holdout_report: Optional[Dict[str, Any]] = None):
+        self.weights = weights  # (F, 2)
+        self.bias = bias  # (2,)
+        self.mean = mean
+        self.scale = scale
+        # 训练样本的特征范围（用于判断是否外推）
+        self.feature_min = feature_min
+        self.feature_max = feature_max
+        self.holdout_report = holdout_report
+
+    @classmethod
+    def fit(cls, agent_x: np.ndarray, post_x: np.ndarray, y: np.ndarray, l2: float = 1.0) -> 'SurrogateModel':
+        """闭式解训练：(XᵀX + λI)W = XᵀY（截距不做正则）"""
+        x = combine_features(agent_x, post_x)
+        mean = x.mean(axis=0)
+        scale = x.std(axis=0)
+        scale[scale < 1e-8] = 1.0  # 常数特征（如样本中全是普通用户）
+        z = (x - mean) / scale
+        y_mean = y.mean(axis=0)
+        weights = np.linalg.solve(z.T @ z + l2 * np.eye(z.shape[1]), z.T @ (y - y_mean))
+        return cls(weights, y_mean, mean, scale, x.min(axis=0), x.max(axis=0))
+
+    def _predict_features(self, x: np.ndarray) -> np.ndarray:
+        return np.clip(((x - self.mean) / self.scale) @ self.weights + self.bias, -1.0, 1.0)
+
+    def predict(self, agent_x: np.ndarray, post_x: np.ndarray) -> np.ndarray:
+        """逐行预测，返回(N, 2)"""
+        return self._predict_features(combine_features(agent_x, post_x))
+
+    def predict_grid(self, agent_x: np.ndarray, post_x: np.ndarray) -> np.ndarray:
+        """一个时间片内所有Agent×帖子的预测，返回(A, P, 2)"""
+        return self._predict_features(combine_features(agent_x[:, None, :], post_x[None, :, :]))
+
+    def feature_bounds(self, tolerance: float = DEFAULT_RANGE_TOLERANCE) -> Tuple[np.ndarray, np.ndarray]:
+        """训练特征范围放宽容差后的上下界"""
+        margin = tolerance * (self.feature_max - self.feature_min)
+        return self.feature_min - margin, self.feature_max + margin
+
+    def in_range(self, agent_x: np.ndarray, post_x: np.ndarray, tolerance: float = DEFAULT_RANGE_TOLERANCE) -> np.ndarray:
+        """样本是否落在训练特征范围内（允许少量容差），返回布尔数组"""
+        x = combine_features(agent_x, post_x)
+        low, high = self.feature_bounds(tolerance)
+        return np.all((x >= low) & (x <= high), axis=-1)
+
+    def calibration_report(self, agent_x: np.ndarray, post_x: np.ndarray, y: np.ndarray,
+                           bins: int = 5) -> Dict[str, Any]:
+        """
+        与留出的LLM回复比较
+
+        Returns:
+            Dict: 每个输出的MAE/RMSE/R²/相关系数/平均偏差/符号一致率，
+                以及按预测值分箱的校准表（每箱的平均预测值与平均LLM值）
+        """
+        predicted = self.predict(agent_x, post_x)
+        report: Dict[str, Any] = {'samples': int(len(y))}
+        edges = np.linspace(-1.0, 1.0, bins + 1)
+        for i, target in enumerate(TARGETS):
+            p, t = predicted[:, i], y[:, i]
+            error = p - t
+            variance = float(np.var(t))
+            correlation = float(np.corrcoef(p, t)[0, 1]) if len(t) > 1 and np.std(p) > 0 and np.std(t) > 0 else None
+            bin_index = np.clip(np.digitize(p, edges) - 1, 0, bins - 1)
+            calibration = []
+            for b in range(bins):
+                mask = bin_index == b
+                if mask.any():
+                    calibration.append({
+                        'range': [float(edges[b]), float(edges[b + 1])],
+                        'count': int(mask.sum()),
+                        'mean_predicted': float(p[mask].mean()),
+                        'mean_llm': float(t[mask].mean()),
+                    })
+            report[target] = {
+                'mae': float(np.abs(error).mean()),
+                'rmse': float(np.sqrt((error ** 2).mean())),
+                'r2': 1.0 - float((error ** 2).mean()) / variance if variance > 0 else None,
+                'correlation': correlation,
+                'bias': float(error.mean()),
+                'sign_agreement': float((np.sign(p) == np.sign(t)).mean()),
+                'calibration': calibration,
+            }
+        return report
+
+    def save(self, path: str):
+        """保存为npz（校准报告以JSON字符串保存）"""
+        with open(path, 'wb') as f:
+            np.savez(f, weights=self.weights, bias=self.bias, mean=self.mean, scale=self.scale,
+                     feature_min=self.feature_min, feature_max=self.feature_max,
+                     feature_names=np.asarray(FEATURE_NAMES),
+                     holdout_report=np.asarray(json.dumps(self.holdout_report, ensure_ascii=False)))
+
+    @classmethod
+    def load(cls, path: str) -> 'SurrogateModel':
+        with np.load(path) as data:
+            if tuple(data['feature_names'].tolist()) != FEATURE_NAMES:
+                raise ValueError(f"代理模型特征与当前版本不一致: {path}")
+            return cls(data['weights'], data['bias'], data['mean'], data['scale'],
+                       data['feature_min'], data['feature_max'], json.loads(str(data['holdout_report'])))
+
+
+def train_surrogate(paths: Sequence[str], holdout_ratio: float = 0.2, l2: float = 1.0,
+                    seed: int = 0) -> SurrogateModel:
+    """
+    从录制的样本文件训练代理模型，随机留出一部分样本生成校准报告（保存在model.holdout_report）
+    """
+    agent_x, post_x, y = load_pairs(paths)
+    indices = list(range(len(y)))
+    random.Random(seed).shuffle(indices)
+    holdout = int(len(indices) * holdout_ratio) if len(indices) > 1 else 0
+    test, train = np.asarray(indices[:holdout], dtype=int), np.asarray(indices[holdout:], dtype=int)
+
+    model = SurrogateModel.fit(agent_x[train], post_x[train], y[train], l2=l2)
+    if holdout:
+        model.holdout_report = model.calibration_report(agent_x[test], post_x[test], y[test])
+    print(f"[Surrogate] 训练样本 {len(train)} 条，留出 {holdout} 条")
+    return model
+
+
+class SurrogatePredictor:
+    """
+    LLMGate的预测器：predict(agent, post)返回(情绪, 立场)或None（交给LLM）
+
+    gate模式下，模型留出误差超过max_holdout_mae时不启用，样本超出训练特征范围时返回None；
+    replace模式下总是返回预测值。
+    """
+
+    def __init__(self, model: SurrogateModel, mode: str = SURROGATE_GATE, max_holdout_mae: Optional[float] = None):
+        if mode not in (SURROGATE_GATE, SURROGATE_REPLACE):
+            raise ValueError(f"未知的代理模型模式: {mode}，支持: {[SURROGATE_GATE, SURROGATE_REPLACE]}")
+        self.model = model
+        self.mode = mode
+        self.enabled = True
+        if mode == SURROGATE_GATE and max_holdout_mae is not None:
+            report = model.holdout_report or {}
+            worst = max((report.get(target, {}).get('mae', float('inf')) for target in TARGETS), default=float('inf'))
+            if worst > max_holdout_mae:
+                print(f"[Surrogate] 留出误差 {worst} 超过阈值 {max_holdout_mae}，不使用代理模型")
+                self.enabled = False
+        self._feature_low, self._feature_high = model.feature_bounds()
+        # 当前时间片帖子的特征行：id(帖子) -> (帖子, 特征)，保存帖子引用避免id被复用
+        self._slice_terms: Dict[int, Tuple[Dict[str, Any], Tuple[float, ...]]] = {}
+        self._lock = threading.Lock()
+        self.predictions = 0
+        self.out_of_range = 0
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> Optional['SurrogatePredictor']:
+        """从仿真配置创建：{"model_path": "surrogate.npz", "mode": "gate", "max_holdout_mae": 0.15}"""
+        if not config or not config.get('model_path'):
+            return None
+        return cls(SurrogateModel.load(config['model_path']),
+                   mode=config.get('mode', SURROGATE_GATE),
+                   max_holdout_mae=config.get('max_holdout_mae'))
+
+    @property
+    def replaces_llm(self) -> bool:
+        return self.mode == SURROGATE_REPLACE
+
+    def begin_slice(self, posts: Sequence[Dict[str, Any]]):
+        """时间片开始时计算本时间片帖子的特征行（所有Agent共用），替换上一时间片的缓存"""
+        self._slice_terms = {id(post): (post, _post_terms(post)) for post in posts}
+
+    def predict(self, agent, post) -> Optional[Tuple[float, float]]:
+        if not self.enabled:
+            return None
+        cached = self._slice_terms.get(id(post))
+        post_terms = cached[1] if cached is not None and cached[0] is post else _post_terms(post)
+        x = _feature_row(agent_feature_row(agent), post_terms)
+        if self.mode == SURROGATE_GATE and not ((x >= self._feature_low) & (x <= self._feature_high)).all():
+            with self._lock:
+                self.out_of_range += 1
+            return None
+        emotion, stance = self.model._predict_features(x)
+        with self._lock:
+            self.predictions += 1
+        return float(emotion), float(stance)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'enabled': self.enabled,
+                'predictions': self.predictions,
+                'out_of_range': self.out_of_range,
+                'holdout_report': self.model.holdout_report,
+            }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="从录制的LLM阅读样本训练代理模型")
+    parser.add_argument("pairs", nargs='+', help="样本文件（surrogate_pairs_*.jsonl.gz）")
+    parser.add_argument("--output", type=str, default="surrogate_model.npz", help="模型输出路径")
+    parser.add_argument("--holdout", type=float, default=0.2, help="留出比例")
+    parser.add_argument("--l2", type=float, default=1.0, help="岭回归正则系数")
+    parser.add_argument("--seed", type=int, default=0, help="留出划分的随机种子")
+    args = parser.parse_args()
+
+    model = train_surrogate(args.pairs, holdout_ratio=args.holdout, l2=args.l2, seed=args.seed)
+    model.save(args.output)
+    print(json.dumps(model.holdout_report, ensure_ascii=False, indent=2))
+    print(f"[Surrogate] 模型已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
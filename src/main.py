@@ -8,21 +8,41 @@ import sys
 import os
 sys.path.append(os.path.dirname(__file__))
 
+import copy
 import json
 import time
+import random
 import datetime
 from typing import Dict, List, Any, Optional
 from src.time_manager import TimeSliceManager
+from src.corpus_stream import StreamingSliceReader, DEFAULT_RUN_SIZE
+from src.social_graph import DEFAULT_TRENDING_SAMPLE, SocialGraph, post_author
+from src.dynamic_pool import DynamicPostPool
+from src.feed_index import DEFAULT_MAX_SKIP_PROBABILITY
+from src.corpus_cache import CompiledCorpus, cache_path, default_cache_dir, load_corpus_cache, save_corpus_cache, source_digest
 from src.world_state import WorldState
 from src.agent_controller import AgentController
 from src.services import DataLoader, flatten_posts_recursive, filter_valid_posts, load_agents_from_file
-from src.llm_service import LLMServiceFactory
+from src.llm_backends import create_llm_backend
+from src.llm_client import get_llm_client
+from src.llm_scheduler import get_llm_scheduler, PRIORITY_INTERACTIVE
+from src.llm_cassette import LLMCassette, MODE_RECORD
+from src.llm_batch import LLMBatchJob, LocalBatchProcessor
+from src.llm_stream import get_event_stream
+from src.prompt_budget import PromptBudget
+from src.llm_gating import LLMGate
+from src.slice_context import SliceContext
+from src.llm_surrogate import SurrogatePairRecorder, SurrogatePredictor
 from src.agent import Agent, RoleType
 
 
 class SimulationEngine:
     """仿真引擎主类"""
     
+    # 检查点不保存、恢复时保留当前值的Agent字段（仿真ID和LLM后端属于本进程）
+    AGENT_RUNTIME_FIELDS = ('simulation_id', 'llm_backend', 'prompt_budget', 'llm_gate', 'surrogate_recorder',
+                            'state_tracker')
+    
     def __init__(self, config: Dict[str, Any]):
         """
         初始化仿真引擎
@@ -34,14 +54,14 @@ class SimulationEngine:
         self.data_loader = DataLoader()
         self.world_state = WorldState()
         
-        # 检查是否跳过LLM
+        # 检查是否跳过LLM；否则按配置创建LLM后端（openai | local | mock），稍后注入AgentController
+        # 支持两种配置字段名：llm_config（前端发送）和 llm（传统字段），未配置时读取环境变量
         self.skip_llm = config.get("skip_llm", False)
         if self.skip_llm:
             print("跳过LLM模式：不会调用大语言模型，仅生成prompt")
-            self.llm_service = None
+            self.llm_backend = None
         else:
-            llm_config = config.get("llm", {})
-            self.llm_service = LLMServiceFactory.create_service(llm_config)
+            self.llm_backend = create_llm_backend(config.get("llm_config", {}) or config.get("llm", {}))
         
         # 创建Agent生成帖子的JSON文件 (在初始化Agent控制器之前)
         import datetime
@@ -60,18 +80,110 @@ class SimulationEngine:
         
         print(f"Agent帖子JSON文件: {agent_posts_filename}")
         
+        # LLM调度：进程级限流参数 + 本仿真的优先级和token预算
+        self.simulation_id = config.get("simulation_id") or f"sim_{self.simulation_timestamp}"
+        scheduler = get_llm_scheduler()
+        rate_limit = config.get("llm_rate_limit")
+        if rate_limit:
+            scheduler.configure(
+                requests_per_second=rate_limit.get("requests_per_second"),
+                tokens_per_minute=rate_limit.get("tokens_per_minute")
+            )
+        scheduler.register_simulation(
+            self.simulation_id,
+            priority=config.get("llm_priority", PRIORITY_INTERACTIVE),
+            token_budget=config.get("llm_token_budget")
+        )
+        # 同一仿真ID重新运行时清掉上次残留的流式事件
+        get_event_stream().clear(self.simulation_id)
+        
+        # LLM录制/回放：回放时使用录制时的随机种子，保证Agent轨迹完全一致
+        self.random_seed = config.get("random_seed")
+        self.llm_cassette = None
+        cassette_config = config.get("llm_cassette")
+        if cassette_config:
+            mode = cassette_config.get("mode", MODE_RECORD)
+            cassette_path = cassette_config.get("path") or f"llm_cassette_{self.simulation_timestamp}.jsonl.gz"
+            if mode == MODE_RECORD:
+                if self.random_seed is None:
+                    self.random_seed = random.randrange(2 ** 32)
+                self.llm_cassette = LLMCassette(cassette_path, mode, header={
+                    "random_seed": self.random_seed,
+                    "simulation_id": self.simulation_id
+                })
+                print(f"[Cassette] 录制模式：LLM调用将写入 {cassette_path}")
+            else:
+                self.llm_cassette = LLMCassette(cassette_path, mode, strict=cassette_config.get("strict", False))
+                self.random_seed = self.llm_cassette.header.get("random_seed", self.random_seed)
+                print(f"[Cassette] 回放模式：从 {cassette_path} 读取LLM回复 (严格模式: {self.llm_cassette.strict})")
+            get_llm_client().attach_cassette(self.simulation_id, self.llm_cassette)
+        
+        # 离线批处理：按时间片导出LLM请求，导入结果后继续（Agent使用独立随机序列，重复执行时间片结果一致）
+        self.llm_batch_job = None
+        self.llm_batch_auto = False
+        self.batch_status = None  # None | 'waiting_for_results' | 'completed'
+        batch_config = config.get("llm_batch")
+        if batch_config:
+            job_dir = batch_config.get("dir") or f"llm_batch_{self.simulation_id}"
+            self.llm_batch_job = LLMBatchJob(job_dir)
+            self.llm_batch_auto = batch_config.get("auto_process", False)
+            if self.random_seed is None:
+                self.random_seed = random.randrange(2 ** 32)
+            print(f"[Batch] 离线批处理模式：批次文件目录 {job_dir} (本地自动处理: {self.llm_batch_auto})")
+        
+        # 代理模型：录制阅读LLM调用的训练样本；已训练的模型作为门控预测器或完全代替LLM
+        surrogate_config = config.get("llm_surrogate") or {}
+        self.surrogate_predictor = SurrogatePredictor.from_config(surrogate_config)
+        self.surrogate_recorder = None
+        if surrogate_config.get("record_pairs"):
+            pairs_path = surrogate_config.get("pairs_path") or f"surrogate_pairs_{self.simulation_timestamp}.jsonl.gz"
+            self.surrogate_recorder = SurrogatePairRecorder(pairs_path)
+            print(f"[Surrogate] 阅读LLM调用的训练样本将写入 {pairs_path}")
+        if self.surrogate_predictor is not None and self.surrogate_predictor.replaces_llm:
+            # 完全代替LLM：除预测器外不启用其他跳过规则
+            llm_gate = LLMGate(min_information_strength=None, budget_min_information_strength=0.0,
+                               predictor=self.surrogate_predictor)
+            print("[Surrogate] 阅读阶段由代理模型代替LLM")
+        else:
+            llm_gate = LLMGate.from_config(config.get("llm_gating"), predictor=self.surrogate_predictor)
+        
         # 初始化Agent控制器（不自动加载Agent）
         self.agents = []  # 空的Agent列表，等待外部添加
-        self.agent_controller = AgentController(self.world_state, None, agent_posts_file=self.agent_posts_file)  # time_manager稍后设置
+        self.agent_controller = AgentController(
+            self.world_state, None,
+            agent_posts_file=self.agent_posts_file,
+            annotation_workers=config.get("annotation_workers", 4),
+            posting_workers=config.get("posting_workers", 4),
+            prompt_budget=PromptBudget.from_config(config.get("prompt_budget")),
+            llm_gate=llm_gate,
+            surrogate_recorder=self.surrogate_recorder
+        )  # time_manager稍后设置
+        # 动态帖子池（true或{"window_slices": .., "half_life_slices": .., ..}）：Agent帖子在之后的时间片重新进入Feed
+        self.agent_controller.dynamic_pool = DynamicPostPool.from_config(config.get("dynamic_pool"))
+        # 近似Feed（true或{"max_skip_probability": ..}）：只评估选中概率可能达到上限的帖子
+        approximate_feed = config.get("approximate_feed")
+        if approximate_feed:
+            self.agent_controller.set_approximate_feed(
+                approximate_feed.get("max_skip_probability", DEFAULT_MAX_SKIP_PROBABILITY)
+                if isinstance(approximate_feed, dict) else DEFAULT_MAX_SKIP_PROBABILITY
+            )
+        self.agent_controller.simulation_id = self.simulation_id
+        if self.llm_batch_job:
+            self.agent_controller.agent_random_seed = self.random_seed
         
-        # 配置Agent的LLM设置
-        # 支持两种配置字段名：llm_config（前端发送）和 llm（传统字段）
-        llm_config = config.get("llm_config", {}) or config.get("llm", {})
-        if llm_config and llm_config.get("enabled", True):
-            self.agent_controller.configure_llm_for_agents(llm_config)
+        # 注入LLM后端（Agent添加到控制器时同步获得）
+        self.agent_controller.set_llm_backend(self.llm_backend)
             
         self.time_manager: Optional[TimeSliceManager] = None
         self.posts_per_slice = config.get("posts_per_slice", 30)
+        # 按时间窗口划分时间片（小时，None时按posts_per_slice的帖子数量划分）
+        self.slice_duration_hours = config.get("slice_duration_hours")
+        # 流式语料（true或{"dir": .., "run_size": ..}）：语料构建为磁盘时间片文件，仿真时按时间片读取
+        self.corpus_stream = config.get("corpus_stream")
+        # 语料缓存（默认启用，false关闭，{"dir": ..}指定目录）：源文件不变时跳过数据处理流程
+        self.corpus_cache = config.get("corpus_cache", True)
+        # 社交关系图（{"path": csv/json} 或 {"synthetic": {..}}，可加 "trending_sample"）：Feed只包含关注作者的帖子和热门样本
+        self.social_graph_config = config.get("social_graph")
         self.current_slice = 0
         self.total_slices = 0
         self.simulation_results = []
@@ -89,6 +201,15 @@ class SimulationEngine:
         Args:
             posts_file_path: 帖子数据文件路径
         """
+        if self.corpus_stream:
+            self._load_streaming_corpus(posts_file_path)
+            return
+        
+        # 源文件未变化时直接加载编译好的语料
+        corpus_cache_key = self._corpus_cache_key(posts_file_path)
+        if corpus_cache_key and self._load_compiled_corpus(corpus_cache_key[0]):
+            return
+        
         try:
             # 1. 加载原始数据
             raw_posts = self.data_loader.load_post_data(posts_file_path)
@@ -107,22 +228,95 @@ class SimulationEngine:
                 self._load_sample_data()
                 return
             
-            # 4. 标准化帖子数据并添加到世界状态
+            # 4. 标准化帖子数据并添加到世界状态（add_post内部完成标准化）
+            pool_start = self.world_state.get_posts_count()
             for post in valid_posts:
-                normalized_post = self.world_state.normalize_post(post)
-                self.world_state.add_post(normalized_post)
+                self.world_state.add_post(post)
             
             # 5. 初始化时间管理器（使用处理后的数据）
-            self.time_manager = TimeSliceManager(valid_posts, self.posts_per_slice)
+            self.time_manager = self._create_time_manager(valid_posts)
             self.total_slices = self.time_manager.total_slices
             
             print(f"✅ 数据处理完成：{len(valid_posts)} 条有效帖子，{self.total_slices} 个时间片")
             
+            # 6. 编译语料缓存，下次启动直接加载
+            if corpus_cache_key:
+                self._save_compiled_corpus(corpus_cache_key, self.world_state.posts_pool[pool_start:])
+            
         except Exception as e:
             print(f"加载初始数据失败: {e}")
             # 使用示例数据
             self._load_sample_data()
     
+    def _corpus_cache_key(self, posts_file_path: str) -> Optional[tuple]:
+        """语料缓存文件路径和源文件摘要，未启用缓存或源文件不存在时为None"""
+        if not self.corpus_cache or not os.path.exists(posts_file_path):
+            return None
+        cache_config = self.corpus_cache if isinstance(self.corpus_cache, dict) else {}
+        # 缓存文件按源文件内容摘要命名，与数据文件位置无关
+        cache_dir = cache_config.get("dir") or default_cache_dir()
+        digest = source_digest(posts_file_path)
+        return cache_path(cache_dir, digest), digest
+    
+    def _load_compiled_corpus(self, path: str) -> bool:
+        """从语料缓存加载世界状态和时间片，成功时返回True"""
+        started = time.time()
+        try:
+            compiled = load_corpus_cache(path)
+        except Exception as e:
+            print(f"[Corpus] 读取语料缓存失败，重新处理数据: {e}")
+            return False
+        if compiled is None or not compiled.slice_posts:
+            return False
+        self.world_state.add_normalized_posts(compiled.pool_posts)
+        self.time_manager = TimeSliceManager.from_sorted(compiled.slice_posts, compiled.epochs, **self._slicing_kwargs())
+        self.total_slices = self.time_manager.total_slices
+        print(f"✅ 从语料缓存加载：{len(compiled.slice_posts)} 条有效帖子，{self.total_slices} 个时间片"
+              f"（{(time.time() - started) * 1000:.1f} ms）")
+        return True
+    
+    def _save_compiled_corpus(self, cache_key: tuple, pool_posts: List[Dict[str, Any]]):
+        """把本次数据处理结果写入语料缓存（失败不影响仿真）"""
+        path, digest = cache_key
+        try:
+            save_corpus_cache(path, CompiledCorpus(
+                slice_posts=self.time_manager.get_all_posts(),
+                epochs=list(self.time_manager.epochs),
+                pool_posts=pool_posts
+            ), digest)
+            print(f"[Corpus] 已写入语料缓存: {path}")
+        except Exception as e:
+            print(f"[Corpus] 写入语料缓存失败: {e}")
+    
+    def _attach_social_graph(self):
+        """按配置加载或合成社交关系图并设置给Agent控制器（只执行一次）"""
+        graph_config = self.social_graph_config
+        if not graph_config or self.agent_controller.social_graph is not None:
+            return
+        if graph_config is True:
+            graph_config = {}
+        if graph_config.get("path"):
+            graph = SocialGraph.load(graph_config["path"])
+        else:
+            # 按作者在语料中的总热度合成关注关系
+            author_weights: Dict[str, float] = {}
+            for post in self._iter_corpus_posts():
+                author = post_author(post)
+                if author is not None:
+                    author_weights[author] = author_weights.get(author, 0.0) + max(0.0, post.get('popularity') or 0)
+            graph = SocialGraph.synthetic(
+                [agent.agent_id for agent in self.agent_controller.agents], author_weights,
+                **(graph_config.get("synthetic") or {})
+            )
+        self.agent_controller.set_social_graph(graph, graph_config.get("trending_sample", DEFAULT_TRENDING_SAMPLE))
+    
+    def _iter_corpus_posts(self):
+        """按时间片顺序遍历语料中的所有帖子（内存和流式时间片管理器通用）"""
+        if self.time_manager is None:
+            return
+        for slice_index in range(self.time_manager.total_slices):
+            yield from self.time_manager.get_slice(slice_index)
+    
     def _load_sample_data(self):
         """加载示例数据"""
         sample_posts = [
@@ -170,10 +364,69 @@ class SimulationEngine:
         for post in sample_posts:
             self.world_state.add_post(post)
         
-        self.time_manager = TimeSliceManager(sample_posts, self.posts_per_slice)
+        self.time_manager = self._create_time_manager(sample_posts)
         self.total_slices = self.time_manager.total_slices
         print(f"使用示例数据：{len(sample_posts)} 条帖子，{self.total_slices} 个时间片")
     
+    def _slicing_kwargs(self) -> Dict[str, Any]:
+        """时间片划分参数（时间窗口或帖子数量）"""
+        if self.slice_duration_hours:
+            return {"slice_duration": float(self.slice_duration_hours) * 3600}
+        return {"slice_size": self.posts_per_slice}
+    
+    def _create_time_manager(self, posts: List[Dict[str, Any]]) -> TimeSliceManager:
+        """按配置创建时间片管理器"""
+        return TimeSliceManager(posts, **self._slicing_kwargs())
+    
+    def _load_streaming_corpus(self, posts_file_path: str):
+        """
+        流式加载语料：源文件没有对应的磁盘时间片文件（或已变化）时外部排序构建，
+        之后每个时间片从内存映射的文件中读取。语料帖子不放入世界状态，内存占用与语料大小无关。
+        
+        Args:
+            posts_file_path: 帖子数据文件路径
+        """
+        stream_config = self.corpus_stream if isinstance(self.corpus_stream, dict) else {}
+        slice_dir = stream_config.get("dir") or os.path.splitext(posts_file_path)[0] + "_slices"
+        try:
+            if not os.path.exists(posts_file_path):
+                raise FileNotFoundError(f"帖子数据文件未找到: {posts_file_path}")
+            self.time_manager = StreamingSliceReader.from_source(
+                posts_file_path, slice_dir, run_size=stream_config.get("run_size", DEFAULT_RUN_SIZE),
+                **self._slicing_kwargs()
+            )
+        except Exception as e:
+            print(f"流式加载语料失败: {e}")
+            self._load_sample_data()
+            return
+        
+        if not self.time_manager.total_posts:
+            print("没有有效的帖子数据，使用示例数据")
+            self.time_manager.close()
+            self._load_sample_data()
+            return
+        
+        self.total_slices = self.time_manager.total_slices
+        print(f"✅ 流式语料：{self.time_manager.total_posts} 条有效帖子，{self.total_slices} 个时间片（按时间片从 {slice_dir} 读取）")
+    
+    def _corpus_posts_count(self) -> int:
+        """帖子总数（流式语料的帖子不在世界状态中，单独计数）"""
+        count = self.world_state.get_posts_count()
+        if isinstance(self.time_manager, StreamingSliceReader):
+            count += self.time_manager.total_posts
+        return count
+    
+    def get_time_slice_info(self) -> List[Dict[str, Any]]:
+        """
+        获取每个时间片的实际时间范围和帖子数量
+        
+        Returns:
+            List[Dict]: [{"index", "start_time", "end_time", "post_count"}]，没有加载数据时为空列表
+        """
+        if not self.time_manager:
+            return []
+        return [self.time_manager.slice_info(i) for i in range(self.time_manager.total_slices)]
+    
     def inject_event(self, event_content: str, event_heat: int = 80):
         """
         注入突发事件
@@ -269,12 +522,13 @@ class SimulationEngine:
             "status": "running",
             "total_time_slices": self.total_slices,
             "agent_count": len(self.agent_controller.agents),
-            "posts_count": len(self.world_state.get_all_posts()),
+            "posts_count": self._corpus_posts_count(),
             "config": {
                 "w_pop": self.config.get("w_pop", 0.7),
                 "k": self.config.get("k", 2),
                 "skip_llm": self.config.get("skip_llm", False),
-                "posts_per_slice": self.posts_per_slice
+                "posts_per_slice": self.posts_per_slice,
+                "slice_duration_hours": self.slice_duration_hours
             },
             "agents": []
         }
@@ -295,20 +549,19 @@ class SimulationEngine:
         
         # 输出时间片信息
         time_slices_info = []
-        for i in range(self.total_slices):
-            if self.time_manager:
-                slice_posts = self.time_manager.get_slice(i)
-                post_count = len(slice_posts)
-                # 计算时间范围（简化版）
-                time_range = f"T{i:02d}:00-T{i:02d}:59"
+        for info in self.get_time_slice_info():
+            i = info["index"]
+            if info["start_time"]:
+                time_range = f"{info['start_time']} - {info['end_time']}"
             else:
-                post_count = 0
                 time_range = f"T{i:02d}:00-T{i:02d}:59"
             
             time_slice_info = {
                 "index": i,
                 "time_range": time_range,
-                "post_count": post_count,
+                "start_time": info["start_time"],
+                "end_time": info["end_time"],
+                "post_count": info["post_count"],
                 "description": f"时间片 {i+1}"
             }
             time_slices_info.append(time_slice_info)
@@ -319,16 +572,27 @@ class SimulationEngine:
         print(json.dumps(simulation_metadata, ensure_ascii=False, indent=2))
         print("=== SIMULATION_METADATA_END ===\n")
         
+        if self.random_seed is not None:
+            random.seed(self.random_seed)
+            print(f"[随机种子] {self.random_seed}")
+        
+        if self.llm_batch_job:
+            self._resume_batch_job()
+        
         start_time = time.time()
         
         # 获取所有Agent对象池（含未激活）
         all_agents = self.agent_controller.agents
+        self._attach_social_graph()
         
         while self.current_slice < self.total_slices:
             # 检查是否应该停止仿真
             if should_stop_callback and should_stop_callback():
                 print(f"\n仿真被用户停止，当前时间片: {self.current_slice + 1}")
                 break
+            
+            if self.llm_batch_job:
+                slice_checkpoint = self._capture_slice_state()
                 
             print(f"\n--- 时间片 {self.current_slice + 1}/{self.total_slices} ---")
             
@@ -346,8 +610,9 @@ class SimulationEngine:
                    event.get("is_official_statement", False)
             ]
             
-            # 将官方声明注入到当前时间片
+            # 将官方声明注入到当前时间片（时间片是只读视图，注入前转为列表）
             if official_statements:
+                current_slice_posts = list(current_slice_posts)
                 print(f"🏛️ [官方声明] 在时间片 {self.current_slice} 发布 {len(official_statements)} 条官方声明")
                 for statement in official_statements:
                     print(f"📢 官方声明: {statement.get('content', '')[:50]}...")
@@ -363,9 +628,19 @@ class SimulationEngine:
                     )
             
             print(f"本时间片帖子数量: {len(current_slice_posts)} (包含 {len(official_statements)} 条官方声明)")
+            new_posts_count = len(current_slice_posts)
+            # 动态帖子池：近期的Agent帖子加入候选集（放在时间片帖子之前，它们发布得更早）
+            dynamic_pool = self.agent_controller.dynamic_pool
+            if dynamic_pool is not None:
+                pool_posts = dynamic_pool.feed_posts(self.current_slice)
+                if pool_posts:
+                    current_slice_posts = pool_posts + list(current_slice_posts)
+                    print(f"[DynamicPool] 加入 {len(pool_posts)} 条近期Agent帖子")
+            # 只依赖本时间片帖子的数据计算一次，供所有Agent共享
+            slice_context = SliceContext(self.current_slice, current_slice_posts)
             
-            # 获取所有历史帖子
-            all_posts = self.world_state.get_all_posts()
+            # 历史帖子总数（只需要数量，不复制帖子池）
+            total_posts = self._corpus_posts_count()
             
             # 1. 只筛选本轮已激活的Agent
             active_agents = [agent for agent in all_agents if getattr(agent, 'is_active', True)]
@@ -411,14 +686,28 @@ class SimulationEngine:
             # 执行所有Agent的情绪更新和发帖判定
             self.agent_controller.update_agent_emotions(current_slice_posts, 
                                                       time_slice_index=self.current_slice,
-                                                      llm_config=llm_config_for_agents)
+                                                      llm_config=llm_config_for_agents,
+                                                      slice_context=slice_context)
+            
+            # 离线批处理：本轮有缺少结果的请求时回滚时间片，导出批次后等待结果
+            if self.llm_batch_job and self.llm_batch_job.has_pending():
+                self._restore_slice_state(slice_checkpoint)
+                batch_path = self.llm_batch_job.write_pending(self.current_slice)
+                if self.llm_batch_auto:
+                    results_path = LocalBatchProcessor().process(batch_path)
+                    if self.llm_batch_job.ingest_results(results_path) > 0:
+                        continue
+                self.llm_batch_job.save_checkpoint(slice_checkpoint)
+                self.batch_status = "waiting_for_results"
+                print(f"[Batch] 仿真暂停在时间片 {self.current_slice}，请处理批次文件后导入结果继续: {batch_path}")
+                break
             
             # 3. 记录结果
             self.simulation_results.append({
                 "slice_index": self.current_slice,
                 "results": {}, # No specific results to record here as update_agent_emotions doesn't return them
-                "total_posts": len(all_posts),
-                "new_posts_count": len(current_slice_posts)
+                "total_posts": total_posts,
+                "new_posts_count": new_posts_count
             })
             
             # 4. 时间片结束后，检查是否有Agent需要激活（下轮生效）
@@ -452,6 +741,10 @@ class SimulationEngine:
                 elapsed = time.time() - start_time
                 print(f"进度: {self.current_slice}/{self.total_slices} ({elapsed:.1f}s)")
         
+        if self.llm_batch_job and self.batch_status != "waiting_for_results" and self.current_slice >= self.total_slices:
+            self.batch_status = "completed"
+            self.llm_batch_job.clear_checkpoint()
+        
         elapsed_time = time.time() - start_time
         print(f"\n=== 仿真完成 ===")
         print(f"总耗时: {elapsed_time:.2f} 秒")
@@ -463,12 +756,24 @@ class SimulationEngine:
         
         completion_metadata = {
             "simulation_id": f"sim_{self.simulation_timestamp}",
-            "status": "completed",
+            "status": self.batch_status if self.batch_status == "waiting_for_results" else "completed",
             "end_time": datetime.datetime.now().isoformat(),
             "duration_seconds": elapsed_time,
             "completed_time_slices": self.current_slice,
             "total_time_slices": self.total_slices,
             "final_posts_count": self.world_state.get_posts_count(),
+            "llm_backend": self.llm_backend.describe() if self.llm_backend else None,
+            "llm_client_stats": get_llm_client().get_stats(),
+            "llm_usage": get_llm_scheduler().get_usage(self.simulation_id),
+            "llm_cassette": self.llm_cassette.get_stats() if self.llm_cassette else None,
+            "llm_batch": self.llm_batch_job.get_stats() if self.llm_batch_job else None,
+            "prompt_budget": self.agent_controller.prompt_budget.get_stats(),
+            "llm_gating": self.agent_controller.llm_gate.get_stats() if self.agent_controller.llm_gate else None,
+            "llm_surrogate": {
+                "predictor": self.surrogate_predictor.get_stats() if self.surrogate_predictor else None,
+                "recorder": self.surrogate_recorder.get_stats() if self.surrogate_recorder else None,
+            },
+            "random_seed": self.random_seed,
             "final_agent_states": []
         }
         
@@ -492,10 +797,96 @@ class SimulationEngine:
         sys.stdout = logger.terminal
         logger.close()
         
+        if self.llm_cassette:
+            get_llm_client().detach_cassette(self.simulation_id)
+            self.llm_cassette.close()
+        if self.llm_batch_job:
+            get_llm_client().detach_batch_job(self.simulation_id)
+        if self.surrogate_recorder:
+            self.surrogate_recorder.close()
+        # 关闭发帖流水线和标注线程池（时间片边界已全部汇合，这里不会丢弃任务）
+        if self.agent_controller.posting_pipeline:
+            self.agent_controller.posting_pipeline.shutdown()
+        if self.agent_controller.post_annotator:
+            self.agent_controller.post_annotator.shutdown()
+        # 关闭流式语料的内存映射和数据文件
+        if isinstance(self.time_manager, StreamingSliceReader):
+            self.time_manager.close()
+
         print(f"仿真完成！详细日志已保存到: {log_filename}")
         
         return self.simulation_results
     
+    def _capture_slice_state(self) -> Dict[str, Any]:
+        """记录时间片开始时的可变状态（离线批处理回滚和续跑用）"""
+        agent_posts_content = None
+        if self.agent_posts_file and os.path.exists(self.agent_posts_file):
+            with open(self.agent_posts_file, 'r', encoding='utf-8') as f:
+                agent_posts_content = f.read()
+        return {
+            "current_slice": self.current_slice,
+            "random_seed": self.random_seed,
+            "random_state": random.getstate(),
+            "agents": {
+                agent.agent_id: copy.deepcopy({
+                    k: v for k, v in agent.__dict__.items() if k not in self.AGENT_RUNTIME_FIELDS
+                })
+                for agent in self.agent_controller.agents
+            },
+            "posts_pool": copy.deepcopy(self.world_state.posts_pool),
+            "dynamic_pool": self.agent_controller.dynamic_pool.state() if self.agent_controller.dynamic_pool else None,
+            "simulation_results": copy.deepcopy(self.simulation_results),
+            "agent_posts_content": agent_posts_content
+        }
+    
+    def _restore_slice_state(self, state: Dict[str, Any]):
+        """把仿真恢复到_capture_slice_state记录的状态"""
+        self.current_slice = state["current_slice"]
+        self.random_seed = state["random_seed"]
+        self.agent_controller.agent_random_seed = self.random_seed
+        random.setstate(state["random_state"])
+        for agent in self.agent_controller.agents:
+            saved = state["agents"].get(agent.agent_id)
+            if saved is not None:
+                runtime = {k: v for k, v in agent.__dict__.items() if k in self.AGENT_RUNTIME_FIELDS}
+                agent.__dict__.clear()
+                agent.__dict__.update(copy.deepcopy(saved))
+                agent.__dict__.update(runtime)
+        # 恢复时直接替换了__dict__，没有经过状态属性赋值，增量统计需要重建
+        self.agent_controller.agent_aggregates.rebuild(self.agent_controller.agents)
+        self.world_state.restore_posts(copy.deepcopy(state["posts_pool"]))
+        if self.agent_controller.dynamic_pool is not None and state.get("dynamic_pool") is not None:
+            # 池中帖子重新关联到恢复后的帖子池记录
+            self.agent_controller.dynamic_pool.restore(state["dynamic_pool"], self.world_state.get_post)
+        self.simulation_results = copy.deepcopy(state["simulation_results"])
+        if state["agent_posts_content"] is not None and self.agent_posts_file:
+            with open(self.agent_posts_file, 'w', encoding='utf-8') as f:
+                f.write(state["agent_posts_content"])
+    
+    def _resume_batch_job(self):
+        """挂载离线批处理任务，从检查点恢复上次暂停的时间片并导入已有结果文件"""
+        get_llm_client().attach_batch_job(self.simulation_id, self.llm_batch_job)
+        self.batch_status = None
+        checkpoint = self.llm_batch_job.load_checkpoint()
+        if checkpoint is not None:
+            self._restore_slice_state(checkpoint)
+            print(f"[Batch] 从检查点恢复到时间片 {self.current_slice}")
+        self.llm_batch_job.ingest_all()
+        awaiting = self.llm_batch_job.awaiting_batches()
+        if awaiting:
+            print(f"[Batch] 仍有 {len(awaiting)} 个批次没有结果文件，对应请求将重新导出")
+    
+    def ingest_batch_results(self, results_path: str) -> int:
+        """
+        导入离线批处理结果文件，之后再次调用run_simulation()即可继续
+        
+        Returns:
+            int: 成功导入的结果条数
+        """
+        if not self.llm_batch_job:
+            raise RuntimeError("仿真未启用离线批处理模式（llm_batch）")
+        return self.llm_batch_job.ingest_results(results_path)
+    
     def get_simulation_summary(self) -> Dict[str, Any]:
         """获取仿真摘要"""
         total_actions = sum(
@@ -516,7 +907,7 @@ class SimulationEngine:
         results = {
             "summary": self.get_simulation_summary(),
             "simulation_results": self.simulation_results,
-            "agent_generated_posts": self.world_state.get_all_posts()
+            "agent_generated_posts": [post.to_dict() for post in self.world_state.get_all_posts()]
         }
         
         with open(output_file, 'w', encoding='utf-8') as f:
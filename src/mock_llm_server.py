@@ -0,0 +1,351 @@
+"""
+本地Mock LLM服务器
+OpenAI兼容的chat/completions接口，只监听本机、不访问网络，用于并发、限流和批量参数的压测。
+回复内容按prompt类型确定性生成（阅读返回emotion_suggested/stance_suggested，标注返回promptdataprocess字段，发帖返回文本），
+延迟分布（固定/对数正态/长尾尖峰）、错误率和429注入均可配置。
+请求带stream=true时按SSE逐段返回（延迟均匀分摊到各段），并遵守max_tokens。
+
+用法：
+    python -m src.mock_llm_server --port 8765 --latency lognormal --median-ms 300 --spike-rate 0.02 --rate-limit-rate 0.05
+然后把llm_config设置为 {"api_key": "mock", "base_url": "http://127.0.0.1:8765/v1/chat/completions"}
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from .llm_backends import mock_reply
+from .llm_scheduler import estimate_tokens
+
+LATENCY_FIXED = 'fixed'
+LATENCY_LOGNORMAL = 'lognormal'
+LATENCY_DISTRIBUTIONS = (LATENCY_FIXED, LATENCY_LOGNORMAL)
+
+# 流式回复每段的字符数
+STREAM_CHUNK_CHARS = 4
+
+
+class LatencyModel:
+    """请求延迟分布：固定或对数正态，可叠加按概率出现的长尾尖峰"""
+
+    def __init__(self, distribution: str = LATENCY_FIXED, latency_ms: float = 0.0,
+                 median_ms: float = 200.0, sigma: float = 0.5,
+                 spike_rate: float = 0.0, spike_ms: float = 2000.0):
+        """
+        Args:
+            distribution: 'fixed' 或 'lognormal'
+            latency_ms: 固定延迟（毫秒）
+            median_ms: 对数正态分布的中位数（毫秒）
+            sigma: 对数正态分布的形状参数
+            spike_rate: 出现尖峰的概率
+            spike_ms: 尖峰额外增加的延迟（毫秒）
+        """
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"未知的延迟分布: {distribution}，支持: {list(LATENCY_DISTRIBUTIONS)}")
+        self.distribution = distribution
+        self.latency_ms = latency_ms
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.spike_rate = spike_rate
+        self.spike_ms = spike_ms
+
+    def sample(self, rng: random.Random) -> float:
+        """采样一次延迟（秒）"""
+        if self.distribution == LATENCY_LOGNORMAL:
+            latency_ms = rng.lognormvariate(math.log(max(self.median_ms, 1e-6)), self.sigma)
+        else:
+            latency_ms = self.latency_ms
+        if self.spike_rate and rng.random() < self.spike_rate:
+            latency_ms += self.spike_ms
+        return max(0.0, latency_ms) / 1000.0
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(math.ceil(q * len(sorted_values))) - 1)
+    return sorted_values[max(0, index)]
+
+
+class _MockLLMHandler(BaseHTTPRequestHandler):
+    """请求处理器，server属性指向_MockHTTPServer"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # 压测时不输出每个请求的访问日志
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        mock = self.server.mock
+        if self.path == '/stats':
+            self._send_json(200, mock.get_stats())
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': {'message': f'not found: {self.path}'}})
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+            prompt = request['messages'][-1]['content']
+        except (ValueError, KeyError, IndexError, TypeError):
+            self._send_json(400, {'error': {'message': 'invalid chat/completions request'}})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'not found: {self.path}'}})
+            return
+
+        outcome, latency = mock.decide()
+        if outcome == 'rate_limited':
+            mock.finish(outcome, 0.0)
+            self._send_json(429, {'error': {'message': 'rate limit exceeded', 'type': 'rate_limit'}},
+                            headers={'Retry-After': str(mock.retry_after)})
+            return
+
+        if outcome == 'error':
+            time.sleep(latency)
+            mock.finish(outcome, latency)
+            self._send_json(500, {'error': {'message': 'injected server error'}})
+            return
+
+        content = mock_reply(prompt)
+        if request.get('stream'):
+            try:
+                self._send_stream(request, prompt, content, latency)
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端提前中止读取（如超过token上限）
+                pass
+            finally:
+                mock.finish(outcome, latency)
+            return
+        time.sleep(latency)
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(content)
+        mock.finish(outcome, latency)
+        self._send_json(200, {
+            'id': f'mockcmpl-{mock.request_count}',
+            'object': 'chat.completion',
+            'model': request.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+
+    def _send_stream(self, request: Dict[str, Any], prompt: str, content: str, latency: float):
+        """按SSE格式逐段发送回复（每段STREAM_CHUNK_CHARS个字符），最后发送usage和[DONE]"""
+        pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+        max_tokens = request.get('max_tokens')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def send_event(body):
+            self.wfile.write(f"data: {json.dumps(body, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        sent = ''
+        finish_reason = 'stop'
+        for piece in pieces:
+            if max_tokens and estimate_tokens(sent) >= max_tokens:
+                finish_reason = 'length'
+                break
+            time.sleep(latency / max(len(pieces), 1))
+            sent += piece
+            send_event({'object': 'chat.completion.chunk', 'model': request.get('model', 'mock'),
+                        'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]})
+        send_event({'object': 'chat.completion.chunk', 'model': request.get('model', 'mock'),
+                    'choices': [{'index': 0, 'delta': {}, 'finish_reason': finish_reason}]})
+        if (request.get('stream_options') or {}).get('include_usage'):
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(sent)
+            send_event({'object': 'chat.completion.chunk', 'choices': [], 'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            }})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, mock):
+        self.mock = mock
+        super().__init__(address, _MockLLMHandler)
+
+
+class MockLLMServer:
+    """
+    本地Mock LLM服务器。
+
+    start()在后台线程中启动并返回自身；url/endpoint给出可直接用作llm_config.base_url的地址。
+    随机决策（延迟、错误、429）使用固定种子，单线程顺序请求时结果可复现。
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: Optional[LatencyModel] = None,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 1.0,
+                 seed: int = 0):
+        """
+        Args:
+            host: 监听地址（默认只监听本机）
+            port: 端口，0表示自动分配
+            latency: 延迟分布，默认无延迟
+            error_rate: 返回500的概率
+            rate_limit_rate: 返回429的概率
+            retry_after: 429响应的Retry-After（秒）
+            seed: 随机种子
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[_MockHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        # 统计
+        self.request_count = 0
+        self.ok_count = 0
+        self.error_count = 0
+        self.rate_limited_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._latencies: List[float] = []
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    @property
+    def endpoint(self) -> str:
+        """chat/completions接口地址"""
+        return f'{self.url}/v1/chat/completions'
+
+    def decide(self):
+        """为一个新请求决定结果（'ok'/'error'/'rate_limited'）和延迟"""
+        with self._lock:
+            self.request_count += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                return 'rate_limited', 0.0
+            latency = self.latency.sample(self._rng)
+            if roll < self.rate_limit_rate + self.error_rate:
+                return 'error', latency
+            return 'ok', latency
+
+    def finish(self, outcome: str, latency: float):
+        """记录一个请求的结束"""
+        with self._lock:
+            self.in_flight -= 1
+            if outcome == 'ok':
+                self.ok_count += 1
+                self._latencies.append(latency)
+            elif outcome == 'error':
+                self.error_count += 1
+            else:
+                self.rate_limited_count += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回请求统计和延迟分位数（毫秒）"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'requests': self.request_count,
+                'ok': self.ok_count,
+                'errors': self.error_count,
+                'rate_limited': self.rate_limited_count,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'latency_ms': {
+                    name: None if not latencies else _percentile(latencies, q) * 1000
+                    for name, q in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))
+                },
+            }
+
+    def start(self) -> 'MockLLMServer':
+        """在后台线程中启动服务器"""
+        self._server = _MockHTTPServer((self.host, self.port), self)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"[MockLLM] 服务器已启动: {self.endpoint}")
+        return self
+
+    def stop(self):
+        """停止服务器"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地Mock LLM服务器（OpenAI兼容）")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="端口")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default=LATENCY_FIXED, help="延迟分布")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="固定延迟（毫秒）")
+    parser.add_argument("--median-ms", type=float, default=200.0, help="对数正态延迟的中位数（毫秒）")
+    parser.add_argument("--sigma", type=float, default=0.5, help="对数正态延迟的形状参数")
+    parser.add_argument("--spike-rate", type=float, default=0.0, help="长尾尖峰概率")
+    parser.add_argument("--spike-ms", type=float, default=2000.0, help="尖峰额外延迟（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回429的概率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429响应的Retry-After（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        host=args.host, port=args.port,
+        latency=LatencyModel(args.latency, args.latency_ms, args.median_ms, args.sigma, args.spike_rate, args.spike_ms),
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, seed=args.seed
+    ).start()
+    print(f"[MockLLM] 统计信息: {server.url}/stats，按Ctrl+C停止")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
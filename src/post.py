@@ -0,0 +1,325 @@
+"""
+帖子记录模块
+Post是世界状态帖子池（WorldState.posts_pool）的规范帖子记录，替代每次复制dict的normalize_post。
+帖子池中的帖子（加载的语料帖子、Agent发布的帖子、注入的事件）转换为Post；
+时间片（TimeManager/StreamingSliceReader）中的语料帖子仍是原始dict，API服务也按dict处理帖子。
+
+- 字段别名（id/mid→post_id、uid→author_id、text→content、t→timestamp、pid→parent_post_id）
+  只在Post.from_dict时解析一次；与规范字段取值相同的别名不再单独保存，按键访问时映射到规范字段
+- 规范字段存放在__slots__中，其他原始字段（popularity、user_id等）保存在extra
+- 情绪/立场类别保存在槽中：显式给出时保存给出的类别，没有给出或之后修改了分值时按分值推导
+
+Post实现MutableMapping接口（[]、get、in、update），按dict访问帖子的代码无需修改；
+只在JSON边界（保存结果）用to_dict()转换为dict，别名字段在其中照常输出。
+"""
+
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+# 规范字段（to_dict的键顺序）
+FIELDS = ('post_id', 'author_id', 'content', 'timestamp',
+          'emotion_score', 'emotion_category', 'stance_score', 'stance_category',
+          'information_strength', 'keywords', 'is_repost', 'parent_post_id')
+# 源数据中可能没有的字段（没有时不存在，与原normalize_post一致）
+OPTIONAL_FIELDS = ('author_id', 'timestamp', 'parent_post_id')
+# 没有显式给出时由分值推导的字段
+DERIVED_FIELDS = ('emotion_category', 'stance_category')
+# 字段别名 (别名, 规范字段)，按from_dict的解析优先级排列
+ALIASES = (('id', 'post_id'), ('mid', 'post_id'), ('uid', 'author_id'),
+           ('text', 'content'), ('t', 'timestamp'), ('pid', 'parent_post_id'))
+
+# 分值超过该阈值（绝对值）时归为正/负类别
+CATEGORY_THRESHOLD = 0.3
+
+_MISSING = object()
+
+
+def emotion_category(score: Optional[float]) -> str:
+    """情绪分值对应的类别（None按0处理）"""
+    score = score or 0.0
+    if score > CATEGORY_THRESHOLD:
+        return 'positive'
+    if score < -CATEGORY_THRESHOLD:
+        return 'negative'
+    return 'neutral'
+
+
+def stance_category(score: Optional[float]) -> str:
+    """立场分值对应的类别（None按0处理）"""
+    score = score or 0.0
+    if score > CATEGORY_THRESHOLD:
+        return 'support'
+    if score < -CATEGORY_THRESHOLD:
+        return 'oppose'
+    return 'neutral'
+
+
+def source_post_id(post: Mapping[str, Any], default: Any = None) -> Any:
+    """
+    帖子在语料中的ID（依次取mid、id、post_id，找到即停止）
+
+    替代各处的post.get('mid', post.get('id', post.get('post_id')))：
+    嵌套get会先求值全部默认值，这里按顺序短路查找（每个键只查一次）。
+    """
+    for key in ('mid', 'id', 'post_id'):
+        value = post.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    return default
+
+
+_FIELD_SET = frozenset(FIELDS)
+# 别名位：位为1时该别名与规范字段取值相同，不保存在extra中
+_ALIAS_BITS = {alias: 1 << bit for bit, (alias, _) in enumerate(ALIASES)}
+# 别名 -> 规范字段
+_ALIAS_FIELDS = dict(ALIASES)
+# 规范字段 -> 映射到它的 (别名, 别名位)
+_FIELD_ALIASES: Dict[str, tuple] = {}
+for _alias, _field in ALIASES:
+    _FIELD_ALIASES[_field] = _FIELD_ALIASES.get(_field, ()) + ((_alias, _ALIAS_BITS[_alias]),)
+# 分值字段 -> (类别字段, 推导函数)：分值赋值时类别改为按新分值推导
+_SCORE_CATEGORY = {'emotion_score': ('emotion_category', emotion_category),
+                   'stance_score': ('stance_category', stance_category)}
+# 别名位组合 -> 按键读取用的 {键: 槽属性名}（规范字段和映射的别名），相同组合的帖子共用一个
+_KEY_FIELDS: Dict[int, Dict[str, str]] = {}
+
+
+def _key_fields(aliases: int) -> Dict[str, str]:
+    """别名位组合对应的键 -> 槽属性名表（缓存）"""
+    table = _KEY_FIELDS.get(aliases)
+    if table is None:
+        table = {field: field for field in FIELDS}
+        table.update((alias, field) for alias, field in ALIASES if aliases & _ALIAS_BITS[alias])
+        _KEY_FIELDS[aliases] = table
+    return table
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    """别名与规范字段取值相同（类型也相同，JSON输出不变）"""
+    return a is b or (type(a) is type(b) and a == b)
+
+
+class Post(MutableMapping):
+    """规范帖子记录（字段见WorldState文档）"""
+
+    __slots__ = ('post_id', 'author_id', 'content', 'timestamp',
+                 'emotion_score', 'emotion_category', 'stance_score', 'stance_category',
+                 'information_strength', 'keywords', 'is_repost', 'parent_post_id', 'extra', '_aliases', '_fields')
+
+    def __init__(self, post_id: str, content: str = '', emotion_score: Optional[float] = 0.0,
+                 stance_score: Optional[float] = 0.0, information_strength: Optional[float] = 0.5,
+                 keywords: Optional[list] = None, is_repost: bool = False,
+                 extra: Optional[Dict[str, Any]] = None, emotion_category: Optional[str] = None,
+                 stance_category: Optional[str] = None, **optional: Any):
+        """
+        Args:
+            post_id: 帖子ID
+            content: 帖子内容
+            emotion_score: 情绪分值
+            stance_score: 立场分值
+            information_strength: 信息强度
+            keywords: 关键词列表
+            is_repost: 是否为转发
+            extra: 其他原始字段
+            emotion_category: 显式情绪类别（None时按分值推导）
+            stance_category: 显式立场类别（None时按分值推导）
+            **optional: author_id/timestamp/parent_post_id（不给出时该字段不存在）
+        """
+        self._aliases = 0
+        self.post_id = post_id
+        self.content = content
+        self.emotion_score = emotion_score
+        self.stance_score = stance_score
+        if emotion_category is not None:
+            self.emotion_category = emotion_category
+        if stance_category is not None:
+            self.stance_category = stance_category
+        self.information_strength = information_strength
+        self.keywords = keywords if keywords is not None else []
+        self.is_repost = is_repost
+        self.extra = extra if extra is not None else {}
+        for key, value in optional.items():
+            if key not in OPTIONAL_FIELDS:
+                raise TypeError(f"未知的帖子字段: {key}")
+            setattr(self, key, value)
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> 'Post':
+        """
+        从原始帖子dict创建规范记录（解析字段别名、补全默认值）。
+
+        原始字段都会保留：与规范字段取值相同的别名（如mid/uid/t）记为映射，不再保存在extra，
+        取值不同的别名原样保存在extra。dict中的类别字段作为显式类别保存。传入Post时返回副本。
+        """
+        if isinstance(data, Post):
+            return data.copy()
+        get = data.get
+
+        if 'post_id' in data:
+            post_id = data['post_id']
+        elif 'id' in data:
+            post_id = data['id']
+        elif 'mid' in data:
+            post_id = data['mid']
+        else:
+            post_id = str(get('uid', '')) + '_' + str(get('t', ''))
+
+        if 'content' in data:
+            content = data['content']
+        else:
+            content = get('text', '')
+
+        optional = {}
+        for field, alias in (('author_id', 'uid'), ('timestamp', 't'), ('parent_post_id', 'pid')):
+            if field in data:
+                optional[field] = data[field]
+            elif alias in data:
+                optional[field] = data[alias]
+
+        post = cls(
+            post_id, content,
+            emotion_score=get('emotion_score', 0.0),
+            stance_score=get('stance_score', 0.0),
+            information_strength=get('information_strength', 0.5),
+            keywords=get('keywords'),
+            is_repost=get('is_repost', False),
+            emotion_category=get('emotion_category'),
+            stance_category=get('stance_category'),
+            **optional
+        )
+        # 新建extra（从副本中删除键不会缩小dict），与规范字段相同的别名只记一位
+        extra = post.extra
+        aliases = 0
+        for key, value in data.items():
+            if key in _FIELD_SET:
+                continue
+            field = _ALIAS_FIELDS.get(key)
+            if field is not None and _same_value(value, getattr(post, field, _MISSING)):
+                aliases |= _ALIAS_BITS[key]
+            else:
+                extra[key] = value
+        post._aliases = aliases
+        return post
+
+    def __setattr__(self, name: str, value: Any):
+        linked = _FIELD_ALIASES.get(name)
+        if linked is not None:
+            self._detach_aliases(name, linked)
+        elif name == '_aliases':
+            object.__setattr__(self, '_fields', _key_fields(value))
+        object.__setattr__(self, name, value)
+        derived = _SCORE_CATEGORY.get(name)
+        if derived is not None:
+            # 类别保存在槽中（读取不需要计算），分值改变后按新分值重新推导
+            object.__setattr__(self, derived[0], derived[1](value))
+
+    def _detach_aliases(self, field: str, linked: tuple):
+        """规范字段改变前，把映射到它的别名按原值写回extra（与dict中别名不随规范字段改变一致）"""
+        aliases = getattr(self, '_aliases', 0)
+        for alias, bit in linked:
+            if aliases & bit:
+                self.extra[alias] = getattr(self, field)
+                aliases &= ~bit
+        self._aliases = aliases
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # 共用的键表不序列化，恢复时按别名位重新取得
+        return {slot: getattr(self, slot) for slot in Post.__slots__[:-1] if hasattr(self, slot)}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        for slot, value in state.items():
+            object.__setattr__(self, slot, value)
+        object.__setattr__(self, '_fields', _key_fields(self._aliases))
+
+    def copy(self) -> 'Post':
+        """浅拷贝（extra字典单独复制）"""
+        clone = Post.__new__(Post)
+        for slot in Post.__slots__:
+            try:
+                object.__setattr__(clone, slot, getattr(self, slot))
+            except AttributeError:
+                pass
+        clone.extra = dict(self.extra)
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为dict（JSON边界使用，别名字段照常输出）"""
+        return dict(self.items())
+
+    # ---- Mapping接口 ----
+
+    def __getitem__(self, key: str) -> Any:
+        field = self._fields.get(key)
+        if field is None:
+            return self.extra[key]
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # 规范字段和映射的别名读槽属性（一次查表），其他键读extra
+        field = self._fields.get(key)
+        if field is None:
+            return self.extra.get(key, default)
+        return getattr(self, field, default)
+
+    def __contains__(self, key) -> bool:
+        field = self._fields.get(key)
+        if field is None:
+            return key in self.extra
+        return hasattr(self, field)
+
+    def __setitem__(self, key: str, value: Any):
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+            return
+        bit = _ALIAS_BITS.get(key)
+        if bit is not None:
+            # 单独写入的别名不再跟随规范字段
+            self._aliases &= ~bit
+        self.extra[key] = value
+
+    def update(self, other=(), **kwds):
+        """与dict.update相同；先写入分值再写入类别，同时给出的显式类别不会被清除"""
+        items = dict(other, **kwds)
+        for key in sorted(items, key=lambda k: k in DERIVED_FIELDS):
+            self[key] = items[key]
+
+    def __delitem__(self, key: str):
+        if key in OPTIONAL_FIELDS:
+            try:
+                self._detach_aliases(key, _FIELD_ALIASES[key])
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif key in _FIELD_SET:
+            raise KeyError(f"规范字段不能删除: {key}")
+        elif key in self.extra:
+            del self.extra[key]
+        else:
+            bit = _ALIAS_BITS.get(key, 0)
+            if not self._aliases & bit:
+                raise KeyError(key)
+            self._aliases &= ~bit
+
+    def __iter__(self) -> Iterator[str]:
+        for field in FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self._aliases:
+            for alias, field in ALIASES:
+                if self._aliases & _ALIAS_BITS[alias] and hasattr(self, field):
+                    yield alias
+        yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Post(post_id={self.post_id!r}, content={str(self.content)[:20]!r}, extra_fields={len(self.extra)})"
+
+
+def as_post(post: Mapping[str, Any]) -> Post:
+    """已是Post时原样返回，否则从dict创建"""
+    return post if isinstance(post, Post) else Post.from_dict(post)
@@ -0,0 +1,197 @@
+"""
+Agent发帖标注模块
+将promptdataprocess.txt标注从发帖循环中剥离：发帖时只提交任务，
+时间片结束前统一等待结果并回写到WorldState和Agent帖子JSON文件。
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from src.llm_batch import BatchPendingError
+from src.llm_client import get_llm_client
+from src.prompt_layout import stable_marker_template
+
+ANNOTATION_TEMPLATE_PATH = 'data/promptdataprocess.txt'
+
+# 模板中需要替换为实际帖子的示例目标帖子标记
+TARGET_POST_MARKERS = ('[目标帖子',)
+
+# 标注结果中需要回写的字段
+ANNOTATION_FIELDS = (
+    'emotion_score',
+    'stance_score',
+    'information_strength',
+    'keywords',
+    'stance_category',
+    'stance_confidence',
+)
+
+_template_cache: Dict[str, str] = {}
+
+
+def load_annotation_template(template_path: str = ANNOTATION_TEMPLATE_PATH) -> str:
+    """读取标注模板（只读一次）"""
+    if template_path not in _template_cache:
+        with open(template_path, 'r', encoding='utf-8') as f:
+            _template_cache[template_path] = f.read()
+    return _template_cache[template_path]
+
+
+def find_parent_content(parent_mid, all_posts_in_slice) -> Optional[str]:
+    """在当前时间片帖子中查找父帖子内容"""
+    if not parent_mid or not all_posts_in_slice:
+        return None
+    for p in all_posts_in_slice:
+        if str(p.get('id', p.get('mid', ''))) == str(parent_mid):
+            return p.get('content', '')
+    return None
+
+
+def build_annotation_prompt(template: str, content: str, parent_content: Optional[str] = None) -> str:
+    """用promptdataprocess模板构建帖子标注prompt（含目标帖子的段落移到末尾，其余部分作为稳定前缀）"""
+    template = stable_marker_template(template, TARGET_POST_MARKERS)
+    target_post_section = f'[目标帖子]: {content}'
+    # 如果有对话上下文，构建完整的目标帖子部分
+    if parent_content is not None:
+        target_post_section = f'\n[父帖子]: {parent_content}\n\n[目标帖子]: {content}'
+
+    # 替换模板中的示例目标帖子（两个地方都需要替换）
+    return template.replace(
+        '[目标帖子 (回复 4)]: 走正常途径不如闹来钱多又快',
+        target_post_section
+    ).replace(
+        '[目标帖子]: "走正常途径不如闹来钱多又快"',
+        f'[目标帖子]: "{content}"'
+    )
+
+
+def parse_annotation_response(result_text: str) -> Optional[Dict[str, Any]]:
+    """
+    从LLM返回文本中提取标注JSON
+
+    Returns:
+        Optional[Dict[str, Any]]: 只包含ANNOTATION_FIELDS中出现的字段；格式无效时返回None
+    """
+    if '{' not in result_text or '}' not in result_text:
+        return None
+    json_start = result_text.find('{')
+    json_end = result_text.rfind('}') + 1
+    annotation_result = json.loads(result_text[json_start:json_end])
+
+    fields = {}
+    for key in ('emotion_score', 'stance_score', 'information_strength', 'stance_confidence'):
+        if annotation_result.get(key) is not None:
+            fields[key] = float(annotation_result[key])
+    if 'keywords' in annotation_result:
+        fields['keywords'] = annotation_result['keywords']
+    if 'stance_category' in annotation_result:
+        fields['stance_category'] = annotation_result['stance_category']
+    return fields
+
+
+def request_annotation(prompt: str, llm_backend, simulation_id=None,
+                       call_info: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """调用LLM完成一次标注，返回解析后的字段"""
+    result_text = get_llm_client().complete(
+        llm_backend, prompt, simulation_id=simulation_id, call_info=call_info
+    ).strip()
+    return parse_annotation_response(result_text)
+
+
+class PostAnnotator:
+    """
+    时间片级别的发帖标注阶段。
+
+    发帖循环调用submit()后立即返回，标注请求在线程池中并行执行；
+    flush()在时间片边界等待所有请求完成，并按提交顺序返回标注结果。
+    """
+
+    def __init__(self, max_workers: int = 4, template_path: str = ANNOTATION_TEMPLATE_PATH):
+        """
+        Args:
+            max_workers: 并行标注的最大线程数
+            template_path: promptdataprocess标注模板路径
+        """
+        self.max_workers = max_workers
+        self.template_path = template_path
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Dict[str, Any]] = []
+        # 累计统计
+        self.submitted_count = 0
+        self.annotated_count = 0
+        self.failed_count = 0
+
+    def submit(self, agent, post_json: Dict[str, Any], all_posts_in_slice: List[Dict[str, Any]],
+               time_slice_index=None) -> bool:
+        """
+        提交一条Agent帖子的标注任务（不阻塞）
+
+        Returns:
+            bool: 是否成功提交（未配置LLM或找不到模板时返回False）
+        """
+        if not agent.llm_configured():
+            return False
+        try:
+            template = load_annotation_template(self.template_path)
+        except FileNotFoundError:
+            print(f"[标注] 找不到标注模板: {self.template_path}，跳过Agent {agent.agent_id}的帖子标注")
+            return False
+
+        parent_content = find_parent_content(post_json.get('pid'), all_posts_in_slice)
+        prompt = build_annotation_prompt(template, post_json.get('content', ''), parent_content)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # 提交时固定LLM配置，避免后续修改Agent属性影响进行中的请求
+        future = self._executor.submit(
+            request_annotation, prompt, agent.llm_backend, agent.simulation_id,
+            {'call_site': 'annotation', 'agent_id': agent.agent_id,
+             'time_slice': time_slice_index, 'post_id': post_json['id']}
+        )
+        self._pending.append({'post_id': post_json['id'], 'agent_id': agent.agent_id, 'future': future})
+        self.submitted_count += 1
+        print(f"[标注] Agent {agent.agent_id} 的帖子 {post_json['id']} 已加入标注队列 (待处理: {len(self._pending)})")
+        return True
+
+    @property
+    def pending_count(self) -> int:
+        """当前等待结果的标注任务数"""
+        return len(self._pending)
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """
+        等待所有标注任务完成（时间片边界调用）
+
+        Returns:
+            List[Dict[str, Any]]: [{'post_id': ..., 'agent_id': ..., 'fields': {...}}]，按提交顺序排列，
+            失败或格式无效的任务不包含在内
+        """
+        pending, self._pending = self._pending, []
+        results = []
+        for item in pending:
+            try:
+                fields = item['future'].result()
+            except BatchPendingError:
+                # 离线批处理：请求已加入待导出批次，时间片会在导入结果后重新执行
+                print(f"[标注] 帖子 {item['post_id']} 等待批处理结果")
+                continue
+            except Exception as e:
+                self.failed_count += 1
+                print(f"[标注] 帖子 {item['post_id']} LLM标注失败: {e}，保留Agent状态值")
+                continue
+            if not fields:
+                self.failed_count += 1
+                print(f"[标注] 帖子 {item['post_id']} LLM返回格式无效，保留Agent状态值")
+                continue
+            self.annotated_count += 1
+            results.append({'post_id': item['post_id'], 'agent_id': item['agent_id'], 'fields': fields})
+        if pending:
+            print(f"[标注] 时间片标注完成: 成功 {len(results)}/{len(pending)}")
+        return results
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
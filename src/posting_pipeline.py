@@ -0,0 +1,60 @@
+"""
+发帖流水线模块
+同一时间片内Agent的发帖（生成内容、标注）不影响其他Agent的阅读——新帖子只在之后的时间片进入帖子池。
+流水线把每个Agent的发帖任务放到线程池中执行，主循环立即开始下一个Agent的阅读；
+时间片边界join()等待所有任务完成，并按提交顺序（即Agent顺序）返回结果，保证写入顺序确定。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class PostingPipeline:
+    """时间片级别的发帖流水线"""
+
+    def __init__(self, max_workers: int = 4):
+        """
+        Args:
+            max_workers: 同时进行的发帖任务数
+        """
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Tuple[Any, Any]] = []
+        # 累计统计
+        self.submitted_count = 0
+        self.failed_count = 0
+
+    def submit(self, agent, task: Callable[..., Any], *args) -> None:
+        """提交一个Agent的发帖任务（不阻塞）"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='posting')
+        self._pending.append((agent, self._executor.submit(task, *args)))
+        self.submitted_count += 1
+
+    @property
+    def pending_count(self) -> int:
+        """当前未join的发帖任务数"""
+        return len(self._pending)
+
+    def join(self) -> List[Tuple[Any, Any, Optional[BaseException]]]:
+        """
+        等待所有发帖任务完成（时间片边界调用）
+
+        Returns:
+            List[Tuple]: [(agent, 任务返回值, 异常)]，按提交顺序排列；任务抛出异常时返回值为None
+        """
+        pending, self._pending = self._pending, []
+        results = []
+        for agent, future in pending:
+            try:
+                results.append((agent, future.result(), None))
+            except Exception as e:
+                self.failed_count += 1
+                results.append((agent, None, e))
+        return results
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
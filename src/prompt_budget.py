@@ -0,0 +1,153 @@
+"""
+Prompt预算模块
+按prompt类型限制token数：发帖prompt按Agent本时间片的情绪立场变化（emotion_stance_history）
+对已读帖子排序，只保留预算内影响最大的帖子；阅读prompt的对话链只保留最近的若干层父帖子。
+token数用与调度器相同的近似估算（estimate_tokens），并统计每类prompt的裁剪量。
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .llm_scheduler import estimate_tokens
+from .influence import InfluenceHistory, influence_score
+from .post import source_post_id
+
+PROMPT_POSTING = 'posting'
+PROMPT_READING = 'reading'
+
+# 每类prompt的默认token上限（None表示不限）
+DEFAULT_MAX_TOKENS = {
+    PROMPT_POSTING: 3000,
+    PROMPT_READING: 2000,
+}
+# 阅读prompt对话链默认保留的父帖子层数
+DEFAULT_MAX_CHAIN_ANCESTORS = 5
+
+
+def post_influence(history: List[Dict[str, Any]]) -> Dict[Any, float]:
+    """按post_id汇总影响分数（同一帖子多条记录取最大值）"""
+    if isinstance(history, InfluenceHistory):
+        return history.post_scores()
+    scores: Dict[Any, float] = {}
+    for record in history or []:
+        score = influence_score(record)
+        post_id = record.get('post_id')
+        if score > scores.get(post_id, -1.0):
+            scores[post_id] = score
+    return scores
+
+
+def _is_forced(post: Dict[str, Any]) -> bool:
+    """官方声明/紧急广播等强制阅读的帖子总是保留"""
+    return bool(post.get('is_official_statement') or post.get('is_hurricane') or post.get('force_read'))
+
+
+class PromptBudget:
+    """按prompt类型的token预算与裁剪统计（线程安全）"""
+
+    def __init__(self, max_tokens: Optional[Dict[str, Optional[int]]] = None,
+                 max_chain_ancestors: Optional[int] = DEFAULT_MAX_CHAIN_ANCESTORS):
+        """
+        Args:
+            max_tokens: {prompt类型: token上限}，未给出的类型使用默认值，None表示不限
+            max_chain_ancestors: 对话链保留的父帖子层数，None表示不限
+        """
+        self.max_tokens = dict(DEFAULT_MAX_TOKENS)
+        self.max_tokens.update(max_tokens or {})
+        self.max_chain_ancestors = max_chain_ancestors
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> 'PromptBudget':
+        """从仿真配置创建：{"max_tokens": {"posting": 3000, "reading": 2000}, "max_chain_ancestors": 5}"""
+        config = config or {}
+        return cls(config.get('max_tokens'), config.get('max_chain_ancestors', DEFAULT_MAX_CHAIN_ANCESTORS))
+
+    def _record(self, prompt_type: str, tokens_before: int, tokens_after: int, dropped: int):
+        with self._lock:
+            stats = self._stats.setdefault(prompt_type, {
+                'prompts': 0, 'trimmed_prompts': 0, 'tokens_before': 0, 'tokens_after': 0, 'items_dropped': 0
+            })
+            stats['prompts'] += 1
+            stats['tokens_before'] += tokens_before
+            stats['tokens_after'] += tokens_after
+            stats['items_dropped'] += dropped
+            if dropped:
+                stats['trimmed_prompts'] += 1
+
+    def select_posts(self, posts: List[Dict[str, Any]], history: List[Dict[str, Any]],
+                     reserved_tokens: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        在发帖prompt的预算内选择已读帖子
+
+        排序：强制阅读的帖子优先，其次按影响分数从高到低，分数相同时后读的优先；
+        选中的帖子保持原来的阅读顺序。
+
+        Args:
+            posts: 本时间片已读帖子（阅读顺序）
+            history: Agent的emotion_stance_history
+            reserved_tokens: prompt其余部分（模板、属性）占用的token数
+
+        Returns:
+            (选中的帖子, 丢弃的帖子数)
+        """
+        limit = self.max_tokens.get(PROMPT_POSTING)
+        costs = [estimate_tokens(post.get('content', post.get('text', ''))) for post in posts]
+        tokens_before = reserved_tokens + sum(costs)
+        if limit is None or tokens_before <= limit:
+            self._record(PROMPT_POSTING, tokens_before, tokens_before, 0)
+            return list(posts), 0
+
+        scores = post_influence(history)
+        ranked = sorted(
+            range(len(posts)),
+            key=lambda i: (not _is_forced(posts[i]), -scores.get(source_post_id(posts[i]), 0.0), -i)
+        )
+        remaining = limit - reserved_tokens
+        keep = set()
+        for i in ranked:
+            if costs[i] <= remaining:
+                keep.add(i)
+                remaining -= costs[i]
+        selected = [post for i, post in enumerate(posts) if i in keep]
+        dropped = len(posts) - len(selected)
+        self._record(PROMPT_POSTING, tokens_before, reserved_tokens + sum(costs[i] for i in keep), dropped)
+        return selected, dropped
+
+    def trim_chain(self, chain: List[Dict[str, Any]], reserved_tokens: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        裁剪阅读prompt的对话链：只保留最近的max_chain_ancestors层父帖子，
+        仍超出预算时继续从最早的父帖子开始丢弃（当前帖子总是保留）
+
+        Args:
+            chain: 父->子顺序的帖子链，最后一个是当前帖子
+            reserved_tokens: prompt其余部分占用的token数
+
+        Returns:
+            (裁剪后的帖子链, 丢弃的父帖子数)
+        """
+        limit = self.max_tokens.get(PROMPT_READING)
+        costs = [estimate_tokens(post.get('text', post.get('content', ''))) for post in chain]
+        tokens_before = reserved_tokens + sum(costs)
+
+        start = 0
+        if self.max_chain_ancestors is not None:
+            start = max(0, len(chain) - 1 - self.max_chain_ancestors)
+        tokens_after = reserved_tokens + sum(costs[start:])
+        if limit is not None:
+            while start < len(chain) - 1 and tokens_after > limit:
+                tokens_after -= costs[start]
+                start += 1
+
+        self._record(PROMPT_READING, tokens_before, tokens_after, start)
+        return chain[start:], start
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回每类prompt的裁剪统计"""
+        with self._lock:
+            return {
+                'max_tokens': dict(self.max_tokens),
+                'max_chain_ancestors': self.max_chain_ancestors,
+                'by_type': {prompt_type: dict(stats) for prompt_type, stats in self._stats.items()},
+            }
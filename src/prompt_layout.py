@@ -0,0 +1,104 @@
+"""
+Prompt布局模块
+上游的前缀缓存只对逐字节相同的开头生效。模板按markdown标题切分成段落，
+不含变量的说明段落保持原顺序放在最前面，含Agent状态/帖子内容的段落移到末尾，
+这样同一模板生成的所有prompt共享同一段静态前缀。
+PrefixReuseTracker按调用点统计相邻两次prompt的公共前缀长度，用于衡量前缀复用程度。
+"""
+
+import os
+import re
+import string
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+from .llm_scheduler import estimate_tokens
+
+_HEADING_PATTERN = re.compile(r'^#{1,6} ', re.MULTILINE)
+
+
+def split_sections(template: str) -> List[str]:
+    """按markdown标题行切分模板（第一个标题之前的内容单独成段），拼接后与原文相同"""
+    starts = [m.start() for m in _HEADING_PATTERN.finditer(template)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return [template[start:end] for start, end in zip(starts, starts[1:] + [len(template)])]
+
+
+def has_format_fields(text: str) -> bool:
+    """段落中是否包含str.format占位符（{{和}}转义的花括号不算）"""
+    try:
+        return any(field_name is not None for _, field_name, _, _ in string.Formatter().parse(text))
+    except ValueError:
+        return False
+
+
+def stable_layout(template: str, is_variable: Callable[[str], bool]) -> str:
+    """
+    把静态段落放在前面、变量段落放在末尾（两组内部各自保持原顺序）
+
+    Args:
+        template: prompt模板
+        is_variable: 判断段落是否包含变量内容
+    """
+    static_sections = []
+    variable_sections = []
+    for section in split_sections(template):
+        if not section.endswith('\n'):
+            section += '\n'
+        (variable_sections if is_variable(section) else static_sections).append(section)
+    return ''.join(static_sections + variable_sections)
+
+
+@lru_cache(maxsize=32)
+def stable_format_template(template: str) -> str:
+    """str.format模板的稳定前缀布局（含占位符的段落移到末尾）"""
+    return stable_layout(template, has_format_fields)
+
+
+@lru_cache(maxsize=32)
+def stable_marker_template(template: str, markers: Tuple[str, ...]) -> str:
+    """文本替换模板的稳定前缀布局（包含任一替换标记的段落移到末尾）"""
+    return stable_layout(template, lambda section: any(marker in section for marker in markers))
+
+
+class PrefixReuseTracker:
+    """按调用点统计相邻两次上游请求的公共前缀（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_prompt: Dict[str, str] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def observe(self, call_site: str, prompt: str) -> int:
+        """
+        记录一次请求的prompt
+
+        Returns:
+            int: 与同一调用点上一次prompt的公共前缀字符数
+        """
+        with self._lock:
+            previous = self._last_prompt.get(call_site)
+            self._last_prompt[call_site] = prompt
+        shared = len(os.path.commonprefix([previous, prompt])) if previous else 0
+        shared_tokens = estimate_tokens(prompt[:shared]) if shared else 0
+        with self._lock:
+            stats = self._stats.setdefault(call_site, {
+                'prompts': 0, 'prompt_tokens': 0, 'shared_prefix_tokens': 0
+            })
+            stats['prompts'] += 1
+            stats['prompt_tokens'] += estimate_tokens(prompt)
+            stats['shared_prefix_tokens'] += shared_tokens
+        return shared
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回每个调用点的前缀复用统计（reuse_ratio为公共前缀token占prompt token的比例）"""
+        with self._lock:
+            return {
+                call_site: {
+                    **stats,
+                    'reuse_ratio': stats['shared_prefix_tokens'] / stats['prompt_tokens'] if stats['prompt_tokens'] else 0.0,
+                }
+                for call_site, stats in self._stats.items()
+            }
@@ -4,6 +4,7 @@ from typing import Dict, List, Any
 from pathlib import Path
 import re
 from src.agent import Agent, RoleType
+from src.aggregates import PostAggregates
 
 
 class DataLoader:
@@ -106,6 +107,9 @@ class DataLoader:
             raise Exception(f"读取Agent配置时发生错误: {str(e)}") 
 
 
+_END = object()
+
+
 def flatten_posts_recursive(posts, parent_id=None, level=0):
     """
     递归展开所有嵌套的帖子，返回扁平化列表
@@ -124,88 +128,49 @@ def flatten_posts_recursive(posts, parent_id=None, level=0):
             ))
     return flattened_posts
 
+def iter_flattened_posts(posts, parent_id=None, level=0):
+    """
+    逐条生成展开后的帖子（顺序和字段与flatten_posts_recursive相同，不构造整个列表，供流式读取使用）
+    """
+    stack = [(iter(posts), parent_id, level)]
+    while stack:
+        siblings, sibling_parent_id, sibling_level = stack[-1]
+        post = next(siblings, _END)
+        if post is _END:
+            stack.pop()
+            continue
+        post = dict(post)  # 避免修改原始数据
+        post['parent_post_id'] = sibling_parent_id
+        post['nesting_level'] = sibling_level
+        yield post
+        if 'children' in post and post['children']:
+            stack.append((iter(post['children']), post.get('pid', post.get('mid', post.get('id'))), sibling_level + 1))
+
+def is_valid_post(post):
+    """
+    帖子是否有效（popularity>0且关键字段不为None）
+    """
+    if post.get('popularity', 0) <= 0:
+        return False
+    if (post.get('emotion_score') is None or
+        post.get('stance_score') is None or
+        post.get('information_strength') is None):
+        return False
+    return True
+
 def filter_valid_posts(posts):
     """
     过滤有效的帖子（popularity>0且关键字段不为None）
     """
-    valid_posts = []
-    for post in posts:
-        if post.get('popularity', 0) <= 0:
-            continue
-        if (post.get('emotion_score') is None or
-            post.get('stance_score') is None or
-            post.get('information_strength') is None):
-            continue
-        valid_posts.append(post)
-    return valid_posts 
+    return [post for post in posts if is_valid_post(post)]
 
 
 def calculate_environmental_summary(posts_in_slice: list) -> dict:
     """
     统计时间片内所有帖子，输出结构化环境摘要，字段和语义严格遵循promptdataprocess.txt定义。
+    （统计由PostAggregates完成，需要逐条加入帖子时直接使用PostAggregates）
     """
-    if not posts_in_slice:
-        return {}
-
-    total_posts = len(posts_in_slice)
-    stance_category_counts = {}
-    emotion_category_counts = {}
-    stance_score_sum = 0.0
-    emotion_score_sum = 0.0
-    stance_confidence_sum = 0.0
-    information_strength_sum = 0.0
-
-    valid_stance_score_count = 0
-    valid_emotion_score_count = 0
-    valid_stance_confidence_count = 0
-    valid_information_strength_count = 0
-
-    for post in posts_in_slice:
-        # 立场类别统计
-        sc = post.get("stance_category")
-        if sc:
-            stance_category_counts[sc] = stance_category_counts.get(sc, 0) + 1
-
-        # 情绪类别统计
-        ec = post.get("emotion_category")
-        if ec:
-            emotion_category_counts[ec] = emotion_category_counts.get(ec, 0) + 1
-
-        # 均值统计
-        ss = post.get("stance_score")
-        if ss is not None:
-            stance_score_sum += ss
-            valid_stance_score_count += 1
-
-        es = post.get("emotion_score")
-        if es is not None:
-            emotion_score_sum += es
-            valid_emotion_score_count += 1
-
-        scf = post.get("stance_confidence")
-        if scf is not None:
-            stance_confidence_sum += scf
-            valid_stance_confidence_count += 1
-
-        isf = post.get("information_strength")
-        if isf is not None:
-            information_strength_sum += isf
-            valid_information_strength_count += 1
-
-    # 归一化分布
-    stance_distribution = {k: v / total_posts for k, v in stance_category_counts.items()}
-    emotion_distribution = {k: v / total_posts for k, v in emotion_category_counts.items()}
-
-    summary = {
-        "total_posts_in_slice": total_posts,
-        "stance_distribution": stance_distribution,
-        "average_stance_score": stance_score_sum / valid_stance_score_count if valid_stance_score_count else 0.0,
-        "average_stance_confidence": stance_confidence_sum / valid_stance_confidence_count if valid_stance_confidence_count else 0.0,
-        "emotion_distribution": emotion_distribution,
-        "average_emotion_score": emotion_score_sum / valid_emotion_score_count if valid_emotion_score_count else 0.0,
-        "average_information_strength": information_strength_sum / valid_information_strength_count if valid_information_strength_count else 0.0,
-    }
-    return summary 
+    return PostAggregates(posts_in_slice).summary()
 
 
 def extract_chain(mid_index, target_mid):
@@ -0,0 +1,74 @@
+"""
+时间片上下文模块
+只依赖时间片帖子的数据（飓风/普通帖子划分、热度归一化范围、最新时间戳、mid索引、环境摘要）
+由SimulationEngine在每个时间片开始时计算一次，供所有Agent共享；时间片结束时失效。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from .aggregates import PostAggregates
+from .time_manager import parse_timestamp
+
+
+def is_forced_broadcast(post: Dict[str, Any]) -> bool:
+    """飓风消息/强制阅读/最高优先级事件：绕过个性化Feed，所有Agent必读"""
+    return bool(post.get('is_hurricane', False) or
+                post.get('force_read', False) or
+                (post.get('is_event', False) and post.get('priority', 0) >= 999))
+
+
+def _latest_timestamp(posts: List[Dict[str, Any]]):
+    timestamps = [p.get('timestamp') for p in posts if p.get('timestamp')]
+    try:
+        return max(timestamps, default=None)
+    except TypeError:
+        # 动态帖子池中Agent帖子为数字时间戳，语料帖子可能为ISO字符串：按解析后的时间比较
+        return max(timestamps, key=parse_timestamp)
+
+
+def _popularity_range(posts: List[Dict[str, Any]]) -> Tuple[float, float]:
+    pops = [post.get('popularity', 0) for post in posts]
+    pop_min = min(pops) if pops else 0
+    pop_max = max(pops) if pops else 1
+    return pop_min, max(1e-6, pop_max - pop_min)
+
+
+def _build_mid_index(posts: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+    """mid -> 帖子（包含嵌套的children）"""
+    mid_index = {}
+    stack = list(reversed(posts))
+    while stack:
+        post = stack.pop()
+        mid_index[post.get('mid', post.get('id'))] = post
+        if 'children' in post:
+            stack.extend(reversed(post['children']))
+    return mid_index
+
+
+class SliceContext:
+    """一个时间片内所有Agent共享的预计算数据（只读）"""
+
+    def __init__(self, slice_index: Optional[int], posts: List[Dict[str, Any]]):
+        """
+        Args:
+            slice_index: 时间片索引
+            posts: 时间片帖子（含注入的官方声明）
+        """
+        self.slice_index = slice_index
+        self.posts = posts
+        # 飓风消息（强制广播）与进入个性化Feed的普通帖子
+        self.hurricane_posts = [post for post in posts if is_forced_broadcast(post)]
+        self.normal_posts = [post for post in posts if not is_forced_broadcast(post)]
+        # 普通帖子的热度归一化参数 (pop_min, pop_range)
+        self.popularity_range = _popularity_range(self.normal_posts)
+        # 新帖子时间戳的基准
+        self.latest_timestamp = _latest_timestamp(posts)
+        # 对话链提取使用的mid索引
+        self.mid_index = _build_mid_index(posts)
+        # 意见领袖发帖prompt使用的环境摘要（与services.calculate_environmental_summary一致）
+        self.post_aggregates = PostAggregates(posts)
+        self.env_summary = self.post_aggregates.summary()
+
+    def __repr__(self):
+        return (f"SliceContext(slice={self.slice_index}, posts={len(self.posts)}, "
+                f"hurricane={len(self.hurricane_posts)})")
@@ -0,0 +1,244 @@
+"""
+社交关系图模块
+Agent关注的作者（agent -> author）以压缩稀疏行（CSR）存储：
+  indices[indptr[i]:indptr[i+1]] 是第i个Agent关注的作者下标（升序，int32）
+可从CSV（agent_id,author_id两列）或JSON（边列表或{agent_id: [author_id, ...]}）加载，也可按作者热度合成。
+启用后个性化Feed只对关注作者的帖子和全局热门样本打分，
+每个时间片的打分量从 O(Agent数 × 帖子数) 降为 O(关注边数 + 候选帖子数)。
+"""
+
+import csv
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 每个时间片所有Agent都能看到的全局热门帖子数
+DEFAULT_TRENDING_SAMPLE = 10
+# 合成关系图时每个Agent平均关注的作者数
+DEFAULT_AVG_FOLLOWING = 20
+
+
+def post_author(post: Dict[str, Any]) -> Optional[str]:
+    """帖子作者ID（依次取author_id、uid、user_id，统一为字符串）"""
+    for key in ('author_id', 'uid', 'user_id'):
+        value = post.get(key)
+        if value is not None:
+            return str(value)
+    return None
+
+
+class SocialGraph:
+    """Agent -> 作者的关注关系（CSR邻接表）"""
+
+    def __init__(self, agent_ids: Sequence[str], author_ids: Sequence[str], indptr, indices):
+        """
+        Args:
+            agent_ids: 行对应的Agent ID
+            author_ids: 列对应的作者ID
+            indptr: 行指针，长度为Agent数+1
+            indices: 列下标（每行内升序）
+
+        Raises:
+            ValueError: 当CSR数组形状不一致时
+        """
+        self.agent_ids = [str(a) for a in agent_ids]
+        self.author_ids = [str(a) for a in author_ids]
+        self._agent_index = {agent_id: i for i, agent_id in enumerate(self.agent_ids)}
+        self._author_index = {author_id: i for i, author_id in enumerate(self.author_ids)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        if len(self.indptr) != len(self.agent_ids) + 1 or self.indptr[-1] != len(self.indices):
+            raise ValueError("关系图的行指针与Agent数或边数不一致")
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[Any, Any]]) -> 'SocialGraph':
+        """由(agent_id, author_id)边创建（重复的边只保留一条）"""
+        agent_index: Dict[str, int] = {}
+        author_index: Dict[str, int] = {}
+        rows, cols = [], []
+        for agent_id, author_id in edges:
+            rows.append(agent_index.setdefault(str(agent_id), len(agent_index)))
+            cols.append(author_index.setdefault(str(author_id), len(author_index)))
+        return cls._from_coo(list(agent_index), list(author_index), rows, cols)
+
+    @classmethod
+    def _from_coo(cls, agent_ids: List[str], author_ids: List[str], rows, cols) -> 'SocialGraph':
+        n_agents, n_authors = len(agent_ids), len(author_ids)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        if len(rows):
+            # 按(行, 列)排序并去重
+            keys = np.unique(rows * n_authors + cols)
+            rows, cols = keys // n_authors, keys % n_authors
+        indptr = np.zeros(n_agents + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_agents), out=indptr[1:])
+        return cls(agent_ids, author_ids, indptr, cols.astype(np.int32))
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'SocialGraph':
+        """
+        从CSV加载（表头包含agent_id和author_id两列）
+
+        Raises:
+            ValueError: 当缺少agent_id或author_id列时
+        """
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            if not {'agent_id', 'author_id'} <= set(reader.fieldnames or []):
+                raise ValueError("关系图CSV必须包含agent_id和author_id列")
+            return cls.from_edges((row['agent_id'], row['author_id']) for row in reader
+                                  if row['agent_id'] and row['author_id'])
+
+    @classmethod
+    def from_json(cls, path: str) -> 'SocialGraph':
+        """
+        从JSON加载：{agent_id: [author_id, ...]}，或边列表（[agent_id, author_id]或{"agent_id", "author_id"}）
+
+        Raises:
+            ValueError: 当JSON格式不符合上述任一形式时
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return cls.from_edges((agent_id, author_id)
+                                  for agent_id, author_ids in data.items() for author_id in author_ids)
+        if isinstance(data, list):
+            return cls.from_edges((edge['agent_id'], edge['author_id']) if isinstance(edge, dict) else tuple(edge)
+                                  for edge in data)
+        raise ValueError("关系图JSON必须是对象或边列表")
+
+    @classmethod
+    def load(cls, path: str) -> 'SocialGraph':
+        """
+        按扩展名加载CSV或JSON关系图
+
+        Raises:
+            ValueError: 当扩展名不是.csv或.json时
+        """
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.csv':
+            return cls.from_csv(path)
+        if ext == '.json':
+            return cls.from_json(path)
+        raise ValueError(f"不支持的关系图文件格式: {path}")
+
+    @classmethod
+    def synthetic(cls, agent_ids: Sequence[str], author_weights: Dict[str, float],
+                  avg_following: float = DEFAULT_AVG_FOLLOWING, seed: int = 0,
+                  popularity_exponent: float = 1.0) -> 'SocialGraph':
+        """
+        合成关系图：每个Agent关注的作者数服从泊松分布（至少1个），
+        被关注概率与作者热度的popularity_exponent次方成正比（热门作者粉丝多）。
+        使用独立的随机数生成器，不影响仿真的全局随机序列。
+
+        Args:
+            agent_ids: Agent ID列表
+            author_weights: 作者ID -> 热度（如语料中该作者帖子的popularity之和）
+            avg_following: 平均关注作者数
+            seed: 随机种子
+            popularity_exponent: 热度指数，0表示均匀关注
+        """
+        author_ids = list(author_weights)
+        n_authors = len(author_ids)
+        rng = np.random.default_rng(seed)
+        weights = np.maximum(np.asarray([author_weights[a] for a in author_ids], dtype=np.float64), 0.0)
+        weights = weights ** popularity_exponent if n_authors else weights
+        total = weights.sum()
+        p = weights / total if total > 0 else None
+        rows, cols = [], []
+        if n_authors:
+            # 热度为0的作者不会被抽中，关注数不超过可抽中的作者数
+            max_degree = int(np.count_nonzero(weights)) if p is not None else n_authors
+            for row in range(len(agent_ids)):
+                degree = int(min(max(rng.poisson(avg_following), 1), max_degree))
+                rows.extend([row] * degree)
+                cols.extend(rng.choice(n_authors, size=degree, replace=False, p=p).tolist())
+        return cls._from_coo([str(a) for a in agent_ids], author_ids, rows, cols)
+
+    def save_csv(self, path: str):
+        """保存为agent_id,author_id两列的CSV（可用from_csv重新加载）"""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['agent_id', 'author_id'])
+            for row, agent_id in enumerate(self.agent_ids):
+                for col in self.indices[self.indptr[row]:self.indptr[row + 1]]:
+                    writer.writerow([agent_id, self.author_ids[col]])
+
+    def following(self, agent_id: str) -> np.ndarray:
+        """Agent关注的作者下标（升序；不在图中的Agent返回空数组）"""
+        row = self._agent_index.get(str(agent_id))
+        if row is None:
+            return self.indices[:0]
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def follows(self, agent_id: str, author_id: str) -> bool:
+        """Agent是否关注了该作者"""
+        col = self._author_index.get(str(author_id))
+        if col is None:
+            return False
+        row = self.following(agent_id)
+        pos = int(np.searchsorted(row, col))
+        return pos < len(row) and row[pos] == col
+
+    def author_index(self, author_id: Optional[str]) -> int:
+        """作者下标（不在图中时为-1）"""
+        if author_id is None:
+            return -1
+        return self._author_index.get(author_id, -1)
+
+    @property
+    def num_agents(self) -> int:
+        return len(self.agent_ids)
+
+    @property
+    def num_authors(self) -> int:
+        return len(self.author_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    def exposure(self, posts: Sequence[Dict[str, Any]], trending_sample: int = DEFAULT_TRENDING_SAMPLE) -> 'SliceExposure':
+        """为一个时间片的帖子构建按关注关系的候选索引"""
+        return SliceExposure(self, posts, trending_sample)
+
+    def __repr__(self):
+        return f"SocialGraph(agents={self.num_agents}, authors={self.num_authors}, edges={self.num_edges})"
+
+
+class SliceExposure:
+    """
+    一个时间片内各Agent可见的候选帖子（时间片开始时构建一次，所有Agent共享）
+
+    帖子按作者下标分组；Agent的候选帖子为其关注作者在本时间片的帖子
+    加上热度最高的trending_sample条帖子，按帖子在时间片中的原顺序返回。
+    """
+
+    def __init__(self, graph: SocialGraph, posts: Sequence[Dict[str, Any]], trending_sample: int):
+        self.graph = graph
+        self.total_posts = len(posts)
+        authors = np.fromiter((graph.author_index(post_author(post)) for post in posts),
+                              dtype=np.int64, count=len(posts))
+        # 已知作者的帖子位置按作者下标排序（稳定排序，组内保持时间片顺序）
+        known = np.flatnonzero(authors >= 0)
+        self._positions = known[np.argsort(authors[known], kind='stable')]
+        sorted_authors = authors[self._positions]
+        self._authors, self._starts = np.unique(sorted_authors, return_index=True)
+        self._ends = np.append(self._starts[1:], len(sorted_authors)).astype(np.int64)
+        # 全局热门样本：热度最高的帖子（热度相同时取时间片中靠前的）
+        pops = np.fromiter(((post.get('popularity') or 0) for post in posts), dtype=np.float64, count=len(posts))
+        self.trending = np.sort(np.argsort(-pops, kind='stable')[:max(0, trending_sample)])
+
+    def candidates(self, agent_id: str) -> List[int]:
+        """Agent的候选帖子在时间片中的位置（升序）"""
+        common = np.intersect1d(self.graph.following(agent_id), self._authors, assume_unique=True)
+        groups = np.searchsorted(self._authors, common)
+        parts = [self._positions[self._starts[g]:self._ends[g]] for g in groups.tolist()]
+        parts.append(self.trending)
+        return np.unique(np.concatenate(parts)).tolist()
+
+    def __repr__(self):
+        return (f"SliceExposure(posts={self.total_posts}, authors={len(self._authors)}, "
+                f"trending={len(self.trending)})")
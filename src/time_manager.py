@@ -1,93 +1,318 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from bisect import bisect_left
+from collections.abc import Sequence
 from datetime import datetime
 
 
-class TimeSliceManager:
+def parse_timestamp(value: Any) -> float:
+    """
+    把帖子时间戳解析为epoch秒。
+
+    支持数字时间戳（10位秒或13位毫秒，允许数字字符串）和ISO格式字符串
+    （末尾的Z按UTC处理，不带时区的按本地时间处理，与build_post_json一致）。
+
+    Args:
+        value: 帖子的timestamp字段
+
+    Returns:
+        float: epoch秒
+
+    Raises:
+        ValueError: 当时间戳无法解析时
+    """
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        ts = float(value)
+    else:
+        text = str(value).strip()
+        try:
+            ts = float(text)
+        except ValueError:
+            if text.endswith('Z'):
+                text = text[:-1] + '+00:00'
+            try:
+                return datetime.fromisoformat(text).timestamp()
+            except ValueError:
+                raise ValueError(f"无法解析的时间戳: {value!r}")
+    # 13位毫秒时间戳转秒
+    return ts / 1000 if ts > 1e12 else ts
+
+
+def _format_epoch(epoch: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(epoch).isoformat() if epoch is not None else None
+
+
+class PostSliceView(Sequence):
+    """
+    已排序帖子列表上一个时间片的只读视图。
+
+    不复制帖子列表，按需索引和迭代；需要修改（如注入官方声明）时先用list()转为列表。
+    """
+
+    __slots__ = ('_posts', '_start', '_stop')
+
+    def __init__(self, posts: List[Dict[str, Any]], start: int, stop: int):
+        self._posts = posts
+        self._start = start
+        self._stop = stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return PostSliceView(self._posts, self._start + start, self._start + max(start, stop))
+            return [self._posts[self._start + i] for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("时间片索引超出范围")
+        return self._posts[self._start + index]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        posts = self._posts
+        for i in range(self._start, self._stop):
+            yield posts[i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (PostSliceView, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"PostSliceView([{self._start}:{self._stop}])"
+
+
+class TimeSlicing:
+    """
+    已排序时间戳上的时间片划分（TimeSliceManager和磁盘时间片文件共用）。
+
+    子类设置self._epochs（按时间升序的epoch秒序列，支持下标访问）后调用_init_slicing。
+    支持两种划分方式：按帖子数量（每个时间片slice_size条帖子），
+    或按时间窗口（从最早的帖子开始，每slice_duration秒一个时间片，
+    没有帖子的时间窗口也是一个时间片），时间窗口的边界用二分查找定位（O(log n)）。
+    """
+
+    @staticmethod
+    def _validate_slicing(slice_size: Optional[int], slice_duration: Optional[float]):
+        """
+        Raises:
+            ValueError: 当slice_size/slice_duration小于等于0或都未给出时
+        """
+        if slice_duration is not None:
+            if slice_duration <= 0:
+                raise ValueError("时间片时长必须大于0")
+        elif slice_size is None or slice_size <= 0:
+            raise ValueError("时间片大小必须大于0")
+
+    def _init_slicing(self, slice_size: Optional[int], slice_duration: Optional[float]):
+        self._validate_slicing(slice_size, slice_duration)
+        self._slice_size = slice_size
+        self._slice_duration = float(slice_duration) if slice_duration is not None else None
+
+        # 计算总时间片数
+        total_posts = len(self._epochs)
+        if self._slice_duration is not None:
+            if total_posts:
+                self._total_slices = int((self._epochs[total_posts - 1] - self._epochs[0]) // self._slice_duration) + 1
+            else:
+                self._total_slices = 0
+        else:
+            self._total_slices = (total_posts + slice_size - 1) // slice_size
+
+    def _check_index(self, slice_index: int):
+        if slice_index < 0 or slice_index >= self._total_slices:
+            raise IndexError(f"时间片索引 {slice_index} 超出范围 (0-{self._total_slices - 1})")
+
+    def _lower_bound(self, epoch: float, lo: int = 0) -> int:
+        """第一个时间不早于epoch的帖子下标（子类可按_epochs的类型替换查找方式）"""
+        return bisect_left(self._epochs, epoch, lo)
+
+    def _window(self, slice_index: int) -> Tuple[float, float]:
+        """时间窗口模式下时间片的[开始, 结束)时间（epoch秒）"""
+        start = self._epochs[0] + slice_index * self._slice_duration
+        return start, start + self._slice_duration
+
+    def slice_bounds(self, slice_index: int) -> Tuple[int, int]:
+        """
+        获取时间片在已排序帖子中的[开始, 结束)下标。
+
+        Args:
+            slice_index (int): 时间片索引，从0开始
+
+        Returns:
+            Tuple[int, int]: (开始下标, 结束下标)
+
+        Raises:
+            IndexError: 当slice_index超出范围时
+        """
+        self._check_index(slice_index)
+        if self._slice_duration is not None:
+            window_start, window_end = self._window(slice_index)
+            start_index = self._lower_bound(window_start)
+            # 最后一个时间片包含最晚的帖子（避免浮点误差把它划到范围外）
+            if slice_index == self._total_slices - 1:
+                return start_index, len(self._epochs)
+            return start_index, self._lower_bound(window_end, start_index)
+        start_index = slice_index * self._slice_size
+        return start_index, min(start_index + self._slice_size, len(self._epochs))
+
+    def slice_info(self, slice_index: int) -> Dict[str, Any]:
+        """
+        获取时间片的实际时间范围和帖子数量。
+
+        时间窗口模式下为窗口边界；按数量划分时为时间片内最早和最晚帖子的时间。
+
+        Args:
+            slice_index (int): 时间片索引，从0开始
+
+        Returns:
+            Dict[str, Any]: {"index", "start_time", "end_time", "post_count"}，时间为ISO格式字符串
+        """
+        start_index, end_index = self.slice_bounds(slice_index)
+        if self._slice_duration is not None:
+            window_start, window_end = self._window(slice_index)
+        elif end_index > start_index:
+            window_start, window_end = self._epochs[start_index], self._epochs[end_index - 1]
+        else:
+            window_start = window_end = None
+        return {
+            "index": slice_index,
+            "start_time": _format_epoch(window_start),
+            "end_time": _format_epoch(window_end),
+            "post_count": end_index - start_index
+        }
+
+    @property
+    def slice_duration(self) -> Optional[float]:
+        """
+        获取时间片时长（秒），按数量划分时为None。
+
+        Returns:
+            Optional[float]: 时间片时长
+        """
+        return self._slice_duration
+
+    @property
+    def total_slices(self) -> int:
+        """
+        获取总时间片数量。
+
+        Returns:
+            int: 总时间片数量
+        """
+        return self._total_slices
+
+    @property
+    def total_posts(self) -> int:
+        """
+        获取总帖子数量。
+
+        Returns:
+            int: 总帖子数量
+        """
+        return len(self._epochs)
+
+
+class TimeSliceManager(TimeSlicing):
     """
     时间片管理器类，负责将帖子按时间戳排序并划分为时间片。
-    
-    该类接收一个帖子列表和每个时间片的帖子数量，将帖子按时间戳排序后
-    划分为多个时间片，提供获取指定时间片的功能。
+
+    按帖子数量或时间窗口划分（见TimeSlicing）。时间戳在初始化时统一解析为
+    epoch秒并排序；get_slice返回已排序列表上的只读视图，不复制帖子。
     """
-    
-    def __init__(self, posts: List[Dict[str, Any]], slice_size: int):
+
+    def __init__(self, posts: List[Dict[str, Any]], slice_size: Optional[int] = None,
+                 slice_duration: Optional[float] = None):
         """
         初始化时间片管理器。
-        
+
         Args:
             posts (List[Dict[str, Any]]): 帖子列表，每个帖子应包含timestamp字段
             slice_size (int): 每个时间片包含的帖子数量
-            
+            slice_duration (float): 每个时间片的时长（秒），给出时按时间窗口划分，忽略slice_size
+
         Raises:
-            ValueError: 当slice_size小于等于0时
+            ValueError: 当slice_size/slice_duration小于等于0、都未给出，或时间戳无法解析时
             KeyError: 当帖子缺少timestamp字段时
         """
-        if slice_size <= 0:
-            raise ValueError("时间片大小必须大于0")
-        
+        self._validate_slicing(slice_size, slice_duration)
+
         # 验证所有帖子都有timestamp字段（支持t和timestamp）
         for i, post in enumerate(posts):
             if 'timestamp' not in post and 't' not in post:
                 raise KeyError(f"帖子 {i} 缺少timestamp字段")
-        
+
         # 只保留popularity（或heat）大于0的帖子
         valid_posts = [post for post in posts if post.get('popularity', post.get('heat', 0)) > 0]
         # 标准化timestamp字段（支持t和timestamp）
         for post in valid_posts:
             if 'timestamp' not in post and 't' in post:
                 post['timestamp'] = post['t']
-        self._posts = sorted(valid_posts, key=lambda x: x['timestamp'])
-        self._slice_size = slice_size
-        
-        # 计算总时间片数
-        self._total_slices = (len(self._posts) + slice_size - 1) // slice_size
-    
-    def get_slice(self, slice_index: int) -> List[Dict[str, Any]]:
+        # 时间戳只解析一次，数字时间戳和ISO字符串混用时也按实际时间排序（稳定排序）
+        epochs = [parse_timestamp(post['timestamp']) for post in valid_posts]
+        order = sorted(range(len(valid_posts)), key=epochs.__getitem__)
+        self._posts = [valid_posts[i] for i in order]
+        self._epochs = [epochs[i] for i in order]
+        self._init_slicing(slice_size, slice_duration)
+
+    @classmethod
+    def from_sorted(cls, posts: List[Dict[str, Any]], epochs: List[float], slice_size: Optional[int] = None,
+                    slice_duration: Optional[float] = None) -> 'TimeSliceManager':
         """
-        获取指定索引的时间片。
-        
+        用已过滤、已排序的帖子及其epoch秒创建时间片管理器（语料缓存加载时使用，跳过解析和排序）。
+
         Args:
-            slice_index (int): 时间片索引，从0开始
-            
+            posts (List[Dict[str, Any]]): 按时间排序的有效帖子
+            epochs (List[float]): 与posts对应的epoch秒
+            slice_size (int): 每个时间片包含的帖子数量
+            slice_duration (float): 每个时间片的时长（秒）
+
         Returns:
-            List[Dict[str, Any]]: 指定时间片的帖子列表
-            
-        Raises:
-            IndexError: 当slice_index超出范围时
+            TimeSliceManager: 时间片管理器
         """
-        if slice_index < 0 or slice_index >= self._total_slices:
-            raise IndexError(f"时间片索引 {slice_index} 超出范围 (0-{self._total_slices - 1})")
-        
-        start_index = slice_index * self._slice_size
-        end_index = min(start_index + self._slice_size, len(self._posts))
-        
-        return self._posts[start_index:end_index]
-    
+        if len(posts) != len(epochs):
+            raise ValueError("帖子数量与时间戳数量不一致")
+        manager = cls.__new__(cls)
+        manager._posts = posts
+        manager._epochs = epochs
+        manager._init_slicing(slice_size, slice_duration)
+        return manager
+
     @property
-    def total_slices(self) -> int:
+    def epochs(self) -> List[float]:
         """
-        获取总时间片数量。
-        
+        获取已排序帖子的epoch秒。
+
         Returns:
-            int: 总时间片数量
+            List[float]: 与get_all_posts顺序对应的epoch秒
         """
-        return self._total_slices
-    
-    @property
-    def total_posts(self) -> int:
+        return self._epochs
+
+    def get_slice(self, slice_index: int) -> PostSliceView:
         """
-        获取总帖子数量。
-        
+        获取指定索引的时间片。
+
+        Args:
+            slice_index (int): 时间片索引，从0开始
+
         Returns:
-            int: 总帖子数量
+            PostSliceView: 指定时间片的帖子（只读视图）
+
+        Raises:
+            IndexError: 当slice_index超出范围时
         """
-        return len(self._posts)
-    
+        start_index, end_index = self.slice_bounds(slice_index)
+        return PostSliceView(self._posts, start_index, end_index)
+
     def get_all_posts(self) -> List[Dict[str, Any]]:
         """
         获取所有已排序的帖子。
-        
+
         Returns:
-            List[Dict[str, Any]]: 按时间戳排序的所有帖子
+            List[Dict[str, Any]]: 按时间戳排序的所有帖子（副本，只读遍历请用get_slice）
         """
-        return self._posts.copy()
\ No newline at end of file
+        return self._posts.copy()
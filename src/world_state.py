@@ -1,14 +1,15 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime
-import uuid
 import re
 
+from .post import Post, as_post
+
 
 class WorldState:
     """
     世界状态管理器，负责维护动态帖子池和全局事件注入。
     
-    帖子数据结构（符合标准定义）：
+    帖子以Post记录保存（规范字段如下，其他原始字段保存在extra中，支持按dict访问）：
     {
         "post_id": str,                    # 帖子唯一标识符
         "author_id": str,                  # 作者ID
@@ -27,7 +28,9 @@ class WorldState:
     
     def __init__(self):
         """初始化世界状态管理器"""
-        self.posts_pool: List[Dict[str, Any]] = []
+        self.posts_pool: List[Post] = []
+        # post_id -> 帖子对象，用于按ID回写
+        self._post_index: Dict[str, Post] = {}
     
     def _extract_hashtags(self, content: str) -> List[str]:
         """
@@ -44,9 +47,9 @@ class WorldState:
         hashtags = re.findall(hashtag_pattern, content)
         return hashtags
     
-    def normalize_post(self, post):
+    def normalize_post(self, post) -> Post:
         """
-        统一标准化post对象的字段名，转换为标准属性定义。
+        统一标准化post对象的字段名，转换为标准属性定义（Post记录，别名只在这里解析一次）。
         主要兼容以下字段：
         - 'id'/'mid' → 'post_id'：帖子ID
         - 'author_id'/'uid'：作者ID
@@ -58,64 +61,7 @@ class WorldState:
         - 'parent_post_id'/'pid'：父帖ID
         - 'keywords'：关键词列表
         """
-        std = dict(post)  # 拷贝，避免原数据被修改
-        
-        # 兼容post_id字段
-        if 'post_id' not in std:
-            if 'id' in std:
-                std['post_id'] = std['id']
-            elif 'mid' in std:
-                std['post_id'] = std['mid']
-            else:
-                std['post_id'] = str(std.get('uid', '')) + '_' + str(std.get('t', ''))
-        
-        # 兼容author_id/uid
-        if 'author_id' not in std and 'uid' in std:
-            std['author_id'] = std['uid']
-        
-        # 兼容content/text
-        if 'content' not in std and 'text' in std:
-            std['content'] = std['text']
-        elif 'content' not in std:
-            std['content'] = ''
-        
-        # 兼容timestamp/t
-        if 'timestamp' not in std and 't' in std:
-            std['timestamp'] = std['t']
-        
-        # 兼容parent_post_id/pid
-        if 'parent_post_id' not in std and 'pid' in std:
-            std['parent_post_id'] = std['pid']
-        
-        # 设置默认值
-        std.setdefault('emotion_score', 0.0)
-        std.setdefault('stance_score', 0.0)
-        std.setdefault('information_strength', 0.5)
-        std.setdefault('keywords', [])
-        std.setdefault('is_repost', False)
-        
-        # 设置情绪和立场类别（处理None值）
-        emotion_score = std.get('emotion_score', 0.0)
-        if emotion_score is None:
-            emotion_score = 0.0
-        if emotion_score > 0.3:
-            std['emotion_category'] = 'positive'
-        elif emotion_score < -0.3:
-            std['emotion_category'] = 'negative'
-        else:
-            std['emotion_category'] = 'neutral'
-        
-        stance_score = std.get('stance_score', 0.0)
-        if stance_score is None:
-            stance_score = 0.0
-        if stance_score > 0.3:
-            std['stance_category'] = 'support'
-        elif stance_score < -0.3:
-            std['stance_category'] = 'oppose'
-        else:
-            std['stance_category'] = 'neutral'
-        
-        return std
+        return Post.from_dict(post)  # 新记录，避免原数据被修改
     
     def add_post(self, post_object: Dict[str, Any]) -> str:
         """
@@ -130,31 +76,70 @@ class WorldState:
         Raises:
             ValueError: 当帖子对象缺少必要字段时
         """
-        post_object = self.normalize_post(post_object)  # 字段标准化
+        return self._add(self.normalize_post(post_object))  # 字段标准化
+    
+    def _add(self, post: Post) -> str:
+        """验证并添加已标准化的帖子"""
         # 验证必要字段
-        if "content" not in post_object or "author_id" not in post_object:
+        if "content" not in post or "author_id" not in post:
             raise ValueError("帖子对象必须包含content和author_id字段")
         
-        # 生成帖子ID（如果未提供）
-        if "post_id" not in post_object:
-            post_object["post_id"] = str(uuid.uuid4())
-        
         # 设置时间戳（如果未提供）
-        if "timestamp" not in post_object:
-            post_object["timestamp"] = datetime.now().isoformat()
-        
-        # 设置默认值
-        post_object.setdefault("emotion_score", 0.0)
-        post_object.setdefault("stance_score", 0.0)
-        post_object.setdefault("information_strength", 0.5)
-        post_object.setdefault("keywords", [])
-        post_object.setdefault("is_repost", False)
-        post_object.setdefault("parent_post_id", None)
+        if "timestamp" not in post:
+            post.timestamp = datetime.now().isoformat()
+        if "parent_post_id" not in post:
+            post.parent_post_id = None
         
         # 添加到帖子池
-        self.posts_pool.append(post_object)
+        self.posts_pool.append(post)
+        self._post_index[post.post_id] = post
+        
+        return post.post_id
+    
+    def add_normalized_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """
+        批量添加已经过add_post处理的帖子（语料缓存加载时使用，不再验证和补全字段）
+        
+        Args:
+            posts (List[Dict[str, Any]]): add_post处理后的帖子（Post或其to_dict()）
+            
+        Returns:
+            None
+        """
+        for post in posts:
+            post = as_post(post)
+            self.posts_pool.append(post)
+            self._post_index[post.post_id] = post
+    
+    def get_post(self, post_id: str) -> Optional[Post]:
+        """
+        按ID获取帖子池中的帖子
+
+        Args:
+            post_id (str): 帖子ID
+
+        Returns:
+            Optional[Post]: 帖子记录，不存在时返回None
+        """
+        return self._post_index.get(post_id)
+
+    def update_post(self, post_id: str, fields: Dict[str, Any]) -> bool:
+        """
+        更新帖子池中已有帖子的字段（如延迟完成的LLM标注），只更新分值时按新分值推导情绪/立场类别
         
-        return post_object["post_id"]
+        Args:
+            post_id (str): 帖子ID
+            fields (Dict[str, Any]): 需要更新的字段
+            
+        Returns:
+            bool: 是否找到并更新了帖子
+        """
+        post = self._post_index.get(post_id)
+        if post is None:
+            return False
+        # 同时给出的显式类别会被保存
+        post.update(fields)
+        return True
     
     def inject_event(self, event_post_object: Dict[str, Any]) -> str:
         """
@@ -166,20 +151,19 @@ class WorldState:
         Returns:
             str: 新添加事件帖子的ID
         """
-        event_post_object = self.normalize_post(event_post_object)  # 字段标准化
+        event_post = self.normalize_post(event_post_object)  # 字段标准化
         
         # 设置事件帖子的特殊属性
-        event_post_object["information_strength"] = 1.0  # 事件帖子具有最高信息强度
+        event_post.information_strength = 1.0  # 事件帖子具有最高信息强度
         
-        # 使用add_post方法添加帖子
-        return self.add_post(event_post_object)
+        return self._add(event_post)
     
-    def get_all_posts(self) -> List[Dict[str, Any]]:
+    def get_all_posts(self) -> List[Post]:
         """
         返回当前池中所有的帖子
         
         Returns:
-            List[Dict[str, Any]]: 帖子列表的副本
+            List[Post]: 帖子列表的副本
         """
         return self.posts_pool.copy()
     
@@ -192,14 +176,14 @@ class WorldState:
         """
         return len(self.posts_pool)
     
-    def get_event_posts(self) -> List[Dict[str, Any]]:
+    def get_event_posts(self) -> List[Post]:
         """
         获取所有事件帖子（信息强度为1.0的帖子）
         
         Returns:
-            List[Dict[str, Any]]: 事件帖子列表
+            List[Post]: 事件帖子列表
         """
-        return [post for post in self.posts_pool if post.get("information_strength", 0.0) >= 1.0]
+        return [post for post in self.posts_pool if (post.information_strength or 0.0) >= 1.0]
     
     def clear_posts(self) -> None:
         """
@@ -209,3 +193,21 @@ class WorldState:
             None
         """
         self.posts_pool.clear()
+        self._post_index.clear()
+    
+    def restore_posts(self, posts: List[Dict[str, Any]]) -> None:
+        """
+        用已标准化的帖子列表替换帖子池（从检查点恢复时使用，不重新生成ID和时间戳）
+        
+        Args:
+            posts (List[Dict[str, Any]]): 帖子列表
+            
+        Returns:
+            None
+        """
+        self.clear_posts()
+        for post in posts:
+            post = as_post(post)
+            self.posts_pool.append(post)
+            if post.post_id is not None:
+                self._post_index[post.post_id] = post
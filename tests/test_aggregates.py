@@ -0,0 +1,109 @@
+import copy
+import random
+from src.aggregates import AgentAggregates, PostAggregates, stance_group
+from src.agent import Agent
+from src.agent_controller import AgentController
+from src.world_state import WorldState
+
+# 与SimulationEngine.AGENT_RUNTIME_FIELDS一致：检查点不保存的运行时字段
+RUNTIME_FIELDS = ('simulation_id', 'llm_backend', 'prompt_budget', 'llm_gate', 'surrogate_recorder', 'state_tracker')
+
+
+def _direct_macro(agents):
+    """逐Agent遍历的宏观统计（增量统计的对照）"""
+    count = len(agents)
+    return {
+        'average_emotion': sum(a.current_emotion for a in agents) / count,
+        'average_stance': sum(a.current_stance for a in agents) / count,
+        'agent_count': count,
+    }
+
+
+class TestAgentAggregates:
+    """Agent状态增量统计的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.controller = AgentController(WorldState(), None, annotation_workers=0, posting_workers=0)
+        rng = random.Random(5)
+        for i in range(40):
+            self.controller.add_agent(Agent(f"a{i}", "ordinary_user", 0.5, 0.2, 0.5,
+                                            rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(0, 1)))
+
+    def test_macro_summary_tracks_state_changes(self):
+        """测试多次赋值后统计与逐Agent遍历一致"""
+        rng = random.Random(7)
+        for _ in range(5000):
+            agent = rng.choice(self.controller.agents)
+            agent.current_emotion = rng.uniform(-1, 1)
+            agent.current_stance = rng.uniform(-1, 1)
+            agent.current_confidence = rng.uniform(0, 1)
+
+        macro = self.controller.compute_macro_summary()
+        expected = _direct_macro(self.controller.agents)
+
+        assert macro['agent_count'] == expected['agent_count']
+        assert abs(macro['average_emotion'] - expected['average_emotion']) < 1e-12
+        assert abs(macro['average_stance'] - expected['average_stance']) < 1e-12
+
+    def test_variance_distribution_and_polarization(self):
+        """测试方差、立场分布和极化指数"""
+        aggregates = AgentAggregates()
+        stances = [1.0, 1.0, -1.0, -1.0]
+        for i, stance in enumerate(stances):
+            aggregates.add(Agent(f"b{i}", "ordinary_user", 0.5, 0.2, 0.5, 0.0, stance, 0.5))
+
+        assert aggregates.variance('stance') == 1.0
+        assert aggregates.polarization_index() == 1.0
+        assert aggregates.stance_distribution() == {'positive': 0.5, 'neutral': 0.0, 'negative': 0.5}
+
+        aggregates.on_change('stance', -1.0, 0.05)
+        aggregates.on_change('stance', -1.0, 0.0)
+        assert aggregates.polarization_index() == 0.0
+        assert aggregates.stance_groups == {'positive': 2, 'neutral': 2, 'negative': 0}
+        assert stance_group(0.1) == 'neutral' and stance_group(-0.11) == 'negative'
+
+    def test_rebuild_after_dict_replacement(self):
+        """测试绕过属性赋值替换状态后rebuild恢复正确统计"""
+        agent = self.controller.agents[0]
+        saved = copy.deepcopy({k: v for k, v in agent.__dict__.items() if k not in RUNTIME_FIELDS})
+        agent.current_stance = 0.9
+        runtime = {k: v for k, v in agent.__dict__.items() if k in RUNTIME_FIELDS}
+
+        agent.__dict__.clear()
+        agent.__dict__.update(saved)
+        agent.__dict__.update(runtime)
+        self.controller.agent_aggregates.rebuild(self.controller.agents)
+
+        expected = _direct_macro(self.controller.agents)
+        assert abs(self.controller.compute_macro_summary()['average_stance'] - expected['average_stance']) < 1e-12
+
+    def test_untracked_agent(self):
+        """测试未加入控制器的Agent状态赋值不影响统计"""
+        before = self.controller.compute_macro_summary()
+        agent = Agent("x", "ordinary_user", 0.5, 0.2, 0.5, 0.0, 0.0, 0.5)
+        agent.current_stance = 1.0
+
+        assert agent.state_tracker is None
+        assert self.controller.compute_macro_summary() == before
+
+
+class TestPostAggregates:
+    """帖子增量统计的测试用例"""
+
+    def test_incremental_summary(self):
+        """测试逐条加入帖子的环境摘要"""
+        aggregates = PostAggregates()
+        assert aggregates.summary() == {}
+
+        aggregates.add({'stance_category': 'SUPPORT_PATIENT', 'stance_score': 0.5, 'emotion_category': 'ANGER'})
+        aggregates.add({'stance_category': 'SUPPORT_PATIENT', 'stance_score': -0.1, 'information_strength': 0.8})
+        aggregates.add({'content': '无标注'})
+        summary = aggregates.summary()
+
+        assert summary['total_posts_in_slice'] == 3
+        assert summary['stance_distribution'] == {'SUPPORT_PATIENT': 2 / 3}
+        assert summary['emotion_distribution'] == {'ANGER': 1 / 3}
+        assert summary['average_stance_score'] == 0.2
+        assert summary['average_information_strength'] == 0.8
+        assert summary['average_emotion_score'] == 0.0
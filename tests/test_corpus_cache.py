@@ -0,0 +1,119 @@
+import json
+import os
+import random
+import tempfile
+from unittest import mock
+from src import corpus_cache
+from src.corpus_cache import CompiledCorpus, cache_path, load_corpus_cache, save_corpus_cache, source_digest
+from src.main import SimulationEngine
+
+
+def _thread(rng, index, depth=0):
+    post = {
+        'mid': f"m{depth}_{index}_{rng.randint(0, 10 ** 6)}",
+        'uid': f"u{rng.randint(0, 9)}",
+        'content': rng.choice(['帖子内容', '第二行\n内容', '']),
+        't': 1704067200 + rng.randint(0, 40) * 600,
+        'popularity': rng.choice([0, 1, 5]),
+        'emotion_score': rng.uniform(-1, 1),
+        'stance_score': rng.uniform(-1, 1),
+        'information_strength': rng.choice([None, 0.5]),
+    }
+    if depth < 2:
+        post['children'] = [_thread(rng, i, depth + 1) for i in range(rng.randint(0, 3))]
+    return post
+
+
+class TestCorpusCache:
+    """编译语料缓存的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        rng = random.Random(5)
+        self.threads = [_thread(rng, i) for i in range(60)]
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, 'postdata.json')
+        self._write_source(self.threads)
+        self.cache_dir = os.path.join(self.tmpdir.name, 'cache')
+        # 仿真引擎初始化时在当前目录创建输出文件
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+
+    def teardown_method(self):
+        """每个测试方法后的清理"""
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def _write_source(self, threads):
+        with open(self.source, 'w', encoding='utf-8') as f:
+            json.dump(threads, f, ensure_ascii=False)
+
+    def _engine(self, corpus_cache=True):
+        engine = SimulationEngine({'posts_per_slice': 7, 'skip_llm': True,
+                                   'corpus_cache': {'dir': self.cache_dir} if corpus_cache else False})
+        engine.load_initial_data(self.source)
+        return engine
+
+    def test_round_trip(self):
+        """测试各种列类型（含缺失字段、None、嵌套值）写入后原样读回"""
+        posts = [
+            {'id': 'a', 'n': 1, 'x': 0.5, 'flag': True, 'tags': ['话题', 1], 'extra': None},
+            {'id': 'b', 'n': 2 ** 70, 'x': 1.5, 'flag': False, 'tags': []},
+            {'id': 'a', 'x': -2.0, 'mixed': 3},
+            {'mixed': 'text', 'nested': {'k': [1, {'v': '值'}]}},
+        ]
+        path = cache_path(self.cache_dir, 'f' * 64)
+        save_corpus_cache(path, CompiledCorpus(posts[:2], [1.0, 2.5], posts), 'f' * 64)
+        compiled = load_corpus_cache(path)
+
+        assert compiled.slice_posts == posts[:2]
+        assert compiled.epochs == [1.0, 2.5]
+        assert compiled.pool_posts == posts
+        assert [list(p) for p in compiled.pool_posts] == [list(p) for p in posts]
+        assert type(compiled.pool_posts[0]['flag']) is bool
+        # 嵌套值每条帖子单独解码
+        assert compiled.pool_posts[0]['tags'] is not compiled.slice_posts[0]['tags']
+
+    def test_cached_load_matches_pipeline(self):
+        """测试第二次启动从缓存加载，世界状态和时间片与完整处理流程一致"""
+        expected = self._engine(corpus_cache=False)
+        built = self._engine()
+        assert len(os.listdir(self.cache_dir)) == 1
+
+        with mock.patch('src.main.flatten_posts_recursive', side_effect=AssertionError("不应重新处理")):
+            cached = self._engine()
+
+        for engine in (built, cached):
+            assert engine.world_state.posts_pool == expected.world_state.posts_pool
+            assert engine.world_state.update_post(expected.world_state.posts_pool[-1]['post_id'], {})
+            assert engine.total_slices == expected.total_slices > 0
+            for i in range(expected.total_slices):
+                assert list(engine.time_manager.get_slice(i)) == list(expected.time_manager.get_slice(i))
+                assert engine.time_manager.slice_info(i) == expected.time_manager.slice_info(i)
+
+    def test_default_dir_outside_source_tree(self):
+        """测试默认缓存目录在用户缓存目录下，不写入数据文件所在目录"""
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.cache_dir}):
+            engine = SimulationEngine({'posts_per_slice': 7, 'skip_llm': True})
+            engine.load_initial_data(self.source)
+            path, digest = engine._corpus_cache_key(self.source)
+
+        assert path == cache_path(os.path.join(self.cache_dir, 'social_simulation', 'corpus'), digest)
+        assert os.path.exists(path) and not os.path.exists(os.path.join(self.tmpdir.name, '.corpus_cache'))
+
+    def test_invalidated_by_source_and_version(self):
+        """测试源文件内容或处理流程版本变化时不使用旧缓存"""
+        digest = source_digest(self.source)
+        self._engine()
+        assert load_corpus_cache(cache_path(self.cache_dir, digest)) is not None
+
+        self._write_source(self.threads[:5])
+        engine = self._engine()
+        assert source_digest(self.source) != digest
+        assert len(os.listdir(self.cache_dir)) == 2
+        assert engine.world_state.get_posts_count() == len(self._engine(corpus_cache=False).world_state.posts_pool)
+
+        path = cache_path(self.cache_dir, digest)
+        with mock.patch.object(corpus_cache, 'PIPELINE_VERSION', corpus_cache.PIPELINE_VERSION + 1):
+            assert not os.path.exists(cache_path(self.cache_dir, digest))
+            assert load_corpus_cache(path) is None
@@ -0,0 +1,105 @@
+import json
+import os
+import random
+import tempfile
+import pytest
+from src.corpus_stream import (
+    StreamingSliceReader, build_slice_file, iter_json_array, slice_file_is_current
+)
+from src.services import flatten_posts_recursive, filter_valid_posts
+from src.time_manager import TimeSliceManager
+
+
+def _thread(rng, index, depth=0):
+    post = {
+        'mid': f"m{depth}_{index}_{rng.randint(0, 10 ** 6)}",
+        'content': '帖子 内容\n第二行' * rng.randint(0, 3),
+        # 时间戳有重复（检查稳定排序），数字与毫秒混用
+        't': 1704067200 + rng.randint(0, 40) * 600,
+        'popularity': rng.choice([0, 1, 5]),
+        'emotion_score': rng.uniform(-1, 1),
+        'stance_score': rng.uniform(-1, 1),
+        'information_strength': rng.choice([None, 0.5]),
+    }
+    if rng.random() < 0.2:
+        post['t'] *= 1000
+    if depth < 2:
+        post['children'] = [_thread(rng, i, depth + 1) for i in range(rng.randint(0, 3))]
+    return post
+
+
+class TestCorpusStream:
+    """流式语料与磁盘时间片文件的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        rng = random.Random(2)
+        self.threads = [_thread(rng, i) for i in range(120)]
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, 'postdata.json')
+        with open(self.source, 'w', encoding='utf-8') as f:
+            json.dump(self.threads, f, ensure_ascii=False, indent=1)
+        self.slice_dir = os.path.join(self.tmpdir.name, 'slices')
+        self.readers = []
+
+    def teardown_method(self):
+        """每个测试方法后的清理"""
+        for reader in self.readers:
+            reader.close()
+        self.tmpdir.cleanup()
+
+    def _reader(self, **kwargs):
+        reader = StreamingSliceReader.from_source(self.source, self.slice_dir, run_size=17, **kwargs)
+        self.readers.append(reader)
+        return reader
+
+    def test_incremental_parse(self):
+        """测试小读取块下逐个解析顶级元素"""
+        assert list(iter_json_array(self.source, chunk_size=5)) == self.threads
+
+    def test_slices_match_in_memory_pipeline(self):
+        """测试外部排序后的时间片与内存中的加载流程一致（按数量和按时间窗口）"""
+        valid_posts = filter_valid_posts(flatten_posts_recursive(self.threads))
+        for kwargs in ({'slice_size': 7}, {'slice_duration': 3600}):
+            expected = TimeSliceManager([dict(p) for p in valid_posts], **kwargs)
+            reader = self._reader(**kwargs)
+
+            assert reader.total_posts == expected.total_posts > 0
+            assert reader.total_slices == expected.total_slices
+            for i in range(reader.total_slices):
+                assert reader.get_slice(i) == list(expected.get_slice(i))
+                assert reader.slice_info(i) == expected.slice_info(i)
+
+    def test_rebuild_when_source_changes(self):
+        """测试源文件不变时复用时间片文件，变化后重新构建"""
+        self._reader(slice_size=10)
+        assert slice_file_is_current(self.source, self.slice_dir)
+
+        with open(self.source, 'w', encoding='utf-8') as f:
+            json.dump(self.threads[:3], f)
+        assert not slice_file_is_current(self.source, self.slice_dir)
+
+        reader = self._reader(slice_size=10)
+        assert reader.total_posts == len(filter_valid_posts(flatten_posts_recursive(self.threads[:3])))
+
+    def test_close_releases_files(self):
+        """测试关闭后释放内存映射和数据文件，帖子数仍可获取，读取时间片报错"""
+        reader = self._reader(slice_duration=3600)
+        data_file = reader._data_file
+        total_posts = reader.total_posts
+        reader.close()
+
+        assert data_file.closed and reader.total_posts == total_posts > 0
+        with pytest.raises(ValueError):
+            reader.get_slice(0)
+
+    def test_empty_corpus(self):
+        """测试没有有效帖子的语料"""
+        with open(self.source, 'w', encoding='utf-8') as f:
+            f.write('[]')
+        meta = build_slice_file(self.source, self.slice_dir)
+        reader = StreamingSliceReader(self.slice_dir, slice_size=5)
+
+        assert meta['post_count'] == 0
+        assert reader.total_slices == 0
+        reader.close()
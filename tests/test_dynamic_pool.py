@@ -0,0 +1,87 @@
+import pickle
+import pytest
+from src.dynamic_pool import DynamicPostPool
+from src.slice_context import SliceContext
+from src.world_state import WorldState
+
+
+class TestDynamicPostPool:
+    """动态帖子池（增量阅读/回复计数与惰性衰减）的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.world_state = WorldState()
+        self.pool = DynamicPostPool(window_slices=2, half_life_slices=1.0,
+                                    read_weight=1.0, reply_weight=3.0, initial_popularity=1.0)
+
+    def _publish(self, mid, slice_index, pid=None):
+        post_id = self.world_state.add_post({'id': mid, 'mid': mid, 'pid': pid, 'author_id': 'a1',
+                                             'content': '内容', 't': 1704067200 + slice_index})
+        post = self.world_state.get_post(post_id)
+        self.pool.add(post, slice_index)
+        return post
+
+    def test_feed_window_and_order(self):
+        """测试帖子从下一个时间片起进入Feed，按发布顺序，超过窗口后移除"""
+        self._publish('m1', 0)
+        self._publish('m2', 1)
+
+        assert self.pool.feed_posts(0) == []
+        assert [p['mid'] for p in self.pool.feed_posts(1)] == ['m1']
+        assert [p['mid'] for p in self.pool.feed_posts(2)] == ['m1', 'm2']
+        assert [p['mid'] for p in self.pool.feed_posts(3)] == ['m2']
+        assert 'm1' not in self.pool and len(self.pool) == 1
+
+    def test_lazy_decay_matches_eager(self):
+        """测试惰性衰减的热度与每个时间片逐条衰减的结果一致"""
+        post = self._publish('m1', 0)
+        reads = {0: 2, 1: 0, 2: 1, 3: 0}
+        expected = 1.0
+        for slice_index, count in reads.items():
+            for _ in range(count):
+                self.pool.record_read(post)
+            self.pool.end_slice(slice_index)
+            expected = expected * (0.5 if slice_index > 0 else 1.0) + count
+
+        assert self.pool.popularity('m1', 3) == pytest.approx(expected)
+        assert self.pool.popularity('m1', 5) == pytest.approx(expected * 0.25)
+        assert self.pool.popularity('missing', 5) == 0.0
+
+    def test_reply_counted_at_slice_end(self):
+        """测试回复在时间片结束时才计入父帖子热度，池外帖子的阅读被忽略"""
+        self._publish('m1', 0)
+        self._publish('m2', 0, pid='m1')
+        self.pool.record_read({'mid': 'corpus'})
+
+        assert self.pool.popularity('m1', 0) == 1.0
+        self.pool.end_slice(0)
+        assert self.pool.popularity('m1', 0) == 4.0
+        assert self.pool.feed_posts(1)[0]['popularity'] == 2.0
+
+    def test_state_restore(self):
+        """测试检查点数据可pickle，恢复后帖子重新关联到帖子池记录"""
+        post = self._publish('m1', 0)
+        self._publish('m2', 1)
+        self.pool.record_read(post)
+        state = pickle.loads(pickle.dumps(self.pool.state()))
+
+        restored = DynamicPostPool(window_slices=2)
+        restored.restore(state, {'m1': post}.get)
+        assert [p['mid'] for p in restored.feed_posts(2)] == ['m1']
+        restored.end_slice(1)
+        self.pool.end_slice(1)
+        assert restored.popularity('m1', 2) == self.pool.popularity('m1', 2)
+
+    def test_mixed_timestamps_in_slice_context(self):
+        """测试Agent帖子的数字时间戳与语料ISO时间戳混合时按时间取最新"""
+        posts = [{'mid': 'a', 'timestamp': 1704067200}, {'mid': 'b', 'timestamp': '2024-01-03T10:00:00'}]
+
+        assert SliceContext(1, posts).latest_timestamp == '2024-01-03T10:00:00'
+
+    def test_from_config(self):
+        """测试配置解析：关闭、默认参数和覆盖参数，非法参数报错"""
+        assert DynamicPostPool.from_config(None) is None
+        assert DynamicPostPool.from_config(True).window_slices == 3
+        assert DynamicPostPool.from_config({'window_slices': 5}).window_slices == 5
+        with pytest.raises(ValueError):
+            DynamicPostPool(window_slices=0)
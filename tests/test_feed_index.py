@@ -0,0 +1,83 @@
+import math
+import random
+import pytest
+from src.agent import Agent
+from src.agent_controller import AgentController
+from src.feed_index import StanceFeedIndex
+from src.slice_context import SliceContext
+from src.world_state import WorldState
+
+
+class TestStanceFeedIndex:
+    """近似Feed立场索引（候选剪枝与误差上界）的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        rng = random.Random(50)
+        self.posts = [{
+            'mid': f"m{i}",
+            'popularity': rng.paretovariate(1.5),
+            'stance_score': rng.uniform(-1, 1),
+            'information_strength': None if i % 17 == 0 else 0.5,
+        } for i in range(600)]
+        self.popularity_range = SliceContext(0, self.posts).popularity_range
+
+    def _exact(self, agent_stance, k, w_pop):
+        """精确Feed的x0和每条帖子的选中概率（帖子位置 -> 概率）"""
+        pop_min, pop_range = self.popularity_range
+        scores = {}
+        for i, post in enumerate(self.posts):
+            if post['information_strength'] is None:
+                continue
+            rel = max(0.0, 1.0 - abs(agent_stance - post['stance_score']))
+            scores[i] = w_pop * (post['popularity'] - pop_min) / pop_range + (1.0 - w_pop) * rel
+        x0 = sum(scores.values()) / len(scores)
+        return x0, {i: 1.0 / (1.0 + math.exp(-k * (s - x0))) for i, s in scores.items()}
+
+    def test_x0_matches_exact_mean(self):
+        """测试前缀和算出的x0与精确Feed的均值一致"""
+        index = StanceFeedIndex(self.posts, self.popularity_range, 0.01)
+        for agent_stance in (-1.0, -0.35, 0.0, 0.8):
+            _, x0 = index.candidates(agent_stance, 2, 0.7, 0.3)
+            assert x0 == pytest.approx(self._exact(agent_stance, 2, 0.7)[0])
+
+    def test_skipped_posts_below_bound(self):
+        """测试被跳过的帖子在精确Feed中的选中概率都低于上限，且大斜率时大部分帖子被跳过"""
+        index = StanceFeedIndex(self.posts, self.popularity_range, 0.01)
+        for agent_stance in (-0.9, -0.2, 0.4, 1.0):
+            for k, w_pop in ((2, 0.7), (25, 0.3), (60, 0.5)):
+                positions, _ = index.candidates(agent_stance, k, w_pop, 1.0 - w_pop)
+                _, probs = self._exact(agent_stance, k, w_pop)
+                assert positions == sorted(positions) and set(positions) <= set(probs)
+                assert all(p < 0.01 for i, p in probs.items() if i not in set(positions))
+        positions, _ = index.candidates(0.0, 60, 0.3, 0.7)
+        assert len(positions) < 0.75 * index.total_posts
+        assert index.scanned == 13 * index.total_posts and index.evaluated < index.scanned
+
+    def test_non_positive_slope_evaluates_all(self):
+        """测试斜率非正时不剪枝，非法的概率上限报错"""
+        index = StanceFeedIndex(self.posts, self.popularity_range, 0.05)
+        positions, _ = index.candidates(0.3, 0, 0.7, 0.3)
+
+        assert positions == [i for i, post in enumerate(self.posts) if post['information_strength'] is not None]
+        with pytest.raises(ValueError):
+            StanceFeedIndex(self.posts, self.popularity_range, 1.0)
+
+    def test_controller_uses_index(self):
+        """测试近似Feed只对候选帖子打分，sigmoid中心点与精确Feed相同，非法配置报错"""
+        controller = AgentController(WorldState(), None, w_pop=0.3, k=60, annotation_workers=0, posting_workers=0)
+        agent = Agent("a1", "ordinary_user", 0.5, 0.2, 0.5, 0.0, 0.0, 0.5)
+        controller.add_agent(agent)
+        agent.current_stance = 0.0
+        controller.set_approximate_feed(0.01)
+
+        candidates, x0 = StanceFeedIndex(self.posts, self.popularity_range, controller.max_skip_probability).candidates(
+            agent.current_stance, controller.k, controller.w_pop, 1.0 - controller.w_pop)
+        _, exact = controller._generate_personalized_feed(agent, self.posts)
+        _, scores = controller._generate_personalized_feed(agent, self.posts, x0=x0, candidate_indices=candidates)
+        assert [s[0] for s in scores] == [self.posts[i]['mid'] for i in candidates]
+        exact_probs = {s[0]: s[4] for s in exact}
+        assert all(s[4] == pytest.approx(exact_probs[s[0]]) for s in scores)
+        assert len(candidates) < len(exact)
+        with pytest.raises(ValueError):
+            controller.set_approximate_feed(0.0)
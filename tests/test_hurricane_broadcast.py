@@ -0,0 +1,109 @@
+import copy
+import random
+import pytest
+from src.agent import Agent
+from src.agent_controller import AgentController
+from src.world_state import WorldState
+from src.llm_batch import BatchPendingError
+
+
+def _reference_official_impact(agent, statement):
+    """逐Agent实现的官方声明影响（向量化实现的对照）"""
+    multiplier = {"high": 1.0, "medium": 0.7, "low": 0.4}.get(statement.get('authority_level', 'high'), 1.0)
+    emotion = agent.current_emotion + statement.get('emotion_score', 0.1) * 0.8 * multiplier
+    stance = agent.current_stance + statement.get('stance_score', 0.0) * 1.2 * multiplier
+    agent.current_emotion = max(-1.0, min(1.0, emotion))
+    agent.current_stance = max(-1.0, min(1.0, stance))
+
+
+class TestHurricaneBroadcast:
+    """飓风消息/官方声明群体广播的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.controller = AgentController(WorldState(), None, annotation_workers=0, posting_workers=0)
+        rng = random.Random(3)
+        self.agents = [
+            Agent(f"a{i}", "ordinary_user", 0.5, rng.choice([0.0, 0.6]), 0.5,
+                  rng.uniform(-1, 1), rng.uniform(-1, 1), 0.5)
+            for i in range(50)
+        ]
+        self.statements = [
+            {'id': 's1', 'content': '通报', 'is_official_statement': True, 'author_id': 'official_authority',
+             'emotion_score': 0.6, 'stance_score': 0.7, 'authority_level': 'medium'},
+            {'id': 's2', 'content': '澄清', 'is_official_statement': True, 'author_id': 'official_authority',
+             'emotion_score': -0.9, 'stance_score': 0.5},
+        ]
+
+    def test_official_statements_match_per_agent_math(self):
+        """测试数组运算与逐Agent计算结果一致（含权威级别加权和截断）"""
+        reference = copy.deepcopy(self.agents)
+        for agent in reference:
+            for statement in self.statements:
+                _reference_official_impact(agent, statement)
+
+        paused = self.controller.broadcast_hurricane_messages(self.agents, self.statements)
+
+        assert paused == {}
+        for agent, expected in zip(self.agents, reference):
+            assert agent.current_emotion == expected.current_emotion
+            assert agent.current_stance == expected.current_stance
+            assert agent.viewed_posts == self.statements
+            assert agent.blocked_user_ids == []
+
+    def test_non_official_source_blocking(self):
+        """测试非官方来源的声明按立场差异批量屏蔽"""
+        statement = {'id': 's3', 'content': '声明', 'is_official_statement': True, 'author_id': 'gov', 'user_id': 'gov',
+                     'emotion_score': 0.0, 'stance_score': 0.0}
+        self.agents[0].current_stance, self.agents[0].opinion_blocking = -1.0, 0.5
+        self.agents[1].current_stance, self.agents[1].opinion_blocking = -1.0, 0.0
+
+        self.controller.broadcast_hurricane_messages(self.agents[:2], [statement])
+
+        assert self.agents[0].blocked_user_ids == ['gov']
+        assert self.agents[1].blocked_user_ids == []
+
+    def test_legacy_broadcast_matches_per_agent_processing(self):
+        """测试紧急广播与官方声明混合时，每个Agent的处理顺序与逐Agent处理一致"""
+        emergency = {'id': 'h1', 'content': '紧急广播', 'is_hurricane': True, 'author_id': 'emergency_system',
+                     'emotion_score': -0.8, 'stance_score': -0.9, 'information_strength': 1.0}
+        messages = [self.statements[0], emergency, self.statements[1]]
+        reference = copy.deepcopy(self.agents)
+        states = {}
+        for agent in reference:
+            random.seed(f"seed:{agent.agent_id}")
+            self.controller.process_hurricane_messages(messages, agent, official_posts=messages)
+            states[agent.agent_id] = random.getstate()
+
+        random_states = {}
+        for agent in self.agents:
+            random.seed(f"seed:{agent.agent_id}")
+            random_states[agent.agent_id] = random.getstate()
+        self.controller.broadcast_hurricane_messages(self.agents, messages, random_states)
+
+        for agent, expected in zip(self.agents, reference):
+            assert (agent.current_emotion, agent.current_stance, agent.current_confidence) == \
+                   (expected.current_emotion, expected.current_stance, expected.current_confidence)
+            assert agent.blocked_user_ids == expected.blocked_user_ids
+            assert len(agent.emotion_stance_history) == 1
+            assert random_states[agent.agent_id] == states[agent.agent_id]
+
+    def test_batch_pending_pauses_agent(self):
+        """测试离线批处理时紧急广播暂停的Agent不再接收后续消息"""
+        emergency = {'id': 'h1', 'content': '紧急广播', 'is_hurricane': True, 'author_id': 'emergency_system',
+                     'emotion_score': -0.8, 'stance_score': -0.9}
+        pending = BatchPendingError("reading a0")
+
+        def raise_pending(*args, **kwargs):
+            raise pending
+
+        self.agents[0].update_emotion_and_stance = raise_pending
+        before = self.agents[0].current_emotion
+
+        paused = self.controller.broadcast_hurricane_messages(self.agents[:3], [emergency, self.statements[0]])
+
+        assert paused == {"a0": pending}
+        assert self.agents[0].current_emotion == before
+        assert len(self.agents[1].emotion_stance_history) == 1
+        with pytest.raises(BatchPendingError):
+            self.controller.process_hurricane_messages([emergency], self.agents[0])
@@ -0,0 +1,79 @@
+import random
+from src.influence import InfluenceHistory, influence_score
+from src.prompt_budget import post_influence
+from src.agent import Agent
+from src.agent_controller import AgentController
+from src.world_state import WorldState
+
+
+class TestInfluenceHistory:
+    """阅读时维护的影响历史的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        rng = random.Random(11)
+        self.records = []
+        for i in range(40):
+            before = [rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(0, 1)]
+            after = [rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(0, 1)]
+            self.records.append({
+                'post_id': f"p{i % 25}",
+                'emotion_before': before[0], 'stance_before': before[1], 'confidence_before': before[2],
+                'emotion_after': after[0], 'stance_after': after[1], 'confidence_after': after[2],
+                'time_slice_index': 3,
+            })
+
+    def _fill(self, history):
+        for r in self.records:
+            history.record(r['post_id'], r['emotion_before'], r['stance_before'], r['confidence_before'],
+                           r['emotion_after'], r['stance_after'], r['confidence_after'], r['time_slice_index'])
+
+    def test_running_argmax_matches_scan(self):
+        """测试运行最大值与回扫全部记录的结果一致（分数相同时取最先读到的）"""
+        history = InfluenceHistory()
+        self._fill(history)
+
+        expected = max(self.records, key=influence_score)
+        record = history.most_influential()
+
+        assert record['post_id'] == expected['post_id']
+        assert record['influence_score'] == influence_score(expected)
+        assert record['stance_change'] == abs(expected['stance_after'] - expected['stance_before'])
+        assert list(history) == self.records
+        assert post_influence(history) == post_influence(self.records)
+
+    def test_ring_buffer_keeps_latest(self):
+        """测试超出容量时只保留最近的记录，影响最大值仍覆盖全部记录"""
+        history = InfluenceHistory(capacity=8)
+        self._fill(history)
+
+        assert len(history) == 8
+        assert history.total_records == 40
+        assert list(history) == self.records[-8:]
+        assert history[-1] == self.records[-1]
+        assert history.most_influential()['post_id'] == max(self.records, key=influence_score)['post_id']
+
+    def test_clear_and_no_change(self):
+        """测试清空后复用，没有变化的记录不算有影响"""
+        history = InfluenceHistory()
+        self._fill(history)
+        history.clear()
+
+        history.record('p0', 0.1, 0.2, 0.5, 0.1, 0.2, 0.5)
+        assert len(history) == 1
+        assert history.most_influential() is None
+
+    def test_controller_sets_record(self):
+        """测试发帖前设置most_influential_post_record，时间片内无变化时保留之前的记录"""
+        controller = AgentController(WorldState(), None, annotation_workers=0, posting_workers=0)
+        agent = Agent("a1", "ordinary_user", 0.5, 0.2, 0.5, 0.0, 0.0, 0.5)
+        agent.emotion_stance_history.record('p1', 0.0, 0.0, 0.5, 0.3, 0.1, 0.5)
+        agent.emotion_stance_history.record('p2', 0.3, 0.1, 0.5, 0.3, 0.6, 0.5)
+
+        controller._analyze_most_influential_post(agent)
+        assert agent.most_influential_post_record['post_id'] == 'p2'
+
+        agent.reset_emotion_stance_history()
+        agent.emotion_stance_history.record('p3', 0.3, 0.6, 0.5, 0.3, 0.6, 0.5)
+        controller._analyze_most_influential_post(agent)
+        assert agent.most_influential_post_record['post_id'] == 'p2'
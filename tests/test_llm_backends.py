@@ -0,0 +1,80 @@
+import asyncio
+import json
+import pytest
+from src.llm_backends import (
+    MockBackend, OpenAIHTTPBackend, LocalModelBackend, create_llm_backend, mock_reply, infer_call_site
+)
+from src.llm_client import LLMClient
+from src.llm_scheduler import LLMScheduler
+from src.llm_service import LLMService
+
+
+class TestLLMBackends:
+    """LLM后端接口及工厂的测试用例"""
+    
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.scheduler = LLMScheduler()
+        self.client = LLMClient(scheduler=self.scheduler)
+    
+    def test_create_backend_from_config(self, monkeypatch):
+        """测试工厂按配置创建后端，HTTP后端缺少配置时返回None"""
+        monkeypatch.delenv("LLM_API_KEY", raising=False)
+        monkeypatch.delenv("LLM_ENDPOINT", raising=False)
+        
+        assert isinstance(create_llm_backend({"backend": "mock"}), MockBackend)
+        assert isinstance(create_llm_backend({"backend": "local", "use_mock": True}), LocalModelBackend)
+        assert create_llm_backend({}) is None
+        
+        backend = create_llm_backend({"api_key": "k", "base_url": "http://x/v1", "model": "m"})
+        assert isinstance(backend, OpenAIHTTPBackend)
+        assert backend.describe() == {"backend": "openai", "model": "m", "endpoint": "http://x/v1"}
+        
+        with pytest.raises(ValueError):
+            create_llm_backend({"backend": "grpc"})
+    
+    def test_env_fallback(self, monkeypatch):
+        """测试未在配置中给出时读取环境变量"""
+        monkeypatch.setenv("LLM_API_KEY", "env-key")
+        monkeypatch.setenv("LLM_ENDPOINT", "http://env/v1")
+        
+        assert create_llm_backend({}).endpoint == "http://env/v1"
+        assert create_llm_backend({}, use_env=False) is None
+    
+    def test_mock_reply_is_deterministic_per_call_site(self):
+        """测试Mock回复按调用点返回对应格式且结果确定"""
+        reading = json.loads(mock_reply("prompt", "reading"))
+        annotation = json.loads(mock_reply("prompt", "annotation"))
+        
+        assert set(reading) == {"emotion_suggested", "stance_suggested"}
+        assert -1.0 <= reading["emotion_suggested"] <= 1.0
+        assert "information_strength" in annotation
+        assert mock_reply("prompt", "reading") == mock_reply("prompt", "reading")
+        assert infer_call_site('请返回 {"emotion_suggested": ...}') == "reading"
+        assert infer_call_site("写一条帖子") == "posting"
+    
+    def test_client_sync_async_and_batch(self):
+        """测试客户端的同步、异步和批量接口返回一致结果"""
+        backend = MockBackend()
+        prompts = ["甲", "乙", "丙"]
+        
+        sync = [self.client.complete(backend, p, simulation_id="sim_1") for p in prompts]
+        async_result = asyncio.run(self.client.acomplete(backend, "乙", simulation_id="sim_1"))
+        batch = self.client.complete_batch(backend, prompts, simulation_id="sim_1")
+        
+        assert batch == sync
+        assert async_result == sync[1]
+        usage = self.scheduler.get_usage("sim_1")
+        assert usage['requests'] == 5  # 3次同步 + 1次异步 + 1次原生批量
+        assert usage['total_tokens'] > 0
+    
+    def test_local_backend_wraps_llm_service(self):
+        """测试本地模型后端调用LLMService生成文本"""
+        backend = LocalModelBackend(LLMService(use_mock=True))
+        
+        assert self.client.complete(backend, "聊聊科技") == "科技发展确实很快，但也要注意平衡发展。"
+    
+    def test_missing_backend(self):
+        """测试没有后端且不在离线模式时抛出异常"""
+        with pytest.raises(ValueError):
+            self.client.complete(None, "prompt")
@@ -0,0 +1,92 @@
+import json
+import pytest
+from src.llm_batch import (
+    LLMBatchJob, LocalBatchProcessor, BatchPendingError, batch_custom_id, RESULTS_SUFFIX
+)
+from src.llm_backends import OpenAIHTTPBackend
+from src.llm_client import LLMClient
+from src.llm_scheduler import LLMScheduler
+
+
+class TestLLMBatchJob:
+    """LLMBatchJob离线批处理的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.call_info = {'call_site': 'reading', 'agent_id': 'agent_1', 'time_slice': 0, 'post_id': 'p1'}
+
+    def test_export_process_ingest(self, tmp_path):
+        """测试缺少结果的请求被导出，处理并导入后可以直接命中"""
+        job = LLMBatchJob(str(tmp_path))
+
+        assert job.lookup(self.call_info, "prompt", "m") is None
+        assert job.lookup(self.call_info, "prompt", "m") is None  # 重复请求只导出一次
+        batch_path = job.write_pending(0)
+
+        with open(batch_path, encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        assert len(lines) == 1
+        assert lines[0]['custom_id'] == batch_custom_id(self.call_info, "prompt")
+        assert lines[0]['body']['messages'][0]['content'] == "prompt"
+        assert job.awaiting_batches() == [batch_path]
+
+        results_path = LocalBatchProcessor(lambda site, prompt: f"{site}回复").process(batch_path)
+
+        assert results_path.endswith(RESULTS_SUFFIX)
+        assert job.awaiting_batches() == []
+        assert job.ingest_results(results_path) == 1
+        assert job.lookup(self.call_info, "prompt", "m") == "reading回复"
+        assert not job.has_pending()
+
+    def test_failed_results_are_exported_again(self, tmp_path):
+        """测试失败的结果不会被导入，下一轮重新导出"""
+        job = LLMBatchJob(str(tmp_path))
+        job.lookup(self.call_info, "prompt", "m")
+        batch_path = job.write_pending(0)
+
+        def failing(site, prompt):
+            raise RuntimeError("upstream error")
+
+        job.ingest_results(LocalBatchProcessor(failing).process(batch_path))
+
+        assert job.lookup(self.call_info, "prompt", "m") is None
+        assert job.write_pending(0).endswith("slice_0000_round_001.jsonl")
+        assert job.get_stats()['failed_results'] == 1
+
+    def test_checkpoint_and_ingest_all(self, tmp_path):
+        """测试新的任务对象可以从目录中恢复检查点和所有结果文件"""
+        job = LLMBatchJob(str(tmp_path))
+        job.lookup(self.call_info, "prompt", "m")
+        LocalBatchProcessor().process(job.write_pending(3))
+        job.save_checkpoint({'current_slice': 3})
+
+        resumed = LLMBatchJob(str(tmp_path))
+
+        assert resumed.load_checkpoint() == {'current_slice': 3}
+        assert resumed.ingest_all() == 1
+        assert resumed.ingest_all() == 0
+        assert json.loads(resumed.lookup(self.call_info, "prompt", "m"))['emotion_suggested'] is not None
+        resumed.clear_checkpoint()
+        assert resumed.load_checkpoint() is None
+
+    def test_client_raises_pending_without_network(self, tmp_path, monkeypatch):
+        """测试挂载批处理任务后客户端不访问网络，缺少结果时抛出BatchPendingError"""
+        client = LLMClient(scheduler=LLMScheduler())
+
+        def no_network(*args):
+            raise AssertionError("批处理模式不应访问网络")
+
+        monkeypatch.setattr(OpenAIHTTPBackend, "complete", no_network)
+        job = LLMBatchJob(str(tmp_path))
+        client.attach_batch_job("sim_1", job)
+
+        assert client.serves_offline("sim_1")
+        with pytest.raises(BatchPendingError):
+            client.chat("http://x", "key", "m", "prompt", simulation_id="sim_1", call_info=self.call_info)
+        assert job.has_pending()
+
+        job.ingest_results(LocalBatchProcessor(lambda site, prompt: "离线回复").process(job.write_pending(0)))
+
+        assert client.chat("http://x", "key", "m", "prompt", simulation_id="sim_1", call_info=self.call_info) == "离线回复"
+        client.detach_batch_job("sim_1")
+        assert not client.serves_offline("sim_1")
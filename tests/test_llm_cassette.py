@@ -0,0 +1,65 @@
+import pytest
+from src.llm_cassette import LLMCassette, CassetteMissError, MODE_RECORD, MODE_REPLAY
+from src.llm_backends import OpenAIHTTPBackend
+from src.llm_client import LLMClient
+from src.llm_scheduler import LLMScheduler
+
+
+class TestLLMCassette:
+    """LLMCassette录制/回放的测试用例"""
+    
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.call_info = {'call_site': 'reading', 'agent_id': 'agent_1', 'time_slice': 0, 'post_id': 'p1'}
+    
+    def test_record_then_replay(self, tmp_path):
+        """测试录制的回复可以按相同上下文回放，并保留头部信息"""
+        path = str(tmp_path / "run.jsonl.gz")
+        cassette = LLMCassette(path, MODE_RECORD, header={'random_seed': 42})
+        cassette.record(self.call_info, "prompt", "第一次")
+        cassette.record(self.call_info, "prompt", "第二次")
+        cassette.close()
+        
+        replay = LLMCassette(path, MODE_REPLAY)
+        
+        assert replay.header['random_seed'] == 42
+        assert replay.lookup(self.call_info, "prompt") == "第一次"
+        assert replay.lookup(self.call_info, "prompt") == "第二次"
+        assert replay.lookup(self.call_info, "prompt") is None
+        assert replay.get_stats()['hits'] == 2
+        assert replay.get_stats()['misses'] == 1
+    
+    def test_strict_replay_fails_on_miss(self, tmp_path):
+        """测试严格模式下找不到记录时抛出异常"""
+        path = str(tmp_path / "run.jsonl.gz")
+        cassette = LLMCassette(path, MODE_RECORD)
+        cassette.record(self.call_info, "prompt", "回复")
+        cassette.close()
+        
+        replay = LLMCassette(path, MODE_REPLAY, strict=True)
+        
+        with pytest.raises(CassetteMissError):
+            replay.lookup({**self.call_info, 'time_slice': 1}, "prompt")
+    
+    def test_invalid_mode(self, tmp_path):
+        """测试未知模式"""
+        with pytest.raises(ValueError):
+            LLMCassette(str(tmp_path / "x.gz"), "rewind")
+    
+    def test_client_replays_without_upstream_call(self, tmp_path, monkeypatch):
+        """测试客户端在回放模式下不发出上游请求"""
+        path = str(tmp_path / "run.jsonl.gz")
+        client = LLMClient(scheduler=LLMScheduler())
+        monkeypatch.setattr(OpenAIHTTPBackend, "complete", lambda self, prompt, timeout=None, call_info=None: ("上游回复", None))
+        client.attach_cassette("sim_1", LLMCassette(path, MODE_RECORD))
+        client.chat("http://x", "key", "m", "prompt", simulation_id="sim_1", call_info=self.call_info)
+        client.detach_cassette("sim_1").close()
+        
+        def no_network(*args):
+            raise AssertionError("回放模式不应访问网络")
+        
+        monkeypatch.setattr(OpenAIHTTPBackend, "complete", no_network)
+        client.attach_cassette("sim_2", LLMCassette(path, MODE_REPLAY, strict=True))
+        
+        assert client.is_replaying("sim_2")
+        assert client.chat(None, None, "m", "prompt", simulation_id="sim_2", call_info=self.call_info) == "上游回复"
@@ -0,0 +1,127 @@
+import threading
+import pytest
+import requests
+from src.llm_backends import OpenAIHTTPBackend
+from src.llm_client import SingleFlight, LLMClient
+from src.llm_scheduler import LLMScheduler
+
+
+class TestSingleFlight:
+    """SingleFlight并发合并的测试用例"""
+    
+    def test_concurrent_identical_calls_share_one_upstream_call(self):
+        """测试相同key的并发调用只执行一次上游请求"""
+        single_flight = SingleFlight()
+        release = threading.Event()
+        upstream = []
+        
+        def slow_call():
+            upstream.append(1)
+            release.wait(timeout=5)
+            return "结果"
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight.do(("m", "p"), slow_call)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        # 等待所有线程进入合并等待
+        while single_flight.get_stats()['total_calls'] < 5:
+            pass
+        release.set()
+        for t in threads:
+            t.join()
+        
+        assert results == ["结果"] * 5
+        assert len(upstream) == 1
+        stats = single_flight.get_stats()
+        assert stats['upstream_calls'] == 1
+        assert stats['coalesced_calls'] == 4
+        assert stats['in_flight'] == 0
+    
+    def test_sequential_calls_are_not_cached(self):
+        """测试调用结束后不缓存结果"""
+        single_flight = SingleFlight()
+        counter = iter(range(10))
+        
+        first = single_flight.do("k", lambda: next(counter))
+        second = single_flight.do("k", lambda: next(counter))
+        
+        assert (first, second) == (0, 1)
+        assert single_flight.get_stats()['coalesced_calls'] == 0
+    
+    def test_error_propagates_and_key_is_released(self):
+        """测试上游异常会抛出且key被释放"""
+        single_flight = SingleFlight()
+        
+        def failing():
+            raise RuntimeError("429")
+        
+        with pytest.raises(RuntimeError):
+            single_flight.do("k", failing)
+        assert single_flight.do("k", lambda: "ok") == "ok"
+
+
+class TestLLMClient:
+    """LLMClient的测试用例"""
+    
+    def test_chat_keys_on_model_and_prompt(self, monkeypatch):
+        """测试不同模型的相同prompt不会被合并"""
+        client = LLMClient()
+        calls = []
+        monkeypatch.setattr(
+            OpenAIHTTPBackend, "complete",
+            lambda self, prompt, timeout=None, call_info=None: calls.append((self.model, prompt)) or (f"{self.model}:{prompt}", None)
+        )
+        
+        assert client.chat("http://x", "key", "m1", "你好") == "m1:你好"
+        assert client.chat("http://x", "key", "m2", "你好") == "m2:你好"
+        assert calls == [("m1", "你好"), ("m2", "你好")]
+    
+    def test_rate_limited_response_is_retried(self, monkeypatch):
+        """测试429响应排队重试而不是直接失败"""
+        scheduler = LLMScheduler()
+        client = LLMClient(scheduler=scheduler)
+        responses = iter([429, 200])
+        
+        def fake_complete(self, prompt, timeout=None, call_info=None):
+            status = next(responses)
+            if status == 429:
+                response = requests.Response()
+                response.status_code = 429
+                response.headers['Retry-After'] = '0'
+                raise requests.HTTPError(response=response)
+            return "ok", {"total_tokens": 10}
+        
+        monkeypatch.setattr(OpenAIHTTPBackend, "complete", fake_complete)
+        
+        assert client.chat("http://x", "key", "m", "你好", simulation_id="sim_1") == "ok"
+        usage = scheduler.get_usage("sim_1")
+        assert usage['retries'] == 1
+        assert usage['requests'] == 2
+        assert usage['total_tokens'] == 10
+    
+    def test_failed_call_releases_budget(self, monkeypatch):
+        """测试超时、不可重试的HTTP错误和响应解析失败都退还预留的预算"""
+        scheduler = LLMScheduler()
+        client = LLMClient(scheduler=scheduler)
+        scheduler.register_simulation("sim_1", token_budget=10 ** 6)
+        errors = iter([requests.Timeout("timeout"), requests.HTTPError(response=requests.Response()),
+                       ValueError("invalid json")])
+        
+        def fake_complete(self, prompt, timeout=None, call_info=None):
+            error = next(errors)
+            if isinstance(error, requests.HTTPError):
+                error.response.status_code = 400
+            raise error
+        
+        monkeypatch.setattr(OpenAIHTTPBackend, "complete", fake_complete)
+        
+        for error_type in (requests.Timeout, requests.HTTPError, ValueError):
+            with pytest.raises(error_type):
+                client.chat("http://x", "key", "m", "你好", simulation_id="sim_1")
+        usage = scheduler.get_usage("sim_1")
+        assert usage['budget_used'] == 0
+        assert usage['requests'] == 3 and usage['retries'] == 0
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+from src.llm_gating import (
+    LLMGate, trajectory_deviation, SKIP_LOW_INFORMATION, SKIP_ALIGNED, SKIP_BUDGET, SKIP_PREDICTED
+)
+from src.llm_scheduler import get_llm_scheduler
+
+
+class _FixedPredictor:
+    def __init__(self, result):
+        self.result = result
+
+    def predict(self, agent, post):
+        return self.result
+
+
+class TestLLMGate:
+    """阅读阶段LLM调用门控的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.agent = SimpleNamespace(agent_id="agent_1", simulation_id="gate_test_sim",
+                                     current_emotion=0.2, current_stance=0.5)
+        self.post = {'mid': 'p1', 'information_strength': 0.6, 'emotion_score': -0.4, 'stance_score': -0.6}
+
+    def test_low_information_uses_annotations(self):
+        """测试信息强度低于阈值时跳过LLM并使用标注值"""
+        gate = LLMGate()
+
+        decision = gate.decide(self.agent, dict(self.post, information_strength=0.1))
+
+        assert not decision.use_llm
+        assert decision.reason == SKIP_LOW_INFORMATION
+        assert (decision.emotion_suggested, decision.stance_suggested) == (-0.4, -0.6)
+        assert gate.decide(self.agent, self.post).use_llm
+        stats = gate.get_stats()
+        assert stats['calls_saved'] == 1 and stats['llm_calls'] == 1
+
+    def test_aligned_posts_are_skipped(self):
+        """测试帖子与Agent当前状态接近时跳过LLM"""
+        gate = LLMGate(min_stance_distance=0.2, min_emotion_distance=0.2)
+
+        aligned = dict(self.post, emotion_score=0.25, stance_score=0.4)
+
+        assert gate.decide(self.agent, aligned).reason == SKIP_ALIGNED
+        assert gate.decide(self.agent, self.post).use_llm
+
+    def test_budget_reserve(self):
+        """测试剩余预算不足时只为高信息强度帖子调用LLM"""
+        scheduler = get_llm_scheduler()
+        scheduler.register_simulation("gate_budget_sim", token_budget=1000)
+        scheduler.record_result("gate_budget_sim", 0, {"prompt_tokens": 900, "completion_tokens": 50})
+        self.agent.simulation_id = "gate_budget_sim"
+        gate = LLMGate()
+
+        assert gate.decide(self.agent, self.post).reason == SKIP_BUDGET
+        assert gate.decide(self.agent, dict(self.post, information_strength=0.9)).use_llm
+
+    def test_predictor_and_shadow_sampling(self):
+        """测试可信预测值代替LLM；影子采样照常调用LLM并统计偏差"""
+        decision = LLMGate(predictor=_FixedPredictor((0.1, 0.2))).decide(self.agent, self.post)
+        assert decision.reason == SKIP_PREDICTED
+        assert (decision.emotion_suggested, decision.stance_suggested) == (0.1, 0.2)
+        assert LLMGate(predictor=_FixedPredictor(None)).decide(self.agent, self.post).use_llm
+
+        gate = LLMGate(shadow_rate=1.0)
+        shadow = gate.decide(self.agent, dict(self.post, information_strength=0.1))
+        assert shadow.use_llm and shadow.shadow
+        gate.record_shadow(shadow, -0.2, -0.1)
+        stats = gate.get_stats()
+        assert abs(stats['shadow_emotion_mae'] - 0.2) < 1e-9
+        assert abs(stats['shadow_stance_mae'] - 0.5) < 1e-9
+
+    def test_trajectory_deviation(self):
+        """测试与全量LLM运行的最终状态比较"""
+        reference = [{'id': 'a1', 'final_emotion': 0.5, 'final_stance': 0.1, 'final_confidence': 0.5},
+                     {'id': 'a2', 'final_emotion': -0.5, 'final_stance': 0.0, 'final_confidence': 0.5}]
+        gated = [{'id': 'a1', 'final_emotion': 0.4, 'final_stance': 0.1, 'final_confidence': 0.5},
+                 {'id': 'a2', 'final_emotion': -0.2, 'final_stance': 0.0, 'final_confidence': 0.5}]
+
+        report = trajectory_deviation(gated, reference)
+
+        assert report['agents'] == 2
+        assert abs(report['emotion_mae'] - 0.2) < 1e-9
+        assert abs(report['emotion_max'] - 0.3) < 1e-9
+        assert report['stance_mae'] == 0.0
@@ -0,0 +1,92 @@
+import threading
+import time
+import pytest
+from src.llm_scheduler import (
+    LLMScheduler, TokenBucket, LLMBudgetExceededError, estimate_tokens,
+    PRIORITY_INTERACTIVE, PRIORITY_BATCH
+)
+
+
+class TestTokenBucket:
+    """TokenBucket的测试用例"""
+    
+    def test_wait_time_after_consume(self):
+        """测试令牌耗尽后的等待时间"""
+        bucket = TokenBucket(rate=10, capacity=2)
+        
+        assert bucket.wait_time(2) == 0.0
+        bucket.consume(2)
+        assert bucket.wait_time(1) == pytest.approx(0.1, abs=0.02)
+    
+    def test_oversized_request_is_capped_at_capacity(self):
+        """测试超过容量的请求不会永远等待"""
+        bucket = TokenBucket(rate=1, capacity=5)
+        
+        assert bucket.wait_time(100) == 0.0
+
+
+class TestLLMScheduler:
+    """LLMScheduler的测试用例"""
+    
+    def test_estimate_tokens(self):
+        """测试近似token估算"""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("你好世界") == 4
+        assert estimate_tokens("abcdefgh") == 2
+    
+    def test_budget_exceeded(self):
+        """测试预算不足时抛出异常而不是发出请求"""
+        scheduler = LLMScheduler()
+        scheduler.register_simulation("sim_1", token_budget=100)
+        
+        scheduler.acquire("sim_1", 80)
+        with pytest.raises(LLMBudgetExceededError):
+            scheduler.acquire("sim_1", 30)
+        assert scheduler.get_usage("sim_1")['requests'] == 1
+    
+    def test_record_result_corrects_estimate(self):
+        """测试实际用量校正预算和统计"""
+        scheduler = LLMScheduler()
+        scheduler.register_simulation("sim_1", token_budget=1000)
+        
+        scheduler.acquire("sim_1", 300)
+        scheduler.record_result("sim_1", 300, {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70})
+        
+        usage = scheduler.get_usage("sim_1")
+        assert usage['estimated_tokens'] == 300
+        assert usage['total_tokens'] == 70
+        assert usage['budget_used'] == 70
+    
+    def test_requests_are_queued_by_rate_limit(self):
+        """测试超过请求速率时排队等待"""
+        scheduler = LLMScheduler(requests_per_second=20)
+        
+        start = time.monotonic()
+        for _ in range(22):
+            scheduler.acquire("sim_1", 1)
+        
+        assert time.monotonic() - start >= 0.05
+        assert scheduler.get_usage("sim_1")['queued_seconds'] > 0
+    
+    def test_interactive_requests_go_first(self):
+        """测试排队时交互式仿真优先于批量仿真"""
+        scheduler = LLMScheduler()
+        scheduler.register_simulation("batch_sim", priority=PRIORITY_BATCH)
+        scheduler.register_simulation("web_sim", priority=PRIORITY_INTERACTIVE)
+        scheduler.penalize(0.2)
+        order = []
+        
+        batch = threading.Thread(target=lambda: (scheduler.acquire("batch_sim", 1), order.append("batch")))
+        batch.start()
+        time.sleep(0.05)
+        interactive = threading.Thread(target=lambda: (scheduler.acquire("web_sim", 1), order.append("web")))
+        interactive.start()
+        batch.join()
+        interactive.join()
+        
+        assert order == ["web", "batch"]
+    
+    def test_unknown_priority(self):
+        """测试未知优先级"""
+        with pytest.raises(ValueError):
+            LLMScheduler().register_simulation("sim_1", priority="urgent")
@@ -0,0 +1,87 @@
+import threading
+import pytest
+from src.llm_service import LLMService, MicroBatcher
+
+
+class TestLLMServiceBatch:
+    """LLMService批量生成和微批队列的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.service = LLMService(use_mock=True, max_batch_size=4, max_wait_ms=50)
+
+    def teardown_method(self):
+        self.service.close()
+
+    def test_generate_batch_keeps_order(self):
+        """测试批量生成按输入顺序返回，并统计吞吐"""
+        results = self.service.generate_batch(["政治话题", "体育话题", "其他"])
+
+        assert results == [
+            self.service._mock_generate("政治话题"),
+            self.service._mock_generate("体育话题"),
+            self.service._mock_generate("其他"),
+        ]
+        stats = self.service.get_stats()
+        assert stats['batches'] == 1
+        assert stats['prompts'] == 3
+        assert self.service.generate_batch([]) == []
+
+    def test_submit_coalesces_concurrent_requests(self):
+        """测试等待窗口内的并发请求合并成一批"""
+        barrier = threading.Barrier(4)
+        results = {}
+
+        def worker(i):
+            barrier.wait()
+            results[i] = self.service.submit(f"科技{i}").result(timeout=5)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert set(results.values()) == {self.service._mock_generate("科技")}
+        batcher_stats = self.service.get_stats()['micro_batcher']
+        assert batcher_stats['requests'] == 4
+        assert batcher_stats['batches'] < 4
+
+
+class TestMicroBatcher:
+    """MicroBatcher的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.calls = []
+
+        def generate_batch(prompts, max_length):
+            self.calls.append((list(prompts), max_length))
+            return [f"{p}:{max_length}" for p in prompts]
+
+        self.generate_batch = generate_batch
+
+    def test_batch_size_limit_and_grouping(self):
+        """测试每批不超过上限，不同max_length分开生成"""
+        batcher = MicroBatcher(self.generate_batch, max_batch_size=3, max_wait_ms=200)
+        futures = [batcher.submit(f"p{i}", 10 if i % 2 else 20) for i in range(5)]
+
+        assert [f.result(timeout=5) for f in futures] == [
+            "p0:20", "p1:10", "p2:20", "p3:10", "p4:20"
+        ]
+        batcher.close()
+        assert all(len(prompts) <= 3 for prompts, _ in self.calls)
+        assert batcher.get_stats()['requests'] == 5
+
+    def test_errors_propagate_to_futures(self):
+        """测试生成异常传递给同批所有请求"""
+        def failing(prompts, max_length):
+            raise RuntimeError("oom")
+
+        batcher = MicroBatcher(failing, max_batch_size=2, max_wait_ms=20)
+        future = batcher.submit("p")
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+        batcher.close()
+        with pytest.raises(RuntimeError):
+            batcher.submit("p")
@@ -0,0 +1,41 @@
+import threading
+from src.llm_stream import SimulationEventStream, EVENT_POST_DELTA, EVENT_POST_DONE
+
+
+class TestSimulationEventStream:
+    """按仿真划分的流式事件缓冲区的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.stream = SimulationEventStream(max_events=3)
+
+    def test_read_since_sequence(self):
+        """测试按序号增量读取，且各仿真互不影响"""
+        first = self.stream.publish("sim_1", EVENT_POST_DELTA, {'agent_id': 'a1', 'delta': '你好'})
+        self.stream.publish("sim_2", EVENT_POST_DELTA, {'agent_id': 'a2', 'delta': 'x'})
+        self.stream.publish("sim_1", EVENT_POST_DONE, {'agent_id': 'a1', 'content': '你好'})
+
+        events = self.stream.read("sim_1")
+        assert [e['type'] for e in events] == [EVENT_POST_DELTA, EVENT_POST_DONE]
+        assert [e['type'] for e in self.stream.read("sim_1", first)] == [EVENT_POST_DONE]
+        assert self.stream.read("sim_3") == []
+
+    def test_buffer_is_bounded(self):
+        """测试超过上限时丢弃最早的事件"""
+        for i in range(5):
+            self.stream.publish("sim_1", EVENT_POST_DELTA, {'delta': str(i)})
+
+        assert [e['delta'] for e in self.stream.read("sim_1")] == ['2', '3', '4']
+        self.stream.clear("sim_1")
+        assert self.stream.read("sim_1") == []
+
+    def test_wait_wakes_on_publish(self):
+        """测试等待方在新事件发布后被唤醒，超时返回空列表"""
+        assert self.stream.wait("sim_1", timeout=0.01) == []
+
+        timer = threading.Timer(0.05, self.stream.publish, args=("sim_1", EVENT_POST_DELTA, {'delta': 'a'}))
+        timer.start()
+        events = self.stream.wait("sim_1", timeout=5)
+        timer.join()
+
+        assert [e['delta'] for e in events] == ['a']
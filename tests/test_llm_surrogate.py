@@ -0,0 +1,128 @@
+import os
+import tempfile
+import numpy as np
+from src.agent import Agent
+from src.llm_gating import LLMGate
+from src.llm_surrogate import (
+    SurrogateModel, SurrogatePairRecorder, SurrogatePredictor, train_surrogate, load_pairs,
+    agent_feature_row, post_feature_row, SURROGATE_REPLACE
+)
+
+
+def _synthetic_pairs(n, seed=0):
+    """建议值 = 当前状态向帖子标注靠拢（按信息强度加权），加少量噪声"""
+    rng = np.random.default_rng(seed)
+    agent_x = np.column_stack([
+        rng.integers(0, 2, n), rng.uniform(0, 1, n), rng.uniform(0, 1, n),
+        rng.uniform(-1, 1, n), rng.uniform(-1, 1, n), rng.uniform(0, 1, n),
+    ])
+    post_x = np.column_stack([rng.uniform(-1, 1, n), rng.uniform(-1, 1, n), rng.uniform(0, 1, n)])
+    emotion = agent_x[:, 3] + 0.6 * post_x[:, 2] * (post_x[:, 0] - agent_x[:, 3])
+    stance = agent_x[:, 4] + 0.4 * (post_x[:, 1] - agent_x[:, 4])
+    y = np.clip(np.column_stack([emotion, stance]) + rng.normal(0, 0.02, (n, 2)), -1, 1)
+    return agent_x, post_x, y
+
+
+class TestLLMSurrogate:
+    """LLM代理模型的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.agent = Agent("agent_1", "ordinary_user", 0.5, 0.2, 0.5, 0.1, 0.2, 0.6)
+        self.post = {'mid': 'p1', 'emotion_score': -0.5, 'stance_score': 0.4, 'information_strength': 0.7}
+
+    def test_fit_and_calibration(self):
+        """测试在合成数据上训练后留出误差很小"""
+        agent_x, post_x, y = _synthetic_pairs(2000)
+        model = SurrogateModel.fit(agent_x[:1500], post_x[:1500], y[:1500], l2=0.1)
+
+        report = model.calibration_report(agent_x[1500:], post_x[1500:], y[1500:])
+
+        assert report['samples'] == 500
+        for target in ('emotion_suggested', 'stance_suggested'):
+            assert report[target]['mae'] < 0.1
+            assert report[target]['r2'] > 0.9
+            assert sum(b['count'] for b in report[target]['calibration']) == 500
+
+    def test_grid_matches_rowwise(self):
+        """测试Agent×帖子网格推理与逐行推理结果一致"""
+        agent_x, post_x, y = _synthetic_pairs(300)
+        model = SurrogateModel.fit(agent_x, post_x, y)
+
+        grid = model.predict_grid(agent_x[:4], post_x[:3])
+        rows = model.predict(np.repeat(agent_x[:4], 3, axis=0), np.tile(post_x[:3], (4, 1)))
+
+        assert grid.shape == (4, 3, 2)
+        assert np.allclose(grid.reshape(-1, 2), rows)
+
+    def test_record_train_save_load(self):
+        """测试录制样本、训练（含留出报告）、保存与加载"""
+        pairs_path = os.path.join(self.temp_dir, "pairs.jsonl.gz")
+        recorder = SurrogatePairRecorder(pairs_path)
+        agent_x, post_x, y = _synthetic_pairs(50)
+        for a, p, t in zip(agent_x, post_x, y):
+            self.agent.current_emotion, self.agent.current_stance = a[3], a[4]
+            recorder.record(self.agent, {'emotion_score': p[0], 'stance_score': p[1], 'information_strength': p[2]}, *t)
+        recorder.close()
+        assert recorder.get_stats()['recorded'] == 50
+        assert load_pairs([pairs_path])[2].shape == (50, 2)
+
+        model = train_surrogate([pairs_path], holdout_ratio=0.2)
+        assert model.holdout_report['samples'] == 10
+        model_path = os.path.join(self.temp_dir, "model.npz")
+        model.save(model_path)
+        loaded = SurrogateModel.load(model_path)
+
+        assert loaded.holdout_report == model.holdout_report
+        assert np.allclose(loaded.predict(agent_x, post_x), model.predict(agent_x, post_x))
+
+    def test_predictor_modes(self):
+        """测试gate模式超出训练范围时交给LLM，replace模式总是预测，留出误差过大时不启用"""
+        agent_x, post_x, y = _synthetic_pairs(500)
+        # 训练样本只包含弱信息强度的帖子
+        post_x[:, 2] *= 0.3
+        model = SurrogateModel.fit(agent_x, post_x, y)
+        model.holdout_report = model.calibration_report(agent_x, post_x, y)
+
+        gate = SurrogatePredictor(model)
+        assert gate.predict(self.agent, self.post) is None
+        assert gate.predict(self.agent, dict(self.post, information_strength=0.2)) is not None
+        assert gate.get_stats()['out_of_range'] == 1
+
+        emotion, stance = SurrogatePredictor(model, mode=SURROGATE_REPLACE).predict(self.agent, self.post)
+        assert -1.0 <= emotion <= 1.0 and -1.0 <= stance <= 1.0
+
+        strict = SurrogatePredictor(model, max_holdout_mae=1e-6)
+        assert not strict.enabled
+        assert strict.predict(self.agent, dict(self.post, information_strength=0.2)) is None
+
+    def test_predictor_matches_model(self):
+        """测试逐条推理（时间片开始时预计算帖子特征，或未预计算）与模型的逐行推理和范围判断一致"""
+        agent_x, post_x, y = _synthetic_pairs(400)
+        post_x[:, 2] *= 0.5
+        model = SurrogateModel.fit(agent_x, post_x, y)
+        posts = [{'mid': f"p{i}", 'emotion_score': -0.8 + 0.4 * i, 'stance_score': 0.9 - 0.45 * i,
+                  'information_strength': 0.15 * (i + 1)} for i in range(5)]
+        rows = np.asarray([post_feature_row(post) for post in posts])
+        expected_x = np.repeat([agent_feature_row(self.agent)], len(posts), axis=0)
+        expected = model.predict(expected_x, rows)
+        in_range = model.in_range(expected_x, rows)
+
+        for begin_slice in (True, False):
+            gate = SurrogatePredictor(model)
+            replace = SurrogatePredictor(model, mode=SURROGATE_REPLACE)
+            if begin_slice:
+                LLMGate(predictor=gate).begin_slice(posts)
+                replace.begin_slice(posts)
+            for i, post in enumerate(posts):
+                assert np.allclose(replace.predict(self.agent, post), expected[i])
+                assert (gate.predict(self.agent, post) is not None) == in_range[i]
+            assert 0 < gate.get_stats()['out_of_range'] < len(posts)
+
+    def test_feature_rows(self):
+        """测试从Agent和帖子提取特征"""
+        leader = Agent("leader", "opinion_leader", 0.9, 0.1, 0.5, 0.0, 0.5, 0.8)
+
+        assert agent_feature_row(leader) == [1.0, 0.9, 0.1, 0.0, 0.5, 0.8]
+        assert post_feature_row({'emotion': 0.3}) == [0.3, 0.0, 1.0]
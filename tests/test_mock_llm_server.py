@@ -0,0 +1,82 @@
+import json
+import pytest
+import requests
+from src.llm_backends import OpenAIHTTPBackend
+from src.llm_client import LLMClient
+from src.llm_scheduler import LLMScheduler
+from src.mock_llm_server import MockLLMServer, LatencyModel
+
+
+class TestMockLLMServer:
+    """本地Mock LLM服务器的测试用例"""
+    
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.client = LLMClient(scheduler=LLMScheduler())
+    
+    def test_replies_by_prompt_type(self):
+        """测试服务器按prompt类型返回阅读JSON、标注JSON和发帖文本"""
+        with MockLLMServer() as server:
+            backend = OpenAIHTTPBackend(server.endpoint, "mock-key", "mock")
+            reading = json.loads(self.client.complete(backend, '请输出 {"emotion_suggested": x, "stance_suggested": y}'))
+            annotation = json.loads(self.client.complete(backend, "输出information_strength和stance_category"))
+            posting = self.client.complete(backend, "写一条帖子")
+            stats = server.get_stats()
+        
+        assert set(reading) == {"emotion_suggested", "stance_suggested"}
+        assert "information_strength" in annotation
+        assert isinstance(posting, str) and posting
+        assert stats["ok"] == 3
+    
+    def test_rate_limit_injection_is_retried(self):
+        """测试注入的429被客户端按Retry-After重试"""
+        with MockLLMServer(rate_limit_rate=0.5, retry_after=0, seed=1) as server:
+            backend = OpenAIHTTPBackend(server.endpoint, "mock-key", "mock")
+            results = [self.client.complete(backend, f"帖子{i}") for i in range(6)]
+            stats = server.get_stats()
+        
+        assert all(results)
+        assert stats["rate_limited"] > 0
+        assert stats["ok"] == 6
+    
+    def test_error_injection(self):
+        """测试注入的500错误直接抛出"""
+        with MockLLMServer(error_rate=1.0) as server:
+            backend = OpenAIHTTPBackend(server.endpoint, "mock-key", "mock")
+            with pytest.raises(requests.HTTPError):
+                self.client.complete(backend, "写一条帖子")
+    
+    def test_latency_models(self):
+        """测试延迟分布的采样"""
+        import random
+        rng = random.Random(0)
+        
+        assert LatencyModel(latency_ms=50).sample(rng) == 0.05
+        assert LatencyModel(latency_ms=0, spike_rate=1.0, spike_ms=100).sample(rng) == 0.1
+        samples = [LatencyModel("lognormal", median_ms=100, sigma=0.3).sample(rng) for _ in range(200)]
+        assert 0.07 < sorted(samples)[100] < 0.14
+        with pytest.raises(ValueError):
+            LatencyModel("uniform")
+    
+    def test_streaming_completion(self):
+        """测试流式生成逐段回调，拼接结果与非流式回复一致"""
+        from src.llm_backends import mock_reply
+        deltas = []
+        with MockLLMServer() as server:
+            backend = OpenAIHTTPBackend(server.endpoint, "mock-key", "mock", stream=True)
+            content = self.client.complete(backend, "写一条帖子", on_delta=deltas.append)
+        
+        assert len(deltas) > 1
+        assert "".join(deltas) == content == mock_reply("写一条帖子")
+    
+    def test_streaming_max_token_guard(self):
+        """测试流式生成超过token上限时提前中止并截断"""
+        from src.llm_backends import mock_reply
+        deltas = []
+        with MockLLMServer() as server:
+            backend = OpenAIHTTPBackend(server.endpoint, "mock-key", "mock", stream=True, max_stream_tokens=3)
+            content = self.client.complete(backend, "写一条帖子", on_delta=deltas.append)
+        
+        assert content == "".join(deltas)
+        assert 0 < len(content) < len(mock_reply("写一条帖子"))
+        assert backend.streams_truncated == 1
@@ -0,0 +1,129 @@
+import copy
+import json
+import pickle
+import sys
+import pytest
+from src.post import Post, as_post, source_post_id
+from src.world_state import WorldState
+
+
+class TestPost:
+    """规范帖子记录Post的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.raw = {
+            'mid': 'm001',
+            'uid': 'u42',
+            'text': '原始内容 #话题#',
+            't': 1704067200,
+            'pid': 'm000',
+            'popularity': 12,
+            'emotion_score': 0.6,
+            'stance_score': -0.5,
+            'information_strength': None,
+            'stance_category': 'NEUTRAL_MEDIATING',
+        }
+
+    def test_from_dict_resolves_aliases(self):
+        """测试别名只解析一次，原始字段全部保留，给出的类别被保存、没有给出的类别按分值计算"""
+        post = Post.from_dict(self.raw)
+
+        assert post.post_id == 'm001'
+        assert post.author_id == 'u42'
+        assert post.content == '原始内容 #话题#'
+        assert post.timestamp == 1704067200
+        assert post.parent_post_id == 'm000'
+        assert post.information_strength is None
+        assert post.emotion_category == 'positive'
+        assert post.stance_category == 'NEUTRAL_MEDIATING'
+        assert post.keywords == [] and post.is_repost is False
+        assert post['mid'] == 'm001' and post['popularity'] == 12 and post['t'] == 1704067200
+        # 与规范字段相同的别名不再保存在extra中
+        assert post.extra == {'popularity': 12}
+        # 原始dict不被修改
+        assert 'post_id' not in self.raw
+        assert set(post) == set(self.raw) | {'post_id', 'author_id', 'content', 'timestamp', 'parent_post_id',
+                                             'emotion_category', 'keywords', 'is_repost'}
+
+    def test_optional_fields_absent(self):
+        """测试源数据没有的可选字段不存在"""
+        post = Post.from_dict({'content': '内容'})
+
+        assert 'author_id' not in post
+        assert post.get('timestamp', 'none') == 'none'
+        with pytest.raises(KeyError):
+            post['parent_post_id']
+        assert post.post_id == '_'
+        assert len(post) == len(post.to_dict()) == 9
+
+    def test_category_follows_score(self):
+        """测试写入的类别被保存，分值赋值（属性、[]或update）时按新分值推导类别"""
+        post = Post.from_dict(self.raw)
+        post.update({'emotion_score': -0.8, 'stance_category': 'support'})
+
+        assert post.emotion_category == 'negative'
+        assert post.stance_category == 'support'
+        post.stance_score = 0.1
+        assert post['stance_category'] == 'neutral'
+        post.update({'stance_category': 'oppose', 'stance_score': 0.9})
+        assert post.stance_category == 'oppose'
+        post['emotion_category'] = 'angry'
+        assert post.to_dict()['emotion_category'] == 'angry'
+
+    def test_alias_writes_match_dict(self):
+        """测试修改规范字段或别名后，别名的取值与dict中一致（别名不随规范字段改变）"""
+        post = Post.from_dict(self.raw)
+        expected = post.to_dict()
+        post['post_id'] = 'm999'
+        post['uid'] = 'u7'
+        del post['parent_post_id']
+        expected.update({'post_id': 'm999', 'uid': 'u7'})
+        del expected['parent_post_id']
+
+        assert post.to_dict() == expected and len(post) == len(expected)
+        assert post['mid'] == 'm001' and post['pid'] == 'm000' and post.author_id == 'u42'
+        del post['t']
+        assert 't' not in post and post.timestamp == 1704067200
+
+    def test_smaller_than_dict(self):
+        """测试Post记录（含extra）比包含相同字段的dict占用更少内存"""
+        post = Post.from_dict(self.raw)
+
+        assert sys.getsizeof(post) + sys.getsizeof(post.extra) < sys.getsizeof(post.to_dict())
+
+    def test_json_boundary_and_copies(self):
+        """测试to_dict可直接序列化，pickle/deepcopy/from_dict副本与原记录相等且相互独立"""
+        post = Post.from_dict(self.raw)
+        data = post.to_dict()
+
+        assert json.loads(json.dumps(data, ensure_ascii=False)) == data
+        assert Post.from_dict(data) == post == data
+        for clone in (pickle.loads(pickle.dumps(post)), copy.deepcopy(post), Post.from_dict(post)):
+            assert clone == post
+            clone['popularity'] = 0
+            assert post['popularity'] == 12
+        assert as_post(post) is post
+
+    def test_source_post_id(self):
+        """测试语料ID按mid、id、post_id顺序查找"""
+        assert source_post_id({'mid': None, 'id': 'i1'}) is None
+        assert source_post_id({'id': 'i1', 'post_id': 'p1'}) == 'i1'
+        assert source_post_id(Post('p1')) == 'p1'
+        assert source_post_id({}, 'unknown') == 'unknown'
+
+    def test_world_state_stores_posts(self):
+        """测试世界状态帖子池保存Post记录，按ID回写时更新分值和类别"""
+        world_state = WorldState()
+        post_id = world_state.add_post(self.raw)
+        event_id = world_state.inject_event({'content': '突发', 'author_id': 'system'})
+
+        stored, event = world_state.get_all_posts()
+        assert isinstance(stored, Post) and stored.post_id == post_id == 'm001'
+        assert event.parent_post_id is None and 'timestamp' in event
+        assert world_state.get_event_posts() == [event] and event.post_id == event_id
+
+        assert world_state.update_post(post_id, {'emotion_score': 0.0, 'keywords': ['话题'],
+                                                 'stance_score': 0.2, 'stance_category': 'NEUTRAL_MEDIATING'})
+        assert stored.emotion_category == 'neutral' and stored.stance_category == 'NEUTRAL_MEDIATING'
+        assert stored['keywords'] == ['话题']
@@ -0,0 +1,74 @@
+import pytest
+from src import post_annotator
+from src.post_annotator import PostAnnotator, build_annotation_prompt, parse_annotation_response
+from src.llm_backends import MockBackend
+
+
+class _FakeAgent:
+    def __init__(self, agent_id):
+        self.agent_id = agent_id
+        self.llm_backend = MockBackend()
+        self.simulation_id = None
+    
+    def llm_configured(self):
+        return self.llm_backend is not None
+
+
+class TestPostAnnotator:
+    """PostAnnotator及标注辅助函数的测试用例"""
+    
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.template = '[目标帖子 (回复 4)]: 走正常途径不如闹来钱多又快\n[目标帖子]: "走正常途径不如闹来钱多又快"'
+        post_annotator._template_cache[post_annotator.ANNOTATION_TEMPLATE_PATH] = self.template
+    
+    def teardown_method(self):
+        """每个测试方法后的清理"""
+        post_annotator._template_cache.clear()
+    
+    def test_build_annotation_prompt_with_parent(self):
+        """测试带父帖子的标注prompt"""
+        prompt = build_annotation_prompt(self.template, "新帖子", "父帖子内容")
+        
+        assert "[父帖子]: 父帖子内容" in prompt
+        assert '[目标帖子]: "新帖子"' in prompt
+        assert "走正常途径" not in prompt
+    
+    def test_parse_annotation_response(self):
+        """测试从markdown包裹的响应中解析标注字段"""
+        text = '```json\n{"emotion_score": "-0.5", "stance_score": 0.2, "keywords": ["医院"], "extra": 1}\n```'
+        
+        fields = parse_annotation_response(text)
+        
+        assert fields == {"emotion_score": -0.5, "stance_score": 0.2, "keywords": ["医院"]}
+        assert parse_annotation_response("无法标注") is None
+    
+    def test_flush_returns_results_in_submit_order(self, monkeypatch):
+        """测试并行标注结果按提交顺序返回，失败任务被跳过"""
+        def fake_request(prompt, llm_backend, simulation_id=None, call_info=None):
+            if "坏帖子" in prompt:
+                raise RuntimeError("429 Too Many Requests")
+            return {"emotion_score": 0.9 if "好" in prompt else -0.9}
+        
+        monkeypatch.setattr(post_annotator, "request_annotation", fake_request)
+        annotator = PostAnnotator(max_workers=3)
+        agent = _FakeAgent("agent_1")
+        for i, content in enumerate(["好帖子", "坏帖子", "差帖子"]):
+            assert annotator.submit(agent, {"id": f"p{i}", "content": content, "pid": None}, [])
+        
+        results = annotator.flush()
+        annotator.shutdown()
+        
+        assert [r["post_id"] for r in results] == ["p0", "p2"]
+        assert results[0]["fields"]["emotion_score"] == 0.9
+        assert annotator.pending_count == 0
+        assert annotator.failed_count == 1
+    
+    def test_submit_without_llm_config(self):
+        """测试未配置LLM时不提交标注任务"""
+        agent = _FakeAgent("agent_2")
+        agent.llm_backend = None
+        annotator = PostAnnotator()
+        
+        assert annotator.submit(agent, {"id": "p0", "content": "内容"}, []) is False
+        assert annotator.pending_count == 0
@@ -0,0 +1,114 @@
+import threading
+import time
+from src import post_annotator
+from src.posting_pipeline import PostingPipeline
+from src.agent_controller import AgentController
+from src.world_state import WorldState
+from src.llm_batch import BatchPendingError
+
+
+class _FakeAgent:
+    def __init__(self, agent_id):
+        self.agent_id = agent_id
+        self.llm_backend = object()
+        self.simulation_id = None
+
+    def llm_configured(self):
+        return True
+
+
+class TestPostingPipeline:
+    """发帖流水线的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.pipeline = PostingPipeline(max_workers=4)
+
+    def teardown_method(self):
+        """每个测试方法后的清理"""
+        self.pipeline.shutdown()
+
+    def test_join_preserves_submit_order(self):
+        """测试任务乱序完成时join仍按提交顺序返回"""
+        def task(delay, value):
+            time.sleep(delay)
+            return value
+
+        agents = [_FakeAgent(f"a{i}") for i in range(4)]
+        for i, agent in enumerate(agents):
+            self.pipeline.submit(agent, task, 0.04 - i * 0.01, i)
+
+        results = self.pipeline.join()
+
+        assert [agent for agent, _, _ in results] == agents
+        assert [value for _, value, _ in results] == [0, 1, 2, 3]
+        assert self.pipeline.pending_count == 0
+
+    def test_submit_does_not_block(self):
+        """测试提交立即返回，任务在后台执行"""
+        release = threading.Event()
+        self.pipeline.submit(_FakeAgent("a0"), release.wait, 5)
+
+        assert self.pipeline.pending_count == 1
+        release.set()
+        assert self.pipeline.join()[0][1] is True
+
+    def test_errors_are_returned(self):
+        """测试任务异常随结果返回，不影响其他任务"""
+        def fail():
+            raise ValueError("boom")
+
+        self.pipeline.submit(_FakeAgent("a0"), fail)
+        self.pipeline.submit(_FakeAgent("a1"), lambda: "ok")
+
+        (_, value0, error0), (_, value1, error1) = self.pipeline.join()
+
+        assert value0 is None and isinstance(error0, ValueError)
+        assert value1 == "ok" and error1 is None
+        assert self.pipeline.failed_count == 1
+
+    def test_controller_join_publishes_in_agent_order(self):
+        """测试时间片边界按Agent顺序写入帖子池，批处理暂停的Agent移出本时间片统计"""
+        controller = AgentController(WorldState(), None, annotation_workers=0, posting_workers=2)
+
+        def compose(agent_id, delay):
+            time.sleep(delay)
+            if agent_id == "a1":
+                raise BatchPendingError("posting a1")
+            return {'id': f"{agent_id}_post", 'content': agent_id, 'author_id': agent_id}
+
+        for i, delay in enumerate([0.03, 0.0, 0.01]):
+            controller.posting_pipeline.submit(_FakeAgent(f"a{i}"), compose, f"a{i}", delay)
+        scores = {"a0": {}, "a1": {}, "a2": {}}
+        posting_agents = ["a0", "a1", "a2"]
+
+        published = controller.join_posting_pipeline([], scores, posting_agents)
+        controller.posting_pipeline.shutdown()
+
+        assert published == 2
+        assert [post['id'] for post in controller.world_state.posts_pool] == ["a0_post", "a2_post"]
+        assert posting_agents == ["a0", "a2"] and "a1" not in scores
+
+    def test_controller_join_submits_deferred_annotations(self, monkeypatch):
+        """测试流水线发帖写入帖子池后提交到标注阶段，时间片边界回写标注结果"""
+        monkeypatch.setitem(post_annotator._template_cache, post_annotator.ANNOTATION_TEMPLATE_PATH, '[目标帖子]: x')
+        monkeypatch.setattr(post_annotator, "request_annotation",
+                            lambda prompt, llm_backend, simulation_id=None, call_info=None: {"emotion_score": -0.9})
+        controller = AgentController(WorldState(), None, annotation_workers=2, posting_workers=2)
+
+        def compose(agent_id):
+            return {'id': f"{agent_id}_post", 'content': agent_id, 'author_id': agent_id, 'emotion_score': 0.5}
+
+        controller._pipeline_deferred_annotation.add("a0")
+        for i in range(2):
+            controller.posting_pipeline.submit(_FakeAgent(f"a{i}"), compose, f"a{i}")
+
+        assert controller.join_posting_pipeline([]) == 2
+        assert controller.post_annotator.pending_count == 1
+        assert controller.flush_post_annotations() == 1
+        controller.posting_pipeline.shutdown()
+        controller.post_annotator.shutdown()
+
+        annotated, plain = controller.world_state.posts_pool
+        assert annotated['emotion_score'] == -0.9 and plain['emotion_score'] == 0.5
+        assert not controller._pipeline_deferred_annotation
@@ -0,0 +1,73 @@
+from src.prompt_budget import PromptBudget, influence_score, post_influence, PROMPT_POSTING, PROMPT_READING
+
+
+def _record(post_id, emotion_change=0.0, stance_change=0.0):
+    return {
+        'post_id': post_id,
+        'emotion_before': 0.0, 'emotion_after': emotion_change,
+        'stance_before': 0.0, 'stance_after': stance_change,
+        'confidence_before': 0.5, 'confidence_after': 0.5,
+    }
+
+
+class TestPromptBudget:
+    """Prompt预算与裁剪的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        # 每个帖子10个汉字，约10个token
+        self.posts = [{'mid': f'p{i}', 'content': '帖' * 10} for i in range(6)]
+
+    def test_influence_score(self):
+        """测试影响分数公式及按帖子取最大值"""
+        assert abs(influence_score(_record('p1', 0.5, 0.25)) - 0.3) < 1e-9
+        scores = post_influence([_record('p1', 0.1), _record('p1', 0.5), _record('p2', 0.2)])
+        assert abs(scores['p1'] - 0.2) < 1e-9
+        assert abs(scores['p2'] - 0.08) < 1e-9
+
+    def test_posts_within_budget_are_untouched(self):
+        """测试未超出预算时保留全部帖子"""
+        budget = PromptBudget({PROMPT_POSTING: 1000})
+
+        selected, dropped = budget.select_posts(self.posts, [], reserved_tokens=100)
+
+        assert selected == self.posts
+        assert dropped == 0
+        assert budget.get_stats()['by_type'][PROMPT_POSTING]['trimmed_prompts'] == 0
+
+    def test_select_most_influential_posts(self):
+        """测试超出预算时保留强制阅读和影响最大的帖子，并保持阅读顺序"""
+        posts = self.posts + [{'mid': 'official', 'content': '官方' * 5, 'is_official_statement': True}]
+        history = [_record('p4', 0.6), _record('p1', 0.3), _record('p2', 0.1)]
+        budget = PromptBudget({PROMPT_POSTING: 50})
+
+        selected, dropped = budget.select_posts(posts, history, reserved_tokens=20)
+
+        assert [p['mid'] for p in selected] == ['p1', 'p4', 'official']
+        assert dropped == 4
+        stats = budget.get_stats()['by_type'][PROMPT_POSTING]
+        assert stats['tokens_before'] == 90
+        assert stats['tokens_after'] == 50
+        assert stats['items_dropped'] == 4
+
+    def test_trim_chain_to_recent_ancestors(self):
+        """测试对话链只保留最近的父帖子，超出预算时继续裁剪，当前帖子总是保留"""
+        chain = [{'mid': f'c{i}', 'text': '链' * 10} for i in range(8)]
+
+        trimmed, dropped = PromptBudget(max_chain_ancestors=3).trim_chain(chain)
+        assert [p['mid'] for p in trimmed] == ['c4', 'c5', 'c6', 'c7']
+        assert dropped == 4
+
+        budget = PromptBudget({PROMPT_READING: 25}, max_chain_ancestors=None)
+        trimmed, dropped = budget.trim_chain(chain, reserved_tokens=5)
+        assert [p['mid'] for p in trimmed] == ['c6', 'c7']
+        trimmed, _ = budget.trim_chain(chain, reserved_tokens=1000)
+        assert [p['mid'] for p in trimmed] == ['c7']
+
+    def test_from_config(self):
+        """测试从仿真配置创建，未给出的类型使用默认值"""
+        budget = PromptBudget.from_config({'max_tokens': {PROMPT_READING: None}, 'max_chain_ancestors': 2})
+
+        assert budget.max_tokens[PROMPT_READING] is None
+        assert budget.max_tokens[PROMPT_POSTING] is not None
+        assert budget.max_chain_ancestors == 2
@@ -0,0 +1,92 @@
+import os
+from src.prompt_layout import (
+    split_sections, has_format_fields, stable_format_template, stable_marker_template, PrefixReuseTracker
+)
+from src.post_annotator import build_annotation_prompt
+from src.llm_backends import OpenAIHTTPBackend
+from src.llm_scheduler import LLMScheduler
+
+READING_TEMPLATE = """# 角色
+你是一名社交媒体用户。
+
+## 2. 对话上下文
+{post_context}
+
+## 3. 你的当前状态
+- 当前情绪: {current_emotion}
+
+## 5. 你的任务
+分析帖子并输出建议值。
+
+## 6. 输出格式
+{{"emotion_suggested": 0.0}}
+
+## 7. 请开始分析
+输出JSON。"""
+
+
+class TestPromptLayout:
+    """稳定前缀布局与前缀复用统计的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.values = [
+            {'post_context': '上下文A', 'current_emotion': 0.1},
+            {'post_context': '另一段上下文', 'current_emotion': -0.5},
+        ]
+
+    def test_split_sections_roundtrip(self):
+        """测试按标题切分后拼接与原文相同"""
+        sections = split_sections(READING_TEMPLATE)
+
+        assert ''.join(sections) == READING_TEMPLATE
+        assert len(sections) == 6
+        assert has_format_fields(sections[1])
+        assert not has_format_fields(sections[4])  # {{ }}转义的花括号不算占位符
+
+    def test_static_sections_form_shared_prefix(self):
+        """测试静态段落在前，不同Agent状态生成的prompt共享全部静态前缀"""
+        layout = stable_format_template(READING_TEMPLATE)
+        prompts = [layout.format(**values) for values in self.values]
+        prefix = os.path.commonprefix(prompts)
+
+        assert layout.index('## 7. 请开始分析') < layout.index('## 2. 对话上下文') < layout.index('## 3. 你的当前状态')
+        assert prefix.startswith('# 角色') and '## 7. 请开始分析\n输出JSON。\n' in prefix
+        assert '上下文A' not in prefix and '0.1' not in prefix
+
+    def test_annotation_target_moves_to_end(self):
+        """测试标注prompt中目标帖子段落移到末尾并替换为实际内容"""
+        template = "# 标注任务\n说明。\n\n## 目标\n[目标帖子]: \"走正常途径不如闹来钱多又快\"\n\n## 输出\nJSON\n"
+
+        prompt = build_annotation_prompt(template, "实际帖子")
+
+        assert prompt.startswith("# 标注任务\n说明。\n\n## 输出\nJSON\n")
+        assert prompt.endswith('[目标帖子]: "实际帖子"\n\n')
+        assert stable_marker_template(template, ('[目标帖子',)) is stable_marker_template(template, ('[目标帖子',))
+
+    def test_prefix_reuse_tracker(self):
+        """测试按调用点统计相邻prompt的公共前缀"""
+        tracker = PrefixReuseTracker()
+
+        assert tracker.observe('reading', '静态说明静态说明A') == 0
+        assert tracker.observe('reading', '静态说明静态说明B') == 8
+        tracker.observe('posting', '完全不同')
+        stats = tracker.get_stats()
+
+        assert stats['reading']['prompts'] == 2
+        assert stats['reading']['shared_prefix_tokens'] == 8
+        assert 0.4 < stats['reading']['reuse_ratio'] < 0.5
+        assert stats['posting']['shared_prefix_tokens'] == 0
+
+    def test_cache_hint_and_cached_tokens(self):
+        """测试前缀缓存路由提示字段，以及usage中缓存命中token的统计"""
+        backend = OpenAIHTTPBackend("http://x", "key", "m", prompt_cache_key="sim")
+        assert backend._request_body("p", {'call_site': 'reading'})['prompt_cache_key'] == "sim:reading"
+        assert 'prompt_cache_key' not in OpenAIHTTPBackend("http://x", "key", "m")._request_body("p", None)
+
+        scheduler = LLMScheduler()
+        scheduler.record_result("sim_1", 10, {"prompt_tokens": 100, "completion_tokens": 5,
+                                              "prompt_tokens_details": {"cached_tokens": 64}})
+        scheduler.record_result("sim_1", 10, {"prompt_tokens": 100, "completion_tokens": 5,
+                                              "prompt_cache_hit_tokens": 32})
+        assert scheduler.get_usage("sim_1")['cached_prompt_tokens'] == 96
@@ -0,0 +1,68 @@
+from src.slice_context import SliceContext, is_forced_broadcast
+from src.agent_controller import AgentController
+from src.world_state import WorldState
+from src.agent import Agent
+
+
+class TestSliceContext:
+    """时间片上下文的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.posts = [
+            {'mid': 'p1', 'content': '普通帖子', 'popularity': 10, 'timestamp': 1704105000,
+             'stance_score': 0.5, 'emotion_score': 0.2, 'information_strength': 0.6, 'stance_category': 'SUPPORT_PATIENT',
+             'children': [{'mid': 'c1', 'pid': 'p1', 'content': '回复', 'children': [{'mid': 'c2', 'pid': 'c1'}]}]},
+            {'mid': 'p2', 'content': '热帖', 'popularity': 30, 'timestamp': 1704105600,
+             'stance_score': -0.5, 'emotion_score': -0.4, 'information_strength': 0.8, 'stance_category': 'SUPPORT_HOSPITAL'},
+            {'mid': 'h1', 'content': '紧急广播', 'is_hurricane': True, 'popularity': 999, 'timestamp': 1704109999},
+            {'mid': 'e1', 'content': '事件', 'is_event': True, 'priority': 999},
+        ]
+
+    def test_partition_and_ranges(self):
+        """测试飓风/普通帖子划分、热度范围（只统计普通帖子）和最新时间戳"""
+        context = SliceContext(3, self.posts)
+
+        assert [p['mid'] for p in context.hurricane_posts] == ['h1', 'e1']
+        assert [p['mid'] for p in context.normal_posts] == ['p1', 'p2']
+        assert context.popularity_range == (10, 20)
+        assert context.latest_timestamp == 1704109999
+        assert not is_forced_broadcast({'is_event': True, 'priority': 5})
+
+    def test_mid_index_includes_children(self):
+        """测试mid索引包含嵌套回复"""
+        context = SliceContext(0, self.posts)
+
+        assert set(context.mid_index) == {'p1', 'c1', 'c2', 'p2', 'h1', 'e1'}
+        assert context.mid_index['c2']['pid'] == 'c1'
+
+    def test_env_summary(self):
+        """测试环境摘要字段与意见领袖prompt对齐"""
+        summary = SliceContext(0, self.posts).env_summary
+
+        assert summary['total_posts_in_slice'] == 4
+        assert summary['stance_distribution'] == {'SUPPORT_PATIENT': 0.25, 'SUPPORT_HOSPITAL': 0.25}
+        assert summary['average_stance_score'] == 0.0
+        assert SliceContext(0, []).env_summary == {}
+
+    def test_controller_uses_precomputed_values(self):
+        """测试控制器使用预计算值的结果与逐次计算一致，时间片结束后上下文失效"""
+        controller = AgentController(WorldState(), None, annotation_workers=0, posting_workers=0)
+        agent = Agent("a1", "ordinary_user", 0.5, 0.2, 0.5, 0.0, 0.1, 0.5)
+        context = SliceContext(0, self.posts)
+
+        feed_scores = controller._generate_personalized_feed(agent, context.normal_posts)[1]
+        precomputed_scores = controller._generate_personalized_feed(
+            agent, context.normal_posts, popularity_range=context.popularity_range
+        )[1]
+        assert feed_scores == precomputed_scores
+
+        post = controller.build_post_json(agent, "内容", self.posts, use_llm_annotation=False)
+        precomputed_post = controller.build_post_json(agent, "内容", self.posts, use_llm_annotation=False,
+                                                      latest_ts=context.latest_timestamp)
+        assert post['t'] == precomputed_post['t'] == 1704110000
+
+        controller.add_agent(agent)
+        controller.update_agent_emotions(self.posts, time_slice_index=0, slice_context=context)
+        assert controller.slice_context is None
+        assert controller.last_env_summary is context.env_summary
@@ -0,0 +1,104 @@
+import json
+import os
+import random
+import tempfile
+import numpy as np
+import pytest
+from src.social_graph import SocialGraph, post_author
+from src.agent import Agent
+from src.agent_controller import AgentController
+from src.world_state import WorldState
+
+
+class TestSocialGraph:
+    """CSR社交关系图与按关注关系的Feed候选的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        rng = random.Random(8)
+        self.edges = [(f"a{rng.randint(0, 5)}", f"u{rng.randint(0, 12)}") for _ in range(40)]
+        self.posts = [{
+            'mid': f"m{i}",
+            'uid': f"u{rng.randint(0, 15)}",
+            'popularity': rng.randint(0, 30),
+            'stance_score': rng.uniform(-1, 1),
+            'information_strength': 0.5,
+        } for i in range(60)]
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def teardown_method(self):
+        """每个测试方法后的清理"""
+        self.tmpdir.cleanup()
+
+    def _following(self):
+        following = {}
+        for agent_id, author_id in self.edges:
+            following.setdefault(agent_id, set()).add(author_id)
+        return following
+
+    def test_csr_from_edges(self):
+        """测试CSR行内作者升序且去重，与边集合一致"""
+        graph = SocialGraph.from_edges(self.edges)
+
+        assert graph.num_edges == len(set(self.edges))
+        for agent_id, authors in self._following().items():
+            row = graph.following(agent_id)
+            assert list(row) == sorted(row) and len(set(row.tolist())) == len(row)
+            assert {graph.author_ids[i] for i in row} == authors
+            assert all(graph.follows(agent_id, author_id) for author_id in authors)
+        assert not graph.follows('a0', 'nobody')
+        assert len(graph.following('missing')) == 0
+
+    def test_load_csv_and_json(self):
+        """测试CSV、边列表JSON和邻接表JSON加载结果一致，save_csv可重新加载"""
+        expected = self._following()
+        json_edges = os.path.join(self.tmpdir.name, 'edges.json')
+        json_adjacency = os.path.join(self.tmpdir.name, 'adjacency.json')
+        csv_path = os.path.join(self.tmpdir.name, 'graph.csv')
+        with open(json_edges, 'w', encoding='utf-8') as f:
+            json.dump([{'agent_id': a, 'author_id': u} for a, u in self.edges], f)
+        with open(json_adjacency, 'w', encoding='utf-8') as f:
+            json.dump({a: sorted(u) for a, u in expected.items()}, f)
+        SocialGraph.from_edges(self.edges).save_csv(csv_path)
+
+        for path in (json_edges, json_adjacency, csv_path):
+            graph = SocialGraph.load(path)
+            assert {a: {graph.author_ids[i] for i in graph.following(a)} for a in graph.agent_ids} == expected
+        with pytest.raises(ValueError):
+            SocialGraph.load(os.path.join(self.tmpdir.name, 'graph.txt'))
+
+    def test_synthetic_is_deterministic(self):
+        """测试合成关系图按种子确定，热度为0的作者不会被关注"""
+        weights = {f"u{i}": float(i % 4) for i in range(30)}
+        agent_ids = [f"a{i}" for i in range(20)]
+        graph = SocialGraph.synthetic(agent_ids, weights, avg_following=5, seed=3)
+        again = SocialGraph.synthetic(agent_ids, weights, avg_following=5, seed=3)
+
+        assert np.array_equal(graph.indptr, again.indptr) and np.array_equal(graph.indices, again.indices)
+        assert all(len(graph.following(a)) >= 1 for a in agent_ids)
+        assert all(weights[graph.author_ids[i]] > 0 for i in graph.indices)
+
+    def test_exposure_candidates_match_scan(self):
+        """测试候选帖子等于关注作者的帖子加热门样本（按时间片顺序）"""
+        graph = SocialGraph.from_edges(self.edges)
+        exposure = graph.exposure(self.posts, trending_sample=5)
+        ranked = sorted(range(len(self.posts)), key=lambda i: (-self.posts[i]['popularity'], i))
+
+        for agent_id in graph.agent_ids + ['missing']:
+            expected = {i for i, post in enumerate(self.posts)
+                        if graph.follows(agent_id, post_author(post))} | set(ranked[:5])
+            assert exposure.candidates(agent_id) == sorted(expected)
+
+    def test_feed_scores_only_candidates(self):
+        """测试启用关系图后个性化Feed只对候选帖子打分，未启用时对全部帖子打分"""
+        controller = AgentController(WorldState(), None, annotation_workers=0, posting_workers=0)
+        agent = Agent("a1", "ordinary_user", 0.5, 0.2, 0.5, 0.0, 0.0, 0.5)
+        controller.add_agent(agent)
+        controller.set_social_graph(SocialGraph.from_edges(self.edges), trending_sample=3)
+
+        candidates = controller.social_graph.exposure(self.posts, 3).candidates("a1")
+        _, scores = controller._generate_personalized_feed(agent, self.posts, candidate_indices=candidates)
+        assert [s[0] for s in scores] == [self.posts[i]['mid'] for i in candidates]
+
+        _, scores = controller._generate_personalized_feed(agent, self.posts)
+        assert len(scores) == len(self.posts)
@@ -165,3 +165,53 @@ class TestTimeSliceManager:
         assert time_manager.total_slices == 1
         slice_data = time_manager.get_slice(0)
         assert len(slice_data) == 4
+
+
+class TestDurationTimeSlices:
+    """按时间窗口划分时间片的测试用例"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        base = datetime(2024, 1, 1, 10, 0, 0).timestamp()
+        # 数字时间戳（秒/毫秒）与ISO字符串混用
+        self.posts = [
+            {"id": "p0", "timestamp": "2024-01-01T10:00:00", "popularity": 5},
+            {"id": "p1", "timestamp": int(base + 1800), "popularity": 5},
+            {"id": "p2", "timestamp": int((base + 3 * 3600) * 1000), "popularity": 5},
+            {"id": "p3", "t": "2024-01-01T15:59:59", "popularity": 5},
+            {"id": "p4", "timestamp": "2024-01-01T11:59:59", "popularity": 5},
+        ]
+
+    def test_windows_and_bounds(self):
+        """测试按2小时窗口划分（含空窗口），混合格式的时间戳按实际时间排序"""
+        time_manager = TimeSliceManager(self.posts, slice_duration=2 * 3600)
+
+        assert time_manager.total_slices == 3
+        assert [p["id"] for p in time_manager.get_slice(0)] == ["p0", "p1", "p4"]
+        assert [p["id"] for p in time_manager.get_slice(1)] == ["p2"]
+        assert [p["id"] for p in time_manager.get_slice(2)] == ["p3"]
+        assert time_manager.slice_bounds(1) == (3, 4)
+
+        info = time_manager.slice_info(1)
+        assert info == {"index": 1, "start_time": "2024-01-01T12:00:00",
+                        "end_time": "2024-01-01T14:00:00", "post_count": 1}
+
+    def test_slices_are_views(self):
+        """测试时间片是不复制帖子的只读视图"""
+        time_manager = TimeSliceManager(self.posts, slice_size=2)
+        slice_0 = time_manager.get_slice(0)
+
+        assert slice_0[0] is time_manager.get_all_posts()[0]
+        assert slice_0[-1]["id"] == "p1"
+        assert slice_0 == [self.posts[0], self.posts[1]]
+        assert not hasattr(slice_0, "append")
+        assert time_manager.slice_info(2)["start_time"] == "2024-01-01T15:59:59"
+
+    def test_invalid_duration(self):
+        """测试无效的时间片时长和无法解析的时间戳"""
+        with pytest.raises(ValueError):
+            TimeSliceManager(self.posts, slice_duration=0)
+        with pytest.raises(ValueError):
+            TimeSliceManager([{"id": "x", "timestamp": "昨天", "popularity": 1}], slice_size=1)
+        with pytest.raises(IndexError):
+            TimeSliceManager(self.posts, slice_duration=3600).get_slice(6)
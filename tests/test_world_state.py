@@ -223,4 +223,19 @@ class TestWorldState:
         
         # 验证帖子ID都是唯一的
         post_ids_in_pool = [post["id"] for post in all_posts]
-        assert len(set(post_ids_in_pool)) == 6
\ No newline at end of file
+        assert len(set(post_ids_in_pool)) == 6
+    
+    def test_update_post(self):
+        """测试按ID回写帖子字段并重新计算类别"""
+        post = self.test_post.copy()
+        post["id"] = "agent_post_001"
+        post_id = self.world_state.add_post(post)
+        
+        updated = self.world_state.update_post(post_id, {"emotion_score": -0.8, "stance_score": 0.6})
+        
+        assert updated is True
+        stored = self.world_state.get_all_posts()[0]
+        assert stored["emotion_score"] == -0.8
+        assert stored["emotion_category"] == "negative"
+        assert stored["stance_category"] == "support"
+        assert self.world_state.update_post("missing_id", {"emotion_score": 0.1}) is False